@@ -1,5 +1,30 @@
 import client from "./client";
 
+// largest page the API sends, see RECIPE_MANAGER["MAX_PAGE_SIZE"]
+const PAGE_SIZE = 1000;
+
+const nextCursor = link => {
+  const next = /<([^>]*)>;\s*rel="next"/.exec(link || "");
+
+  return next ? new URL(next[1]).searchParams.get("cursor") : null;
+};
+
+// list endpoints send one page at a time with the next one in the Link header
+const getAllPages = async url => {
+  const data = [];
+  let cursor;
+
+  do {
+    const response = await client.get(url, {
+      params: { page_size: PAGE_SIZE, cursor: cursor || undefined }
+    });
+    data.push(...response.data);
+    cursor = nextCursor(response.headers.link);
+  } while (cursor);
+
+  return { data };
+};
+
 const requests = {
   login(username, password) {
     return client.post("/token/", {
@@ -21,7 +46,7 @@ const requests = {
   },
 
   getAllIngredients() {
-    return client.get("/recipe-manager/ingredients/");
+    return getAllPages("/recipe-manager/ingredients/");
   },
 
   getIngredientUnits() {
@@ -40,7 +65,7 @@ const requests = {
   },
 
   getAllTags() {
-    return client.get("/recipe-manager/tags/");
+    return getAllPages("/recipe-manager/tags/");
   },
 
   createTag(tag) {
@@ -56,7 +81,7 @@ const requests = {
   },
 
   getAllRecipes() {
-    return client.get("/recipe-manager/recipes/");
+    return getAllPages("/recipe-manager/recipes/");
   },
 
   createRecipe(recipe) {
@@ -45,6 +45,8 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE = (
+    "recipe_manager.middleware.ServerTimingMiddleware",
+    "recipe_manager.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -55,6 +57,25 @@ MIDDLEWARE = (
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 )
 
+# set by manage.py benchmark_http on the server it starts, reports each
+# request's SQL queries and the worker's peak memory in response headers
+BENCHMARK = os.environ.get("BENCHMARK", "").strip('"') == "1"
+
+if BENCHMARK:
+    MIDDLEWARE = ("recipe_manager.middleware.BenchmarkMiddleware",) + MIDDLEWARE
+
+# hold requests to the SQL query budgets in recipe_manager.budgets, "raise"
+# fails the request, "warn" logs a warning and unset skips the check.
+# Defaults to "warn" in development
+QUERY_BUDGETS = (
+    os.environ.get("QUERY_BUDGETS", "warn" if DEBUG else "").strip('"') or None
+)
+
+MIDDLEWARE = ("recipe_manager.middleware.QueryBudgetMiddleware",) + MIDDLEWARE
+
+# superusers can have a request profiled with the X-Profile header or ?profile=
+MIDDLEWARE = ("recipe_manager.middleware.ProfileMiddleware",) + MIDDLEWARE
+
 ROOT_URLCONF = "cookbook.urls"
 
 TEMPLATES = (
@@ -75,13 +96,28 @@ TEMPLATES = (
 
 
 CORS_ORIGIN_ALLOW_ALL = True
+# list endpoints link to their next and previous pages in the Link header
+CORS_EXPOSE_HEADERS = ("Link",)
 
 # CORS_ORIGIN_WHITELIST = (
 #     '*',
 # )
 
+# "orjson" swaps the stdlib json parser and renderer for the orjson based ones
+JSON_BACKEND = os.environ.get("JSON_BACKEND", "stdlib").strip('"')
+
 REST_FRAMEWORK = {
-    "DEFAULT_PARSER_CLASSES": ("rest_framework.parsers.JSONParser",),
+    "DEFAULT_PARSER_CLASSES": (
+        "recipe_manager.parsers.ORJSONParser"
+        if JSON_BACKEND == "orjson"
+        else "rest_framework.parsers.JSONParser",
+    ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "recipe_manager.renderers.ORJSONRenderer"
+        if JSON_BACKEND == "orjson"
+        else "recipe_manager.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
     "DEFAULT_AUTHENTICATION_CLASSES": ("users.authentication.JWTCookieAuthentication",),
 }
 
@@ -125,6 +161,46 @@ DATABASES = {
 
 FIXTURE_DIRS = ("cookbook/recipe_manager/fixtures/simple_recipes.json",)
 
+# RecipeManager
+RECIPE_MANAGER = {
+    # rows per page on list endpoints, clients may ask for up to MAX_PAGE_SIZE
+    "PAGE_SIZE": int(os.environ.get("PAGE_SIZE", "100").strip('"')),
+    "MAX_PAGE_SIZE": int(os.environ.get("MAX_PAGE_SIZE", "1000").strip('"')),
+    # rows read and serialized at a time by ?stream=true list responses
+    "STREAM_CHUNK_SIZE": 500,
+    # matches returned by /ingredients/suggest/ unless ?limit= asks for more
+    "SUGGEST_LIMIT": 10,
+    # similar recipes precomputed for /recipes/<pk>/similar/
+    "SIMILAR_RECIPES": 10,
+    # share of requests given a Server-Timing header and a timing log record
+    "SERVER_TIMING_SAMPLE_RATE": float(
+        os.environ.get("SERVER_TIMING_SAMPLE_RATE", "0").strip('"')
+    ),
+    # directory the workers of one server share their /metrics counts through
+    "METRICS_DIR": os.environ.get("METRICS_DIR", "").strip('"') or None,
+    # bearer token scrapers send to /metrics, it isn't served without one
+    "METRICS_TOKEN": os.environ.get("METRICS_TOKEN", "").strip('"') or None,
+    # newest request profiles kept, seconds between samples of ?profile=sample
+    # and SELECTs explained per profile
+    "PROFILES_KEPT": 50,
+    "PROFILE_SAMPLE_INTERVAL": 0.001,
+    "PROFILE_EXPLAIN_LIMIT": 100,
+}
+
+# sampled request timings are written to stderr as one JSON object per line
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"timing": {"()": "recipe_manager.timing.LogFormatter"}},
+    "handlers": {"timing": {"class": "logging.StreamHandler", "formatter": "timing"}},
+    "loggers": {
+        "recipe_manager.timing": {
+            "handlers": ("timing",),
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
 
 # Default Auth model
 AUTH_USER_MODEL = "users.User"
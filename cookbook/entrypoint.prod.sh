@@ -9,4 +9,11 @@ then
     echo "PostgreSQL started"
 fi
 
+if [ -n "$METRICS_DIR" ]
+then
+    # counts of the previous server's workers
+    rm -rf "$METRICS_DIR"
+    mkdir -p "$METRICS_DIR"
+fi
+
 exec "$@"
@@ -8,3 +8,7 @@ class RecipeManagerConfig(AppConfig):
     """
 
     name = "recipe_manager"
+
+    def ready(self):
+        # pylint: disable=import-outside-toplevel,unused-import
+        from . import signals  # noqa: F401
@@ -0,0 +1,854 @@
+"""
+HTTP load benchmark of every API route, run by manage.py benchmark_http.
+Worker threads run scenarios, short sequences of requests that put back what
+they change where the API allows it, against a server started with
+BENCHMARK=1 so every response carries its SQL query count and the peak
+memory of the worker that served it (see middleware.BenchmarkMiddleware).
+Results are kept per method and route and written as JSON, compare diffs two
+runs.
+"""
+import contextlib
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Generator, List, NamedTuple, Tuple, Union
+from django.conf import settings
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework_simplejwt.tokens import RefreshToken
+from users.models import User
+from . import dataset, models, profiling
+from .middleware import MAX_RSS_HEADER, QUERY_COUNT_HEADER
+
+USERNAME = "benchmark"
+PERCENTILES = (50, 95, 99)
+# ids read by scenarios, sampled from the whole table
+SAMPLE_SIZE = 10000
+
+
+class Request(NamedTuple):
+    """A request a scenario makes, route is the URL name"""
+
+    route: str
+    method: str
+    path: str
+    body: Union[dict, list, bytes, None] = None
+
+
+class Reply(NamedTuple):
+    """Response a scenario gets back for its last Request"""
+
+    status: int
+    body: bytes
+
+    def json(self):
+        """Decoded JSON body"""
+        return json.loads(self.body)
+
+
+class Context(NamedTuple):
+    """Rows and credentials the scenarios use, shared by every worker"""
+
+    run_id: str
+    password: str
+    access: str
+    refresh: str
+    recipe_ids: List[int]
+    recipe_names: List[str]
+    sub_recipe_ids: List[int]
+    ingredient_ids: List[int]
+    ingredient_names: List[str]
+    tag_ids: List[int]
+
+
+class Worker:
+    """State of one load generating thread
+
+    Attributes:
+        index (int): worker number
+        rng (random.Random): random source of the worker's scenarios
+        recipe_ids (List[int]): recipes only this worker writes to, so
+            scenarios of different workers don't undo each other
+        created (int): rows named by this worker so far
+    """
+
+    def __init__(self, index: int, concurrency: int, context: Context, seed: int):
+        self.index = index
+        self.rng = random.Random(seed * 1000 + index)
+        self.recipe_ids = context.recipe_ids[index::concurrency]
+        self.created = 0
+
+    def name(self, context: Context, kind: str) -> str:
+        """A name no other worker or run uses"""
+        self.created += 1
+        return f"benchmark {kind} {context.run_id} {self.index} {self.created}"
+
+
+Scenario = Callable[[Context, Worker], Generator[Request, Reply, None]]
+
+
+def prepare(
+    recipes: int = 0, seed: int = 0, batch_size: int = dataset.BATCH_SIZE
+) -> Context:
+    """Seed a dataset and gather what the scenarios need. Scenarios log in as
+    a superuser, so they may write to any recipe.
+
+    Args:
+        recipes (int, optional): recipes to generate first, with users,
+            ingredients, tags and meal plans in proportion. Defaults to 0.
+        seed (int, optional): random seed of the dataset and the sampling.
+        batch_size (int, optional): recipes written per transaction
+
+    Returns:
+        Context: shared scenario state
+    """
+    if recipes:
+        dataset.generate(
+            users=max(recipes // 100, 1),
+            recipes=recipes,
+            ingredients=max(recipes // 5, 20),
+            tags=max(recipes // 50, 10),
+            meal_plans=28,
+            seed=seed,
+            batch_size=batch_size,
+        )
+
+    user = User.objects.filter(username=USERNAME).first()
+    if user is None:
+        user = User.objects.create_superuser(
+            USERNAME, f"{USERNAME}@example.com", dataset.PASSWORD
+        )
+
+    rng = random.Random(seed)
+    token = RefreshToken.for_user(user)
+    recipes = _sample(models.Recipe.objects.values_list("id", "name"), rng)
+    ingredients = _sample(models.Ingredient.objects.values_list("id", "name"), rng)
+
+    return Context(
+        run_id=uuid.uuid4().hex[:8],
+        password=dataset.PASSWORD,
+        access=str(token.access_token),
+        refresh=str(token),
+        recipe_ids=[recipe_id for recipe_id, _ in recipes],
+        recipe_names=[name for _, name in recipes],
+        sub_recipe_ids=_sample(
+            models.Ingredient.objects.filter(recipe__isnull=False).values_list(
+                "recipe_id", flat=True
+            ),
+            rng,
+        ),
+        ingredient_ids=[ingredient_id for ingredient_id, _ in ingredients],
+        ingredient_names=[name for _, name in ingredients],
+        tag_ids=_sample(models.Tag.objects.values_list("id", flat=True), rng),
+    )
+
+
+def _sample(queryset, rng: random.Random) -> list:
+    rows = list(queryset.order_by("id").iterator())
+
+    return rng.sample(rows, SAMPLE_SIZE) if len(rows) > SAMPLE_SIZE else rows
+
+
+# scenarios, each yields requests and is sent the reply to the last one
+
+
+def _get(route: str, path: str):
+    def scenario(context: Context, worker: Worker):
+        yield Request(route, "GET", path)
+
+    return scenario
+
+
+def _get_recipe(route: str, path: str):
+    def scenario(context: Context, worker: Worker):
+        recipe_id = worker.rng.choice(context.recipe_ids)
+        yield Request(route, "GET", f"/api/recipe-manager/recipes/{recipe_id}/{path}")
+
+    return scenario
+
+
+def _get_ingredient(context: Context, worker: Worker):
+    ingredient_id = worker.rng.choice(context.ingredient_ids)
+    yield Request(
+        "ingredient-detail", "GET", f"/api/recipe-manager/ingredients/{ingredient_id}/"
+    )
+
+
+def _suggest_ingredient(context: Context, worker: Worker):
+    prefix = worker.rng.choice(context.ingredient_names)[:3]
+    yield Request(
+        "ingredient-suggest",
+        "GET",
+        f"/api/recipe-manager/ingredients/suggest/?q={urllib.parse.quote(prefix)}",
+    )
+
+
+def _get_tag(context: Context, worker: Worker):
+    tag_id = worker.rng.choice(context.tag_ids)
+    yield Request("tag-detail", "GET", f"/api/recipe-manager/tags/{tag_id}/")
+
+
+def _search_recipes(context: Context, worker: Worker):
+    query = worker.rng.choice(context.recipe_names).split()[0]
+    yield Request(
+        "recipe-search",
+        "GET",
+        f"/api/recipe-manager/recipes/search/?q={urllib.parse.quote(query)}",
+    )
+
+
+def _match_recipes(context: Context, worker: Worker):
+    pantry = worker.rng.sample(
+        context.ingredient_ids, min(len(context.ingredient_ids), 8)
+    )
+    yield Request(
+        "recipe-match",
+        "GET",
+        "/api/recipe-manager/recipes/match/?ingredients=" + ",".join(map(str, pantry)),
+    )
+
+
+def _get_used_in(context: Context, worker: Worker):
+    recipe_id = worker.rng.choice(context.sub_recipe_ids or context.recipe_ids)
+    yield Request(
+        "recipe-used-in", "GET", f"/api/recipe-manager/recipes/{recipe_id}/used-in/"
+    )
+
+
+def _get_recipe_ingredient(context: Context, worker: Worker):
+    recipe_id = worker.rng.choice(context.recipe_ids)
+    path = f"/api/recipe-manager/recipes/{recipe_id}/ingredients/"
+    reply = yield Request("recipe-ingredients", "GET", path)
+
+    if reply.status == 200 and (used := reply.json()):
+        ingredient_id = worker.rng.choice(used)["ingredient_id"]
+        yield Request("recipe-ingredient-detail", "GET", f"{path}{ingredient_id}/")
+
+
+def _get_step(context: Context, worker: Worker):
+    recipe_id = worker.rng.choice(context.recipe_ids)
+    yield Request(
+        "recipe-step-detail",
+        "GET",
+        f"/api/recipe-manager/recipes/{recipe_id}/steps/{worker.rng.randint(1, 5)}/",
+    )
+
+
+def _create_ingredient(context: Context, worker: Worker):
+    yield Request(
+        "ingredient",
+        "POST",
+        "/api/recipe-manager/ingredients/",
+        {"name": worker.name(context, "ingredient"), "recipe_id": None},
+    )
+
+
+def _create_tag(context: Context, worker: Worker):
+    yield Request(
+        "tag",
+        "POST",
+        "/api/recipe-manager/tags/",
+        {"value": worker.name(context, "tag"), "kind": "Meal"},
+    )
+
+
+def _recipe_body(context: Context, worker: Worker, name: str) -> dict:
+    rng = worker.rng
+
+    return {
+        "name": name,
+        "description": "Written by the benchmark",
+        "servings": rng.randint(1, 8),
+        "cook_time": f"{rng.randrange(10, 120, 5)} minutes",
+        "ingredients": [
+            {"ingredient_id": ingredient_id, "amount": "1.50", "unit": "c"}
+            for ingredient_id in rng.sample(
+                context.ingredient_ids, min(len(context.ingredient_ids), 8)
+            )
+        ],
+        "steps": [f"Step {position}" for position in range(1, rng.randint(5, 25) + 1)],
+        "tags": rng.sample(context.tag_ids, min(len(context.tag_ids), 3)),
+    }
+
+
+def _create_recipe(context: Context, worker: Worker):
+    yield Request(
+        "recipe",
+        "POST",
+        "/api/recipe-manager/recipes/",
+        _recipe_body(context, worker, worker.name(context, "recipe")),
+    )
+
+
+def _replace_recipe(context: Context, worker: Worker):
+    recipe_id = worker.rng.choice(worker.recipe_ids)
+    path = f"/api/recipe-manager/recipes/{recipe_id}/"
+    reply = yield Request("recipe-detail", "GET", path)
+
+    if reply.status == 200:
+        recipe = reply.json()
+        yield Request(
+            "recipe-detail",
+            "PUT",
+            path,
+            {
+                **{
+                    field: recipe[field]
+                    for field in ("name", "description", "servings", "cook_time")
+                },
+                "ingredients": [
+                    {
+                        field: ingredient[field]
+                        for field in ("ingredient_id", "amount", "unit", "specifier")
+                    }
+                    for ingredient in recipe["ingredients"]
+                ],
+                "steps": recipe["steps"],
+                "tags": recipe["tags"],
+            },
+        )
+
+
+def _import_recipe(context: Context, worker: Worker):
+    # the same name every time, so it is created once and updated after
+    recipe = _recipe_body(context, worker, f"benchmark import {worker.index}")
+    recipe["ingredients"] = [
+        {"name": name, "amount": "2.00", "unit": "g"}
+        for name in worker.rng.sample(
+            context.ingredient_names, min(len(context.ingredient_names), 8)
+        )
+    ]
+    recipe["tags"] = [{"value": "benchmark import", "kind": "Meal"}]
+    yield Request(
+        "recipe-import",
+        "POST",
+        "/api/recipe-manager/recipes/import/",
+        json.dumps(recipe).encode() + b"\n",
+    )
+
+
+def _add_ingredient(context: Context, worker: Worker):
+    recipe_id = worker.rng.choice(worker.recipe_ids)
+    path = f"/api/recipe-manager/recipes/{recipe_id}/ingredients/"
+    reply = yield Request("recipe-ingredients", "GET", path)
+
+    if reply.status != 200:
+        return
+
+    ingredient_id = _unused(
+        worker, context.ingredient_ids, {used["ingredient_id"] for used in reply.json()}
+    )
+    reply = yield Request(
+        "recipe-ingredients",
+        "POST",
+        path,
+        {
+            "ingredient_id": ingredient_id,
+            "amount": "1.00",
+            "unit": "tsp",
+            "specifier": "",
+        },
+    )
+
+    if reply.status == 201:
+        path = f"{path}{ingredient_id}/"
+        yield Request(
+            "recipe-ingredient-detail",
+            "PUT",
+            path,
+            {"amount": "2.00", "unit": "tbsp", "specifier": "chopped"},
+        )
+        yield Request("recipe-ingredient-detail", "DELETE", path)
+
+
+def _add_step(context: Context, worker: Worker):
+    recipe_id = worker.rng.choice(worker.recipe_ids)
+    path = f"/api/recipe-manager/recipes/{recipe_id}/steps/"
+    reply = yield Request(
+        "recipe-steps",
+        "POST",
+        path,
+        {"instruction": "Added by the benchmark", "position": 1},
+    )
+
+    if reply.status == 201:
+        yield Request(
+            "recipe-step-detail",
+            "PUT",
+            f"{path}1/",
+            {"instruction": "Moved by the benchmark", "position": 2},
+        )
+        yield Request("recipe-step-detail", "DELETE", f"{path}2/")
+
+
+def _reorder_steps(context: Context, worker: Worker):
+    recipe_id = worker.rng.choice(worker.recipe_ids)
+    path = f"/api/recipe-manager/recipes/{recipe_id}/steps/"
+    reply = yield Request("recipe-steps", "GET", path)
+
+    if reply.status == 200:
+        yield Request(
+            "recipe-steps-order",
+            "PUT",
+            f"{path}order/",
+            {"positions": list(range(len(reply.json()), 0, -1))},
+        )
+
+
+def _add_tag(context: Context, worker: Worker):
+    recipe_id = worker.rng.choice(worker.recipe_ids)
+    path = f"/api/recipe-manager/recipes/{recipe_id}/tags/"
+    reply = yield Request("recipe-tags", "GET", path)
+
+    if reply.status != 200:
+        return
+
+    tag_id = _unused(worker, context.tag_ids, {tag["id"] for tag in reply.json()})
+    reply = yield Request("recipe-tags", "POST", path, {"id": tag_id})
+
+    if reply.status == 201:
+        yield Request("recipe-tags-delete", "DELETE", f"{path}{tag_id}/")
+
+
+def _unused(worker: Worker, ids: List[int], used: set) -> int:
+    """A random ID not in used, or any ID should they all be"""
+    for _ in range(10):
+        if (choice := worker.rng.choice(ids)) not in used:
+            return choice
+
+    return next((choice for choice in ids if choice not in used), choice)
+
+
+def _plan_meal(context: Context, worker: Worker):
+    meal_plan = {
+        "recipe_id": worker.rng.choice(context.recipe_ids),
+        "planned_date": time.strftime("%Y-%m-%d"),
+        "meal": "Dinner",
+        "cooked": False,
+    }
+    reply = yield Request(
+        "meal-plan", "POST", "/api/recipe-manager/meal-plan/", meal_plan
+    )
+
+    if reply.status == 201:
+        yield Request(
+            "meal-plan-detail",
+            "PUT",
+            f"/api/recipe-manager/meal-plan/{reply.json()['id']}/",
+            {**meal_plan, "cooked": True},
+        )
+
+
+def _obtain_token(context: Context, worker: Worker):
+    yield Request(
+        "token_obtain_pair",
+        "POST",
+        "/api/token/",
+        {"username": USERNAME, "password": context.password},
+    )
+
+
+def _refresh_token(context: Context, worker: Worker):
+    yield Request(
+        "token_refresh", "POST", "/api/token/refresh/", {"refresh": context.refresh}
+    )
+
+
+def _log_out(context: Context, worker: Worker):
+    yield Request("token_logout", "POST", "/api/token/logout/")
+
+
+def _profile_recipe(context: Context, worker: Worker):
+    recipe_id = worker.rng.choice(context.recipe_ids)
+    profiler = worker.rng.choice((profiling.CPROFILE, profiling.SAMPLE))
+    yield Request(
+        "recipe-detail",
+        "GET",
+        f"/api/recipe-manager/recipes/{recipe_id}/?profile={profiler}",
+    )
+    reply = yield Request("profile", "GET", "/api/recipe-manager/profiles/")
+
+    if reply.status == 200 and (profiles := reply.json()):
+        path = f"/api/recipe-manager/profiles/{profiles[0]['id']}/"
+        yield Request("profile-detail", "GET", path)
+        yield Request("profile-download", "GET", f"{path}download/")
+
+
+# name to (reads or writes, relative weight, scenario)
+SCENARIOS: Dict[str, Tuple[str, float, Scenario]] = {
+    "list ingredients": (
+        "read",
+        1,
+        _get("ingredient", "/api/recipe-manager/ingredients/"),
+    ),
+    "ingredient units": (
+        "read",
+        1,
+        _get("ingredient-units", "/api/recipe-manager/ingredients/units/"),
+    ),
+    "suggest ingredients": ("read", 2, _suggest_ingredient),
+    "get ingredient": ("read", 2, _get_ingredient),
+    "list tags": ("read", 1, _get("tag", "/api/recipe-manager/tags/")),
+    "tag kinds": ("read", 1, _get("tag_kind", "/api/recipe-manager/tags/kind/")),
+    "get tag": ("read", 1, _get_tag),
+    "list recipes": ("read", 4, _get("recipe", "/api/recipe-manager/recipes/")),
+    "search recipes": ("read", 4, _search_recipes),
+    "match recipes": ("read", 2, _match_recipes),
+    "export recipes": (
+        "read",
+        0.05,
+        _get("recipe-export", "/api/recipe-manager/recipes/export/"),
+    ),
+    "get recipe": ("read", 8, _get_recipe("recipe-detail", "")),
+    "flatten recipe": ("read", 2, _get_recipe("recipe-flattened", "flattened/")),
+    "recipes used in": ("read", 1, _get_used_in),
+    "similar recipes": ("read", 2, _get_recipe("recipe-similar", "similar/")),
+    "recipe ingredients": ("read", 2, _get_recipe_ingredient),
+    "recipe steps": ("read", 2, _get_recipe("recipe-steps", "steps/")),
+    "get step": ("read", 1, _get_step),
+    "recipe tags": ("read", 2, _get_recipe("recipe-tags", "tags/")),
+    "list meal plans": ("read", 2, _get("meal-plan", "/api/recipe-manager/meal-plan/")),
+    "shopping list": (
+        "read",
+        2,
+        _get("meal-plan-shopping-list", "/api/recipe-manager/meal-plan/shopping-list/"),
+    ),
+    "create ingredient": ("write", 1, _create_ingredient),
+    "create tag": ("write", 1, _create_tag),
+    "create recipe": ("write", 2, _create_recipe),
+    "replace recipe": ("write", 2, _replace_recipe),
+    "import recipe": ("write", 0.5, _import_recipe),
+    "add recipe ingredient": ("write", 2, _add_ingredient),
+    "add step": ("write", 2, _add_step),
+    "reorder steps": ("write", 1, _reorder_steps),
+    "add recipe tag": ("write", 2, _add_tag),
+    "plan meal": ("write", 2, _plan_meal),
+    "obtain token": ("write", 0.5, _obtain_token),
+    "refresh token": ("write", 1, _refresh_token),
+    "log out": ("write", 1, _log_out),
+    "profile recipe": ("write", 0.05, _profile_recipe),
+}
+
+
+def route_names() -> List[str]:
+    """Names of every API route, the scenarios cover all of them
+
+    Returns:
+        List[str]: URL names under /api/
+    """
+    names = []
+    for pattern in get_resolver().url_patterns:
+        if isinstance(pattern, URLResolver) and str(pattern.pattern).startswith("api/"):
+            names.extend(
+                child.name
+                for child in pattern.url_patterns
+                if isinstance(child, URLPattern)
+            )
+
+    return names
+
+
+@contextlib.contextmanager
+def gunicorn(workers: int, port: int = 0, timeout: float = 30):
+    """Start gunicorn serving this project with BenchmarkMiddleware installed
+
+    Args:
+        workers (int): gunicorn worker processes
+        port (int, optional): port to bind on 127.0.0.1. Defaults to a free one.
+        timeout (float, optional): seconds to wait for it to accept connections
+
+    Yields:
+        str: base URL of the server
+    """
+    if not port:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+
+    server = subprocess.Popen(
+        (
+            # the one installed along with this interpreter
+            shutil.which("gunicorn", path=os.path.dirname(sys.executable))
+            or "gunicorn",
+            "cookbook.wsgi",
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ),
+        cwd=settings.BASE_DIR,
+        env={**os.environ, "BENCHMARK": "1"},
+    )
+
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with {server.returncode}")
+
+            try:
+                socket.create_connection(("127.0.0.1", port), 1).close()
+                break
+
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("gunicorn did not start listening")
+
+                time.sleep(0.1)
+
+        yield f"http://127.0.0.1:{port}"
+
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run(
+    base_url: str,
+    context: Context,
+    concurrency: int = 8,
+    duration: float = 30,
+    writes: float = 0.2,
+    seed: int = 0,
+    scenarios: Dict[str, tuple] = None,
+) -> dict:
+    """Run scenarios from concurrent workers for a while. Each scenario a
+    worker starts is a write scenario with probability writes, otherwise a read
+    one, picked by weight.
+
+    Args:
+        base_url (str): server to load
+        context (Context): from prepare
+        concurrency (int, optional): workers sending requests at once
+        duration (float, optional): seconds to keep starting scenarios
+        writes (float, optional): share of scenarios that write, 0 to 1
+        seed (int, optional): random seed of the scenario mix
+        scenarios (Dict[str, tuple], optional): subset of SCENARIOS
+
+    Returns:
+        dict: results as made by summarize
+    """
+    scenarios = scenarios or SCENARIOS
+    by_kind = {
+        kind: [
+            (weight, scenario)
+            for scenario_kind, weight, scenario in scenarios.values()
+            if scenario_kind == kind
+        ]
+        for kind in ("read", "write")
+    }
+    if not by_kind["write"]:
+        writes = 0
+    elif not by_kind["read"]:
+        writes = 1
+
+    url = urllib.parse.urlsplit(base_url)
+    samples = defaultdict(_Samples)
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def work(index: int):
+        worker = Worker(index, concurrency, context, seed)
+        mine = defaultdict(_Samples)
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=300)
+
+        while time.perf_counter() < deadline:
+            kind = "write" if worker.rng.random() < writes else "read"
+            weights, choices = zip(*by_kind[kind])
+            scenario = worker.rng.choices(choices, weights)[0](context, worker)
+
+            try:
+                request = next(scenario)
+                while True:
+                    reply = _send(connection, context, request, mine)
+                    request = scenario.send(reply)
+
+            except StopIteration:
+                pass
+
+        connection.close()
+        with lock:
+            for key, sample in mine.items():
+                samples[key].merge(sample)
+
+    threads = [
+        threading.Thread(target=work, args=(index,), daemon=True)
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return summarize(samples, time.perf_counter() - start)
+
+
+def _send(connection, context: Context, request: Request, samples) -> Reply:
+    headers = {"Authorization": f"Bearer {context.access}"}
+    body = request.body
+    if isinstance(body, bytes):
+        headers["Content-Type"] = "application/x-ndjson"
+    elif body is not None:
+        headers["Content-Type"] = "application/json"
+        body = json.dumps(body).encode()
+
+    sample = samples[(request.method, request.route)]
+    started = time.perf_counter()
+
+    try:
+        connection.request(request.method, request.path, body, headers)
+        response = connection.getresponse()
+        reply = Reply(response.status, response.read())
+
+    except (OSError, http.client.HTTPException):
+        connection.close()
+        sample.add(time.perf_counter() - started, 0, None, None)
+        return Reply(0, b"")
+
+    sample.add(
+        time.perf_counter() - started,
+        reply.status,
+        response.getheader(QUERY_COUNT_HEADER),
+        response.getheader(MAX_RSS_HEADER),
+    )
+
+    return reply
+
+
+class _Samples:
+    def __init__(self):
+        self.latencies = []
+        self.queries = []
+        self.statuses = Counter()
+        self.max_rss_kb = 0
+
+    def add(self, latency: float, status: int, queries: str, max_rss_kb: str):
+        self.latencies.append(latency)
+        self.statuses[status] += 1
+        if queries is not None:
+            self.queries.append(int(queries))
+        if max_rss_kb is not None:
+            self.max_rss_kb = max(self.max_rss_kb, int(max_rss_kb))
+
+    def merge(self, other: "_Samples"):
+        self.latencies.extend(other.latencies)
+        self.queries.extend(other.queries)
+        self.statuses.update(other.statuses)
+        self.max_rss_kb = max(self.max_rss_kb, other.max_rss_kb)
+
+
+def summarize(samples: Dict[tuple, _Samples], elapsed: float) -> dict:
+    """Latency percentiles, throughput, queries per request and peak worker
+    memory per endpoint and overall
+
+    Args:
+        samples (Dict[tuple, _Samples]): (method, route) to samples
+        elapsed (float): seconds the run took
+
+    Returns:
+        dict: {elapsed_s, total, endpoints: {"<method> <route>": stats}}
+    """
+    total = _Samples()
+    endpoints = {}
+
+    for (method, route), sample in sorted(samples.items(), key=lambda item: item[0][1]):
+        total.merge(sample)
+        endpoints[f"{method} {route}"] = _stats(sample, elapsed)
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "total": _stats(total, elapsed),
+        "endpoints": endpoints,
+    }
+
+
+def _stats(sample: _Samples, elapsed: float) -> dict:
+    latencies = sorted(sample.latencies)
+    queries = sorted(sample.queries)
+
+    return {
+        "requests": len(latencies),
+        "errors": sum(
+            count
+            for status, count in sample.statuses.items()
+            if not status or status >= 500
+        ),
+        "statuses": {
+            str(status): count for status, count in sorted(sample.statuses.items())
+        },
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            **{
+                f"p{percentile}": round(_percentile(latencies, percentile) * 1000, 2)
+                for percentile in PERCENTILES
+            },
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2),
+        },
+        "queries": {
+            "mean": round(sum(queries) / len(queries), 2) if queries else None,
+            "max": queries[-1] if queries else None,
+        },
+        "max_rss_kb": sample.max_rss_kb or None,
+    }
+
+
+def _percentile(ordered: list, percentile: float):
+    """Nearest rank percentile of a sorted list"""
+    return ordered[max(-(-len(ordered) * percentile // 100) - 1, 0)]
+
+
+def compare(
+    baseline: dict, current: dict, threshold: float = 0.1, min_requests: int = 20
+) -> List[dict]:
+    """Endpoints of two results whose p95 latency or mean queries per request
+    went up by more than threshold. Endpoints with too few requests in either
+    run to give a stable p95 are skipped.
+
+    Args:
+        baseline (dict): earlier results
+        current (dict): results to check
+        threshold (float, optional): allowed relative increase. Defaults to 0.1.
+        min_requests (int, optional): requests an endpoint needs in both runs
+            to be compared. Defaults to 20.
+
+    Returns:
+        List[dict]: {endpoint, metric, baseline, current, change} per regression
+    """
+    regressions = []
+
+    for endpoint, stats in current["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if before is None or min(before["requests"], stats["requests"]) < min_requests:
+            continue
+
+        for metric, old, new in (
+            ("p95 ms", before["latency_ms"]["p95"], stats["latency_ms"]["p95"]),
+            ("queries", before["queries"]["mean"], stats["queries"]["mean"]),
+        ):
+            if old is None or new is None or new <= old * (1 + threshold):
+                continue
+
+            regressions.append(
+                {
+                    "endpoint": endpoint,
+                    "metric": metric,
+                    "baseline": old,
+                    "current": new,
+                    "change": round(new / old - 1, 3) if old else None,
+                }
+            )
+
+    return regressions
@@ -0,0 +1,96 @@
+"""
+SQL query budgets per API route. Every request may make at most the number
+of queries its URL name and method are given here, whatever the size of the
+tables, so a query per row shows up as soon as a list has more rows than
+the budget. middleware.QueryBudgetMiddleware checks every request, raising
+in tests and logging a warning in development.
+"""
+import logging
+from typing import Union
+from django.conf import settings
+
+# URL name to method to queries. Writes include rebuilding the documents and
+# indexes of the recipes they change, see signals.refresh_recipes. Write
+# budgets are the fixed cost of the costliest path through a request, e.g. a
+# PUT that changes a recipe's ingredients also updates the ingredient indexes,
+# and don't grow with the rows written. Each write to a per-worker index also
+# records the change, and reads through one include replaying the changes other
+# workers made, see indexes.VersionedIndex. An import's is per batch of
+# transfer.BATCH_SIZE lines
+QUERY_BUDGETS = {
+    "ingredient": {"GET": 3, "POST": 7},
+    "ingredient-units": {"GET": 1},
+    "ingredient-suggest": {"GET": 5},
+    "ingredient-detail": {"GET": 2},
+    "tag": {"GET": 3, "POST": 7},
+    "tag_kind": {"GET": 1},
+    "tag-detail": {"GET": 2},
+    "recipe": {"GET": 8, "POST": 57},
+    "recipe-search": {"GET": 4},
+    "recipe-match": {"GET": 7},
+    "recipe-export": {"GET": 5},
+    "recipe-import": {"POST": 52},
+    "recipe-detail": {"GET": 7, "PUT": 56},
+    "recipe-flattened": {"GET": 5},
+    "recipe-used-in": {"GET": 4},
+    # includes computing the similar recipes when they are missing or stale
+    "recipe-similar": {"GET": 17},
+    "recipe-ingredients": {"GET": 3, "POST": 36},
+    "recipe-ingredient-detail": {"GET": 2, "PUT": 21, "DELETE": 28},
+    "recipe-steps": {"GET": 2, "POST": 28},
+    "recipe-steps-order": {"PUT": 26},
+    "recipe-step-detail": {"GET": 2, "PUT": 28, "DELETE": 14},
+    "recipe-tags": {"GET": 3, "POST": 33},
+    "recipe-tags-delete": {"DELETE": 32},
+    "meal-plan": {"GET": 3, "POST": 8},
+    "meal-plan-shopping-list": {"GET": 4},
+    "meal-plan-detail": {"PUT": 2},
+    "profile": {"GET": 2},
+    "profile-detail": {"GET": 2},
+    "profile-download": {"GET": 2},
+    "token_obtain_pair": {"POST": 1},
+    "token_refresh": {"POST": 0},
+    "token_logout": {"POST": 1},
+}
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request made more SQL queries than its budget"""
+
+
+def budget(url_name: str, method: str) -> Union[int, None]:
+    """Queries a request may make
+
+    Args:
+        url_name (str): name of the URL pattern that served it
+        method (str): HTTP method
+
+    Returns:
+        Union[int, None]: budget or None if the route has none
+    """
+    return QUERY_BUDGETS.get(url_name, {}).get(method)
+
+
+def check(url_name: str, method: str, queries: int):
+    """Hold a request to its budget according to settings.QUERY_BUDGETS,
+    "raise" raises QueryBudgetExceeded and "warn" logs a warning
+
+    Args:
+        url_name (str): name of the URL pattern that served it
+        method (str): HTTP method
+        queries (int): queries it made
+
+    Raises:
+        QueryBudgetExceeded: it made more queries than its budget
+    """
+    if (limit := budget(url_name, method)) is None or queries <= limit:
+        return
+
+    message = f"{method} {url_name} made {queries} queries, its budget is {limit}"
+
+    if settings.QUERY_BUDGETS == "raise":
+        raise QueryBudgetExceeded(message)
+
+    logger.warning(message)
@@ -0,0 +1,75 @@
+"""
+Conditional GET (ETag and Last-Modified) for APIView methods
+"""
+import functools
+import hashlib
+from typing import Callable, Tuple, Union
+from datetime import datetime
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    quote_etag,
+)
+from django.utils.http import http_date
+from rest_framework import status
+
+
+def conditional_get(
+    version_func: Callable[..., Union[Tuple[str, Union[datetime, None]], None]]
+):
+    """Answer If-None-Match and If-Modified-Since with a 304 when the resource
+    has not changed, without calling the decorated method.
+
+    The ETag is derived from the version and the full request path, so every
+    page or query string variant of a list gets its own tag.
+
+    Args:
+        version_func (Callable): takes the method's request and URL kwargs and
+            returns (version, last modified) for the resource or None if it
+            doesn't exist
+
+    Returns:
+        Callable: decorator for APIView get methods
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if (version := version_func(request, *args, **kwargs)) is None:
+                return method(view, request, *args, **kwargs)
+
+            tag, last_modified = version
+            etag = quote_etag(
+                hashlib.md5(
+                    "\n".join(
+                        (
+                            str(tag),
+                            request.get_full_path(),
+                            request.META.get("HTTP_ACCEPT", ""),
+                        )
+                    ).encode("utf-8")
+                ).hexdigest()
+            )
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if response is None:
+                response = method(view, request, *args, **kwargs)
+
+            if response.status_code in (
+                status.HTTP_200_OK,
+                status.HTTP_304_NOT_MODIFIED,
+            ):
+                response["ETag"] = etag
+                if timestamp is not None:
+                    response["Last-Modified"] = http_date(timestamp)
+                # make browsers revalidate instead of reusing a stale copy
+                patch_cache_control(response, no_cache=True)
+
+            return response
+
+        return wrapper
+
+    return decorator
@@ -32,3 +32,8 @@ NOT_ALLOWED_RESPONSE = response.Response(
     },
     status=status.HTTP_403_FORBIDDEN,
 )
+
+STEPS_CONFLICT_RESPONSE = response.Response(
+    {"errors": ("Steps are being changed concurrently, try again",)},
+    status=status.HTTP_409_CONFLICT,
+)
@@ -0,0 +1,372 @@
+"""
+Synthetic data for trying the API at production-like sizes. Everything is
+drawn from one seeded random.Random so the same options always give the same
+rows. Ingredients, tags and planned recipes are picked with Zipf weights, a
+few staples in most recipes and a long tail in few, and some recipes stand
+for ingredients of later ones. Rows get their primary keys up front so every
+table is written with bulk_create in batches without reading IDs back.
+"""
+import datetime
+import itertools
+import random
+from decimal import Decimal
+from typing import Callable, Dict, List, Sequence
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from users.models import User
+from . import models, signals, similarity, subrecipes, versions
+
+# password of every generated user
+PASSWORD = "password"
+# recipes written per transaction
+BATCH_SIZE = 1000
+
+_ADJECTIVES = (
+    "classic",
+    "spicy",
+    "creamy",
+    "smoky",
+    "crispy",
+    "quick",
+    "hearty",
+    "lemony",
+    "garlicky",
+    "roasted",
+    "grilled",
+    "slow cooked",
+    "herbed",
+    "sticky",
+    "fresh",
+)
+_DISHES = (
+    "soup",
+    "stew",
+    "salad",
+    "curry",
+    "pasta",
+    "tacos",
+    "pie",
+    "risotto",
+    "casserole",
+    "stir fry",
+    "bread",
+    "noodles",
+    "chili",
+    "pancakes",
+    "cake",
+)
+_FOODS = (
+    "salt",
+    "olive oil",
+    "garlic",
+    "onion",
+    "butter",
+    "flour",
+    "sugar",
+    "egg",
+    "black pepper",
+    "milk",
+    "tomato",
+    "water",
+    "lemon",
+    "chicken",
+    "rice",
+    "carrot",
+    "parsley",
+    "cheddar",
+    "potato",
+    "honey",
+    "ginger",
+    "cumin",
+    "paprika",
+    "basil",
+    "beef",
+    "spinach",
+    "mushroom",
+    "yogurt",
+    "lime",
+    "bean",
+)
+_VERBS = ("chop", "stir", "whisk", "fold in", "simmer", "season", "roast", "add")
+_KINDS = tuple(kind for kind, _ in models.Tag.KIND)
+_MEALS = tuple(meal for meal, _ in models.MealPlan.MEALS)
+# unit to (smallest amount, largest amount, step)
+_AMOUNTS = {
+    "tsp": (1, 12, Decimal("0.25")),
+    "tbsp": (1, 8, Decimal("0.5")),
+    "c": (1, 16, Decimal("0.25")),
+    "g": (1, 50, Decimal("10")),
+    "oz": (1, 32, Decimal("0.5")),
+    "lb": (1, 12, Decimal("0.25")),
+    "ml": (1, 50, Decimal("10")),
+    "pieces": (1, 12, Decimal("1")),
+}
+_SUB_RECIPE_USE = 0.1
+
+
+def generate(
+    users: int,
+    recipes: int,
+    ingredients: int,
+    tags: int,
+    meal_plans: int = 0,
+    sub_recipes: float = 0.02,
+    seed: int = 0,
+    batch_size: int = BATCH_SIZE,
+    derived: bool = True,
+    start_date: datetime.date = None,
+    progress: Callable[[str, int], None] = None,
+) -> Dict[str, int]:
+    """Generate users, ingredients, tags, recipes and meal plans. Recipes get
+    5-25 steps, 3-15 ingredients and 1-4 tags.
+
+    Args:
+        users (int): users to create, each one can log in with PASSWORD
+        recipes (int): recipes to create
+        ingredients (int): ingredients to create, not counting the ones
+            standing for recipes
+        tags (int): tags to create
+        meal_plans (int, optional): meals each user plans. Defaults to 0.
+        sub_recipes (float, optional): share of recipes that become an
+            ingredient later recipes can use. Defaults to 0.02.
+        seed (int, optional): random seed. Defaults to 0.
+        batch_size (int, optional): recipes written per transaction.
+        derived (bool, optional): build stored documents and the search index
+            of each batch. Defaults to True, rebuild_recipe_documents and
+            rebuild_search_index can build them later.
+        start_date (datetime.date, optional): first date meals are planned
+            on. Defaults to today.
+        progress (Callable[[str, int], None], optional): called with a table
+            and the number of rows written to it so far
+
+    Returns:
+        Dict[str, int]: number of rows created per table
+    """
+    rng = random.Random(seed)
+    progress = progress or (lambda table, written: None)
+    counts = {}
+
+    user_ids = _create_users(users)
+    counts["users"] = len(user_ids)
+    progress("users", len(user_ids))
+
+    ingredient_ids = _create_named(
+        models.Ingredient,
+        "name",
+        (_FOODS[index % len(_FOODS)] for index in range(ingredients)),
+    )
+    tag_ids = _create_named(
+        models.Tag,
+        "value",
+        (f"{rng.choice(_ADJECTIVES)} {rng.choice(_DISHES)}" for _ in range(tags)),
+        lambda: {"kind": rng.choice(_KINDS)},
+    )
+    counts["tags"] = len(tag_ids)
+    progress("tags", len(tag_ids))
+
+    pick_ingredients = _zipf(ingredient_ids, rng)
+    pick_tags = _zipf(tag_ids, rng)
+    next_recipe_id = _next_id(models.Recipe)
+    next_ingredient_id = _next_id(models.Ingredient)
+    # ingredients standing for recipes made so far
+    sub_recipe_ingredients = []
+    counts["recipes"] = 0
+
+    for batch_start in range(0, recipes, batch_size):
+        recipe_rows = []
+        sub_recipe_rows = []
+        used_rows = []
+        step_rows = []
+        tag_rows = []
+
+        for recipe_id in range(
+            next_recipe_id + batch_start,
+            next_recipe_id + min(batch_start + batch_size, recipes),
+        ):
+            name = f"{rng.choice(_ADJECTIVES)} {rng.choice(_DISHES)} {recipe_id}"
+            recipe_rows.append(
+                models.Recipe(
+                    id=recipe_id,
+                    name=name,
+                    description=f"A {name} everyone asks for again.",
+                    servings=rng.randint(1, 8),
+                    cook_time=f"{rng.randrange(10, 180, 5)} minutes",
+                    author_id=rng.choice(user_ids) if user_ids else None,
+                )
+            )
+
+            used = pick_ingredients(rng.randint(3, 15))
+            if sub_recipe_ingredients and rng.random() < _SUB_RECIPE_USE:
+                used.append(rng.choice(sub_recipe_ingredients))
+
+            for ingredient_id in dict.fromkeys(used):
+                unit = rng.choice(tuple(_AMOUNTS))
+                low, high, step = _AMOUNTS[unit]
+                used_rows.append(
+                    models.IngredientInRecipe(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=rng.randint(low, high) * step,
+                        unit=unit,
+                        specifier="",
+                    )
+                )
+
+            step_rows.extend(
+                models.Step(
+                    recipe_id=recipe_id,
+                    order=position * models.Step.ORDER_GAP,
+                    instruction=(
+                        f"{rng.choice(_VERBS).capitalize()} the "
+                        f"{rng.choice(_FOODS)} for {rng.randint(1, 20)} minutes."
+                    ),
+                )
+                for position in range(1, rng.randint(5, 25) + 1)
+            )
+            tag_rows.extend(
+                models.Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for tag_id in dict.fromkeys(pick_tags(rng.randint(1, 4)))
+            )
+
+            if rng.random() < sub_recipes:
+                sub_recipe_rows.append(
+                    models.Ingredient(
+                        id=next_ingredient_id,
+                        name=f"homemade {name}",
+                        recipe_id=recipe_id,
+                    )
+                )
+                next_ingredient_id += 1
+
+        with transaction.atomic():
+            models.Recipe.objects.bulk_create(recipe_rows)
+            models.Ingredient.objects.bulk_create(sub_recipe_rows)
+            models.IngredientInRecipe.objects.bulk_create(used_rows)
+            models.Step.objects.bulk_create(step_rows)
+            models.Recipe.tags.through.objects.bulk_create(tag_rows)
+
+            recipe_ids = [recipe.id for recipe in recipe_rows]
+            subrecipes.relink(recipe_ids)
+            if derived:
+                signals.refresh_recipes(recipe_ids, touch=False)
+
+        # only recipes that exist can be used, which keeps sub-recipes acyclic
+        sub_recipe_ingredients.extend(row.id for row in sub_recipe_rows)
+        counts["recipes"] += len(recipe_rows)
+        progress("recipes", counts["recipes"])
+
+    counts["ingredients"] = len(ingredient_ids) + len(sub_recipe_ingredients)
+    counts["meal_plans"] = _create_meal_plans(
+        user_ids,
+        range(next_recipe_id, next_recipe_id + recipes),
+        meal_plans,
+        start_date or datetime.date.today(),
+        rng,
+        batch_size,
+    )
+    progress("meal plans", counts["meal_plans"])
+
+    _reset_sequences(User, models.Ingredient, models.Tag, models.Recipe)
+    versions.bump(
+        versions.RECIPES,
+        versions.TAGS,
+        versions.INGREDIENTS,
+        versions.RECIPE_TAGS,
+        versions.INGREDIENT_USES,
+        versions.RECIPE_INGREDIENTS,
+        versions.RECIPE_VECTORS,
+    )
+    similarity.invalidate_all()
+
+    return counts
+
+
+def _create_users(count: int) -> List[int]:
+    first_id = _next_id(User)
+    # hashing is slow on purpose, every user shares one hash
+    password = make_password(PASSWORD)
+
+    User.objects.bulk_create(
+        (
+            User(
+                id=user_id,
+                username=f"user{user_id}",
+                email=f"user{user_id}@example.com",
+                password=password,
+            )
+            for user_id in range(first_id, first_id + count)
+        )
+    )
+
+    return list(range(first_id, first_id + count))
+
+
+def _create_named(
+    model, field: str, names, extra: Callable[[], dict] = dict
+) -> List[int]:
+    """Create rows with a unique name, made unique by their ID"""
+    first_id = _next_id(model)
+    rows = [
+        model(id=row_id, **{field: f"{name} {row_id}"}, **extra())
+        for row_id, name in zip(itertools.count(first_id), names)
+    ]
+    model.objects.bulk_create(rows)
+
+    return [row.id for row in rows]
+
+
+def _create_meal_plans(
+    user_ids: Sequence[int],
+    recipe_ids: Sequence[int],
+    per_user: int,
+    start_date: datetime.date,
+    rng: random.Random,
+    batch_size: int,
+) -> int:
+    if not (user_ids and recipe_ids and per_user):
+        return 0
+
+    pick_recipes = _zipf(recipe_ids, rng)
+    rows = (
+        models.MealPlan(
+            user_id=user_id,
+            recipe_id=recipe_id,
+            planned_date=start_date + datetime.timedelta(days=rng.randrange(28)),
+            meal=rng.choice(_MEALS),
+            servings=rng.choice((None, rng.randint(1, 8))),
+        )
+        for user_id in user_ids
+        for recipe_id in pick_recipes(per_user)
+    )
+    created = 0
+
+    for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+        models.MealPlan.objects.bulk_create(batch)
+        created += len(batch)
+
+    return created
+
+
+def _zipf(values: Sequence[int], rng: random.Random, exponent: float = 1.1):
+    """Picker of k values where the nth is drawn in proportion to 1 / n^exponent"""
+    weights = list(
+        itertools.accumulate(1 / rank ** exponent for rank in range(1, len(values) + 1))
+    )
+
+    def pick(k: int) -> List[int]:
+        return rng.choices(values, cum_weights=weights, k=k) if values else []
+
+    return pick
+
+
+def _next_id(model) -> int:
+    return (model.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+
+
+def _reset_sequences(*model_classes):
+    """Move Postgres sequences past the IDs given explicitly"""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), model_classes):
+            cursor.execute(sql)
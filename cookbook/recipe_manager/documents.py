@@ -0,0 +1,105 @@
+"""
+Materialized recipe documents.
+Each recipe's API representation is stored pre-rendered in RecipeDocument so
+reads can send the stored bytes without touching the relational tables.
+"""
+from typing import Dict, Iterable
+from django.db import transaction
+from rest_framework.settings import api_settings
+from . import metrics, models, projections
+
+
+def render(recipes: Iterable[models.Recipe]) -> Dict[int, str]:
+    """Render recipes to JSON the same way the API would
+
+    Args:
+        recipes (Iterable[Recipe]): recipes to render
+
+    Returns:
+        Dict[int, str]: recipe ID to rendered JSON
+    """
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+
+    return {
+        document["id"]: renderer.render(document).decode("utf-8")
+        for document in projections.recipe_documents(recipes)
+    }
+
+
+def rebuild(recipe_ids: Iterable[int]) -> Dict[int, str]:
+    """Rebuild and store documents for recipes
+
+    Args:
+        recipe_ids (Iterable[int]): recipes to rebuild. IDs of recipes that
+            no longer exist are ignored
+
+    Returns:
+        Dict[int, str]: recipe ID to rendered JSON
+    """
+    recipe_ids = tuple(recipe_ids)
+    rendered = render(models.Recipe.objects.filter(id__in=recipe_ids))
+
+    with transaction.atomic():
+        models.RecipeDocument.objects.filter(recipe_id__in=recipe_ids).delete()
+        models.RecipeDocument.objects.bulk_create(
+            models.RecipeDocument(recipe_id=recipe_id, document=document)
+            for recipe_id, document in rendered.items()
+        )
+
+    return rendered
+
+
+def invalidate(recipe_ids: Iterable[int]):
+    """Drop stored documents, they are rebuilt the next time they are read
+
+    Args:
+        recipe_ids (Iterable[int]): recipes whose documents are out of date
+    """
+    models.RecipeDocument.objects.filter(recipe_id__in=tuple(recipe_ids)).delete()
+
+
+def get(recipe_ids: Iterable[int]) -> Dict[int, str]:
+    """Get documents for recipes, building any that are missing
+
+    Args:
+        recipe_ids (Iterable[int]): recipes to get
+
+    Returns:
+        Dict[int, str]: recipe ID to rendered JSON, recipes that don't exist
+            are left out
+    """
+    recipe_ids = tuple(recipe_ids)
+    documents = dict(
+        models.RecipeDocument.objects.filter(recipe_id__in=recipe_ids).values_list(
+            "recipe_id", "document"
+        )
+    )
+
+    missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in documents]
+    metrics.cache("documents", len(documents), len(missing))
+
+    if missing:
+        rendered = render(models.Recipe.objects.filter(id__in=missing))
+        # another request may be building the same documents
+        models.RecipeDocument.objects.bulk_create(
+            (
+                models.RecipeDocument(recipe_id=recipe_id, document=document)
+                for recipe_id, document in rendered.items()
+            ),
+            ignore_conflicts=True,
+        )
+        documents.update(rendered)
+
+    return documents
+
+
+def to_json_array(documents: Iterable[str]) -> bytes:
+    """Join rendered documents into a JSON array
+
+    Args:
+        documents (Iterable[str]): rendered documents
+
+    Returns:
+        bytes: JSON array
+    """
+    return f"[{','.join(documents)}]".encode("utf-8")
@@ -0,0 +1,8 @@
+"""
+Per-worker in-memory indexes, kept current with version tokens
+"""
+from .base import VersionedIndex
+from .tags import TagBitmaps, TagIndex, tag_index, parse_tag_filter
+from .ingredients import IngredientIndex, IngredientTrigrams, ingredient_index
+from .pantry import IngredientPostings, PantryIndex, pantry_index
+from .vectors import RecipeVectors, VectorIndex, vector_index
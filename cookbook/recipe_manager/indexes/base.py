@@ -0,0 +1,140 @@
+"""
+Base class for per-worker in-memory indexes
+"""
+import json
+import threading
+from typing import Tuple
+from django.db.models import Subquery
+from .. import metrics, models, versions
+
+# a copy further behind than this many writes is rebuilt instead of replayed
+MAX_REPLAYED = 1000
+# every PRUNE_EVERY changes, those older than the last KEPT_CHANGES are deleted
+PRUNE_EVERY = 100
+KEPT_CHANGES = 10000
+
+
+class VersionedIndex:
+    """An index built from the database and held in memory by each worker.
+
+    The index is tagged with the version token of version_key it was built
+    from. Reads compare it to the current token, one query. Every write moves
+    the token forward and is saved as a models.IndexChange, so a worker whose
+    copy is behind replays the writes made since its token, one more query,
+    and only rebuilds when they can't be replayed: it's more than MAX_REPLAYED
+    writes behind, the key was bumped without recording a change e.g. by a bulk
+    import, or this worker applied a write that was rolled back.
+
+    Attributes:
+        version_key (str): versions key covering everything the index is built from
+    """
+
+    version_key = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+
+    def build(self):
+        """Build the index from the database
+
+        Returns:
+            object: index data returned by get
+        """
+        raise NotImplementedError
+
+    def current_version(self) -> str:
+        """Version of the data in the database the index is built from
+
+        Returns:
+            str: version token
+        """
+        return versions.token(self.version_key)
+
+    def get(self):
+        """Get the index, catching up with the database if it changed since the
+        index was built
+
+        Returns:
+            object: index data
+        """
+        version = self.current_version()
+
+        with self._lock:
+            if self._data is not None and self._version != version:
+                self._replay(version)
+
+            current = self._data is not None and self._version == version
+            metrics.cache(type(self).__name__, int(current), int(not current))
+
+            if not current:
+                self._data = self.build()
+                self._version = version
+
+            return self._data
+
+    def update(self, *changes: Tuple):
+        """Record a write to the data the index is built from
+
+        Args:
+            changes (Tuple): (method, *args) of the index data to call for each
+                change, args must be JSON serializable since other workers
+                replay them from the database
+        """
+        with self._lock:
+            current = self._data is not None
+            previous = self._version if current else versions.token(self.version_key)
+
+            while (version := versions.replace(self.version_key, previous)) is None:
+                # another worker wrote first, this copy replays both on its next read
+                current = False
+                previous = versions.token(self.version_key)
+
+            change = models.IndexChange.objects.create(
+                key=self.version_key,
+                previous=previous,
+                version=version,
+                changes=json.dumps(changes),
+            )
+
+            if current:
+                self._apply(changes)
+                self._version = version
+
+        if not change.id % PRUNE_EVERY:
+            models.IndexChange.objects.filter(id__lte=change.id - KEPT_CHANGES).delete()
+
+    def _replay(self, version: str):
+        """Apply the changes recorded since this worker's copy was current, or
+        drop the copy if they don't lead to version"""
+        changes = (
+            models.IndexChange.objects.filter(
+                key=self.version_key,
+                id__gte=Subquery(
+                    models.IndexChange.objects.filter(
+                        key=self.version_key, previous=self._version
+                    ).values("id")[:1]
+                ),
+            )
+            .order_by("id")
+            .values_list("previous", "version", "changes")[:MAX_REPLAYED]
+        )
+        following = {previous: (next_, applied) for previous, next_, applied in changes}
+        replayed = []
+        at = self._version
+
+        while at != version:
+            if at not in following:
+                self._data = None
+                return
+
+            at, applied = following.pop(at)
+            replayed.extend(json.loads(applied))
+
+        self._apply(replayed)
+        self._version = version
+
+    def _apply(self, changes):
+        for method, *args in changes:
+            getattr(self._data, method)(*args)
@@ -0,0 +1,67 @@
+"""
+Sets of IDs stored as python ints, bit n is set when ID n is in the set
+"""
+from typing import Iterable, Iterator
+
+
+def from_ids(ids: Iterable[int]) -> int:
+    """Build a bitmap from IDs
+
+    Args:
+        ids (Iterable[int]): IDs in the set
+
+    Returns:
+        int: bitmap
+    """
+    ids = tuple(ids)
+    if not ids:
+        return 0
+
+    # set bits in a buffer, or-ing into a growing int is quadratic
+    buffer = bytearray(max(ids) // 8 + 1)
+    for id_ in ids:
+        buffer[id_ >> 3] |= 1 << (id_ & 7)
+
+    return int.from_bytes(buffer, "little")
+
+
+def count(bitmap: int) -> int:
+    """Number of IDs in a bitmap
+
+    Args:
+        bitmap (int): bitmap
+
+    Returns:
+        int: set bits
+    """
+    return bin(bitmap).count("1")
+
+
+def iter_ids(bitmap: int, start: int = None, descending: bool = False) -> Iterator[int]:
+    """Iterate over the IDs in a bitmap in order
+
+    Args:
+        bitmap (int): bitmap
+        start (int, optional): only yield IDs past this one. Defaults to None.
+        descending (bool, optional): largest ID first. Defaults to False.
+
+    Yields:
+        int: next ID
+    """
+    if descending:
+        if start is not None:
+            bitmap &= (1 << max(start, 0)) - 1
+
+        while bitmap:
+            id_ = bitmap.bit_length() - 1
+            yield id_
+            bitmap ^= 1 << id_
+
+    else:
+        if start is not None and start >= 0:
+            bitmap = bitmap >> (start + 1) << (start + 1)
+
+        while bitmap:
+            lowest = bitmap & -bitmap
+            yield lowest.bit_length() - 1
+            bitmap ^= lowest
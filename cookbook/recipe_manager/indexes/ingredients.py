@@ -0,0 +1,202 @@
+"""
+Prefix and trigram index of ingredient names for autocomplete on databases
+without pg_trgm
+"""
+import bisect
+import heapq
+import re
+from collections import Counter, defaultdict
+from typing import Dict, FrozenSet, List, Tuple
+from django.db.models import Count
+from .. import models, versions
+from .base import VersionedIndex
+
+# pg_trgm's default similarity threshold
+SIMILARITY_THRESHOLD = 0.3
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """Trigrams of a string the way pg_trgm extracts them: lower cased words
+    padded with two spaces in front and one behind
+
+    Args:
+        text (str): text
+
+    Returns:
+        FrozenSet[str]: distinct trigrams
+    """
+    return frozenset(
+        padded[i : i + 3]
+        for word in _WORD.findall(text.lower())
+        for padded in (f"  {word} ",)
+        for i in range(len(padded) - 2)
+    )
+
+
+def similarity(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    """pg_trgm similarity, shared trigrams over distinct trigrams
+
+    Args:
+        first (FrozenSet[str]): trigrams
+        second (FrozenSet[str]): trigrams
+
+    Returns:
+        float: 0 to 1
+    """
+    if not first or not second:
+        return 0.0
+
+    shared = len(first & second)
+    return shared / (len(first) + len(second) - shared)
+
+
+class IngredientTrigrams:
+    """Ingredient names sorted for prefix lookups, posting lists of ingredient
+    IDs per trigram and how many recipes use each ingredient.
+
+    Attributes:
+        ingredients (Dict[int, Tuple[str, Union[int, None]]]): ID to
+            (name, recipe_id)
+        uses (Dict[int, int]): ID to number of recipes using it
+    """
+
+    def __init__(self, ingredients: Dict[int, Tuple[str, int]], uses: Dict[int, int]):
+        self.ingredients = {}
+        self.uses = uses
+        self._sizes = {}
+        # sort key of prefix matches, (trigram count, -uses, ID)
+        self._prefix_rank = {}
+        self._postings = defaultdict(list)
+
+        for ingredient_id, (name, recipe_id) in ingredients.items():
+            self._index(ingredient_id, name, recipe_id)
+
+        self._names = sorted(
+            (name.lower(), ingredient_id)
+            for ingredient_id, (name, _) in self.ingredients.items()
+        )
+
+    def suggest(self, query: str, limit: int) -> List[dict]:
+        """Best matches for a partial ingredient name, ranked like pg_trgm would.
+        Names starting with the query come first, then names at least
+        SIMILARITY_THRESHOLD similar to it. Each group is ordered by
+        similarity, ties go to the ingredient used in more recipes.
+
+        Args:
+            query (str): what the user typed
+            limit (int): max number of matches
+
+        Returns:
+            List[dict]: {id, name, recipe_id} of the matches, best first
+        """
+        if not (prefix := query.strip().lower()):
+            return []
+
+        start = bisect.bisect_left(self._names, (prefix,))
+        end = bisect.bisect_left(self._names, (f"{prefix}\U0010ffff",), start)
+        prefixed = [ingredient_id for _, ingredient_id in self._names[start:end]]
+        # prefix matches share the same trigrams with the query, so the fewer
+        # trigrams a name has the more similar it is
+        best = heapq.nsmallest(limit, prefixed, key=self._prefix_rank.__getitem__)
+
+        if len(best) < limit:
+            best.extend(
+                self._similar(trigrams(prefix), set(prefixed), limit - len(best))
+            )
+
+        return [
+            {
+                "id": ingredient_id,
+                "name": self.ingredients[ingredient_id][0],
+                "recipe_id": self.ingredients[ingredient_id][1],
+            }
+            for ingredient_id in best
+        ]
+
+    def add(self, ingredient_id: int, name: str, recipe_id: int):
+        """Ingredient created or edited"""
+        self.remove(ingredient_id)
+        self._index(ingredient_id, name, recipe_id)
+        bisect.insort(self._names, (name.lower(), ingredient_id))
+
+    def remove(self, ingredient_id: int):
+        """Ingredient deleted"""
+        if (ingredient := self.ingredients.pop(ingredient_id, None)) is None:
+            return
+
+        del self._sizes[ingredient_id]
+        del self._prefix_rank[ingredient_id]
+        for trigram in trigrams(ingredient[0]):
+            self._postings[trigram].remove(ingredient_id)
+
+        entry = (ingredient[0].lower(), ingredient_id)
+        del self._names[bisect.bisect_left(self._names, entry)]
+
+    def use(self, ingredient_id: int, count: int):
+        """Ingredient added to (count 1) or removed from (-1) a recipe"""
+        self.uses[ingredient_id] = self.uses.get(ingredient_id, 0) + count
+        if ingredient_id in self._sizes:
+            self._prefix_rank[ingredient_id] = (
+                self._sizes[ingredient_id],
+                -self.uses[ingredient_id],
+                ingredient_id,
+            )
+
+    def _similar(self, query_trigrams: FrozenSet[str], exclude: set, limit: int):
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self._postings.get(trigram, ()))
+
+        scores = {}
+        for ingredient_id, count in shared.items():
+            score = count / (len(query_trigrams) + self._sizes[ingredient_id] - count)
+            if score >= SIMILARITY_THRESHOLD and ingredient_id not in exclude:
+                scores[ingredient_id] = score
+
+        return heapq.nsmallest(
+            limit,
+            scores,
+            key=lambda ingredient_id: (
+                -scores[ingredient_id],
+                -self.uses.get(ingredient_id, 0),
+                ingredient_id,
+            ),
+        )
+
+    def _index(self, ingredient_id: int, name: str, recipe_id: int):
+        self.ingredients[ingredient_id] = (name, recipe_id)
+        self._sizes[ingredient_id] = len(name_trigrams := trigrams(name))
+        self._prefix_rank[ingredient_id] = (
+            self._sizes[ingredient_id],
+            -self.uses.get(ingredient_id, 0),
+            ingredient_id,
+        )
+        for trigram in name_trigrams:
+            self._postings[trigram].append(ingredient_id)
+
+
+class IngredientIndex(VersionedIndex):
+    """Per-worker IngredientTrigrams
+    """
+
+    version_key = versions.INGREDIENT_USES
+
+    def build(self) -> IngredientTrigrams:
+        return IngredientTrigrams(
+            {
+                ingredient_id: (name, recipe_id)
+                for ingredient_id, name, recipe_id in models.Ingredient.objects.values_list(
+                    "id", "name", "recipe_id"
+                ).iterator()
+            },
+            dict(
+                models.IngredientInRecipe.objects.values("ingredient_id")
+                .annotate(uses=Count("id"))
+                .values_list("ingredient_id", "uses")
+            ),
+        )
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,118 @@
+"""
+Inverted index from ingredient to the recipes using it, for pantry matching
+"""
+import bisect
+import heapq
+from array import array
+from collections import Counter, defaultdict
+from typing import Iterable, List, Tuple
+from .. import models, versions
+from .base import VersionedIndex
+
+
+class IngredientPostings:
+    """Sorted arrays of recipe IDs per ingredient and sorted ingredient IDs
+    per recipe
+
+    Attributes:
+        recipes (Dict[int, array]): ingredient ID to the IDs of recipes using it
+        ingredients (Dict[int, List[int]]): recipe ID to its ingredient IDs
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, int]]):
+        """
+        Args:
+            rows (Iterable[Tuple[int, int]]): (ingredient ID, recipe ID) sorted
+                by ingredient ID then recipe ID
+        """
+        self.recipes = defaultdict(lambda: array("q"))
+        self.ingredients = defaultdict(list)
+
+        for ingredient_id, recipe_id in rows:
+            self.recipes[ingredient_id].append(recipe_id)
+            self.ingredients[recipe_id].append(ingredient_id)
+
+        for ingredient_ids in self.ingredients.values():
+            ingredient_ids.sort()
+
+    def match(
+        self, pantry: Iterable[int], limit: int
+    ) -> List[Tuple[int, int, Tuple[int, ...]]]:
+        """Recipes that use the most of a pantry relative to their size
+
+        Args:
+            pantry (Iterable[int]): ingredient IDs on hand
+            limit (int): max number of recipes
+
+        Returns:
+            List[Tuple[int, int, Tuple[int, ...]]]: (recipe ID, ingredients on
+                hand, IDs of missing ingredients), best covered first, ties go to
+                the recipe using more of the pantry
+        """
+        pantry = set(pantry)
+        on_hand = Counter()
+
+        for ingredient_id in pantry:
+            if ingredient_id in self.recipes:
+                on_hand.update(self.recipes[ingredient_id])
+
+        best = heapq.nsmallest(
+            limit,
+            on_hand.items(),
+            key=lambda item: (
+                -item[1] / len(self.ingredients[item[0]]),
+                -item[1],
+                item[0],
+            ),
+        )
+
+        return [
+            (
+                recipe_id,
+                count,
+                tuple(
+                    ingredient_id
+                    for ingredient_id in self.ingredients[recipe_id]
+                    if ingredient_id not in pantry
+                ),
+            )
+            for recipe_id, count in best
+        ]
+
+    def add(self, recipe_id: int, ingredient_id: int):
+        """Ingredient added to a recipe"""
+        bisect.insort(self.recipes[ingredient_id], recipe_id)
+        bisect.insort(self.ingredients[recipe_id], ingredient_id)
+
+    def remove(self, recipe_id: int, ingredient_id: int):
+        """Ingredient removed from a recipe"""
+        for sorted_ids, id_ in (
+            (self.recipes.get(ingredient_id), recipe_id),
+            (self.ingredients.get(recipe_id), ingredient_id),
+        ):
+            if sorted_ids is None:
+                continue
+
+            position = bisect.bisect_left(sorted_ids, id_)
+            if position < len(sorted_ids) and sorted_ids[position] == id_:
+                del sorted_ids[position]
+
+        if not self.ingredients.get(recipe_id, True):
+            del self.ingredients[recipe_id]
+
+
+class PantryIndex(VersionedIndex):
+    """Per-worker IngredientPostings
+    """
+
+    version_key = versions.RECIPE_INGREDIENTS
+
+    def build(self) -> IngredientPostings:
+        return IngredientPostings(
+            models.IngredientInRecipe.objects.order_by("ingredient_id", "recipe_id")
+            .values_list("ingredient_id", "recipe_id")
+            .iterator(chunk_size=10000)
+        )
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,167 @@
+"""
+Tag bitmap index for filtering recipes by tag and counting facets
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple
+from rest_framework import exceptions
+from .. import models, versions
+from . import bitmaps
+from .base import VersionedIndex
+
+
+class TagBitmaps:
+    """A bitmap of recipe IDs for every tag and one of every recipe
+
+    Attributes:
+        recipes (int): every recipe
+        tags (Dict[int, int]): tag ID to the recipes that have it
+        kinds (Dict[int, str]): tag ID to Tag.kind
+    """
+
+    def __init__(self, recipes: int, tags: Dict[int, int], kinds: Dict[int, str]):
+        self.recipes = recipes
+        self.tags = tags
+        self.kinds = kinds
+
+    def match(self, clauses: Iterable[Tuple[Tuple[int, bool], ...]]) -> int:
+        """Recipes matching every clause of a tag filter
+
+        Args:
+            clauses (Iterable[Tuple[Tuple[int, bool], ...]]): see parse_tag_filter
+
+        Returns:
+            int: bitmap of matching recipes
+        """
+        matched = self.recipes
+
+        for clause in clauses:
+            either = 0
+            for tag_id, negated in clause:
+                tagged = self.tags.get(tag_id, 0)
+                either |= (self.recipes & ~tagged) if negated else tagged
+
+            matched &= either
+
+        return matched
+
+    def facets(self, matched: int) -> Dict[str, Dict[int, int]]:
+        """Count how many of the matched recipes have each tag
+
+        Args:
+            matched (int): bitmap of recipes
+
+        Returns:
+            Dict[str, Dict[int, int]]: kind to tag ID to count
+        """
+        facets = defaultdict(dict)
+
+        for tag_id in sorted(self.tags):
+            facets[self.kinds[tag_id]][tag_id] = bitmaps.count(
+                self.tags[tag_id] & matched
+            )
+
+        return {kind: facets[kind] for kind in sorted(facets)}
+
+    def add_recipe(self, recipe_id: int):
+        """Recipe created"""
+        self.recipes |= 1 << recipe_id
+
+    def remove_recipe(self, recipe_id: int):
+        """Recipe deleted, its tag rows are deleted with it"""
+        self.recipes &= ~(1 << recipe_id)
+        self.clear_recipes((recipe_id,))
+
+    def set_tag(self, tag_id: int, kind: str):
+        """Tag created or edited"""
+        self.tags.setdefault(tag_id, 0)
+        self.kinds[tag_id] = kind
+
+    def remove_tag(self, tag_id: int):
+        """Tag deleted"""
+        self.tags.pop(tag_id, None)
+        self.kinds.pop(tag_id, None)
+
+    def add_tags(self, recipe_ids: Iterable[int], tag_ids: Iterable[int]):
+        """Tags added to recipes"""
+        added = bitmaps.from_ids(recipe_ids)
+        for tag_id in tag_ids:
+            if tag_id in self.tags:
+                self.tags[tag_id] |= added
+
+    def remove_tags(self, recipe_ids: Iterable[int], tag_ids: Iterable[int]):
+        """Tags removed from recipes"""
+        removed = ~bitmaps.from_ids(recipe_ids)
+        for tag_id in tag_ids:
+            if tag_id in self.tags:
+                self.tags[tag_id] &= removed
+
+    def clear_tag(self, tag_id: int):
+        """Tag removed from every recipe"""
+        if tag_id in self.tags:
+            self.tags[tag_id] = 0
+
+    def clear_recipes(self, recipe_ids: Iterable[int]):
+        """Every tag removed from recipes"""
+        self.remove_tags(recipe_ids, tuple(self.tags))
+
+
+class TagIndex(VersionedIndex):
+    """Per-worker TagBitmaps
+    """
+
+    version_key = versions.RECIPE_TAGS
+
+    def build(self) -> TagBitmaps:
+        tagged = defaultdict(list)
+
+        for recipe_id, tag_id in models.Recipe.tags.through.objects.values_list(
+            "recipe_id", "tag_id"
+        ):
+            tagged[tag_id].append(recipe_id)
+
+        kinds = dict(models.Tag.objects.values_list("id", "kind"))
+
+        return TagBitmaps(
+            bitmaps.from_ids(models.Recipe.objects.values_list("id", flat=True)),
+            {tag_id: bitmaps.from_ids(tagged[tag_id]) for tag_id in kinds},
+            kinds,
+        )
+
+
+tag_index = TagIndex()
+
+
+def parse_tag_filter(value: str) -> Tuple[Tuple[Tuple[int, bool], ...], ...]:
+    """Parse a ?tags= filter. Commas separate clauses that must all match, a
+    clause matches if any of its |-separated tags match and -<id> matches
+    recipes without that tag, e.g. "1,2|3,-4" is 1 AND (2 OR 3) AND NOT 4
+
+    Args:
+        value (str): filter
+
+    Raises:
+        ValidationError: filter is malformed
+
+    Returns:
+        Tuple[Tuple[Tuple[int, bool], ...], ...]: clauses of (tag ID, negated)
+    """
+    try:
+        return tuple(
+            tuple(
+                (abs(int(term)), term.strip().startswith("-"))
+                for term in clause.split("|")
+            )
+            for clause in value.split(",")
+        )
+
+    except ValueError:
+        raise exceptions.ValidationError(
+            {
+                "errors": {
+                    "tags": (
+                        "Must be comma separated tag IDs, "
+                        "| between alternatives and - before excluded tags",
+                    )
+                }
+            }
+        )
@@ -0,0 +1,389 @@
+"""
+TF-IDF vectors of recipe ingredients and tags for similar recipe suggestions
+"""
+from typing import Iterable, Iterator, List, Sequence, Set, Tuple, Union
+import numpy as np
+from scipy import sparse
+from .. import models, versions
+from .base import VersionedIndex
+
+# changed rows are folded into the main matrix once there are more than this
+# many, or more than one per COMPACT_RATIO rows of it
+COMPACT_AFTER = 256
+COMPACT_RATIO = 16
+
+INGREDIENT = "i"
+TAG = "t"
+
+
+class RecipeVectors:
+    """Binary vectors with one row per recipe and one column per ingredient and
+    tag. Rows are weighted by TF-IDF and L2 normalized when they are scored, so
+    the dot product of two rows is their cosine similarity and a write only
+    changes the rows of the recipes it touches and the counts of its columns.
+
+    Rows written since the index was built are kept in a dict and scored as a
+    small second matrix, their old rows in the main one are masked out, until
+    there are enough of them to fold the two together.
+
+    Attributes:
+        recipe_ids (np.ndarray): sorted recipe IDs, one per row of matrix
+        matrix (sparse.csr_matrix): recipe vectors as of the last compaction
+    """
+
+    def __init__(
+        self,
+        recipe_ids: np.ndarray,
+        ingredients: Tuple[np.ndarray, np.ndarray],
+        tags: Tuple[np.ndarray, np.ndarray],
+    ):
+        """
+        Args:
+            recipe_ids (np.ndarray): sorted IDs of every recipe
+            ingredients (Tuple[np.ndarray, np.ndarray]): recipe IDs and the
+                ingredient ID each of them uses
+            tags (Tuple[np.ndarray, np.ndarray]): recipe IDs and the tag ID
+                each of them has
+        """
+        ingredient_ids, ingredient_columns = np.unique(
+            ingredients[1], return_inverse=True
+        )
+        tag_ids, tag_columns = np.unique(tags[1], return_inverse=True)
+
+        # (kind, ID) of each column and the other way around
+        self._terms = [(INGREDIENT, int(id_)) for id_ in ingredient_ids] + [
+            (TAG, int(id_)) for id_ in tag_ids
+        ]
+        self._columns = {term: column for column, term in enumerate(self._terms)}
+        # recipes using each column, with room to add columns
+        self._counts = np.zeros(max(len(self._terms), 64), dtype=np.int64)
+        self._count = len(recipe_ids)
+        # recipe ID to the columns of rows written since the last compaction
+        self._changed = {}
+
+        rows = _rows(recipe_ids, np.concatenate((ingredients[0], tags[0])))
+        columns = np.concatenate(
+            (ingredient_columns, tag_columns + len(ingredient_ids))
+        )
+        # rows of recipes created after recipe_ids was read are left out
+        self._set_matrix(recipe_ids, rows[rows >= 0], columns[rows >= 0])
+
+    def most_similar(
+        self, recipe_ids: Sequence[int], count: int, batch_size: int = 100
+    ) -> Iterator[Tuple[int, List[Tuple[int, float]]]]:
+        """Find the most similar recipes of each recipe, batch_size recipes at
+        a time so memory stays bounded
+
+        Args:
+            recipe_ids (Sequence[int]): recipes to find similar recipes for,
+                unknown IDs are skipped
+            count (int): similar recipes per recipe
+            batch_size (int, optional): recipes scored per matrix product.
+                Defaults to 100.
+
+        Yields:
+            Tuple[int, List[Tuple[int, float]]]: recipe ID and up to count
+                (recipe ID, score) pairs, most similar first
+        """
+        width = len(self._terms)
+        # rarer ingredients and tags say more about a recipe, smoothed like
+        # scikit-learn's TfidfTransformer
+        idf = np.log((1 + self._count) / (1 + self._counts[:width])) + 1
+        squared = idf ** 2
+
+        changed_ids = np.array(sorted(self._changed), dtype=np.int64)
+        changed = self._matrix_of(
+            [self._changed[recipe_id] for recipe_id in changed_ids], width
+        )
+        candidate_ids = np.concatenate((self.recipe_ids, changed_ids))
+        live = np.concatenate((self._live, np.ones(len(changed_ids), dtype=bool)))
+        norms = np.sqrt(
+            np.concatenate(
+                (self.matrix @ squared[: self.matrix.shape[1]], changed @ squared)
+            )
+        )
+        recipe_ids = [
+            recipe_id
+            for recipe_id in recipe_ids
+            if self._columns_of(recipe_id) is not None
+        ]
+
+        for start in range(0, len(recipe_ids), batch_size):
+            batch = recipe_ids[start : start + batch_size]
+            weighted = self._matrix_of(
+                [self._columns_of(recipe_id) for recipe_id in batch], width
+            ) @ sparse.diags(squared)
+            scores = sparse.hstack(
+                (
+                    weighted[:, : self.matrix.shape[1]] @ self._transposed,
+                    weighted @ changed.T,
+                )
+            ).tocsr()
+
+            for i, recipe_id in enumerate(batch):
+                columns = scores.indices[scores.indptr[i] : scores.indptr[i + 1]]
+                values = scores.data[scores.indptr[i] : scores.indptr[i + 1]]
+                similar_ids = candidate_ids[columns]
+                keep = live[columns] & (similar_ids != recipe_id) & (values > 0)
+                columns, values = columns[keep], values[keep]
+                # rounded so equal scores tie whatever order they were summed in
+                values = np.round(
+                    values / (norms[columns] * np.sqrt(weighted[i].sum())), 6
+                )
+
+                if len(values) > count:
+                    # everything tied with the last one, ties go to the lower ID
+                    best = values >= -np.partition(-values, count - 1)[count - 1]
+                    columns, values = columns[best], values[best]
+
+                similar_ids = candidate_ids[columns]
+                order = np.lexsort((similar_ids, -values))[:count]
+
+                yield recipe_id, [
+                    (int(similar_ids[j]), float(values[j])) for j in order
+                ]
+
+    def add_recipe(self, recipe_id: int):
+        """Recipe created"""
+        if self._columns_of(recipe_id) is None:
+            self._changed[recipe_id] = set()
+            self._count += 1
+            self._compact_if_due()
+
+    def remove_recipe(self, recipe_id: int):
+        """Recipe deleted"""
+        if (columns := self._pop(recipe_id)) is not None:
+            self._counts[list(columns)] -= 1
+            self._count -= 1
+
+    def add_ingredient(self, recipe_id: int, ingredient_id: int):
+        """Ingredient added to a recipe"""
+        self._write((recipe_id,), ((INGREDIENT, ingredient_id),), True)
+
+    def remove_ingredient(self, recipe_id: int, ingredient_id: int):
+        """Ingredient removed from a recipe"""
+        self._write((recipe_id,), ((INGREDIENT, ingredient_id),), False)
+
+    def add_tags(self, recipe_ids: Iterable[int], tag_ids: Iterable[int]):
+        """Tags added to recipes"""
+        self._write(recipe_ids, tuple((TAG, tag_id) for tag_id in tag_ids), True)
+
+    def remove_tags(self, recipe_ids: Iterable[int], tag_ids: Iterable[int]):
+        """Tags removed from recipes"""
+        self._write(recipe_ids, tuple((TAG, tag_id) for tag_id in tag_ids), False)
+
+    def clear_tag(self, tag_id: int):
+        """Tag removed from every recipe or deleted"""
+        if (column := self._columns.get((TAG, tag_id))) is None:
+            return
+
+        tagged = [
+            recipe_id
+            for recipe_id, columns in self._changed.items()
+            if column in columns
+        ]
+        if column < self._transposed.shape[0]:
+            rows = self._transposed.indices[
+                self._transposed.indptr[column] : self._transposed.indptr[column + 1]
+            ]
+            tagged.extend(int(id_) for id_ in self.recipe_ids[rows[self._live[rows]]])
+
+        self.remove_tags(tagged, (tag_id,))
+
+    def clear_recipe_tags(self, recipe_ids: Iterable[int]):
+        """Every tag removed from recipes"""
+        for recipe_id in recipe_ids:
+            if (columns := self._columns_of(recipe_id)) is not None:
+                tag_ids = [
+                    self._terms[column][1]
+                    for column in columns
+                    if self._terms[column][0] == TAG
+                ]
+                self.remove_tags((recipe_id,), tag_ids)
+
+    def _write(self, recipe_ids: Iterable[int], terms: Tuple, add: bool):
+        for recipe_id in recipe_ids:
+            if (columns := self._changed.get(recipe_id)) is None:
+                if (columns := self._pop(recipe_id)) is None and not add:
+                    continue
+
+                if columns is None:
+                    # written by a bulk query before this recipe's post_save
+                    self._count += 1
+                    columns = ()
+
+                columns = self._changed[recipe_id] = set(columns)
+
+            for term in terms:
+                if add and (column := self._column(term)) not in columns:
+                    columns.add(column)
+                    self._counts[column] += 1
+
+                elif not add and (column := self._columns.get(term)) in columns:
+                    columns.remove(column)
+                    self._counts[column] -= 1
+
+        self._compact_if_due()
+
+    def _column(self, term: Tuple[str, int]) -> int:
+        """Column of an ingredient or tag, adding one for a new one"""
+        if (column := self._columns.get(term)) is None:
+            column = self._columns[term] = len(self._terms)
+            self._terms.append(term)
+
+            if column == len(self._counts):
+                self._counts = np.concatenate(
+                    (self._counts, np.zeros(len(self._counts), dtype=np.int64))
+                )
+
+        return column
+
+    def _columns_of(self, recipe_id: int) -> Union[Set[int], np.ndarray, None]:
+        """Columns of a recipe's row, None for a recipe the index doesn't have"""
+        if recipe_id in self._changed:
+            return self._changed[recipe_id]
+
+        if (row := self._row(recipe_id)) < 0:
+            return None
+
+        return self.matrix.indices[
+            self.matrix.indptr[row] : self.matrix.indptr[row + 1]
+        ]
+
+    def _pop(self, recipe_id: int) -> Union[Set[int], np.ndarray, None]:
+        """Remove a recipe's row, returning its columns"""
+        if recipe_id in self._changed:
+            return self._changed.pop(recipe_id)
+
+        if (columns := self._columns_of(recipe_id)) is not None:
+            self._live[self._row(recipe_id)] = False
+
+        return columns
+
+    def _row(self, recipe_id: int) -> int:
+        """Row of a recipe in matrix, -1 if it has none or it was masked out"""
+        row = _rows(self.recipe_ids, np.array((recipe_id,), dtype=np.int64))[0]
+        return row if row >= 0 and self._live[row] else -1
+
+    def _matrix_of(
+        self, rows: Sequence[Iterable[int]], width: int
+    ) -> sparse.csr_matrix:
+        """Binary matrix with the given columns set in each row"""
+        lengths = [len(columns) for columns in rows]
+        indices = np.fromiter(
+            (column for columns in rows for column in columns),
+            dtype=np.int64,
+            count=sum(lengths),
+        )
+
+        return sparse.csr_matrix(
+            (
+                np.ones(len(indices)),
+                indices,
+                np.concatenate(([0], np.cumsum(lengths, dtype=np.int64))),
+            ),
+            shape=(len(rows), width),
+        )
+
+    def _compact_if_due(self):
+        if len(self._changed) <= max(
+            COMPACT_AFTER, len(self.recipe_ids) // COMPACT_RATIO
+        ):
+            return
+
+        kept = np.flatnonzero(self._live)
+        lengths = np.diff(self.matrix.indptr)
+        changed_ids = np.array(sorted(self._changed), dtype=np.int64)
+        recipe_ids = np.concatenate((self.recipe_ids[kept], changed_ids))
+        order = np.argsort(recipe_ids, kind="stable")
+        # new row of each kept and changed row once recipe_ids is sorted
+        new_rows = np.empty(len(order), dtype=np.int64)
+        new_rows[order] = np.arange(len(order))
+
+        kept_matrix = self.matrix[kept]
+        rows = np.concatenate(
+            (
+                np.repeat(new_rows[: len(kept)], lengths[kept]),
+                np.repeat(
+                    new_rows[len(kept) :],
+                    [len(self._changed[recipe_id]) for recipe_id in changed_ids],
+                ),
+            )
+        )
+        columns = np.concatenate(
+            (
+                kept_matrix.indices,
+                np.fromiter(
+                    (
+                        column
+                        for recipe_id in changed_ids
+                        for column in self._changed[recipe_id]
+                    ),
+                    dtype=np.int64,
+                ),
+            )
+        )
+
+        self._changed = {}
+        self._set_matrix(recipe_ids[order], rows, columns)
+
+    def _set_matrix(
+        self, recipe_ids: np.ndarray, rows: np.ndarray, columns: np.ndarray
+    ):
+        """Replace matrix with the given rows, which counts every column again"""
+        self.recipe_ids = recipe_ids
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, columns)),
+            shape=(len(recipe_ids), len(self._terms)),
+        )
+        self._transposed = self.matrix.T.tocsr()
+        self._live = np.ones(len(recipe_ids), dtype=bool)
+        self._counts[:] = 0
+        self._counts[: len(self._terms)] = np.bincount(
+            columns, minlength=len(self._terms)
+        )
+
+
+def _rows(recipe_ids: np.ndarray, lookup: np.ndarray) -> np.ndarray:
+    """Row of each looked up recipe ID, -1 for IDs not in recipe_ids"""
+    if not len(recipe_ids):
+        return np.full(len(lookup), -1)
+
+    rows = np.searchsorted(recipe_ids, lookup)
+    rows[rows == len(recipe_ids)] = 0
+    rows[recipe_ids[rows] != lookup] = -1
+
+    return rows
+
+
+class VectorIndex(VersionedIndex):
+    """Per-worker RecipeVectors
+    """
+
+    version_key = versions.RECIPE_VECTORS
+
+    def build(self) -> RecipeVectors:
+        ingredients = np.array(
+            list(
+                models.IngredientInRecipe.objects.values_list(
+                    "recipe_id", "ingredient_id"
+                )
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        tags = np.array(
+            list(models.Recipe.tags.through.objects.values_list("recipe_id", "tag_id")),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+
+        return RecipeVectors(
+            np.array(
+                list(models.Recipe.objects.order_by("id").values_list("id", flat=True)),
+                dtype=np.int64,
+            ),
+            (ingredients[:, 0], ingredients[:, 1]),
+            (tags[:, 0], tags[:, 1]),
+        )
+
+
+vector_index = VectorIndex()
@@ -0,0 +1,149 @@
+"""
+manage.py benchmark_http
+"""
+import json
+from django.core.management.base import BaseCommand, CommandError
+from ... import benchmark, dataset
+
+
+class Command(BaseCommand):
+    """Load every API route through gunicorn and record latency, throughput,
+    queries per request and worker memory per endpoint, see
+    recipe_manager.benchmark. Seeding and write scenarios change the
+    configured database, point SQL_DATABASE at a scratch one.
+    """
+
+    help = "Benchmark every API route over HTTP and write the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recipes",
+            type=int,
+            default=1000,
+            help="Recipes to generate before the run, 0 to use the data there is",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--concurrency", type=int, default=8, help="Requests sent at once"
+        )
+        parser.add_argument(
+            "--duration", type=float, default=30, help="Seconds to send requests for"
+        )
+        parser.add_argument(
+            "--writes",
+            type=float,
+            default=0.2,
+            help="Share of scenarios that write, 0 to 1",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4, help="gunicorn worker processes"
+        )
+        parser.add_argument(
+            "--url", help="Load a server that is already running instead of gunicorn",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=tuple(benchmark.SCENARIOS),
+            help="Only run this scenario, may be repeated",
+        )
+        parser.add_argument(
+            "--output", default="-", help="File to write the results to, - for stdout"
+        )
+        parser.add_argument(
+            "--baseline", help="Results of an earlier run to compare against",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.1,
+            help="Relative increase of p95 latency or queries that counts as a "
+            "regression",
+        )
+        parser.add_argument(
+            "--min-requests",
+            type=int,
+            default=20,
+            help="Requests an endpoint needs in both runs to be compared",
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options["writes"] <= 1:
+            raise CommandError("--writes must be between 0 and 1")
+
+        context = benchmark.prepare(
+            options["recipes"], options["seed"], dataset.BATCH_SIZE
+        )
+        if not context.recipe_ids:
+            raise CommandError("There are no recipes to benchmark, use --recipes")
+
+        scenarios = {
+            name: benchmark.SCENARIOS[name]
+            for name in options["scenario"] or benchmark.SCENARIOS
+        }
+        run_options = {
+            "concurrency": options["concurrency"],
+            "duration": options["duration"],
+            "writes": options["writes"],
+            "seed": options["seed"],
+            "scenarios": scenarios,
+        }
+
+        if options["url"]:
+            results = benchmark.run(options["url"], context, **run_options)
+
+        else:
+            try:
+                with benchmark.gunicorn(options["workers"]) as url:
+                    results = benchmark.run(url, context, **run_options)
+
+            except (OSError, RuntimeError) as err:
+                raise CommandError(f"Could not start gunicorn: {err}")
+
+        results = {
+            "options": {
+                **{
+                    option: options[option]
+                    for option in ("recipes", "seed", "workers", "url")
+                },
+                **{
+                    key: value
+                    for key, value in run_options.items()
+                    if key != "scenarios"
+                },
+                "scenarios": sorted(scenarios),
+            },
+            **results,
+        }
+        rendered = json.dumps(results, indent=2)
+
+        if options["output"] == "-":
+            self.stdout.write(rendered)
+
+        else:
+            with open(options["output"], "w") as output:
+                output.write(rendered + "\n")
+
+        total = results["total"]
+        self.stderr.write(
+            f"{total['requests']} requests, {total['throughput_rps']} req/s, "
+            f"p95 {total['latency_ms']['p95']} ms, {total['errors']} errors"
+        )
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline:
+                regressions = benchmark.compare(
+                    json.load(baseline),
+                    results,
+                    options["threshold"],
+                    options["min_requests"],
+                )
+
+            for regression in regressions:
+                self.stderr.write(
+                    f"{regression['endpoint']}: {regression['metric']} "
+                    f"{regression['baseline']} -> {regression['current']}"
+                )
+
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions")
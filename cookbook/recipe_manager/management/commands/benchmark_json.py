@@ -0,0 +1,111 @@
+"""
+manage.py benchmark_json
+"""
+import io
+import timeit
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from ...parsers import ORJSONParser
+from ...renderers import ORJSONRenderer
+
+BACKENDS = (
+    ("stdlib", JSONRenderer, JSONParser),
+    ("orjson", ORJSONRenderer, ORJSONParser),
+)
+
+
+class Command(BaseCommand):
+    """Time the stdlib and orjson renderers and parsers on a recipe list payload
+    """
+
+    help = "Compare JSON render and parse times of the stdlib and orjson backends"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recipes",
+            type=int,
+            default=1000,
+            help="Number of recipes in the payload",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Number of timed runs per backend",
+        )
+
+    def handle(self, *args, **options):
+        data = recipe_list_payload(options["recipes"])
+        outputs = set()
+
+        self.stdout.write(
+            f"{'backend':<8}{'bytes':>10}{'render ms':>12}{'parse ms':>12}"
+        )
+
+        for name, renderer_class, parser_class in BACKENDS:
+            renderer = renderer_class()
+            parser = parser_class()
+            rendered = renderer.render(data)
+            outputs.add(rendered)
+
+            render_time = min(
+                timeit.repeat(
+                    lambda: renderer.render(data), number=1, repeat=options["repeat"]
+                )
+            )
+            parse_time = min(
+                timeit.repeat(
+                    lambda: parser.parse(io.BytesIO(rendered)),
+                    number=1,
+                    repeat=options["repeat"],
+                )
+            )
+
+            self.stdout.write(
+                f"{name:<8}{len(rendered):>10}"
+                f"{render_time * 1000:>12.2f}{parse_time * 1000:>12.2f}"
+            )
+
+        if len(outputs) == 1:
+            self.stdout.write(self.style.SUCCESS("Rendered output is identical"))
+
+        else:
+            self.stdout.write(self.style.WARNING("Rendered output differs"))
+
+
+def recipe_list_payload(count: int) -> list:
+    """Build data shaped like a page of /recipe/ with some values the
+    renderers have to convert
+
+    Args:
+        count (int): number of recipes
+
+    Returns:
+        list: recipes
+    """
+    now = timezone.now()
+
+    return [
+        {
+            "id": recipe_id,
+            "name": f"recipe {recipe_id}",
+            "description": "Whisk everything together — then bake ☕ " * 4,
+            "servings": 4,
+            "cook_time": "1:30",
+            "author_id": 1,
+            "created_on": now,
+            "last_updated_on": now,
+            "ingredients": tuple(
+                {
+                    "amount": Decimal("1.50"),
+                    "unit": "c",
+                    "specifier": "chopped",
+                    "ingredient_id": ingredient_id,
+                }
+                for ingredient_id in range(8)
+            ),
+            "steps": tuple(f"step {order} of recipe {recipe_id}" for order in range(6)),
+            "tags": (1, 2, 3),
+        }
+        for recipe_id in range(count)
+    ]
@@ -0,0 +1,66 @@
+"""
+manage.py check_recipe_documents
+"""
+from django.core.management.base import BaseCommand, CommandError
+from ... import models, documents
+from ...utils import chunked
+
+
+class Command(BaseCommand):
+    """Compare every stored recipe document with a freshly built one
+    """
+
+    help = (
+        "Check stored recipe documents match the relational tables. "
+        "Exits with an error if any are stale unless --fix is given"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of recipes checked per query batch",
+        )
+        parser.add_argument(
+            "--fix", action="store_true", help="Rebuild missing and stale documents",
+        )
+
+    def handle(self, *args, **options):
+        missing = []
+        stale = []
+        recipe_ids = (
+            models.Recipe.objects.order_by("id").values_list("id", flat=True).iterator()
+        )
+
+        for batch in chunked(recipe_ids, options["batch_size"]):
+            stored = dict(
+                models.RecipeDocument.objects.filter(recipe_id__in=batch).values_list(
+                    "recipe_id", "document"
+                )
+            )
+            fresh = documents.render(models.Recipe.objects.filter(id__in=batch))
+
+            for recipe_id, document in fresh.items():
+                if recipe_id not in stored:
+                    missing.append(recipe_id)
+
+                elif stored[recipe_id] != document:
+                    stale.append(recipe_id)
+
+        self.stdout.write(
+            f"{len(missing)} missing (built on next read), {len(stale)} stale"
+        )
+
+        if options["fix"]:
+            for batch in chunked(missing + stale, options["batch_size"]):
+                documents.rebuild(batch)
+
+            self.stdout.write(
+                self.style.SUCCESS(f"Rebuilt {len(missing) + len(stale)} documents")
+            )
+
+        elif stale:
+            raise CommandError(
+                f"Stale documents for recipes: {', '.join(map(str, stale))}"
+            )
@@ -0,0 +1,43 @@
+"""
+manage.py export_recipes
+"""
+import sys
+from django.core.management.base import BaseCommand
+from ... import transfer
+
+
+class Command(BaseCommand):
+    """Write every recipe as JSON lines, see recipe_manager.transfer
+    """
+
+    help = "Export every recipe with its ingredients, steps and tags as JSON lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "output", nargs="?", default="-", help="File to write, - for stdout",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=transfer.BATCH_SIZE,
+            help="Number of recipes serialized at a time",
+        )
+
+    def handle(self, *args, **options):
+        exported = 0
+        output = (
+            sys.stdout.buffer
+            if options["output"] == "-"
+            else open(options["output"], "wb")
+        )
+
+        try:
+            for lines in transfer.export_lines(batch_size=options["batch_size"]):
+                output.write(lines)
+                exported += lines.count(b"\n")
+
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+
+        self.stderr.write(self.style.SUCCESS(f"Exported {exported} recipes"))
@@ -0,0 +1,61 @@
+"""
+manage.py generate_dataset
+"""
+from django.core.management.base import BaseCommand
+from ... import dataset
+
+
+class Command(BaseCommand):
+    """Fill the database with synthetic users, recipes and meal plans, see
+    recipe_manager.dataset
+    """
+
+    help = "Generate a deterministic synthetic dataset for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--ingredients", type=int, default=2000)
+        parser.add_argument("--tags", type=int, default=200)
+        parser.add_argument(
+            "--meal-plans", type=int, default=28, help="Meals planned per user",
+        )
+        parser.add_argument(
+            "--sub-recipes",
+            type=float,
+            default=0.02,
+            help="Share of recipes later recipes can use as an ingredient",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=dataset.BATCH_SIZE,
+            help="Number of recipes written at a time",
+        )
+        parser.add_argument(
+            "--skip-derived",
+            action="store_true",
+            help="Leave stored documents and the search index to "
+            "rebuild_recipe_documents and rebuild_search_index",
+        )
+
+    def handle(self, *args, **options):
+        counts = dataset.generate(
+            users=options["users"],
+            recipes=options["recipes"],
+            ingredients=options["ingredients"],
+            tags=options["tags"],
+            meal_plans=options["meal_plans"],
+            sub_recipes=options["sub_recipes"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            derived=not options["skip_derived"],
+            progress=lambda table, written: self.stderr.write(f"{table}: {written}"),
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                ", ".join(f"{count} {table}" for table, count in counts.items())
+            )
+        )
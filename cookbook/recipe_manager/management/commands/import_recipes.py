@@ -0,0 +1,61 @@
+"""
+manage.py import_recipes
+"""
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from users.models import User
+from ... import transfer
+
+
+class Command(BaseCommand):
+    """Import recipes from JSON lines written by export_recipes, see
+    recipe_manager.transfer
+    """
+
+    help = "Import recipes from JSON lines, updating the ones whose name exists"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "input", nargs="?", default="-", help="File to read, - for stdin",
+        )
+        parser.add_argument(
+            "--author", help="Username of the author of created recipes",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=transfer.BATCH_SIZE,
+            help="Number of recipes written at a time",
+        )
+
+    def handle(self, *args, **options):
+        author_id = None
+        if options["author"]:
+            try:
+                author_id = User.objects.get(username=options["author"]).id
+
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['author']}")
+
+        lines = (
+            sys.stdin.buffer
+            if options["input"] == "-"
+            else open(options["input"], "rb")
+        )
+
+        try:
+            counts = transfer.import_lines(lines, author_id, options["batch_size"])
+
+        except ValueError as err:
+            raise CommandError(str(err))
+
+        finally:
+            if lines is not sys.stdin.buffer:
+                lines.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {counts['created']} recipes, updated {counts['updated']}, "
+                f"skipped {counts['skipped_links']} sub-recipe links"
+            )
+        )
@@ -0,0 +1,32 @@
+"""
+manage.py rebuild_recipe_documents
+"""
+from django.core.management.base import BaseCommand
+from ... import models, documents
+from ...utils import chunked
+
+
+class Command(BaseCommand):
+    """Rebuild the stored document of every recipe in batches
+    """
+
+    help = "Rebuild the stored JSON document of every recipe"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of recipes rebuilt per query batch",
+        )
+
+    def handle(self, *args, **options):
+        rebuilt = 0
+        recipe_ids = (
+            models.Recipe.objects.order_by("id").values_list("id", flat=True).iterator()
+        )
+
+        for batch in chunked(recipe_ids, options["batch_size"]):
+            rebuilt += len(documents.rebuild(batch))
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} recipe documents"))
@@ -0,0 +1,38 @@
+"""
+manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+from ... import models, search
+from ...utils import chunked
+
+
+class Command(BaseCommand):
+    """Reindex every recipe for full-text search in batches
+    """
+
+    help = "Rebuild the full-text search index of every recipe"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of recipes indexed per query batch",
+        )
+
+    def handle(self, *args, **options):
+        pruned = search.prune()
+        indexed = 0
+        recipe_ids = (
+            models.Recipe.objects.order_by("id").values_list("id", flat=True).iterator()
+        )
+
+        for batch in chunked(recipe_ids, options["batch_size"]):
+            search.index(batch)
+            indexed += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {indexed} recipes, removed {pruned} deleted ones"
+            )
+        )
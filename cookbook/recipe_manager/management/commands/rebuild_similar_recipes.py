@@ -0,0 +1,49 @@
+"""
+manage.py rebuild_similar_recipes
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from ... import models, similarity
+from ...utils import chunked
+
+
+class Command(BaseCommand):
+    """Recompute the similar recipes of every recipe in batches, which also
+    picks up changes in how rare ingredients and tags are. With --stale only
+    the ones writes made stale are, so reads don't have to.
+    """
+
+    help = "Recompute the similar recipes of every recipe, or only stale ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of recipes scored per matrix product",
+        )
+        parser.add_argument(
+            "--stale",
+            action="store_true",
+            help="Only recipes whose suggestions are missing or stale",
+        )
+
+    def handle(self, *args, **options):
+        computed = 0
+        recipes = models.Recipe.objects.order_by("id")
+
+        if options["stale"]:
+            recipes = recipes.filter(
+                Q(similar_version__computed=None)
+                | ~Q(similar_version__computed=F("similar_version__version"))
+            )
+
+        recipe_ids = recipes.values_list("id", flat=True).iterator()
+
+        for batch in chunked(recipe_ids, options["batch_size"]):
+            similarity.compute(batch, options["batch_size"])
+            computed += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Computed similar recipes of {computed} recipes")
+        )
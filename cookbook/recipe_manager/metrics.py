@@ -0,0 +1,360 @@
+"""
+Request, database and cache metrics for /metrics in the Prometheus text
+exposition format. Every process counts into its own memory mapped file in
+RECIPE_MANAGER["METRICS_DIR"] named after its PID, and a scrape adds up every
+file in the directory, so any gunicorn worker can answer for all of them.
+Files of workers that exited are kept so counts never go backwards when
+gunicorn replaces a worker, empty the directory when the server starts.
+Nothing is counted when METRICS_DIR is not set.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+from typing import Dict, Iterator, Sequence, Tuple, Union
+from django.conf import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+REQUESTS = "cookbook_http_requests_total"
+REQUEST_DURATION = "cookbook_http_request_duration_seconds"
+REQUESTS_IN_FLIGHT = "cookbook_http_requests_in_flight"
+DB_QUERIES = "cookbook_db_queries_per_request"
+DB_DURATION = "cookbook_db_duration_seconds"
+CACHE_REQUESTS = "cookbook_cache_requests_total"
+CACHE_HIT_RATIO = "cookbook_cache_hit_ratio"
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name to (type, help, label names, histogram buckets)
+METRICS = {
+    REQUESTS: (COUNTER, "Requests served", ("url_name", "method", "status"), ()),
+    REQUEST_DURATION: (
+        HISTOGRAM,
+        "Time to build a response, streamed bodies excluded",
+        ("url_name", "method", "status"),
+        _LATENCY_BUCKETS,
+    ),
+    REQUESTS_IN_FLIGHT: (GAUGE, "Requests being served", (), ()),
+    DB_QUERIES: (
+        HISTOGRAM,
+        "SQL queries made per request",
+        ("url_name",),
+        (1, 2, 5, 10, 25, 50, 100, 250),
+    ),
+    DB_DURATION: (
+        HISTOGRAM,
+        "Time spent in SQL queries per request",
+        ("url_name",),
+        _LATENCY_BUCKETS,
+    ),
+    CACHE_REQUESTS: (
+        COUNTER,
+        "Cache lookups by result, hit or miss",
+        ("cache", "result"),
+        (),
+    ),
+}
+
+# header holding the bytes used, then entries of a 4 byte key length, the
+# UTF-8 key padded to 8 bytes and an 8 byte double
+_HEADER = struct.Struct("q")
+_KEY_LENGTH = struct.Struct("i")
+_VALUE = struct.Struct("d")
+_INITIAL_SIZE = 1 << 16
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class MmapValues:
+    """Floats by key in a memory mapped file written by one process. New
+    entries are written before the header is moved past them so readers in
+    other processes only ever see whole entries.
+
+    Args:
+        path (str): file to map, created if missing
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a+b")
+        if os.fstat(self._file.fileno()).st_size < _INITIAL_SIZE:
+            self._file.truncate(_INITIAL_SIZE)
+
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._used = _HEADER.unpack_from(self._mmap)[0] or _HEADER.size
+        self._positions = {
+            key: position for key, position in _entries(self._mmap, self._used)
+        }
+
+    def add(self, key: str, amount: float):
+        """Add to the value of a key, keys start at 0
+
+        Args:
+            key (str): key
+            amount (float): amount to add, negative to subtract
+        """
+        with self._lock:
+            if (position := self._positions.get(key)) is None:
+                position = self._append(key)
+
+            (value,) = _VALUE.unpack_from(self._mmap, position)
+            _VALUE.pack_into(self._mmap, position, value + amount)
+
+    def close(self):
+        """Unmap and close the file"""
+        self._mmap.close()
+        self._file.close()
+
+    def _append(self, key: str) -> int:
+        encoded = key.encode("utf-8")
+        padded = _padded(_KEY_LENGTH.size + len(encoded))
+        end = self._used + padded + _VALUE.size
+
+        if end > len(self._mmap):
+            size = len(self._mmap)
+            while size < end:
+                size *= 2
+
+            self._mmap.close()
+            self._file.truncate(size)
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+
+        _KEY_LENGTH.pack_into(self._mmap, self._used, len(encoded))
+        self._mmap[
+            self._used + _KEY_LENGTH.size : self._used + _KEY_LENGTH.size + len(encoded)
+        ] = encoded
+        position = self._used + padded
+        _VALUE.pack_into(self._mmap, position, 0.0)
+        self._used = end
+        _HEADER.pack_into(self._mmap, 0, end)
+        self._positions[key] = position
+
+        return position
+
+
+def inc(name: str, labels: Sequence[str] = (), amount: float = 1):
+    """Add to a counter or gauge
+
+    Args:
+        name (str): metric from METRICS
+        labels (Sequence[str], optional): label values in the metric's order
+        amount (float, optional): amount to add. Defaults to 1.
+    """
+    if (store := _values()) is not None:
+        store.add(_key(name, labels), amount)
+
+
+def observe(name: str, labels: Sequence[str], value: float):
+    """Record a value in a histogram
+
+    Args:
+        name (str): metric from METRICS
+        labels (Sequence[str]): label values in the metric's order
+        value (float): observed value
+    """
+    if (store := _values()) is None:
+        return
+
+    buckets = METRICS[name][3]
+    bucket = next((_bound(bound) for bound in buckets if value <= bound), "+Inf")
+    # buckets are stored apart and added up when collected
+    store.add(_key(f"{name}_bucket", (*labels, bucket)), 1)
+    store.add(_key(f"{name}_sum", labels), value)
+    store.add(_key(f"{name}_count", labels), 1)
+
+
+def cache(name: str, hits: int, misses: int = 0):
+    """Count lookups in a cache
+
+    Args:
+        name (str): cache
+        hits (int): lookups answered from the cache
+        misses (int, optional): lookups that had to be computed. Defaults to 0.
+    """
+    if hits:
+        inc(CACHE_REQUESTS, (name, "hit"), hits)
+
+    if misses:
+        inc(CACHE_REQUESTS, (name, "miss"), misses)
+
+
+def collect(directory: str = None) -> str:
+    """Add up the files of every process and format them for Prometheus.
+    Gauges only count processes that are still running.
+
+    Args:
+        directory (str, optional): metrics directory. Defaults to
+            RECIPE_MANAGER["METRICS_DIR"].
+
+    Returns:
+        str: metrics in the text exposition format
+    """
+    directory = directory or settings.RECIPE_MANAGER["METRICS_DIR"]
+    samples = defaultdict(float)
+
+    file_names = sorted(os.listdir(directory)) if os.path.isdir(directory) else ()
+
+    for file_name in file_names:
+        pid, extension = os.path.splitext(file_name)
+        if extension != ".db" or not pid.isdigit():
+            continue
+
+        alive = _alive(int(pid))
+        for (sample, labels), value in _read(os.path.join(directory, file_name)):
+            if alive or METRICS.get(sample, (None,))[0] != GAUGE:
+                samples[sample, labels] += value
+
+    lines = []
+    for name, (kind, description, label_names, buckets) in METRICS.items():
+        lines.extend((f"# HELP {name} {description}", f"# TYPE {name} {kind}"))
+
+        if kind == HISTOGRAM:
+            lines.extend(_histogram(name, label_names, buckets, samples))
+
+        else:
+            lines.extend(
+                _line(name, label_names, labels, value)
+                for (sample, labels), value in sorted(samples.items())
+                if sample == name
+            )
+
+    lines.extend(_hit_ratios(samples))
+
+    return "\n".join(lines) + "\n"
+
+
+def _values() -> Union[MmapValues, None]:
+    """This process's file, reopened after a fork or a change of directory"""
+    global _store  # pylint: disable=global-statement
+
+    if (directory := settings.RECIPE_MANAGER["METRICS_DIR"]) is None:
+        return None
+
+    path = os.path.join(directory, f"{os.getpid()}.db")
+    if _store is not None and _store.path == path:
+        return _store
+
+    with _store_lock:
+        if _store is None or _store.path != path:
+            if _store is not None:
+                _store.close()
+
+            os.makedirs(directory, exist_ok=True)
+            _store = MmapValues(path)
+
+        return _store
+
+
+def _key(sample: str, labels: Sequence[str]) -> str:
+    return json.dumps((sample, labels))
+
+
+def _bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def _padded(size: int) -> int:
+    return size + (-size % 8)
+
+
+def _entries(data, used: int) -> Iterator[Tuple[str, int]]:
+    """Keys and value positions of the entries in a file's bytes"""
+    position = _HEADER.size
+
+    while position < used:
+        (length,) = _KEY_LENGTH.unpack_from(data, position)
+        start = position + _KEY_LENGTH.size
+        key = bytes(data[start : start + length]).decode("utf-8")
+        value_position = position + _padded(_KEY_LENGTH.size + length)
+
+        yield key, value_position
+
+        position = value_position + _VALUE.size
+
+
+def _read(path: str) -> Iterator[Tuple[Tuple[str, tuple], float]]:
+    with open(path, "rb") as file:
+        data = file.read()
+
+    if len(data) < _HEADER.size:
+        return
+
+    for key, position in _entries(data, _HEADER.unpack_from(data)[0]):
+        sample, labels = json.loads(key)
+
+        yield (sample, tuple(labels)), _VALUE.unpack_from(data, position)[0]
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+
+    except ProcessLookupError:
+        return False
+
+    except PermissionError:
+        return True
+
+    return True
+
+
+def _histogram(
+    name: str, label_names: tuple, buckets: tuple, samples: Dict[tuple, float]
+) -> Iterator[str]:
+    bounds = (*(_bound(bound) for bound in buckets), "+Inf")
+    series = sorted(labels for sample, labels in samples if sample == f"{name}_count")
+
+    for labels in series:
+        total = 0.0
+        for bound in bounds:
+            total += samples.get((f"{name}_bucket", (*labels, bound)), 0.0)
+            yield _line(f"{name}_bucket", (*label_names, "le"), (*labels, bound), total)
+
+        yield _line(f"{name}_sum", label_names, labels, samples[f"{name}_sum", labels])
+        yield _line(
+            f"{name}_count", label_names, labels, samples[f"{name}_count", labels]
+        )
+
+
+def _hit_ratios(samples: Dict[tuple, float]) -> Iterator[str]:
+    lookups = defaultdict(dict)
+    for (sample, labels), value in samples.items():
+        if sample == CACHE_REQUESTS:
+            lookups[labels[0]][labels[1]] = value
+
+    yield f"# HELP {CACHE_HIT_RATIO} Share of cache lookups that were hits"
+    yield f"# TYPE {CACHE_HIT_RATIO} {GAUGE}"
+
+    for name, results in sorted(lookups.items()):
+        hits = results.get("hit", 0.0)
+        yield _line(
+            CACHE_HIT_RATIO,
+            ("cache",),
+            (name,),
+            hits / (hits + results.get("miss", 0.0)),
+        )
+
+
+def _line(sample: str, label_names: Sequence[str], labels: Sequence[str], value) -> str:
+    if not label_names:
+        return f"{sample} {value!r}"
+
+    pairs = ",".join(
+        f'{label}="{_escape(str(label_value))}"'
+        for label, label_value in zip(label_names, labels)
+    )
+
+    return f"{sample}{{{pairs}}} {value!r}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
@@ -0,0 +1,218 @@
+"""
+Django middleware
+"""
+import random
+import resource
+import time
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from . import budgets, metrics, profiling, timing
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+MAX_RSS_HEADER = "X-Max-RSS-KB"
+SERVER_TIMING_HEADER = "Server-Timing"
+
+
+class QueryCounter:
+    """Count and time the SQL queries run on the default connection, install
+    with connection.execute_wrapper(counter)
+
+    Attributes:
+        count (int): queries run so far
+        duration (float): seconds spent running them
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        start = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+
+        finally:
+            self.duration += time.perf_counter() - start
+
+
+class BenchmarkMiddleware:
+    """Report the SQL queries a request made and the peak resident memory of
+    the worker that served it in the X-Query-Count and X-Max-RSS-KB headers,
+    read by manage.py benchmark_http. Installed only when the BENCHMARK
+    environment variable is set. Queries made while a streamed response is
+    being sent are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+
+        response[QUERY_COUNT_HEADER] = str(counter.count)
+        # kilobytes on Linux
+        response[MAX_RSS_HEADER] = str(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        )
+
+        return response
+
+
+class QueryBudgetMiddleware:
+    """Hold every request to the query budget of its URL name and method in
+    budgets.QUERY_BUDGETS, see budgets.check. Streamed responses send a chunk
+    of rows at a time, so each piece they send is held to the budget instead.
+    Does nothing unless settings.QUERY_BUDGETS is set.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGETS:
+            return self.get_response(request)
+
+        counter = QueryCounter()
+
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+
+        if request.resolver_match is None:
+            return response
+
+        url_name, method = request.resolver_match.url_name, request.method
+
+        if response.streaming:
+            response.streaming_content = _counted(
+                response.streaming_content, counter, url_name, method
+            )
+
+        else:
+            budgets.check(url_name, method, counter.count)
+
+        return response
+
+
+def _counted(content, counter: QueryCounter, url_name: str, method: str):
+    """Hold every piece of a streamed response to the budget, the first one
+    along with the queries made before it
+    """
+    pieces = iter(content)
+    done = object()
+
+    while True:
+        with connection.execute_wrapper(counter):
+            piece = next(pieces, done)
+
+        if piece is done:
+            break
+
+        budgets.check(url_name, method, counter.count)
+        counter.count = 0
+
+        yield piece
+
+
+class ServerTimingMiddleware:
+    """Time the database, authentication, serializer and renderer phases of a
+    sample of requests, see timing. Sampled requests get a Server-Timing
+    header and a log record on the recipe_manager.timing logger with the
+    durations as fields. RECIPE_MANAGER["SERVER_TIMING_SAMPLE_RATE"] is the
+    share of requests sampled, at 0 the middleware removes itself. Work done
+    while a streamed response is being sent is not timed.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = settings.RECIPE_MANAGER["SERVER_TIMING_SAMPLE_RATE"]
+
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+
+        with timing.timed() as timings, connection.execute_wrapper(timings.query):
+            response = self.get_response(request)
+
+        total = time.perf_counter() - start
+        response[SERVER_TIMING_HEADER] = timings.header(total)
+        timing.logger.info(
+            "%s %s",
+            request.method,
+            request.path,
+            extra={
+                "timing": {
+                    "method": request.method,
+                    "path": request.path,
+                    "url_name": getattr(request.resolver_match, "url_name", None),
+                    "status": response.status_code,
+                    **timings.fields(total),
+                }
+            },
+        )
+
+        return response
+
+
+class MetricsMiddleware:
+    """Count requests, their latency and SQL queries by URL name for
+    /metrics, see metrics. Installed when RECIPE_MANAGER["METRICS_DIR"] is set.
+    Work done while a streamed response is being sent is not measured.
+    """
+
+    def __init__(self, get_response):
+        if settings.RECIPE_MANAGER["METRICS_DIR"] is None:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        metrics.inc(metrics.REQUESTS_IN_FLIGHT)
+        start = time.perf_counter()
+
+        try:
+            with connection.execute_wrapper(counter):
+                response = self.get_response(request)
+
+        finally:
+            metrics.inc(metrics.REQUESTS_IN_FLIGHT, amount=-1)
+
+        duration = time.perf_counter() - start
+        url_name = getattr(request.resolver_match, "url_name", None) or "none"
+        labels = (url_name, request.method, str(response.status_code))
+        metrics.inc(metrics.REQUESTS, labels)
+        metrics.observe(metrics.REQUEST_DURATION, labels, duration)
+        metrics.observe(metrics.DB_QUERIES, (url_name,), counter.count)
+        metrics.observe(metrics.DB_DURATION, (url_name,), counter.duration)
+
+        return response
+
+
+class ProfileMiddleware:
+    """Run requests from superusers that ask for it under a profiler, see
+    profiling. Installed outside the other middleware so saving the profile
+    and explaining its queries are not counted as the request's own work.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (profiler := profiling.requested(request)) is None or (
+            user := profiling.superuser(request)
+        ) is None:
+            return self.get_response(request)
+
+        return profiling.profile(request, user, profiler, self.get_response)
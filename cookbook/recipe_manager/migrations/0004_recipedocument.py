@@ -0,0 +1,22 @@
+# Generated by Django 3.0.3 on 2026-10-18 04:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0003_mealplan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='recipe_manager.Recipe')),
+                ('document', models.TextField()),
+                ('built_on', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
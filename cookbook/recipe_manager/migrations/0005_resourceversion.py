@@ -0,0 +1,26 @@
+# Generated by Django 3.0.3 on 2026-10-18 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0004_recipedocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceVersion',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('version', models.CharField(max_length=32)),
+                ('last_modified', models.DateTimeField()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='last_updated_on',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,86 @@
+from django.db import migrations
+
+TABLE = "recipe_manager_recipesearch"
+
+POSTGRES_CREATE = f"""
+CREATE TABLE {TABLE} (
+    recipe_id integer PRIMARY KEY
+        REFERENCES recipe_manager_recipe (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    document tsvector NOT NULL
+);
+CREATE INDEX {TABLE}_document_idx ON {TABLE} USING GIN (document);
+INSERT INTO {TABLE} (recipe_id, document)
+SELECT
+    recipe.id,
+    setweight(to_tsvector('english', recipe.name), 'A')
+    || setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(ingredient.name, E'\\n')
+        FROM recipe_manager_ingredientinrecipe ingredient_in_recipe
+        JOIN recipe_manager_ingredient ingredient ON ingredient.id = ingredient_in_recipe.ingredient_id
+        WHERE ingredient_in_recipe.recipe_id = recipe.id
+    ), '')), 'B')
+    || setweight(to_tsvector('english', recipe.description), 'C')
+    || setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(step.instruction, E'\\n' ORDER BY step."order")
+        FROM recipe_manager_step step
+        WHERE step.recipe_id = recipe.id
+    ), '')), 'D')
+FROM recipe_manager_recipe recipe;
+"""
+
+SQLITE_CREATE = (
+    f"""
+CREATE VIRTUAL TABLE {TABLE} USING fts5(
+    name, ingredients, description, steps,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+)
+""",
+    f"""
+INSERT INTO {TABLE} (rowid, name, ingredients, description, steps)
+SELECT
+    recipe.id,
+    recipe.name,
+    coalesce((
+        SELECT group_concat(ingredient.name, char(10))
+        FROM recipe_manager_ingredientinrecipe ingredient_in_recipe
+        JOIN recipe_manager_ingredient ingredient ON ingredient.id = ingredient_in_recipe.ingredient_id
+        WHERE ingredient_in_recipe.recipe_id = recipe.id
+    ), ''),
+    recipe.description,
+    coalesce((
+        SELECT group_concat(instruction, char(10))
+        FROM (
+            SELECT step.instruction FROM recipe_manager_step step
+            WHERE step.recipe_id = recipe.id ORDER BY step."order"
+        )
+    ), '')
+FROM recipe_manager_recipe recipe
+""",
+)
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "postgresql":
+        schema_editor.execute(POSTGRES_CREATE)
+
+    elif vendor == "sqlite":
+        for statement in SQLITE_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ("postgresql", "sqlite"):
+        schema_editor.execute(f"DROP TABLE {TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0005_resourceversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
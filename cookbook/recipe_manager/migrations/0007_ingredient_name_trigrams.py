@@ -0,0 +1,28 @@
+from django.db import migrations
+
+INDEX = "recipe_manager_ingredient_name_trgm"
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            f"CREATE INDEX {INDEX} ON recipe_manager_ingredient "
+            "USING GIN (lower(name) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX {INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0006_recipe_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
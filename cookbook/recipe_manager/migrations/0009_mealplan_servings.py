@@ -0,0 +1,19 @@
+# Generated by Django 3.0.3 on 2026-10-18 04:52
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0008_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mealplan',
+            name='servings',
+            field=models.IntegerField(null=True, validators=[django.core.validators.MinValueValidator(1, message='servings must be greater than zero')]),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.3 on 2026-10-18 04:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0009_mealplan_servings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlattenedRecipe',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='flattened', serialize=False, to='recipe_manager.Recipe')),
+                ('document', models.TextField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.0.3 on 2026-10-18 04:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BACKFILL = """
+WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+    SELECT id, id, 0 FROM recipe_manager_recipe
+    UNION ALL
+    SELECT tree.ancestor_id, ingredient.recipe_id, tree.depth + 1
+    FROM tree
+    JOIN recipe_manager_ingredientinrecipe used ON used.recipe_id = tree.descendant_id
+    JOIN recipe_manager_ingredient ingredient ON ingredient.id = used.ingredient_id
+    WHERE ingredient.recipe_id IS NOT NULL AND tree.depth < 32
+)
+INSERT INTO recipe_manager_recipedependency (ancestor_id, descendant_id, depth)
+SELECT ancestor_id, descendant_id, MIN(depth) FROM tree
+WHERE depth > 0
+GROUP BY ancestor_id, descendant_id
+"""
+
+
+def backfill(apps, schema_editor):
+    schema_editor.execute(BACKFILL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0010_flattenedrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDependency',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='recipe_manager.Recipe')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='recipe_manager.Recipe')),
+            ],
+            options={
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.0.3 on 2026-10-18 05:04
+
+from django.db import migrations
+from django.db.models import F
+
+ORDER_GAP = 1024
+
+
+def space_steps(apps, schema_editor):
+    Step = apps.get_model("recipe_manager", "Step")
+    # negated first so no key collides with one not yet updated
+    Step.objects.update(order=-F("order"))
+    Step.objects.update(order=-F("order") * ORDER_GAP)
+
+
+def number_steps(apps, schema_editor):
+    Step = apps.get_model("recipe_manager", "Step")
+    Step.objects.update(order=-F("order"))
+    position, recipe_id = 0, None
+
+    for step in Step.objects.order_by("recipe_id", "-order").only("recipe_id"):
+        position = position + 1 if step.recipe_id == recipe_id else 1
+        recipe_id = step.recipe_id
+        Step.objects.filter(id=step.id).update(order=position)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0011_recipedependency'),
+    ]
+
+    operations = [
+        migrations.RunPython(space_steps, number_steps),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.0.3 on 2026-10-18 05:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipe_manager', '0012_step_order_gaps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('method', models.CharField(max_length=16)),
+                ('path', models.TextField()),
+                ('status', models.PositiveSmallIntegerField()),
+                ('duration', models.FloatField()),
+                ('profiler', models.CharField(choices=[('cprofile', 'cProfile'), ('sample', 'Sampling')], max_length=16)),
+                ('result', models.BinaryField()),
+                ('queries', models.TextField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.3 on 2026-10-18 05:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0013_request_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRecipesVersion',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similar_version', serialize=False, to='recipe_manager.Recipe')),
+                ('version', models.CharField(max_length=64)),
+            ],
+        ),
+    ]
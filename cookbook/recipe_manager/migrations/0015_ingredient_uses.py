@@ -0,0 +1,93 @@
+from django.db import migrations
+
+USES = "recipe_manager_ingredient_uses"
+PREFIX_INDEX = "recipe_manager_ingredient_name_prefix"
+TRIGGERS = (
+    ("insert", "INSERT", "REFERENCING NEW TABLE AS new_rows"),
+    ("update", "UPDATE", "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    ("delete", "DELETE", "REFERENCING OLD TABLE AS old_rows"),
+    ("truncate", "TRUNCATE", ""),
+)
+
+# statement level so bulk inserts and COPY update each count once
+COUNT_USES = f"""
+CREATE FUNCTION {USES}_count() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM {USES};
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE {USES} SET uses = {USES}.uses - removed.uses
+        FROM (
+            SELECT ingredient_id, count(*) AS uses FROM old_rows
+            GROUP BY ingredient_id
+        ) removed
+        WHERE {USES}.ingredient_id = removed.ingredient_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {USES} AS counted (ingredient_id, uses)
+            SELECT ingredient_id, count(*) FROM new_rows GROUP BY ingredient_id
+        ON CONFLICT (ingredient_id)
+            DO UPDATE SET uses = counted.uses + excluded.uses;
+    END IF;
+
+    RETURN NULL;
+END
+$$
+"""
+
+
+def create_ingredient_uses(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute(
+        f"CREATE INDEX {PREFIX_INDEX} ON recipe_manager_ingredient "
+        "(lower(name) text_pattern_ops)"
+    )
+    # no foreign key, so flushing the ingredient table isn't blocked by it
+    schema_editor.execute(
+        f"CREATE TABLE {USES} "
+        "(ingredient_id integer PRIMARY KEY, uses integer NOT NULL)"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {USES} (ingredient_id, uses) "
+        "SELECT ingredient_id, count(*) FROM recipe_manager_ingredientinrecipe "
+        "GROUP BY ingredient_id"
+    )
+    schema_editor.execute(COUNT_USES)
+
+    for name, event, referencing in TRIGGERS:
+        schema_editor.execute(
+            f"CREATE TRIGGER {USES}_{name} AFTER {event} "
+            f"ON recipe_manager_ingredientinrecipe {referencing} "
+            f"FOR EACH STATEMENT EXECUTE PROCEDURE {USES}_count()"
+        )
+
+
+def drop_ingredient_uses(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for name, _, _ in TRIGGERS:
+        schema_editor.execute(
+            f"DROP TRIGGER {USES}_{name} ON recipe_manager_ingredientinrecipe"
+        )
+
+    schema_editor.execute(f"DROP FUNCTION {USES}_count()")
+    schema_editor.execute(f"DROP TABLE {USES}")
+    schema_editor.execute(f"DROP INDEX {PREFIX_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0014_similar_recipes_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_ingredient_uses, drop_ingredient_uses),
+    ]
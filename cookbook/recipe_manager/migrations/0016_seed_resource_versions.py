@@ -0,0 +1,39 @@
+import uuid
+from django.db import migrations
+from django.utils import timezone
+
+# versions keys that exist in every database, a write bumping a key that has
+# no row yet makes four more queries to create it
+KEYS = (
+    "recipes",
+    "tags",
+    "ingredients",
+    "recipe-tags",
+    "ingredient-uses",
+    "recipe-ingredients",
+)
+
+
+def seed_versions(apps, schema_editor):
+    ResourceVersion = apps.get_model("recipe_manager", "ResourceVersion")
+    existing = set(
+        ResourceVersion.objects.filter(key__in=KEYS).values_list("key", flat=True)
+    )
+    now = timezone.now()
+
+    ResourceVersion.objects.bulk_create(
+        ResourceVersion(key=key, version=uuid.uuid4().hex, last_modified=now)
+        for key in KEYS
+        if key not in existing
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0015_ingredient_uses'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_versions, migrations.RunPython.noop),
+    ]
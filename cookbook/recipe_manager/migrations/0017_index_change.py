@@ -0,0 +1,27 @@
+# Generated by Django 3.0.3 on 2026-10-18 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0016_seed_resource_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('previous', models.CharField(max_length=32)),
+                ('version', models.CharField(max_length=32)),
+                ('changes', models.TextField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='indexchange',
+            index=models.Index(fields=['key', 'previous'], name='recipe_mana_key_016bfe_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+import uuid
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def drop_versions(apps, schema_editor):
+    # stamped with the old global token, recomputed when next read
+    apps.get_model("recipe_manager", "SimilarRecipesVersion").objects.all().delete()
+
+
+def seed_vectors_version(apps, schema_editor):
+    apps.get_model("recipe_manager", "ResourceVersion").objects.get_or_create(
+        key="recipe-vectors",
+        defaults={"version": uuid.uuid4().hex, "last_modified": timezone.now()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_manager', '0017_index_change'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_versions, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='similarrecipesversion',
+            name='version',
+        ),
+        migrations.AddField(
+            model_name='similarrecipesversion',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='similarrecipesversion',
+            name='computed',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.RunPython(seed_vectors_version, migrations.RunPython.noop),
+    ]
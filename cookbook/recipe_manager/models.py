@@ -83,7 +83,7 @@ class Recipe(models.Model):
     )
     cook_time = models.CharField(max_length=128)
     created_on = models.DateTimeField(auto_now_add=timezone.now,)
-    last_updated_on = models.DateTimeField(auto_now=timezone.now)
+    last_updated_on = models.DateTimeField(auto_now=timezone.now, db_index=True)
 
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -170,12 +170,15 @@ class Step(models.Model):
     """Instructions to make recipe
 
     Attributes:
-        order (int): step order
+        order (int): sort key of the step within its recipe, spaced ORDER_GAP
+            apart so a step can be put between two others by writing one row
         instruction (str): text block with instruction
         recipe (Recipe): recipe this step goes to
 
     """
 
+    ORDER_GAP = 1024
+
     order = models.IntegerField(
         validators=(
             validators.MinValueValidator(1, message="Step order must be start at 1"),
@@ -205,6 +208,7 @@ class MealPlan(models.Model):
         meal (str): indicates breakfast lunch or dinner. optional
         cooked: (bool): Recipe was cooked
         user: (User): User associated to this meal plan
+        servings: (int): servings to cook, null for as many as the recipe makes
     """
 
     MEALS = (
@@ -222,3 +226,211 @@ class MealPlan(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="meal_plans",
     )
+    servings = models.IntegerField(
+        null=True,
+        validators=(
+            validators.MinValueValidator(
+                1, message="servings must be greater than zero"
+            ),
+        ),
+    )
+
+
+class RecipeDocument(models.Model):
+    """Recipe serialized with its ingredients, steps and tags, stored so reads
+    don't have to rebuild it from the relational tables.
+    Kept up to date by the handlers in recipe_manager.signals
+
+    Attributes:
+        recipe (Recipe): recipe the document was built from
+        document (str): JSON for the recipe as returned by the API
+        built_on (datetime): when the document was last rebuilt
+    """
+
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, primary_key=True, related_name="document"
+    )
+    document = models.TextField()
+    built_on = models.DateTimeField(auto_now=True)
+
+    def __repr__(self):
+        return f"<RecipeDocument: recipe_id: {self.recipe_id}>"
+
+
+class RecipeDependency(models.Model):
+    """Closure of recipes used as ingredients through Ingredient.recipe, one
+    row per recipe and every sub-recipe below it however deep.
+    Kept up to date by recipe_manager.subrecipes
+
+    Attributes:
+        ancestor (Recipe): recipe using the sub-recipe
+        descendant (Recipe): sub-recipe
+        depth (int): sub-recipe levels between them, 1 for a direct ingredient
+    """
+
+    ancestor = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="descendant_links"
+    )
+    descendant = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="ancestor_links"
+    )
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ("ancestor", "descendant")
+
+    def __repr__(self):
+        return (
+            f"<RecipeDependency: ancestor_id: {self.ancestor_id} "
+            f"descendant_id: {self.descendant_id} depth: {self.depth}>"
+        )
+
+
+class FlattenedRecipe(models.Model):
+    """Raw ingredients of a recipe with its sub-recipes expanded, stored so
+    reads don't have to walk the sub-recipe graph.
+    Computed by recipe_manager.subrecipes
+
+    Attributes:
+        recipe (Recipe): recipe that was flattened
+        document (str): JSON for the flattened recipe as returned by the API
+    """
+
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, primary_key=True, related_name="flattened"
+    )
+    document = models.TextField()
+
+    def __repr__(self):
+        return f"<FlattenedRecipe: recipe_id: {self.recipe_id}>"
+
+
+class SimilarRecipe(models.Model):
+    """One of the recipes most similar to another by ingredients and tags,
+    computed by recipe_manager.similarity
+
+    Attributes:
+        recipe (Recipe): recipe the suggestion is for
+        similar (Recipe): suggested recipe
+        score (float): cosine similarity of the two recipes
+    """
+
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="similar_recipes"
+    )
+    similar = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ("recipe", "similar")
+
+    def __repr__(self):
+        return (
+            f"<SimilarRecipe: recipe_id: {self.recipe_id} "
+            f"similar_id: {self.similar_id} score: {self.score}>"
+        )
+
+
+class SimilarRecipesVersion(models.Model):
+    """Version of a recipe's SimilarRecipe rows. Writes that can change the
+    suggestions bump version, computing them stores the version read before
+    they were computed in computed, so the rows are current only while the two
+    match. A recipe nothing is similar to has this row and no SimilarRecipe rows.
+    Kept up to date by recipe_manager.similarity
+
+    Attributes:
+        recipe (Recipe): recipe the suggestions are for
+        version (int): bumped whenever the suggestions may have changed
+        computed (int): version the stored rows were computed at, None if never
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="similar_version",
+    )
+    version = models.PositiveIntegerField(default=0)
+    computed = models.PositiveIntegerField(null=True)
+
+    def __repr__(self):
+        return (
+            f"<SimilarRecipesVersion: recipe_id: {self.recipe_id} "
+            f"version: {self.version} computed: {self.computed}>"
+        )
+
+
+class ResourceVersion(models.Model):
+    """Version token for a collection that has no timestamp of its own e.g. the
+    tag list. The token is replaced whenever the collection changes, which gives
+    conditional GETs and per process caches something cheap to compare against.
+
+    Attributes:
+        key (str): collection name e.g. 'tags' or 'meal-plans:1'
+        version (str): random token replaced on every change
+        last_modified (datetime): when the collection last changed
+    """
+
+    key = models.CharField(max_length=64, primary_key=True)
+    version = models.CharField(max_length=32)
+    last_modified = models.DateTimeField()
+
+    def __repr__(self):
+        return f"<ResourceVersion: {self.key} {self.version}>"
+
+
+class IndexChange(models.Model):
+    """A write applied to a per-worker index, moving its version key from one
+    token to the next. Workers holding a copy at an older token replay the
+    changes after it instead of rebuilding, see indexes.VersionedIndex
+
+    Attributes:
+        key (str): versions key of the index
+        previous (str): token before the write
+        version (str): token after the write
+        changes (str): JSON list of [method, *args] called on the index data
+    """
+
+    key = models.CharField(max_length=64)
+    previous = models.CharField(max_length=32)
+    version = models.CharField(max_length=32)
+    changes = models.TextField()
+
+    class Meta:
+        indexes = (models.Index(fields=("key", "previous")),)
+
+    def __repr__(self):
+        return f"<IndexChange: {self.key} {self.previous} -> {self.version}>"
+
+
+class RequestProfile(models.Model):
+    """A request a superuser had run under a profiler, see
+    recipe_manager.profiling
+
+    Attributes:
+        user (User): superuser who asked for the profile
+        created_on (datetime): when the request was made
+        method (str): HTTP method
+        path (str): path and query string of the request
+        status (int): response status code
+        duration (float): seconds the request took while profiled
+        profiler (str): cprofile or sample
+        result (bytes): pstats dump for cprofile, collapsed stacks for sample
+        queries (str): JSON list of the SQL queries made with their plans
+    """
+
+    PROFILERS = (("cprofile", "cProfile"), ("sample", "Sampling"))
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    created_on = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(max_length=16)
+    path = models.TextField()
+    status = models.PositiveSmallIntegerField()
+    duration = models.FloatField()
+    profiler = models.CharField(max_length=16, choices=PROFILERS)
+    result = models.BinaryField()
+    queries = models.TextField()
+
+    def __repr__(self):
+        return f"<RequestProfile: {self.id} {self.method} {self.path}>"
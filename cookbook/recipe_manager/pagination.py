@@ -0,0 +1,254 @@
+"""
+Keyset (cursor) pagination shared by the list views
+"""
+import base64
+import binascii
+import json
+from itertools import islice
+from typing import List
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework import exceptions, status
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from .indexes import bitmaps
+
+
+class CursorPaginationMixin:
+    """Pages through a queryset by seeking past the last row seen instead of using
+    OFFSET, so the cost of a page stays the same however deep the client pages.
+
+    The page itself is returned as a JSON array. Navigation links are sent in the
+    ``Link`` header (rel="next" and rel="prev") and carry an opaque cursor.
+
+    Attributes:
+        ordering_fields (tuple): fields a client may sort by with ?ordering=,
+            the first one is used by default. ``id`` is always the tie breaker.
+        cursor_query_param (str): query param holding the cursor
+        page_size_query_param (str): query param used to request a page size
+        ordering_query_param (str): query param used to pick the sort key
+    """
+
+    ordering_fields = ("id",)
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    ordering_query_param = "ordering"
+
+    def paginate_queryset(self, queryset, request) -> list:
+        """Get one page of a queryset
+
+        Args:
+            queryset (QuerySet): rows to paginate
+            request (HttpRequest): DRF Request
+
+        Raises:
+            ValidationError: cursor or ordering is invalid
+
+        Returns:
+            list: model instances in the page
+        """
+        field, descending = self._get_ordering(request)
+        page_size = self._get_page_size(request)
+        cursor = self._decode_cursor(request, field)
+
+        reverse = cursor is not None and cursor[2]
+        seek_descending = descending != reverse
+
+        if cursor is not None:
+            queryset = queryset.filter(
+                _seek_filter(field, cursor[0], cursor[1], seek_descending)
+            )
+
+        order_by = ("-id",) if seek_descending else ("id",)
+        if field != "id":
+            order_by = (f"-{field}" if seek_descending else field, *order_by)
+
+        rows = list(queryset.order_by(*order_by)[: page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        self._request = request
+        self._cursor_field = field
+        self._next_position = (
+            (getattr(rows[-1], field), rows[-1].id) if rows and has_next else None
+        )
+        self._previous_position = (
+            (getattr(rows[0], field), rows[0].id) if rows and has_previous else None
+        )
+
+        return rows
+
+    def paginate_bitmap(self, bitmap: int, request) -> List[int]:
+        """Get one page of the IDs in a bitmap, see indexes.bitmaps.
+        Only ordering by id is supported.
+
+        Args:
+            bitmap (int): IDs to paginate
+            request (HttpRequest): DRF Request
+
+        Raises:
+            ValidationError: cursor or ordering is invalid
+
+        Returns:
+            List[int]: IDs in the page
+        """
+        field, descending = self._get_ordering(request)
+        if field != "id":
+            raise exceptions.ValidationError(
+                {"errors": {self.ordering_query_param: ("Must be id or -id",)}}
+            )
+
+        page_size = self._get_page_size(request)
+        cursor = self._decode_cursor(request, field)
+
+        reverse = cursor is not None and cursor[2]
+        ids = list(
+            islice(
+                bitmaps.iter_ids(
+                    bitmap,
+                    start=None if cursor is None else cursor[1],
+                    descending=descending != reverse,
+                ),
+                page_size + 1,
+            )
+        )
+        has_more = len(ids) > page_size
+        ids = ids[:page_size]
+
+        if reverse:
+            ids.reverse()
+            has_next, has_previous = True, has_more
+
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        self._request = request
+        self._cursor_field = field
+        self._next_position = (ids[-1], ids[-1]) if ids and has_next else None
+        self._previous_position = (ids[0], ids[0]) if ids and has_previous else None
+
+        return ids
+
+    def get_paginated_response(self, data, status_code=status.HTTP_200_OK):
+        """Build response for a page and attach the navigation links
+
+        Args:
+            data (Iterable): serialized page
+            status_code (int, optional): Defaults to 200.
+
+        Returns:
+            Response: DRF Response
+        """
+        response = Response(data, status=status_code)
+        self.set_pagination_headers(response)
+
+        return response
+
+    def set_pagination_headers(self, response):
+        """Add a Link header with the next and previous page URLs to a response
+
+        Args:
+            response (HttpResponse): response for the current page
+        """
+        links = []
+
+        if self._next_position is not None:
+            links.append(f'<{self._get_link(self._next_position, False)}>; rel="next"')
+
+        if self._previous_position is not None:
+            links.append(
+                f'<{self._get_link(self._previous_position, True)}>; rel="prev"'
+            )
+
+        if links:
+            response["Link"] = ", ".join(links)
+
+    def _get_link(self, position: tuple, reverse: bool) -> str:
+        url = self._request.build_absolute_uri()
+        cursor = _encode_cursor(self._cursor_field, *position, reverse)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def _get_ordering(self, request) -> tuple:
+        ordering = request.query_params.get(
+            self.ordering_query_param, self.ordering_fields[0]
+        )
+        field = ordering.lstrip("-")
+
+        if field not in self.ordering_fields:
+            raise exceptions.ValidationError(
+                {
+                    "errors": {
+                        self.ordering_query_param: (
+                            f"Must be one of {', '.join(self.ordering_fields)}",
+                        )
+                    }
+                }
+            )
+
+        return field, ordering.startswith("-")
+
+    def _get_page_size(self, request) -> int:
+        return get_page_size(request, self.page_size_query_param)
+
+    def _decode_cursor(self, request, field: str):
+        if not (encoded := request.query_params.get(self.cursor_query_param)):
+            return None
+
+        try:
+            cursor_field, value, pk, reverse = json.loads(
+                base64.urlsafe_b64decode(encoded.encode("ascii"))
+            )
+            if cursor_field != field or not isinstance(pk, int):
+                raise ValueError(encoded)
+
+        except (binascii.Error, UnicodeError, TypeError, ValueError):
+            raise exceptions.ValidationError(
+                {"errors": {self.cursor_query_param: ("Invalid cursor",)}}
+            )
+
+        return value, pk, bool(reverse)
+
+
+def get_page_size(request, query_param: str = "page_size", default: int = None) -> int:
+    """Read the requested page size, clamped to RECIPE_MANAGER["MAX_PAGE_SIZE"]
+
+    Args:
+        request (HttpRequest): DRF Request
+        query_param (str, optional): Defaults to "page_size".
+        default (int, optional): page size if none or an invalid one was
+            requested. Defaults to RECIPE_MANAGER["PAGE_SIZE"].
+
+    Returns:
+        int: page size
+    """
+    page_size = settings.RECIPE_MANAGER["PAGE_SIZE"] if default is None else default
+
+    try:
+        page_size = int(request.query_params[query_param])
+
+    except (KeyError, ValueError):
+        pass
+
+    return max(1, min(page_size, settings.RECIPE_MANAGER["MAX_PAGE_SIZE"]))
+
+
+def _encode_cursor(field: str, value, pk: int, reverse: bool) -> str:
+    payload = json.dumps((field, value, pk, int(reverse)), cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode("ascii")
+
+
+def _seek_filter(field: str, value, pk: int, descending: bool) -> Q:
+    lookup = "lt" if descending else "gt"
+
+    if field == "id":
+        return Q(**{f"id__{lookup}": pk})
+
+    return Q(**{f"{field}__{lookup}": value}) | Q(**{field: value, f"id__{lookup}": pk})
@@ -0,0 +1,27 @@
+"""
+orjson based parser, select it with JSON_BACKEND=orjson
+"""
+import codecs
+import orjson
+from django.conf import settings
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+
+class ORJSONParser(parsers.JSONParser):
+    """JSONParser that decodes with orjson
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+
+        try:
+            data = stream.read()
+            if codecs.lookup(encoding).name != "utf-8":
+                data = data.decode(encoding)
+
+            return orjson.loads(data)
+
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
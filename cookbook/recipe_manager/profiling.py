@@ -0,0 +1,279 @@
+"""
+Profiles of single requests on demand. A superuser sends the X-Profile header
+or ?profile= with cprofile for a deterministic profile saved as a pstats dump,
+or sample for a sampling profile saved as collapsed stacks flamegraph.pl and
+speedscope read. Any other value picks DEFAULT_PROFILER. The SQL the request
+made is saved with its EXPLAIN plans in a RequestProfile, served by
+/profiles/<pk>/. Requests without the flag only pay for looking it up, and
+one request per process is profiled at a time.
+"""
+import cProfile
+import json
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, List, Union
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.http import HttpRequest, HttpResponse
+from django.urls import reverse
+from rest_framework.exceptions import APIException
+from users.authentication import JWTCookieAuthentication
+from . import models
+
+HEADER = "HTTP_X_PROFILE"
+QUERY_PARAM = "profile"
+RESULT_HEADER = "X-Profile"
+CPROFILE = "cprofile"
+SAMPLE = "sample"
+DEFAULT_PROFILER = SAMPLE
+
+# a profiler hooks the interpreter, so only one runs per process
+_running = threading.Lock()
+
+
+def requested(request: HttpRequest) -> Union[str, None]:
+    """Profiler a request asks for
+
+    Args:
+        request (HttpRequest): Django HttpRequest
+
+    Returns:
+        Union[str, None]: CPROFILE, SAMPLE or None to run it normally
+    """
+    if not (value := request.META.get(HEADER) or request.GET.get(QUERY_PARAM)):
+        return None
+
+    return value if value in (CPROFILE, SAMPLE) else DEFAULT_PROFILER
+
+
+def superuser(request: HttpRequest):
+    """The superuser a request's credentials belong to
+
+    Args:
+        request (HttpRequest): Django HttpRequest
+
+    Returns:
+        Union[User, None]: user or None if it isn't from a superuser, the
+            view deals with credentials that aren't valid
+    """
+    try:
+        authenticated = JWTCookieAuthentication().authenticate(request)
+
+    except APIException:
+        return None
+
+    if authenticated is None or not authenticated[0].is_superuser:
+        return None
+
+    return authenticated[0]
+
+
+class SamplingProfiler:
+    """Records the call stack of the thread that entered it every interval
+    seconds from a background thread. Samples are only taken while the
+    profiled thread gives up the GIL, at least every sys.getswitchinterval().
+
+    Args:
+        interval (float): seconds between samples
+
+    Attributes:
+        stacks (Counter): collapsed stack to samples taken in it
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def result(self) -> bytes:
+        """Collapsed stacks, one "frame;frame;frame samples" line per stack
+
+        Returns:
+            bytes: UTF-8 text
+        """
+        return "".join(
+            f"{stack} {samples}\n" for stack, samples in self.stacks.most_common()
+        ).encode("utf-8")
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            if (frame := sys._current_frames().get(self._target)) is not None:
+                self.stacks[_collapse(frame)] += 1
+
+
+class DeterministicProfiler:
+    """cProfile of the thread that entered it"""
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def __enter__(self):
+        self._profile.enable()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profile.disable()
+
+    def result(self) -> bytes:
+        """The same bytes pstats.Stats.dump_stats writes
+
+        Returns:
+            bytes: pstats dump
+        """
+        return marshal.dumps(pstats.Stats(self._profile).stats)
+
+
+class QueryLog:
+    """Record the SQL queries run on the default connection, install with
+    connection.execute_wrapper(log)
+
+    Attributes:
+        queries (list): (sql, params, many, seconds) of each query
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+
+        finally:
+            self.queries.append((sql, params, many, time.perf_counter() - start))
+
+
+def profile(
+    request: HttpRequest,
+    user,
+    profiler: str,
+    get_response: Callable[[HttpRequest], HttpResponse],
+) -> HttpResponse:
+    """Run a request under a profiler and save a RequestProfile. The response
+    links to it in the X-Profile header. Streamed responses are read in full
+    while profiled. When another request is being profiled this one runs
+    normally.
+
+    Args:
+        request (HttpRequest): Django HttpRequest
+        user (User): superuser who asked for the profile
+        profiler (str): CPROFILE or SAMPLE
+        get_response (Callable): rest of the middleware chain
+
+    Returns:
+        HttpResponse: response to the request
+    """
+    if not _running.acquire(blocking=False):
+        return get_response(request)
+
+    try:
+        running = (
+            DeterministicProfiler()
+            if profiler == CPROFILE
+            else SamplingProfiler(settings.RECIPE_MANAGER["PROFILE_SAMPLE_INTERVAL"])
+        )
+        log = QueryLog()
+        start = time.perf_counter()
+
+        with running, connection.execute_wrapper(log):
+            response = get_response(request)
+
+            if response.streaming:
+                response.streaming_content = [b"".join(response.streaming_content)]
+
+        duration = time.perf_counter() - start
+
+    finally:
+        _running.release()
+
+    saved = models.RequestProfile.objects.create(
+        user=user,
+        method=request.method,
+        path=request.get_full_path(),
+        status=response.status_code,
+        duration=duration,
+        profiler=profiler,
+        result=running.result(),
+        queries=json.dumps(explain(log.queries)),
+    )
+    stale = models.RequestProfile.objects.order_by("-id").values_list("id", flat=True)[
+        settings.RECIPE_MANAGER["PROFILES_KEPT"] :
+    ]
+    models.RequestProfile.objects.filter(id__in=list(stale)).delete()
+    response[RESULT_HEADER] = reverse("profile-detail", args=(saved.id,))
+
+    return response
+
+
+def explain(queries: list) -> List[dict]:
+    """Add the plan of every SELECT, up to RECIPE_MANAGER["PROFILE_EXPLAIN_LIMIT"]
+    of them. Plans are only read, EXPLAIN doesn't run the query.
+
+    Args:
+        queries (list): (sql, params, many, seconds) of each query
+
+    Returns:
+        List[dict]: {sql, params, seconds, plan} of each query, plan is None
+            for queries that were not explained
+    """
+    limit = settings.RECIPE_MANAGER["PROFILE_EXPLAIN_LIMIT"]
+    prefix = connection.ops.explain_query_prefix()
+    explained = []
+
+    with connection.cursor() as cursor:
+        for sql, params, many, seconds in queries:
+            plan = None
+
+            if not many and limit and sql.lstrip()[:6].upper() == "SELECT":
+                limit -= 1
+                try:
+                    cursor.execute(f"{prefix} {sql}", params)
+                    plan = "\n".join(
+                        " ".join(str(column) for column in row)
+                        for row in cursor.fetchall()
+                    )
+
+                except DatabaseError as error:
+                    plan = f"EXPLAIN failed: {error}"
+
+            explained.append(
+                {
+                    "sql": sql,
+                    "params": None if many else [str(param) for param in params or ()],
+                    "seconds": seconds,
+                    "plan": plan,
+                }
+            )
+
+    return explained
+
+
+def _collapse(frame) -> str:
+    """Stack of a frame, outermost call first"""
+    frames = []
+
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+
+    return ";".join(reversed(frames))
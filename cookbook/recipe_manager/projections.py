@@ -0,0 +1,203 @@
+"""
+Read projections that build API documents in a fixed number of queries
+"""
+from collections import defaultdict
+from typing import Collection, Iterable, List, Tuple, Union
+from datetime import datetime
+from rest_framework import exceptions, serializers
+from .serializers import RecipeSerializer
+from . import models, timing, versions
+
+_AMOUNT_FIELD = serializers.DecimalField(max_digits=5, decimal_places=2)
+
+RECIPE_RELATIONS = ("ingredients", "steps", "tags")
+RECIPE_FIELDS = (*RecipeSerializer().fields, *RECIPE_RELATIONS)
+# related objects that can be embedded with ?include=
+RECIPE_INCLUDES = (
+    # each ingredient gets an "ingredient": {id, name, recipe_id} object
+    "ingredients.ingredient",
+    # tags are {id, value, kind} objects instead of ids
+    "tags.value",
+)
+# collection each include embeds rows from, renaming one of those rows
+# changes the embedding recipes without touching them
+INCLUDE_VERSIONS = {
+    "ingredients.ingredient": versions.INGREDIENTS,
+    "tags.value": versions.TAGS,
+}
+
+
+def recipe_documents(
+    recipes: Iterable[models.Recipe],
+    fields: Collection[str] = None,
+    include: Collection[str] = (),
+) -> List[dict]:
+    """Serialize recipes with their ingredients, ordered steps and tag ids.
+
+    One query is made per relation however many recipes are passed in, so
+    callers only pay for the query that loaded the recipes plus three at most.
+    Relations left out of fields are not queried, and includes are joined into
+    the relation's query so they never add one.
+
+    Args:
+        recipes (Iterable[Recipe]): recipes to serialize
+        fields (Collection[str], optional): fields to keep from RECIPE_FIELDS,
+            id is always kept. Defaults to every field.
+        include (Collection[str], optional): related objects to embed from
+            RECIPE_INCLUDES. Defaults to none.
+
+    Returns:
+        List[dict]: serialized recipes in the order they were given
+    """
+    with timing.phase(timing.SERIALIZE):
+        recipes = tuple(recipes)
+        recipe_ids = tuple(recipe.id for recipe in recipes)
+        fields = {
+            "id",
+            *(RECIPE_FIELDS if fields is None else fields),
+            *(path.split(".")[0] for path in include),
+        }
+        relations = tuple(
+            relation for relation in RECIPE_RELATIONS if relation in fields
+        )
+        related = {relation: defaultdict(list) for relation in relations}
+
+        if recipe_ids and "ingredients" in related:
+            _add_ingredients(
+                related["ingredients"], recipe_ids, "ingredients.ingredient" in include
+            )
+
+        if recipe_ids and "steps" in related:
+            for recipe_id, instruction in (
+                models.Step.objects.filter(recipe_id__in=recipe_ids)
+                .order_by("recipe_id", "order")
+                .values_list("recipe_id", "instruction")
+            ):
+                related["steps"][recipe_id].append(instruction)
+
+        if recipe_ids and "tags" in related:
+            _add_tags(related["tags"], recipe_ids, "tags.value" in include)
+
+        # one serializer for every recipe, each instance deep copies its fields
+        serializer = RecipeSerializer()
+
+        return [
+            {
+                **{
+                    field: value
+                    for field, value in serializer.to_representation(recipe).items()
+                    if field in fields
+                },
+                **{
+                    relation: tuple(related[relation][recipe.id])
+                    for relation in relations
+                },
+            }
+            for recipe in recipes
+        ]
+
+
+def recipe_options(query_params) -> dict:
+    """Read ?fields= and ?include= from a request
+
+    Args:
+        query_params (QueryDict): request query params
+
+    Raises:
+        ValidationError: unknown field or include
+
+    Returns:
+        dict: keyword arguments for recipe_documents, empty if neither was given
+    """
+    options = {}
+    errors = {}
+
+    for param, allowed in (("fields", RECIPE_FIELDS), ("include", RECIPE_INCLUDES)):
+        if not (value := query_params.get(param)):
+            continue
+
+        options[param] = {name.strip() for name in value.split(",") if name.strip()}
+
+        if unknown := options[param].difference(allowed):
+            errors[param] = (
+                f"Unknown {param} {', '.join(sorted(unknown))}. "
+                f"Must be one of {', '.join(allowed)}",
+            )
+
+    if errors:
+        raise exceptions.ValidationError({"errors": errors})
+
+    return options
+
+
+def include_version(
+    request, version: Union[Tuple[str, Union[datetime, None]], None]
+) -> Union[Tuple[str, Union[datetime, None]], None]:
+    """Fold the versions of the collections a request's ?include= embeds rows
+    from into a recipe version, for conditional_get. ?fields= only trims
+    recipes, so it needs nothing extra.
+
+    Args:
+        request (HttpRequest): DRF Request
+        version (Union[Tuple[str, Union[datetime, None]], None]): version of
+            the recipes, None if they don't exist
+
+    Returns:
+        Union[Tuple[str, Union[datetime, None]], None]: combined version and
+            the latest last modified, None if version is None
+    """
+    include = {
+        name.strip() for name in request.query_params.get("include", "").split(",")
+    }
+    keys = sorted({key for path, key in INCLUDE_VERSIONS.items() if path in include})
+
+    if version is None or not keys:
+        return version
+
+    tokens, last_modified = zip(version, *versions.get_many(keys))
+
+    return (
+        ":".join(tokens),
+        max((modified for modified in last_modified if modified), default=None),
+    )
+
+
+def _add_ingredients(ingredients: dict, recipe_ids: tuple, embed: bool):
+    columns = ("recipe_id", "amount", "unit", "specifier", "ingredient_id")
+    if embed:
+        columns = (*columns, "ingredient__name", "ingredient__recipe_id")
+
+    for row in (
+        models.IngredientInRecipe.objects.filter(recipe_id__in=recipe_ids)
+        .order_by("id")
+        .values_list(*columns)
+    ):
+        ingredient = {
+            "amount": _AMOUNT_FIELD.to_representation(row[1]),
+            "unit": row[2],
+            "specifier": row[3],
+            "ingredient_id": row[4],
+        }
+        if embed:
+            ingredient["ingredient"] = {
+                "id": row[4],
+                "name": row[5],
+                "recipe_id": row[6],
+            }
+
+        ingredients[row[0]].append(ingredient)
+
+
+def _add_tags(tags: dict, recipe_ids: tuple, embed: bool):
+    columns = ("recipe_id", "tag_id")
+    if embed:
+        columns = (*columns, "tag__value", "tag__kind")
+
+    for row in (
+        models.Recipe.tags.through.objects.filter(recipe_id__in=recipe_ids)
+        .order_by("tag_id")
+        .values_list(*columns)
+    ):
+        tags[row[0]].append(
+            {"id": row[1], "value": row[2], "kind": row[3]} if embed else row[1]
+        )
@@ -0,0 +1,47 @@
+"""
+JSON renderers timed as the render phase of the request, see timing. The
+orjson based one is selected with JSON_BACKEND=orjson
+"""
+import orjson
+from rest_framework import renderers
+from rest_framework.utils import encoders
+from . import timing
+
+# orjson calls this for types it can't serialize natively e.g. Decimal, lazy
+# strings and querysets, so they come out the same as with JSONRenderer
+_ENCODER = encoders.JSONEncoder()
+
+_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer timed as the render phase, subclasses override encode"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timing.phase(timing.RENDER):
+            return self.encode(data, accepted_media_type, renderer_context)
+
+    def encode(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson.
+
+    Output is byte for byte what JSONRenderer produces with the default compact,
+    unicode settings. Requests for indented output are handed to JSONRenderer.
+    """
+
+    def encode(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().encode(data, accepted_media_type, renderer_context)
+
+        # JSONRenderer escapes these so the output is a strict javascript subset
+        return (
+            orjson.dumps(data, default=_ENCODER.default, option=_OPTIONS)
+            .replace(b"\xe2\x80\xa8", b"\\u2028")
+            .replace(b"\xe2\x80\xa9", b"\\u2029")
+        )
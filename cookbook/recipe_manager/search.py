@@ -0,0 +1,165 @@
+"""
+Full-text recipe search over name, ingredient names, description and steps.
+Postgres keeps a weighted tsvector per recipe behind a GIN index, sqlite3 uses
+an FTS5 table. Both live in TABLE, see migration 0006, and are kept in sync by
+signals.refresh_recipes.
+"""
+import re
+from collections import defaultdict
+from typing import Iterable, List
+from django.db import connection, transaction
+from . import models
+
+TABLE = "recipe_manager_recipesearch"
+
+# weights in column order: name, ingredients, description, steps
+_POSTGRES_INSERT = f"""
+    INSERT INTO {TABLE} (recipe_id, document) VALUES (
+        %s,
+        setweight(to_tsvector('english', %s), 'A')
+        || setweight(to_tsvector('english', %s), 'B')
+        || setweight(to_tsvector('english', %s), 'C')
+        || setweight(to_tsvector('english', %s), 'D')
+    )
+"""
+_POSTGRES_SEARCH = f"""
+    SELECT recipe_id FROM {TABLE}, to_tsquery('english', %s) query
+    WHERE document @@ query
+    ORDER BY ts_rank(document, query) DESC, recipe_id
+    LIMIT %s
+"""
+_SQLITE_INSERT = f"""
+    INSERT INTO {TABLE} (rowid, name, ingredients, description, steps)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+_SQLITE_SEARCH = f"""
+    SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s
+    ORDER BY bm25({TABLE}, 10.0, 4.0, 2.0, 1.0), rowid
+    LIMIT %s
+"""
+
+_TERM = re.compile(r"\w+")
+
+
+def index(recipe_ids: Iterable[int]):
+    """Replace the search rows of recipes, recipes that no longer exist are
+    removed from the index
+
+    Args:
+        recipe_ids (Iterable[int]): recipes to index
+    """
+    recipe_ids = tuple(recipe_ids)
+
+    if not recipe_ids or connection.vendor not in ("postgresql", "sqlite"):
+        return
+
+    rows = _index_rows(recipe_ids)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        _delete(cursor, recipe_ids)
+        cursor.executemany(
+            _POSTGRES_INSERT if connection.vendor == "postgresql" else _SQLITE_INSERT,
+            rows,
+        )
+
+
+def remove(recipe_ids: Iterable[int]):
+    """Remove recipes from the index
+
+    Args:
+        recipe_ids (Iterable[int]): deleted recipes
+    """
+    recipe_ids = tuple(recipe_ids)
+
+    if recipe_ids and connection.vendor in ("postgresql", "sqlite"):
+        with connection.cursor() as cursor:
+            _delete(cursor, recipe_ids)
+
+
+def prune() -> int:
+    """Remove index rows of recipes that no longer exist, e.g. after bulk deletes
+
+    Returns:
+        int: number of rows removed
+    """
+    if connection.vendor not in ("postgresql", "sqlite"):
+        return 0
+
+    column = "recipe_id" if connection.vendor == "postgresql" else "rowid"
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE {column} NOT IN "
+            "(SELECT id FROM recipe_manager_recipe)"
+        )
+        return cursor.rowcount
+
+
+def search(query: str, limit: int) -> List[int]:
+    """Find recipes matching every word of a query, each word also matches
+    as a prefix e.g. "tom" matches "tomatoes"
+
+    Args:
+        query (str): words to search for
+        limit (int): max number of results
+
+    Returns:
+        List[int]: IDs of matching recipes, best match first
+    """
+    if not (terms := _TERM.findall(query.lower())):
+        return []
+
+    if connection.vendor == "postgresql":
+        sql, match = _POSTGRES_SEARCH, " & ".join(f"{term}:*" for term in terms)
+
+    elif connection.vendor == "sqlite":
+        sql, match = _SQLITE_SEARCH, " ".join(f'"{term}"*' for term in terms)
+
+    else:
+        return list(
+            models.Recipe.objects.filter(name__icontains=query.strip())
+            .order_by("id")
+            .values_list("id", flat=True)[:limit]
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (match, limit))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _index_rows(recipe_ids: tuple) -> list:
+    ingredients = defaultdict(list)
+    steps = defaultdict(list)
+
+    for recipe_id, name in models.IngredientInRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list("recipe_id", "ingredient__name"):
+        ingredients[recipe_id].append(name)
+
+    for recipe_id, instruction in (
+        models.Step.objects.filter(recipe_id__in=recipe_ids)
+        .order_by("recipe_id", "order")
+        .values_list("recipe_id", "instruction")
+    ):
+        steps[recipe_id].append(instruction)
+
+    return [
+        (
+            recipe_id,
+            name,
+            "\n".join(ingredients[recipe_id]),
+            description,
+            "\n".join(steps[recipe_id]),
+        )
+        for recipe_id, name, description in models.Recipe.objects.filter(
+            id__in=recipe_ids
+        ).values_list("id", "name", "description")
+    ]
+
+
+def _delete(cursor, recipe_ids: tuple):
+    column = "recipe_id" if connection.vendor == "postgresql" else "rowid"
+    cursor.execute(
+        f"DELETE FROM {TABLE} WHERE {column} IN ({', '.join(['%s'] * len(recipe_ids))})",
+        recipe_ids,
+    )
@@ -1,10 +1,24 @@
 """Serializers for models
 """
 from rest_framework import serializers
-from . import models
+from . import models, subrecipes, timing
 
 
-class IngredientSerializer(serializers.Serializer):
+class TimedSerializer(serializers.Serializer):
+    """Serializer whose validation and representation are timed as the
+    serialize phase of the request, see timing
+    """
+
+    def is_valid(self, raise_exception=False):
+        with timing.phase(timing.SERIALIZE):
+            return super().is_valid(raise_exception=raise_exception)
+
+    def to_representation(self, instance):
+        with timing.phase(timing.SERIALIZE):
+            return super().to_representation(instance)
+
+
+class IngredientSerializer(TimedSerializer):
     """Serialize and validate Ingredient
 
     Args:
@@ -19,27 +33,44 @@ class IngredientSerializer(serializers.Serializer):
         """
         Validate Recipe ID exists
         """
-        try:
-            if value is not None:
-                models.Recipe.objects.get(id=value)
-
-        except models.Recipe.DoesNotExist:
+        if value is not None and not models.Recipe.objects.filter(id=value).exists():
             raise serializers.ValidationError("Recipe with that ID does not exist")
 
+        if (
+            value is not None
+            and self.instance is not None
+            and subrecipes.descendants(value).intersection(
+                models.IngredientInRecipe.objects.filter(
+                    ingredient_id=self.instance.id
+                ).values_list("recipe_id", flat=True)
+            )
+        ):
+            raise serializers.ValidationError(
+                "A recipe using this ingredient is part of that recipe"
+            )
+
         return value
 
     def create(self, validated_data):
         return models.Ingredient.objects.create(**validated_data)
 
     def update(self, instance, validated_data):
-        instance.name = validated_data.get("name", instance.name)
-        instance.recipe_id = validated_data.get("recipe_id", instance.recipe_id)
-        instance.save()
+        # only the fields that changed, see signals.ingredient_saved
+        changed = [
+            field
+            for field in ("name", "recipe_id")
+            if field in validated_data
+            and validated_data[field] != getattr(instance, field)
+        ]
+        for field in changed:
+            setattr(instance, field, validated_data[field])
+
+        instance.save(update_fields=changed)
 
         return instance
 
 
-class TagSerializer(serializers.Serializer):
+class TagSerializer(TimedSerializer):
     """[summary]
 
     Args:
@@ -61,7 +92,7 @@ class TagSerializer(serializers.Serializer):
         return instance
 
 
-class IngredientInRecipeSerializer(serializers.Serializer):
+class IngredientInRecipeSerializer(TimedSerializer):
     """[summary]
 
     Args:
@@ -76,16 +107,41 @@ class IngredientInRecipeSerializer(serializers.Serializer):
 
     def validate_ingredient_id(self, value):
         """
-        Validate Ingredient ID exists
+        Validate Ingredient ID exists, keeping the recipe it stands for
         """
-        try:
-            models.Ingredient.objects.get(id=value)
+        if self.instance is not None and value == self.instance.ingredient_id:
+            return value
 
-        except models.Ingredient.DoesNotExist:
+        ingredient = models.Ingredient.objects.filter(id=value).values("recipe_id")
+
+        if (ingredient := ingredient.first()) is None:
             raise serializers.ValidationError("Ingredient with that ID does not exist")
 
+        self._sub_recipe_id = ingredient["recipe_id"]
+
         return value
 
+    def validate(self, attrs):
+        """
+        Validate a recipe doesn't become an ingredient of itself
+        """
+        # validate_ingredient_id read the sub-recipe of a new ingredient
+        if (
+            self.instance is None
+            and "recipe_id" in attrs
+            and subrecipes.creates_cycle(attrs["recipe_id"], self._sub_recipe_id)
+        ):
+            raise serializers.ValidationError(
+                {
+                    "ingredient_id": (
+                        "A recipe can't be an ingredient of itself "
+                        "or of its sub-recipes",
+                    )
+                }
+            )
+
+        return attrs
+
     def create(self, validated_data):
         return models.IngredientInRecipe.objects.create(**validated_data)
 
@@ -99,7 +155,7 @@ class IngredientInRecipeSerializer(serializers.Serializer):
         return instance
 
 
-class StepSerializer(serializers.Serializer):
+class StepSerializer(TimedSerializer):
     """[summary]
 
     Args:
@@ -108,19 +164,22 @@ class StepSerializer(serializers.Serializer):
 
     instruction = serializers.CharField()
     order = serializers.IntegerField(min_value=1, required=False, write_only=True)
+    position = serializers.IntegerField(min_value=1, required=False, write_only=True)
     recipe_id = serializers.IntegerField(required=False, write_only=True)
 
     def create(self, validated_data):
+        validated_data.pop("position", None)
         return models.Step.objects.create(**validated_data)
 
     def update(self, instance, validated_data):
         instance.instruction = validated_data.get("instruction", instance.instruction)
+        instance.order = validated_data.get("order", instance.order)
         instance.save()
 
         return instance
 
 
-class RecipeSerializer(serializers.Serializer):
+class RecipeSerializer(TimedSerializer):
     """[summary]
 
     Args:
@@ -149,7 +208,84 @@ class RecipeSerializer(serializers.Serializer):
         return instance
 
 
-class MealPlanSerializer(serializers.Serializer):
+class NestedIngredientSerializer(TimedSerializer):
+    """Ingredient written along with its recipe, NestedRecipeSerializer checks
+    every ingredient ID with one query
+    """
+
+    amount = serializers.DecimalField(max_digits=5, decimal_places=2)
+    unit = serializers.ChoiceField(models.IngredientInRecipe.UNITS)
+    specifier = serializers.CharField(max_length=256, allow_blank=True, default="")
+    ingredient_id = serializers.IntegerField()
+
+
+class NestedRecipeSerializer(RecipeSerializer):
+    """Validate a recipe with its ingredients, steps and tags, written by
+    recipe_manager.writes. Each relation is optional and checked against the
+    database with one query however many items it has.
+    """
+
+    ingredients = NestedIngredientSerializer(many=True, required=False)
+    steps = serializers.ListField(child=serializers.CharField(), required=False)
+    tags = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate_ingredients(self, value):
+        """
+        Validate ingredient IDs exist, are used once and don't make the
+        recipe an ingredient of itself
+        """
+        ingredient_ids = [ingredient["ingredient_id"] for ingredient in value]
+
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise serializers.ValidationError("Each ingredient can only be used once")
+
+        sub_recipe_ids = dict(
+            models.Ingredient.objects.filter(id__in=ingredient_ids).values_list(
+                "id", "recipe_id"
+            )
+        )
+
+        if missing := set(ingredient_ids).difference(sub_recipe_ids):
+            raise serializers.ValidationError(
+                "Ingredients with IDs "
+                f"{', '.join(map(str, sorted(missing)))} do not exist"
+            )
+
+        sub_recipe_ids = set(sub_recipe_ids.values()) - {None}
+
+        if (
+            self.instance is not None
+            and sub_recipe_ids
+            and (
+                self.instance.id in sub_recipe_ids
+                or models.RecipeDependency.objects.filter(
+                    ancestor_id__in=sub_recipe_ids, descendant_id=self.instance.id
+                ).exists()
+            )
+        ):
+            raise serializers.ValidationError(
+                "A recipe can't be an ingredient of itself or of its sub-recipes"
+            )
+
+        return value
+
+    def validate_tags(self, value):
+        """
+        Validate Tag IDs exist
+        """
+        tag_ids = set(value)
+
+        if missing := tag_ids.difference(
+            models.Tag.objects.filter(id__in=tag_ids).values_list("id", flat=True)
+        ):
+            raise serializers.ValidationError(
+                f"Tags with IDs {', '.join(map(str, sorted(missing)))} do not exist"
+            )
+
+        return sorted(tag_ids)
+
+
+class MealPlanSerializer(TimedSerializer):
     """[summary]
 
     Args:
@@ -162,16 +298,16 @@ class MealPlanSerializer(serializers.Serializer):
     meal = serializers.CharField(max_length=16, allow_null=True)
     cooked = serializers.BooleanField()
     user_id = serializers.IntegerField()
+    servings = serializers.IntegerField(min_value=1, allow_null=True, required=False)
 
     def validate_recipe_id(self, value):
         """
         Validate Recipe ID exists
         """
-        try:
-            models.Recipe.objects.get(id=value)
-
-        except models.Recipe.DoesNotExist:
-            raise models.Recipe.DoesNotExist
+        if (
+            self.instance is None or value != self.instance.recipe_id
+        ) and not models.Recipe.objects.filter(id=value).exists():
+            raise serializers.ValidationError("Recipe with that ID does not exist")
 
         return value
 
@@ -186,6 +322,22 @@ class MealPlanSerializer(serializers.Serializer):
         instance.meal = validated_data.get("meal", instance.meal)
         instance.cooked = validated_data.get("cooked", instance.cooked)
         instance.user_id = validated_data.get("user_id", instance.user_id)
+        instance.servings = validated_data.get("servings", instance.servings)
         instance.save()
 
         return instance
+
+
+class RequestProfileSerializer(TimedSerializer):
+    """Serialize RequestProfile without its result, which is downloaded on its
+    own from /profiles/<pk>/download/
+    """
+
+    id = serializers.IntegerField(read_only=True)
+    user_id = serializers.IntegerField(read_only=True)
+    created_on = serializers.DateTimeField(read_only=True)
+    method = serializers.CharField(read_only=True)
+    path = serializers.CharField(read_only=True)
+    status = serializers.IntegerField(read_only=True)
+    duration = serializers.FloatField(read_only=True)
+    profiler = serializers.CharField(read_only=True)
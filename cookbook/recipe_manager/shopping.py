@@ -0,0 +1,88 @@
+"""
+Shopping lists combining the ingredients of a user's planned meals
+"""
+import datetime
+from decimal import Decimal
+from typing import Iterable, List, Tuple
+from . import models, units
+
+
+def shopping_list(
+    user_id: int, start: datetime.date, end: datetime.date, system: str = None
+) -> List[dict]:
+    """Total amount of each ingredient needed for the meals a user planned
+    between two dates. Amounts are scaled by the servings planned over the
+    servings the recipe makes and added up by totals.
+
+    Args:
+        user_id (int): meal plan owner
+        start (datetime.date): first planned date, inclusive
+        end (datetime.date): last planned date, inclusive
+        system (str, optional): units.METRIC or units.US. Defaults to the
+            system the recipes used, metric when they used both.
+
+    Returns:
+        List[dict]: {ingredient_id, name, amount, unit} ordered by name
+    """
+    rows = models.MealPlan.objects.filter(
+        user_id=user_id, planned_date__range=(start, end)
+    ).values_list(
+        "servings",
+        "recipe__servings",
+        "recipe__ingredients_in_recipe__ingredient_id",
+        "recipe__ingredients_in_recipe__ingredient__name",
+        "recipe__ingredients_in_recipe__amount",
+        "recipe__ingredients_in_recipe__unit",
+    )
+
+    return totals(
+        (
+            (ingredient_id, name, amount * planned / makes if planned else amount, unit)
+            for planned, makes, ingredient_id, name, amount, unit in rows
+            if ingredient_id is not None
+        ),
+        system,
+    )
+
+
+def totals(
+    amounts: Iterable[Tuple[int, str, Decimal, str]], system: str = None
+) -> List[dict]:
+    """Sum amounts per ingredient and dimension and put them in kitchen units
+    by units.kitchen
+
+    Args:
+        amounts (Iterable[Tuple[int, str, Decimal, str]]): ingredient ID,
+            ingredient name, amount and unit
+        system (str, optional): units.METRIC or units.US. Defaults to the
+            system the amounts used, metric when they used both.
+
+    Returns:
+        List[dict]: {ingredient_id, name, amount, unit} ordered by name
+    """
+    # (ingredient ID, base unit) to [name, total in base unit, systems summed]
+    sums = {}
+
+    for ingredient_id, name, amount, unit in amounts:
+        base_amount, base = units.to_base(amount, unit)
+        total = sums.setdefault((ingredient_id, base), [name, Decimal(0), set()])
+        total[1] += base_amount
+        total[2].add(units.system_of(unit))
+
+    items = []
+    for (ingredient_id, base), (name, amount, systems) in sums.items():
+        amount, unit = units.kitchen(
+            amount,
+            base,
+            system or (systems.pop() if len(systems) == 1 else units.METRIC),
+        )
+        items.append(
+            {
+                "ingredient_id": ingredient_id,
+                "name": name,
+                "amount": str(amount),
+                "unit": unit,
+            }
+        )
+
+    return sorted(items, key=lambda item: (item["name"], item["ingredient_id"]))
@@ -0,0 +1,385 @@
+"""
+Signal handlers that keep data derived from recipes in sync with writes
+"""
+import contextlib
+import contextvars
+from typing import Collection, Iterable, Tuple
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from . import models, documents, indexes, search, similarity, subrecipes
+from . import versions
+from .utils import chunked
+
+# recipes refreshed at a time when an ingredient many use changes
+REFRESH_BATCH_SIZE = 500
+
+# recipe ID to whether it needs touching, while inside refresh_once
+_pending = contextvars.ContextVar("pending_refresh", default=None)
+
+
+def refresh_recipes(recipe_ids: Iterable[int], touch: bool = True):
+    """Bring everything derived from recipes up to date after they were written.
+    Code that writes with bulk queries, which don't send signals, must call this.
+    Inside refresh_once the recipes are only refreshed on the way out.
+
+    Args:
+        recipe_ids (Iterable[int]): recipes that changed
+        touch (bool, optional): bump Recipe.last_updated_on. Defaults to True.
+    """
+    recipe_ids = tuple(recipe_ids)
+
+    if (pending := _pending.get()) is not None:
+        for recipe_id in recipe_ids:
+            pending[recipe_id] = pending.get(recipe_id, False) or touch
+
+        return
+
+    if touch:
+        touch_recipes(recipe_ids)
+
+    documents.rebuild(recipe_ids)
+    search.index(recipe_ids)
+    subrecipes.invalidate(recipe_ids)
+
+
+@contextlib.contextmanager
+def refresh_once():
+    """Refresh the recipes written inside once on the way out, instead of once
+    for the recipe's post_save and again for its relations. Nothing is
+    refreshed if the block raises.
+    """
+    if _pending.get() is not None:
+        yield
+        return
+
+    pending = {}
+    token = _pending.set(pending)
+
+    try:
+        yield
+
+    finally:
+        _pending.reset(token)
+
+    if touched := [recipe_id for recipe_id, touch in pending.items() if touch]:
+        touch_recipes(touched)
+
+    if pending:
+        refresh_recipes(pending, touch=False)
+
+
+def invalidate_recipes(recipe_ids: Iterable[int]):
+    """Drop data derived from recipes so it gets rebuilt when it's next read.
+    Used while rows are being deleted, since the recipe may be deleted with them.
+
+    Args:
+        recipe_ids (Iterable[int]): recipes that changed
+    """
+    recipe_ids = tuple(recipe_ids)
+    touch_recipes(recipe_ids)
+    documents.invalidate(recipe_ids)
+    search.index(recipe_ids)
+    subrecipes.invalidate(recipe_ids)
+
+
+def relations_written(
+    recipe_id: int,
+    ingredients: Tuple[Collection[int], Collection[int]] = None,
+    tags: Tuple[Collection[int], Collection[int]] = None,
+    touch: bool = True,
+):
+    """Bring everything derived from a recipe up to date after its ingredients,
+    steps or tags were replaced with bulk queries, which don't send signals
+
+    Args:
+        recipe_id (int): recipe that was written
+        ingredients (Tuple[Collection[int], Collection[int]], optional): IDs
+            of the ingredients the recipe used before and after the write.
+            Defaults to None for ingredients that weren't written.
+        tags (Tuple[Collection[int], Collection[int]], optional): IDs of the
+            recipe's tags before and after the write. Defaults to None for
+            tags that weren't written.
+        touch (bool, optional): update the recipe's last_updated_on. Defaults
+            to True, False when the recipe was saved along with the write.
+    """
+    # vector changes, and the ingredient and tag IDs they add or remove
+    vectors = []
+    changed = {"ingredient_ids": [], "tag_ids": []}
+
+    if ingredients is not None:
+        removed = sorted(set(ingredients[0]).difference(ingredients[1]))
+        added = sorted(set(ingredients[1]).difference(ingredients[0]))
+
+        if removed or added:
+            indexes.ingredient_index.update(
+                *(("use", ingredient_id, -1) for ingredient_id in removed),
+                *(("use", ingredient_id, 1) for ingredient_id in added),
+            )
+            indexes.pantry_index.update(
+                *(("remove", recipe_id, ingredient_id) for ingredient_id in removed),
+                *(("add", recipe_id, ingredient_id) for ingredient_id in added),
+            )
+            subrecipes.relink((recipe_id,))
+            vectors.extend(
+                ("remove_ingredient", recipe_id, ingredient_id)
+                for ingredient_id in removed
+            )
+            vectors.extend(
+                ("add_ingredient", recipe_id, ingredient_id) for ingredient_id in added
+            )
+            changed["ingredient_ids"] = removed + added
+
+    if tags is not None:
+        removed = sorted(set(tags[0]).difference(tags[1]))
+        added = sorted(set(tags[1]).difference(tags[0]))
+
+        indexes.tag_index.update(
+            ("clear_recipes", [recipe_id]), ("add_tags", [recipe_id], sorted(tags[1]))
+        )
+
+        if removed or added:
+            vectors.append(("remove_tags", [recipe_id], removed))
+            vectors.append(("add_tags", [recipe_id], added))
+            changed["tag_ids"] = removed + added
+
+    if vectors:
+        indexes.vector_index.update(*vectors)
+        similarity.invalidate((recipe_id,), **changed)
+
+    refresh_recipes((recipe_id,), touch=touch)
+
+
+def touch_recipes(recipe_ids: Iterable[int]):
+    """Mark recipes as changed when one of their child rows changed
+
+    Args:
+        recipe_ids (Iterable[int]): recipes that changed
+    """
+    models.Recipe.objects.filter(id__in=tuple(recipe_ids)).update(
+        last_updated_on=timezone.now()
+    )
+    versions.bump(versions.RECIPES)
+
+
+@receiver(post_save, sender=models.Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    """Recipe created or edited"""
+    versions.bump(versions.RECIPES)
+    refresh_recipes((instance.id,), touch=False)
+
+    if created:
+        indexes.tag_index.update(("add_recipe", instance.id))
+        indexes.vector_index.update(("add_recipe", instance.id))
+
+
+@receiver(post_delete, sender=models.Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Recipe deleted"""
+    versions.bump(versions.RECIPES)
+    search.remove((instance.id,))
+    indexes.tag_index.update(("remove_recipe", instance.id))
+    indexes.vector_index.update(("remove_recipe", instance.id))
+
+
+@receiver(post_save, sender=models.IngredientInRecipe)
+@receiver(post_save, sender=models.Step)
+def recipe_child_saved(sender, instance, **kwargs):
+    """Ingredient or step added to a recipe or edited"""
+    refresh_recipes((instance.recipe_id,))
+
+
+@receiver(post_delete, sender=models.IngredientInRecipe)
+@receiver(post_delete, sender=models.Step)
+def recipe_child_deleted(sender, instance, **kwargs):
+    """Ingredient or step removed from a recipe"""
+    invalidate_recipes((instance.recipe_id,))
+
+
+@receiver(m2m_changed, sender=models.Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Tags added to or removed from recipes, from either side of the relation"""
+    if action == "pre_clear" and reverse:
+        instance._cleared_recipe_ids = tuple(
+            instance.recipes.values_list("id", flat=True)
+        )
+        return
+
+    if action == "pre_clear":
+        instance._cleared_tag_ids = tuple(instance.tags.values_list("id", flat=True))
+        return
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        recipe_ids = (instance.id,)
+        tag_ids = (
+            getattr(instance, "_cleared_tag_ids", ())
+            if action == "post_clear"
+            else pk_set
+        )
+
+    else:
+        recipe_ids = (
+            getattr(instance, "_cleared_recipe_ids", ())
+            if action == "post_clear"
+            else pk_set
+        )
+        tag_ids = (instance.id,)
+
+    similarity.invalidate(recipe_ids, tag_ids=tag_ids)
+    refresh_recipes(recipe_ids)
+
+
+@receiver(m2m_changed, sender=models.Recipe.tags.through)
+def recipe_tags_indexed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Apply tag changes to this worker's tag index"""
+    if action in ("post_add", "post_remove"):
+        recipe_ids, tag_ids = (
+            (sorted(pk_set), [instance.id])
+            if reverse
+            else ([instance.id], sorted(pk_set))
+        )
+        method = "add_tags" if action == "post_add" else "remove_tags"
+        indexes.tag_index.update((method, recipe_ids, tag_ids))
+        indexes.vector_index.update((method, recipe_ids, tag_ids))
+
+    elif action == "post_clear" and reverse:
+        indexes.tag_index.update(("clear_tag", instance.id))
+        indexes.vector_index.update(("clear_tag", instance.id))
+
+    elif action == "post_clear":
+        indexes.tag_index.update(("clear_recipes", [instance.id]))
+        indexes.vector_index.update(("clear_recipe_tags", [instance.id]))
+
+
+@receiver(pre_delete, sender=models.Tag)
+def tag_deleting(sender, instance, **kwargs):
+    """Tag rows are removed from recipes without an m2m_changed signal"""
+    instance._tagged_recipe_ids = tuple(instance.recipes.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=models.Tag)
+def tag_deleted(sender, instance, **kwargs):
+    """Tag deleted"""
+    tagged = getattr(instance, "_tagged_recipe_ids", ())
+    similarity.invalidate(tagged)
+    invalidate_recipes(tagged)
+
+
+@receiver(post_save, sender=models.Tag)
+@receiver(post_delete, sender=models.Tag)
+def tag_changed(sender, instance, **kwargs):
+    """Tag created, edited or deleted"""
+    versions.bump(versions.TAGS)
+
+
+@receiver(post_save, sender=models.Tag)
+def tag_saved(sender, instance, **kwargs):
+    """Tag created or its kind changed"""
+    indexes.tag_index.update(("set_tag", instance.id, instance.kind))
+
+
+@receiver(post_delete, sender=models.Tag)
+def tag_unindexed(sender, instance, **kwargs):
+    """Tag deleted along with its recipe rows"""
+    indexes.tag_index.update(("remove_tag", instance.id))
+    indexes.vector_index.update(("clear_tag", instance.id))
+
+
+@receiver(post_save, sender=models.Ingredient)
+@receiver(post_delete, sender=models.Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    """Ingredient created, edited or deleted"""
+    versions.bump(versions.INGREDIENTS)
+
+
+@receiver(post_save, sender=models.Ingredient)
+def ingredient_indexed(sender, instance, **kwargs):
+    """Ingredient created or edited"""
+    indexes.ingredient_index.update(
+        ("add", instance.id, instance.name, instance.recipe_id)
+    )
+
+
+@receiver(post_delete, sender=models.Ingredient)
+def ingredient_unindexed(sender, instance, **kwargs):
+    """Ingredient deleted"""
+    indexes.ingredient_index.update(("remove", instance.id))
+
+
+@receiver(post_save, sender=models.IngredientInRecipe)
+def ingredient_used(sender, instance, created, **kwargs):
+    """Ingredient added to a recipe"""
+    if created:
+        indexes.ingredient_index.update(("use", instance.ingredient_id, 1))
+        indexes.pantry_index.update(("add", instance.recipe_id, instance.ingredient_id))
+        indexes.vector_index.update(
+            ("add_ingredient", instance.recipe_id, instance.ingredient_id)
+        )
+        similarity.invalidate((instance.recipe_id,), (instance.ingredient_id,))
+
+
+@receiver(post_delete, sender=models.IngredientInRecipe)
+def ingredient_unused(sender, instance, **kwargs):
+    """Ingredient removed from a recipe"""
+    indexes.ingredient_index.update(("use", instance.ingredient_id, -1))
+    indexes.pantry_index.update(("remove", instance.recipe_id, instance.ingredient_id))
+    indexes.vector_index.update(
+        ("remove_ingredient", instance.recipe_id, instance.ingredient_id)
+    )
+    similarity.invalidate((instance.recipe_id,), (instance.ingredient_id,))
+
+
+@receiver(post_save, sender=models.Ingredient)
+def ingredient_saved(sender, instance, created, update_fields=None, **kwargs):
+    """Recipes are searchable by ingredient name, so a rename changes them.
+    The ingredient may also link to a different recipe now. Saves whose
+    update_fields have neither change nothing, the recipes using it are
+    refreshed REFRESH_BATCH_SIZE at a time otherwise."""
+    if created:
+        return
+
+    linked = update_fields is None or not update_fields.isdisjoint(
+        ("recipe", "recipe_id")
+    )
+    if not linked and "name" not in update_fields:
+        return
+
+    recipe_ids = models.IngredientInRecipe.objects.filter(
+        ingredient_id=instance.id
+    ).values_list("recipe_id", flat=True)
+
+    for batch in chunked(recipe_ids, REFRESH_BATCH_SIZE):
+        if linked:
+            subrecipes.relink(batch)
+
+        refresh_recipes(batch)
+
+
+@receiver(post_save, sender=models.IngredientInRecipe)
+@receiver(post_delete, sender=models.IngredientInRecipe)
+def sub_recipe_linked(sender, instance, created=True, **kwargs):
+    """Recipe used as an ingredient added to or removed from a recipe"""
+    if (
+        created
+        and models.Ingredient.objects.filter(
+            id=instance.ingredient_id, recipe__isnull=False
+        ).exists()
+    ):
+        subrecipes.relink((instance.recipe_id,))
+
+
+@receiver(post_save, sender=models.MealPlan)
+@receiver(post_delete, sender=models.MealPlan)
+def meal_plan_changed(sender, instance, **kwargs):
+    """Meal plan created, edited or deleted"""
+    versions.bump(versions.meal_plans(instance.user_id))
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def author_deleting(sender, instance, **kwargs):
+    """Recipe.author is set to null with a bulk update that sends no signals"""
+    invalidate_recipes(instance.created_recipes.values_list("id", flat=True))
@@ -0,0 +1,145 @@
+"""
+Similar recipe suggestions stored as SimilarRecipe rows.
+A recipe's rows are computed from indexes.vector_index the first time they
+are read. Each recipe's rows have their own SimilarRecipesVersion, and a write
+changing which ingredients or tags recipes have only makes stale the rows it
+can change, see invalidate. Stale rows are recomputed when next read or by
+manage.py rebuild_similar_recipes --stale.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from . import indexes, metrics, models
+
+
+def get(recipe_id: int) -> List[Tuple[int, float]]:
+    """Get the most similar recipes to a recipe, computing them if the stored
+    ones are missing or stale
+
+    Args:
+        recipe_id (int): recipe to get suggestions for
+
+    Returns:
+        List[Tuple[int, float]]: (recipe ID, score) most similar first
+    """
+    # no rows when stale, one (None, None) row when nothing is similar
+    similar = list(
+        models.Recipe.objects.filter(
+            id=recipe_id, similar_version__computed=F("similar_version__version")
+        )
+        .order_by("-similar_recipes__score", "similar_recipes__similar_id")
+        .values_list("similar_recipes__similar_id", "similar_recipes__score")
+    )
+
+    metrics.cache("similar", int(bool(similar)), int(not similar))
+
+    if not similar:
+        return compute((recipe_id,)).get(recipe_id, [])
+
+    return [(similar_id, score) for similar_id, score in similar if similar_id]
+
+
+def compute(
+    recipe_ids: Iterable[int], batch_size: int = 100
+) -> Dict[int, List[Tuple[int, float]]]:
+    """Compute and store the most similar recipes of recipes
+
+    Args:
+        recipe_ids (Iterable[int]): recipes to compute suggestions for
+        batch_size (int, optional): recipes scored per matrix product.
+            Defaults to 100.
+
+    Returns:
+        Dict[int, List[Tuple[int, float]]]: recipe ID to (recipe ID, score)
+            most similar first
+    """
+    recipe_ids = tuple(recipe_ids)
+    # read before the vectors, so a write in between leaves the rows stale
+    models.SimilarRecipesVersion.objects.bulk_create(
+        (models.SimilarRecipesVersion(recipe_id=recipe_id) for recipe_id in recipe_ids),
+        ignore_conflicts=True,
+    )
+    read = defaultdict(list)
+    for recipe_id, version in models.SimilarRecipesVersion.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list("recipe_id", "version"):
+        read[version].append(recipe_id)
+
+    similar = dict(
+        indexes.vector_index.get().most_similar(
+            recipe_ids, settings.RECIPE_MANAGER["SIMILAR_RECIPES"], batch_size
+        )
+    )
+
+    with transaction.atomic():
+        models.SimilarRecipe.objects.filter(recipe_id__in=similar).delete()
+        # another request may be computing the same recipes
+        models.SimilarRecipe.objects.bulk_create(
+            (
+                models.SimilarRecipe(
+                    recipe_id=recipe_id, similar_id=similar_id, score=score
+                )
+                for recipe_id, scores in similar.items()
+                for similar_id, score in scores
+            ),
+            ignore_conflicts=True,
+        )
+
+        for version, version_ids in read.items():
+            models.SimilarRecipesVersion.objects.filter(
+                recipe_id__in=version_ids, version=version
+            ).update(computed=version)
+
+    return similar
+
+
+def invalidate(
+    recipe_ids: Iterable[int],
+    ingredient_ids: Iterable[int] = (),
+    tag_ids: Iterable[int] = (),
+):
+    """Make stale the suggestions a change to recipes' ingredients or tags can
+    change, in one query: the recipes' own, those of the recipes listing them or
+    sharing an ingredient or tag with them, and those of every recipe with one
+    of the ingredients or tags added or removed, since it became more or less
+    rare. How many recipes there are also changes how rare everything is, but
+    only slowly, manage.py rebuild_similar_recipes picks that up.
+
+    Args:
+        recipe_ids (Iterable[int]): recipes whose ingredients or tags changed
+        ingredient_ids (Iterable[int], optional): ingredients added to or
+            removed from them. Defaults to ().
+        tag_ids (Iterable[int], optional): tags added to or removed from them.
+            Defaults to ().
+    """
+    recipe_ids = tuple(recipe_ids)
+    tagged = models.Recipe.tags.through.objects
+    sharing_ingredient = models.IngredientInRecipe.objects.filter(
+        Q(ingredient_id__in=tuple(ingredient_ids))
+        | Q(
+            ingredient_id__in=models.IngredientInRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values("ingredient_id")
+        )
+    ).values("recipe_id")
+    sharing_tag = tagged.filter(
+        Q(tag_id__in=tuple(tag_ids))
+        | Q(tag_id__in=tagged.filter(recipe_id__in=recipe_ids).values("tag_id"))
+    ).values("recipe_id")
+    listing = models.SimilarRecipe.objects.filter(similar_id__in=recipe_ids).values(
+        "recipe_id"
+    )
+
+    models.SimilarRecipesVersion.objects.filter(
+        Q(recipe_id__in=recipe_ids)
+        | Q(recipe_id__in=sharing_ingredient)
+        | Q(recipe_id__in=sharing_tag)
+        | Q(recipe_id__in=listing)
+    ).update(version=F("version") + 1)
+
+
+def invalidate_all():
+    """Make every recipe's suggestions stale, after bulk writes"""
+    models.SimilarRecipesVersion.objects.update(version=F("version") + 1)
@@ -0,0 +1,202 @@
+"""
+Ordering of a recipe's steps. The API addresses steps by their 1-based
+position while Step.order is a sort key spaced Step.ORDER_GAP apart, so
+inserting or moving a step writes one row with a key between its new
+neighbours'. A recipe's keys are spaced out again in one UPDATE when two
+neighbours run out of room or the whole order is replaced. Writes to the order
+lock the recipe's row first, so requests reordering the same recipe take turns.
+"""
+from typing import Callable, List, Sequence, Union
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Max, Value, When
+from . import models, signals
+
+# inserts retried when another request took the same key
+_ATTEMPTS = 3
+
+
+def step_at(recipe_id: int, position: int) -> Union[models.Step, None]:
+    """Get a recipe's step by its position
+
+    Args:
+        recipe_id (int): recipe the step is in
+        position (int): 1-based position of the step
+
+    Returns:
+        Union[models.Step, None]: step with its recipe or None if the recipe
+            has fewer steps
+    """
+    if position < 1:
+        return None
+
+    return (
+        models.Step.objects.select_related("recipe")
+        .filter(recipe_id=recipe_id)
+        .order_by("order")[position - 1 : position]
+        .first()
+    )
+
+
+def insert(recipe_id: int, instruction: str, position: int = None) -> models.Step:
+    """Add a step to a recipe
+
+    Args:
+        recipe_id (int): recipe to add the step to
+        instruction (str): step instruction
+        position (int, optional): 1-based position of the new step, the steps
+            from there on move down one. Defaults to after the last step.
+
+    Raises:
+        IntegrityError: the key was taken by other requests every attempt
+
+    Returns:
+        models.Step: created step
+    """
+    attempt = 1
+
+    while True:
+        try:
+            with transaction.atomic():
+                _lock(recipe_id)
+                return models.Step.objects.create(
+                    recipe_id=recipe_id,
+                    instruction=instruction,
+                    order=_key_at(recipe_id, position),
+                )
+
+        except IntegrityError:
+            if attempt == _ATTEMPTS:
+                raise
+
+            attempt += 1
+
+
+def move(step: models.Step, position: int):
+    """Give a step the key of a new position without saving it, the steps
+    between its old and new position shift by one. Must be called in a
+    transaction that also saves the step.
+
+    Args:
+        step (models.Step): step to move
+        position (int): 1-based position to move the step to
+    """
+    _lock(step.recipe_id)
+    # the recipe may have been respaced since the step was read
+    step.order = models.Step.objects.values_list("order", flat=True).get(id=step.id)
+    current = (
+        models.Step.objects.filter(
+            recipe_id=step.recipe_id, order__lt=step.order
+        ).count()
+        + 1
+    )
+
+    if position != current:
+        # the step's own key counts until it moves, skip over it
+        step.order = _key_at(
+            step.recipe_id, position + 1 if position > current else position
+        )
+
+
+def reorder(recipe_id: int, positions: Sequence[int]) -> List[str]:
+    """Replace the order of a recipe's steps with one UPDATE, spacing their
+    keys Step.ORDER_GAP apart again
+
+    Args:
+        recipe_id (int): recipe to reorder
+        positions (Sequence[int]): current 1-based positions of every step in
+            their new order
+
+    Raises:
+        ValueError: positions isn't an ordering of every step
+        IntegrityError: another request took one of the new keys
+
+    Returns:
+        List[str]: instructions in their new order
+    """
+    with transaction.atomic():
+        _lock(recipe_id)
+        steps = tuple(
+            models.Step.objects.filter(recipe_id=recipe_id)
+            .order_by("order")
+            .values_list("id", "order", "instruction")
+        )
+
+        if sorted(positions) != list(range(1, len(steps) + 1)):
+            raise ValueError(f"positions must order all {len(steps)} steps")
+
+        _respace(recipe_id, [steps[position - 1][:2] for position in positions])
+        signals.refresh_recipes((recipe_id,))
+
+    return [steps[position - 1][2] for position in positions]
+
+
+def _key_at(recipe_id: int, position: Union[int, None]) -> int:
+    """Key that sorts a step at a position, spacing the recipe's keys out
+    first if the neighbours there are adjacent
+    """
+    gap = models.Step.ORDER_GAP
+    steps = models.Step.objects.filter(recipe_id=recipe_id).order_by("order")
+
+    if position is None or position < 1:
+        return (steps.aggregate(last=Max("order"))["last"] or 0) + gap
+
+    # the steps before and at the position
+    neighbours = tuple(
+        steps.values_list("order", flat=True)[max(position - 2, 0) : position]
+    )
+
+    if position == 1:
+        before, after = 0, (neighbours[0] if neighbours else None)
+
+    elif len(neighbours) == 2:
+        before, after = neighbours
+
+    else:
+        return (steps.aggregate(last=Max("order"))["last"] or 0) + gap
+
+    if after is None:
+        return before + gap
+
+    if after - before < 2:
+        _respace(recipe_id, steps.values_list("id", "order"))
+        return _key_at(recipe_id, position)
+
+    return (before + after) // 2
+
+
+def _lock(recipe_id: int):
+    """Lock a recipe's row until the transaction ends"""
+    list(models.Recipe.objects.select_for_update().filter(id=recipe_id).values("id"))
+
+
+def _respace(recipe_id: int, steps: Sequence[tuple]):
+    """Key (id, order) steps ORDER_GAP apart in the order given with one
+    UPDATE, other steps keep their keys. Unique keys are checked row by row,
+    so the new keys are offset to miss every old one. If the old keys take
+    every offset, the steps are first moved to negative keys with a second
+    UPDATE.
+    """
+    steps = tuple(steps)
+    gap = models.Step.ORDER_GAP
+    taken = {order % gap for _, order in steps}
+
+    if (offset := next((n for n in range(gap) if n not in taken), None)) is None:
+        _set_keys(recipe_id, steps, lambda number: -number)
+        offset = 0
+
+    _set_keys(recipe_id, steps, lambda number: number * gap + offset)
+
+
+def _set_keys(recipe_id: int, steps: Sequence[tuple], key: Callable[[int], int]):
+    models.Step.objects.filter(
+        recipe_id=recipe_id, id__in=[step_id for step_id, _ in steps]
+    ).update(
+        order=Case(
+            *(
+                When(id=step_id, then=Value(key(number)))
+                for number, (step_id, _) in enumerate(steps, 1)
+            ),
+            default=F("order"),
+            output_field=IntegerField(),
+        )
+    )
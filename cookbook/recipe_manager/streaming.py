@@ -0,0 +1,73 @@
+"""
+Streaming JSON responses for list views
+"""
+from typing import Callable, Iterable, Iterator
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.settings import api_settings
+from .utils import chunked
+
+
+class StreamingListMixin:
+    """Lets a list view send every row as one JSON array when the client asks for
+    ?stream=true. Rows are read with QuerySet.iterator() and serialized a chunk at
+    a time, so memory use does not grow with the size of the table and the client
+    starts receiving bytes as soon as the first chunk is ready.
+
+    Attributes:
+        stream_query_param (str): query param that turns streaming on
+    """
+
+    stream_query_param = "stream"
+
+    def wants_stream(self, request) -> bool:
+        """Check if the client asked for a streamed response
+
+        Args:
+            request (HttpRequest): DRF Request
+
+        Returns:
+            bool: True if the response should be streamed
+        """
+        return request.query_params.get(self.stream_query_param, "").lower() in (
+            "1",
+            "true",
+        )
+
+    def get_streaming_response(
+        self, queryset, serialize_chunk: Callable[[list], Iterable[dict]]
+    ) -> StreamingHttpResponse:
+        """Stream a queryset as a JSON array
+
+        Args:
+            queryset (QuerySet): rows to send, in the order to send them
+            serialize_chunk (Callable[[list], Iterable[dict]]): serializes a list
+                of model instances
+
+        Returns:
+            StreamingHttpResponse: response streaming the JSON array
+        """
+        chunk_size = settings.RECIPE_MANAGER["STREAM_CHUNK_SIZE"]
+
+        return StreamingHttpResponse(
+            _stream_json_array(
+                queryset.iterator(chunk_size=chunk_size), chunk_size, serialize_chunk
+            ),
+            content_type="application/json",
+        )
+
+
+def _stream_json_array(
+    rows: Iterator, chunk_size: int, serialize_chunk: Callable[[list], Iterable[dict]]
+) -> Iterator[bytes]:
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    separator = b""
+
+    yield b"["
+
+    for chunk in chunked(rows, chunk_size):
+        # render the chunk as an array and drop the brackets to splice it in
+        yield separator + renderer.render(list(serialize_chunk(chunk)))[1:-1]
+        separator = b","
+
+    yield b"]"
@@ -0,0 +1,265 @@
+"""
+Recipes used as ingredients of other recipes through Ingredient.recipe.
+RecipeDependency holds the closure of that graph so the recipes above or
+below one cost one indexed query. The closure is rebuilt from the
+IngredientInRecipe rows with a recursive CTE, which runs on both Postgres and
+sqlite3, whenever a recipe's sub-recipes change. Flattened recipes are stored
+in FlattenedRecipe and dropped along with their ancestors' by
+signals.refresh_recipes.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Iterable, List, Set, Tuple, Union
+from django.db import connection, transaction
+from django.db.models import Q
+from rest_framework.settings import api_settings
+from . import models, shopping
+
+# deepest sub-recipe nesting walked. Writes and imports never store a cycle,
+# see creates_cycles, the bound only keeps one written around them, through
+# the admin or SQL, from recursing forever
+MAX_DEPTH = 32
+
+_FLATTEN = """
+    WITH RECURSIVE tree(id) AS (
+        SELECT CAST(%s AS integer)
+        UNION
+        SELECT ingredient.recipe_id
+        FROM tree
+        JOIN recipe_manager_ingredientinrecipe used ON used.recipe_id = tree.id
+        JOIN recipe_manager_ingredient ingredient ON ingredient.id = used.ingredient_id
+        WHERE ingredient.recipe_id IS NOT NULL
+    )
+    SELECT
+        recipe.id, recipe.servings, used.ingredient_id, ingredient.name,
+        ingredient.recipe_id, used.amount, used.unit
+    FROM tree
+    JOIN recipe_manager_recipe recipe ON recipe.id = tree.id
+    LEFT JOIN recipe_manager_ingredientinrecipe used ON used.recipe_id = recipe.id
+    LEFT JOIN recipe_manager_ingredient ingredient ON ingredient.id = used.ingredient_id
+    ORDER BY used.id
+"""
+_RELINK = """
+    WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+        SELECT id, id, 0 FROM recipe_manager_recipe WHERE id IN ({})
+        UNION ALL
+        SELECT tree.ancestor_id, ingredient.recipe_id, tree.depth + 1
+        FROM tree
+        JOIN recipe_manager_ingredientinrecipe used ON used.recipe_id = tree.descendant_id
+        JOIN recipe_manager_ingredient ingredient ON ingredient.id = used.ingredient_id
+        WHERE ingredient.recipe_id IS NOT NULL AND tree.depth < %s
+    )
+    INSERT INTO recipe_manager_recipedependency (ancestor_id, descendant_id, depth)
+    SELECT ancestor_id, descendant_id, MIN(depth) FROM tree
+    WHERE depth > 0
+    GROUP BY ancestor_id, descendant_id
+"""
+
+
+def descendants(recipe_id: int) -> Set[int]:
+    """Recipes a recipe uses as ingredients, directly or through sub-recipes
+
+    Args:
+        recipe_id (int): recipe to start from
+
+    Returns:
+        Set[int]: IDs of the recipe and every sub-recipe below it
+    """
+    return {
+        recipe_id,
+        *models.RecipeDependency.objects.filter(ancestor_id=recipe_id).values_list(
+            "descendant_id", flat=True
+        ),
+    }
+
+
+def ancestors(recipe_ids: Iterable[int]) -> Set[int]:
+    """Recipes using recipes as ingredients, directly or through sub-recipes
+
+    Args:
+        recipe_ids (Iterable[int]): recipes to start from
+
+    Returns:
+        Set[int]: IDs of the recipes and every recipe above them
+    """
+    recipe_ids = set(recipe_ids)
+
+    return recipe_ids.union(
+        models.RecipeDependency.objects.filter(
+            descendant_id__in=recipe_ids
+        ).values_list("ancestor_id", flat=True)
+    )
+
+
+def relink(recipe_ids: Iterable[int]):
+    """Rebuild the closure rows of recipes whose sub-recipes changed and of
+    every recipe above them
+
+    Args:
+        recipe_ids (Iterable[int]): recipes that gained or lost a sub-recipe
+    """
+    if not (recipe_ids := tuple(ancestors(recipe_ids))):
+        return
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        models.RecipeDependency.objects.filter(ancestor_id__in=recipe_ids).delete()
+        cursor.execute(
+            _RELINK.format(", ".join(["%s"] * len(recipe_ids))),
+            (*recipe_ids, MAX_DEPTH),
+        )
+
+
+def creates_cycle(recipe_id: int, sub_recipe_id: Union[int, None]) -> bool:
+    """Whether using a recipe as an ingredient of another would make a recipe
+    contain itself
+
+    Args:
+        recipe_id (int): recipe getting the ingredient
+        sub_recipe_id (Union[int, None]): Ingredient.recipe_id of the
+            ingredient, None for raw ingredients
+
+    Returns:
+        bool: the recipe is the sub-recipe or one of its descendants
+    """
+    return (
+        sub_recipe_id is not None and creates_cycles([({recipe_id}, sub_recipe_id)])[0]
+    )
+
+
+def creates_cycles(links: List[Tuple[Set[int], int]]) -> List[bool]:
+    """creates_cycle for links made one after another, each checked along with
+    the links before it that don't create a cycle, reading the closure rows of
+    every sub-recipe in one query
+
+    Args:
+        links (List[Tuple[Set[int], int]]): recipes getting an ingredient and
+            the Ingredient.recipe_id it gets
+
+    Returns:
+        List[bool]: whether each link would make a recipe contain itself
+    """
+    below = {sub_recipe_id: {sub_recipe_id} for _, sub_recipe_id in links}
+    for ancestor_id, descendant_id in models.RecipeDependency.objects.filter(
+        ancestor_id__in=below
+    ).values_list("ancestor_id", "descendant_id"):
+        below[ancestor_id].add(descendant_id)
+
+    added = defaultdict(set)
+    cycles = []
+
+    for recipe_ids, sub_recipe_id in links:
+        reached, stack = set(), [sub_recipe_id]
+        while stack:
+            for reached_id in below[stack.pop()] - reached:
+                reached.add(reached_id)
+                stack.extend(added[reached_id])
+
+        cycles.append(not reached.isdisjoint(recipe_ids))
+        if not cycles[-1]:
+            for recipe_id in recipe_ids:
+                added[recipe_id].add(sub_recipe_id)
+
+    return cycles
+
+
+def flatten(
+    recipe_id: int, servings: int = None, system: str = None
+) -> Union[dict, None]:
+    """Expand a recipe's sub-recipes down to raw ingredients, reading every
+    level with one recursive query. The amount of a sub-recipe is the number
+    of its servings used, so its ingredients are scaled by amount over the
+    servings it makes. Raw ingredients are added up by shopping.totals.
+
+    Args:
+        recipe_id (int): recipe to flatten
+        servings (int, optional): servings to scale to. Defaults to the
+            servings the recipe makes.
+        system (str, optional): units.METRIC or units.US. Defaults to the
+            system the amounts used.
+
+    Returns:
+        Union[dict, None]: {recipe_id, servings, ingredients} or None if the
+            recipe doesn't exist
+    """
+    makes = {}
+    used = defaultdict(list)
+
+    with connection.cursor() as cursor:
+        cursor.execute(_FLATTEN, (recipe_id,))
+
+        for row_recipe_id, row_makes, *ingredient in cursor.fetchall():
+            makes[row_recipe_id] = row_makes
+            if ingredient[0] is not None:
+                used[row_recipe_id].append(ingredient)
+
+    if recipe_id not in makes:
+        return None
+
+    servings = servings or makes[recipe_id]
+    raw = []
+    # (recipe ID, servings of it needed, recipes above it)
+    stack = [(recipe_id, Decimal(servings), frozenset((recipe_id,)))]
+
+    while stack:
+        current, needed, path = stack.pop()
+
+        for ingredient_id, name, sub_recipe_id, amount, unit in used[current]:
+            amount = Decimal(str(amount)) * needed / makes[current]
+
+            if sub_recipe_id is None:
+                raw.append((ingredient_id, name, amount, unit))
+
+            elif sub_recipe_id not in path:
+                stack.append((sub_recipe_id, amount, path | {sub_recipe_id}))
+
+    return {
+        "recipe_id": recipe_id,
+        "servings": servings,
+        "ingredients": shopping.totals(raw, system),
+    }
+
+
+def get(recipe_id: int) -> Union[str, None]:
+    """Get the stored flattened recipe, flattening it if needed
+
+    Args:
+        recipe_id (int): recipe to get
+
+    Returns:
+        Union[str, None]: rendered JSON or None if the recipe doesn't exist
+    """
+    document = (
+        models.FlattenedRecipe.objects.filter(recipe_id=recipe_id)
+        .values_list("document", flat=True)
+        .first()
+    )
+
+    if document is None and (flattened := flatten(recipe_id)) is not None:
+        document = (
+            api_settings.DEFAULT_RENDERER_CLASSES[0]().render(flattened).decode("utf-8")
+        )
+        # another request may be flattening the same recipe
+        models.FlattenedRecipe.objects.bulk_create(
+            (models.FlattenedRecipe(recipe_id=recipe_id, document=document),),
+            ignore_conflicts=True,
+        )
+
+    return document
+
+
+def invalidate(recipe_ids: Iterable[int]):
+    """Drop stored flattened recipes of recipes that changed and of every
+    recipe using them
+
+    Args:
+        recipe_ids (Iterable[int]): recipes that changed
+    """
+    recipe_ids = tuple(recipe_ids)
+    models.FlattenedRecipe.objects.filter(
+        Q(recipe_id__in=recipe_ids)
+        | Q(
+            recipe_id__in=models.RecipeDependency.objects.filter(
+                descendant_id__in=recipe_ids
+            ).values("ancestor_id")
+        )
+    ).delete()
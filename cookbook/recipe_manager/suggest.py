@@ -0,0 +1,62 @@
+"""
+Ingredient autocomplete. Postgres matches with pg_trgm, see migration 0007,
+and breaks ties with the usage counts triggers keep in
+recipe_manager_ingredient_uses, see migration 0015. Other databases use the
+per-worker indexes.IngredientIndex.
+"""
+from typing import List
+from django.db import connection
+from . import indexes
+
+# same ranking as indexes.IngredientTrigrams.suggest, prefixes use the
+# text_pattern_ops index and similar names the trigram index
+_POSTGRES_SUGGEST = """
+    SELECT match.id, match.name, match.recipe_id FROM (
+        SELECT
+            ingredient.id,
+            ingredient.name,
+            ingredient.recipe_id,
+            lower(ingredient.name) LIKE %(prefix)s AS prefixed,
+            similarity(lower(ingredient.name), %(query)s) AS score
+        FROM recipe_manager_ingredient ingredient
+        WHERE lower(ingredient.name) LIKE %(prefix)s
+            OR lower(ingredient.name) %% %(query)s
+    ) match
+    LEFT JOIN recipe_manager_ingredient_uses counted
+        ON counted.ingredient_id = match.id
+    ORDER BY
+        match.prefixed DESC,
+        match.score DESC,
+        coalesce(counted.uses, 0) DESC,
+        match.id
+    LIMIT %(limit)s
+"""
+
+
+def suggest_ingredients(query: str, limit: int) -> List[dict]:
+    """Ingredients whose name starts with or is similar to a partial name
+
+    Args:
+        query (str): what the user typed
+        limit (int): max number of matches
+
+    Returns:
+        List[dict]: {id, name, recipe_id} of the matches, best first
+    """
+    if not (query := query.strip().lower()):
+        return []
+
+    if connection.vendor != "postgresql":
+        return indexes.ingredient_index.get().suggest(query, limit)
+
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _POSTGRES_SUGGEST,
+            {"prefix": f"{escaped}%", "query": query, "limit": limit},
+        )
+        return [
+            {"id": row[0], "name": row[1], "recipe_id": row[2]}
+            for row in cursor.fetchall()
+        ]
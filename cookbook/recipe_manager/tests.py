@@ -1,11 +1,36 @@
 """RecipeManager Tests
 """
 # pylint: disable=import-error,too-many-public-methods
-from django.test import TestCase, Client
+import io
+import json
+import os
+import pstats
+import re
+import subprocess
+import tempfile
+import time
+from unittest import mock
+from datetime import date, datetime, timedelta, timezone
+from collections import Counter
+from decimal import Decimal
+from django.conf import settings
+from django.db import IntegrityError, connection
+from django.db.models import Count, F
+from django.core.management import call_command, CommandError
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from model_bakery import baker, seq
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
 from users.models import User
-from . import models, constants, serializers
+from . import models, constants, serializers, projections, documents, search
+from . import benchmark, budgets, dataset, indexes, metrics, profiling, similarity
+from . import signals, steps, subrecipes, timing, units, versions
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
 
 TEST_USER_NAME = "testUser"
 TEST_EMAIL = "test@test.net"
@@ -102,6 +127,39 @@ class IngredientTestCase(TestCase):
         self.assertEqual(response_data["id"], self.ingredient1.id)
         self.assertIn("name", response.json())
 
+    def test_saved_refreshes_recipes(self):
+        """
+        saving an ingredient refreshes the recipes using it a batch at a time,
+        unless neither its name nor its recipe was written
+        """
+        for recipe in baker.make(models.Recipe, _quantity=3):
+            baker.make(
+                models.IngredientInRecipe,
+                recipe=recipe,
+                ingredient=self.ingredient1,
+                amount="1.00",
+                unit="n/a",
+                specifier="",
+            )
+        serializer = serializers.IngredientSerializer()
+
+        with mock.patch.object(signals, "REFRESH_BATCH_SIZE", 2), mock.patch.object(
+            signals, "refresh_recipes"
+        ) as refresh:
+            serializer.update(self.ingredient1, {"name": self.ingredient1.name})
+            self.ingredient1.save(update_fields=("recipe",))
+            self.assertEqual(
+                [len(call.args[0]) for call in refresh.call_args_list], [2, 1]
+            )
+
+            refresh.reset_mock()
+            serializer.update(self.ingredient1, {"name": "renamed"})
+            self.assertEqual(refresh.call_count, 2)
+
+        self.assertEqual(
+            models.Ingredient.objects.get(id=self.ingredient1.id).name, "renamed"
+        )
+
 
 class TagTestCase(TestCase):
     """Tests for /tag/
@@ -648,7 +706,9 @@ class RecipeStepsCase(TestCase):
             content_type="application/json",
             HTTP_AUTHORIZATION=token,
         )
-        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.recipe1.steps.count(), 4)
+        self.assertNotIn(db_step, self.recipe1.steps.all())
 
     def test_delete_last_step(self):
         """
@@ -667,6 +727,189 @@ class RecipeStepsCase(TestCase):
         self.assertEqual(response.status_code, 204)
 
 
+class StepOrderTestCase(TestCase):
+    """Tests for step positions over gapped Step.order keys
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            TEST_USER_NAME, email=TEST_EMAIL, password=TEST_PASSWORD
+        )
+        self.token = get_token()
+        self.recipe = baker.make(models.Recipe, author=self.user)
+        models.Step.objects.bulk_create(
+            models.Step(
+                recipe=self.recipe,
+                order=position * models.Step.ORDER_GAP,
+                instruction=instruction,
+            )
+            for position, instruction in enumerate("abcd", 1)
+        )
+
+    def instructions(self):
+        return "".join(self.recipe.steps.values_list("instruction", flat=True))
+
+    def add(self, instruction, **data):
+        return self.client.post(
+            reverse("recipe-steps", kwargs={"recipe_pk": self.recipe.id}),
+            {"instruction": instruction, **data},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=self.token,
+        )
+
+    def move(self, order, position):
+        return self.client.put(
+            reverse(
+                "recipe-step-detail",
+                kwargs={"recipe_pk": self.recipe.id, "order": order},
+            ),
+            {"position": position},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=self.token,
+        )
+
+    def reorder(self, positions):
+        return self.client.put(
+            reverse("recipe-steps-order", kwargs={"recipe_pk": self.recipe.id}),
+            {"positions": positions},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=self.token,
+        )
+
+    def test_insert(self):
+        """
+        POST /recipe/<int:recipe_pk>/steps/ with a position writes one row
+        """
+        orders = dict(self.recipe.steps.values_list("instruction", "order"))
+
+        self.assertEqual(self.add("x", position=2).status_code, 201)
+        self.assertEqual(self.add("y", position=1).status_code, 201)
+        self.assertEqual(self.add("z").status_code, 201)
+        self.assertEqual(self.add("w", position=99).status_code, 201)
+
+        self.assertEqual(self.instructions(), "yaxbcdzw")
+        for instruction, order in orders.items():
+            self.assertEqual(
+                self.recipe.steps.get(instruction=instruction).order, order
+            )
+
+    def test_insert_respaces(self):
+        """
+        POST /recipe/<int:recipe_pk>/steps/ between adjacent keys
+        """
+        for _ in range(12):
+            self.assertEqual(self.add("x", position=2).status_code, 201)
+
+        self.assertEqual(self.instructions(), "a" + "x" * 12 + "bcd")
+
+    def test_get_by_position(self):
+        """
+        GET /recipe/<int:recipe_pk>/steps/<int:order>/ counts from 1
+        """
+        for position, instruction in enumerate("abcd", 1):
+            response = self.client.get(
+                reverse(
+                    "recipe-step-detail",
+                    kwargs={"recipe_pk": self.recipe.id, "order": position},
+                )
+            )
+            self.assertEqual(response.json()["instruction"], instruction)
+
+        response = self.client.get(
+            reverse(
+                "recipe-step-detail", kwargs={"recipe_pk": self.recipe.id, "order": 5}
+            )
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_move(self):
+        """
+        PUT /recipe/<int:recipe_pk>/steps/<int:order>/ with a position
+        """
+        for order, position, expected in (
+            (1, 3, "bcad"),
+            (4, 1, "dbca"),
+            (2, 4, "dcab"),
+            (3, 3, "dcab"),
+        ):
+            response = self.move(order, position)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.instructions(), expected)
+
+    def test_reorder(self):
+        """
+        PUT /recipe/<int:recipe_pk>/steps/order/
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.reorder([4, 2, 1, 3])
+
+        step_updates = [
+            query
+            for query in queries
+            if query["sql"].startswith('UPDATE "recipe_manager_step"')
+        ]
+        self.assertEqual(len(step_updates), 1)
+
+        response = self.reorder([2, 1, 3, 4])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), list("bdac"))
+        self.assertEqual(self.instructions(), "bdac")
+        self.assertEqual(
+            json.loads(documents.get((self.recipe.id,))[self.recipe.id])["steps"],
+            list("bdac"),
+        )
+
+        for positions in ([1, 2, 3], [1, 1, 2, 3], "1,2,3,4", None):
+            self.assertEqual(self.reorder(positions).status_code, 400)
+
+    def test_reorder_every_offset_taken(self):
+        """
+        PUT /recipe/<int:recipe_pk>/steps/order/ when the old keys leave no
+        offset free for the new ones
+        """
+        self.recipe.steps.filter(instruction="d").update(order=4097)
+
+        with mock.patch.object(models.Step, "ORDER_GAP", 2):
+            response = self.reorder([4, 3, 2, 1])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.instructions(), "dcba")
+        self.assertEqual(
+            list(self.recipe.steps.values_list("order", flat=True)), [2, 4, 6, 8]
+        )
+
+    def test_respace_keeps_other_steps(self):
+        """
+        respacing only writes the keys of the steps it was given
+        """
+        orders = dict(self.recipe.steps.values_list("instruction", "order"))
+        first, second = self.recipe.steps.values_list("id", "order")[:2]
+        steps._respace(self.recipe.id, (second, first))
+
+        self.assertEqual(self.instructions(), "bacd")
+        for instruction in "cd":
+            self.assertEqual(
+                self.recipe.steps.get(instruction=instruction).order,
+                orders[instruction],
+            )
+
+    def test_conflict(self):
+        """
+        a key taken by another request is a 409, not a 500
+        """
+        taken = self.recipe.steps.get(instruction="b").order
+
+        with mock.patch.object(
+            steps, "move", lambda step, position: setattr(step, "order", taken)
+        ):
+            self.assertEqual(self.move(1, 2).status_code, 409)
+
+        with mock.patch.object(steps, "_respace", side_effect=IntegrityError):
+            self.assertEqual(self.reorder([4, 3, 2, 1]).status_code, 409)
+
+        self.assertEqual(self.instructions(), "abcd")
+
+
 class RecipeTagTest(TestCase):
     """Test for Tags in Recipes
     """
@@ -761,3 +1004,3205 @@ class RecipeTagTest(TestCase):
         )
         self.assertEqual(response.status_code, 204)
         self.assertEqual(self.recipe1.tags.all().count(), tag_count_before_delete - 1)
+
+
+def get_link(response, rel):
+    """Get a URL from the Link header of a response
+
+    Args:
+        response (HttpResponse): paginated response
+        rel (str): relation e.g. 'next' or 'prev'
+
+    Returns:
+        Union[str, None]: URL for rel if present
+    """
+    match = re.search(rf'<([^>]+)>; rel="{rel}"', response.get("Link", ""))
+    return match.group(1) if match else None
+
+
+@override_settings(RECIPE_MANAGER={**settings.RECIPE_MANAGER, "PAGE_SIZE": 2})
+class CursorPaginationTestCase(TestCase):
+    """Tests for cursor pagination on list endpoints
+    """
+
+    def setUp(self):
+        for name in ("e", "b", "d", "a", "c"):
+            baker.make(models.Ingredient, name=name)
+
+    def test_pages_cover_every_row_once(self):
+        """
+        GET /ingredient/ following next links
+        """
+        seen = []
+        url = reverse("ingredient")
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.json()), 2)
+            seen.extend(ingredient["id"] for ingredient in response.json())
+            url = get_link(response, "next")
+
+        self.assertEqual(
+            seen,
+            list(models.Ingredient.objects.order_by("id").values_list("id", flat=True)),
+        )
+
+    def test_previous_link(self):
+        """
+        GET /ingredient/ following prev link returns the page before
+        """
+        first_page = self.client.get(reverse("ingredient"))
+        self.assertIsNone(get_link(first_page, "prev"))
+        second_page = self.client.get(get_link(first_page, "next"))
+        previous_page = self.client.get(get_link(second_page, "prev"))
+        self.assertEqual(previous_page.json(), first_page.json())
+
+    def test_ordering_by_name(self):
+        """
+        GET /ingredient/?ordering=-name
+        """
+        seen = []
+        url = f'{reverse("ingredient")}?ordering=-name'
+        while url:
+            response = self.client.get(url)
+            seen.extend(ingredient["name"] for ingredient in response.json())
+            url = get_link(response, "next")
+
+        self.assertEqual(seen, ["e", "d", "c", "b", "a"])
+
+    @override_settings(
+        RECIPE_MANAGER={**settings.RECIPE_MANAGER, "PAGE_SIZE": 2, "MAX_PAGE_SIZE": 3}
+    )
+    def test_page_size_is_capped(self):
+        """
+        GET /ingredient/?page_size=100
+        """
+        response = self.client.get(f'{reverse("ingredient")}?page_size=100')
+        self.assertEqual(len(response.json()), 3)
+
+    def test_link_exposed(self):
+        """
+        cross origin clients can read the Link header
+        """
+        response = self.client.get(
+            reverse("ingredient"), HTTP_ORIGIN="http://localhost:8080"
+        )
+        self.assertEqual(response["Access-Control-Expose-Headers"], "Link")
+
+    def test_invalid_cursor(self):
+        """
+        GET /ingredient/?cursor=garbage
+        """
+        response = self.client.get(f'{reverse("ingredient")}?cursor=garbage')
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_ordering(self):
+        """
+        GET /ingredient/?ordering=recipe_id
+        """
+        response = self.client.get(f'{reverse("ingredient")}?ordering=recipe_id')
+        self.assertEqual(response.status_code, 400)
+
+
+def make_recipes(
+    count, steps_per_recipe=3, ingredients_per_recipe=3, tags_per_recipe=2
+):
+    """Bulk create fully populated recipes
+
+    Args:
+        count (int): number of recipes to create
+        steps_per_recipe (int, optional): Defaults to 3.
+        ingredients_per_recipe (int, optional): Defaults to 3.
+        tags_per_recipe (int, optional): Defaults to 2.
+
+    Returns:
+        QuerySet[Recipe]: created recipes
+    """
+    offset = models.Recipe.objects.filter(name__startswith="recipe ").count()
+    models.Recipe.objects.bulk_create(
+        models.Recipe(
+            name=f"recipe {offset + i}",
+            description="description",
+            servings=4,
+            cook_time="1 hour",
+        )
+        for i in range(count)
+    )
+    recipes = models.Recipe.objects.filter(name__startswith="recipe ").order_by("id")[
+        offset:
+    ]
+    ingredients = baker.make(models.Ingredient, _quantity=ingredients_per_recipe)
+    tags = baker.make(models.Tag, _quantity=tags_per_recipe)
+
+    models.Step.objects.bulk_create(
+        models.Step(recipe=recipe, order=order, instruction=f"step {order}")
+        for recipe in recipes
+        for order in range(steps_per_recipe, 0, -1)
+    )
+    models.IngredientInRecipe.objects.bulk_create(
+        models.IngredientInRecipe(
+            recipe=recipe, ingredient=ingredient, amount="1.50", unit="c"
+        )
+        for recipe in recipes
+        for ingredient in ingredients
+    )
+    models.Recipe.tags.through.objects.bulk_create(
+        models.Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+        for recipe in recipes
+        for tag in tags
+    )
+
+    return recipes
+
+
+class RecipeProjectionTestCase(TestCase):
+    """Tests for projections.recipe_documents
+    """
+
+    def test_query_count_is_constant(self):
+        """
+        one query per relation for 1, 10 and 1000 recipes
+        """
+        for count in (1, 10, 1000):
+            recipes = list(make_recipes(count))
+            with self.assertNumQueries(3):
+                documents = projections.recipe_documents(recipes)
+
+            self.assertEqual(len(documents), count)
+
+    def test_document_contents(self):
+        """
+        steps are ordered and relations are attached to the right recipe
+        """
+        recipe = make_recipes(2)[1]
+        document = projections.recipe_documents((recipe,))[0]
+
+        self.assertEqual(document["id"], recipe.id)
+        self.assertEqual(document["steps"], ("step 1", "step 2", "step 3"))
+        self.assertEqual(
+            document["tags"],
+            tuple(recipe.tags.order_by("id").values_list("id", flat=True)),
+        )
+        self.assertEqual(len(document["ingredients"]), 3)
+        self.assertEqual(document["ingredients"][0]["amount"], "1.50")
+
+    def test_recipe_list_query_count(self):
+        """
+        GET /recipe/ does not grow with the page size
+        """
+        make_recipes(20)
+        call_command("rebuild_recipe_documents", stdout=io.StringIO())
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("recipe"))
+
+        self.assertEqual(len(response.json()), 20)
+
+
+@override_settings(
+    RECIPE_MANAGER={**settings.RECIPE_MANAGER, "PAGE_SIZE": 2, "STREAM_CHUNK_SIZE": 3}
+)
+class StreamingListTestCase(TestCase):
+    """Tests for ?stream=true on list endpoints
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            TEST_USER_NAME, email=TEST_EMAIL, password=TEST_PASSWORD
+        )
+
+    def test_stream_recipes(self):
+        """
+        GET /recipe/?stream=true returns every recipe
+        """
+        recipes = make_recipes(7)
+        response = self.client.get(f'{reverse("recipe")}?stream=true')
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            json.loads(b"".join(response.streaming_content)),
+            json.loads(
+                json.dumps(projections.recipe_documents(recipes), cls=JSONEncoder)
+            ),
+        )
+
+    def test_stream_ingredients(self):
+        """
+        GET /ingredient/?stream=true returns every ingredient
+        """
+        baker.make(models.Ingredient, _quantity=5)
+        response = self.client.get(f'{reverse("ingredient")}?stream=1')
+        ingredients = json.loads(b"".join(response.streaming_content))
+
+        self.assertEqual(
+            [ingredient["id"] for ingredient in ingredients],
+            list(models.Ingredient.objects.order_by("id").values_list("id", flat=True)),
+        )
+
+    def test_stream_meal_plans_empty(self):
+        """
+        GET /meal-plan/?stream=true with no rows is an empty array
+        """
+        response = self.client.get(
+            f'{reverse("meal-plan")}?stream=true', HTTP_AUTHORIZATION=get_token()
+        )
+        self.assertEqual(b"".join(response.streaming_content), b"[]")
+
+
+class RecipeDocumentTestCase(TestCase):
+    """Tests for stored recipe documents
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            TEST_USER_NAME, email=TEST_EMAIL, password=TEST_PASSWORD
+        )
+        self.recipe = make_recipes(1)[0]
+        self.recipe.author = self.user
+        self.recipe.save()
+
+    def get_recipe(self):
+        """Get recipe from the API and the projection
+
+        Returns:
+            tuple: (API response data, projection)
+        """
+        response = self.client.get(
+            reverse("recipe-detail", kwargs={"pk": self.recipe.id})
+        )
+        projection = projections.recipe_documents(
+            models.Recipe.objects.filter(id=self.recipe.id)
+        )[0]
+
+        return response.json(), json.loads(json.dumps(projection, cls=JSONEncoder))
+
+    def test_detail_served_from_document(self):
+        """
+        GET /recipe/<int:pk>/ reads the version and the document
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse("recipe-detail", kwargs={"pk": self.recipe.id})
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(*self.get_recipe())
+
+    def test_missing_document_is_built_on_read(self):
+        """
+        GET /recipe/<int:pk>/ without a stored document
+        """
+        models.RecipeDocument.objects.all().delete()
+        self.assertEqual(*self.get_recipe())
+        self.assertTrue(
+            models.RecipeDocument.objects.filter(recipe_id=self.recipe.id).exists()
+        )
+
+    def test_missing_recipe(self):
+        """
+        GET /recipe/<int:pk>/ for a recipe that doesn't exist
+        """
+        response = self.client.get(reverse("recipe-detail", kwargs={"pk": 999999}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_child_writes_update_document(self):
+        """
+        adding a step, removing an ingredient and a tag change the document
+        """
+        token = get_token()
+        self.client.post(
+            reverse("recipe-steps", kwargs={"recipe_pk": self.recipe.id}),
+            {"instruction": "serve"},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=token,
+        )
+        self.client.delete(
+            reverse(
+                "recipe-ingredient-detail",
+                kwargs={
+                    "recipe_pk": self.recipe.id,
+                    "ingredient_pk": self.recipe.ingredients.first().id,
+                },
+            ),
+            HTTP_AUTHORIZATION=token,
+        )
+        self.recipe.tags.first().delete()
+
+        document, projection = self.get_recipe()
+        self.assertEqual(document, projection)
+        self.assertEqual(document["steps"][-1], "serve")
+        self.assertEqual(len(document["ingredients"]), 2)
+        self.assertEqual(len(document["tags"]), 1)
+
+    def test_rebuild_command(self):
+        """
+        manage.py rebuild_recipe_documents
+        """
+        make_recipes(3)
+        models.RecipeDocument.objects.all().delete()
+        call_command("rebuild_recipe_documents", batch_size=2, stdout=io.StringIO())
+        self.assertEqual(
+            models.RecipeDocument.objects.count(), models.Recipe.objects.count()
+        )
+
+    def test_check_command(self):
+        """
+        manage.py check_recipe_documents finds and fixes stale documents
+        """
+        models.RecipeDocument.objects.update(document="{}")
+        with self.assertRaises(CommandError):
+            call_command("check_recipe_documents", stdout=io.StringIO())
+
+        call_command("check_recipe_documents", fix=True, stdout=io.StringIO())
+        call_command("check_recipe_documents", stdout=io.StringIO())
+        self.assertEqual(*self.get_recipe())
+
+
+class ConditionalGetTestCase(TestCase):
+    """Tests for ETag and Last-Modified handling
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            TEST_USER_NAME, email=TEST_EMAIL, password=TEST_PASSWORD
+        )
+        self.recipe = baker.make(models.Recipe, author=self.user, servings=4)
+        baker.make(models.Tag, _quantity=2)
+
+    def test_recipe_detail_not_modified(self):
+        """
+        GET /recipe/<int:pk>/ with If-None-Match costs one query
+        """
+        url = reverse("recipe-detail", kwargs={"pk": self.recipe.id})
+        response = self.client.get(url)
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+
+    def test_child_write_changes_recipe_etag(self):
+        """
+        POST /recipe/<int:pk>/steps/ bumps the recipe version
+        """
+        url = reverse("recipe-detail", kwargs={"pk": self.recipe.id})
+        response = self.client.get(url)
+        self.client.post(
+            reverse("recipe-steps", kwargs={"recipe_pk": self.recipe.id}),
+            {"instruction": "mix"},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=get_token(),
+        )
+
+        modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(modified.status_code, 200)
+        self.assertNotEqual(modified["ETag"], response["ETag"])
+        self.assertEqual(modified.json()["steps"], ["mix"])
+        self.assertGreater(
+            models.Recipe.objects.get(id=self.recipe.id).last_updated_on,
+            self.recipe.last_updated_on,
+        )
+
+    def test_recipe_list_changes_with_recipe_tags(self):
+        """
+        GET /recipe/ is modified after a tag is added to a recipe
+        """
+        response = self.client.get(reverse("recipe"))
+        self.assertEqual(
+            self.client.get(
+                reverse("recipe"), HTTP_IF_NONE_MATCH=response["ETag"]
+            ).status_code,
+            304,
+        )
+
+        self.recipe.tags.add(models.Tag.objects.first())
+        modified = self.client.get(
+            reverse("recipe"), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(modified.status_code, 200)
+
+    def test_included_tag_rename_changes_etag(self):
+        """
+        GET /recipe/<int:pk>/?include=tags.value is modified after a tag rename
+        """
+        tag = models.Tag.objects.first()
+        self.recipe.tags.add(tag)
+        url = reverse("recipe-detail", kwargs={"pk": self.recipe.id})
+        plain = self.client.get(url)
+        included = self.client.get(f"{url}?include=tags.value")
+
+        tag.value = "renamed"
+        tag.save()
+        modified = self.client.get(
+            f"{url}?include=tags.value", HTTP_IF_NONE_MATCH=included["ETag"]
+        )
+        self.assertEqual(modified.status_code, 200)
+        self.assertEqual(modified.json()["tags"][0]["value"], "renamed")
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=plain["ETag"]).status_code, 304
+        )
+
+    def test_included_ingredient_rename_changes_list_etag(self):
+        """
+        GET /recipe/?include=ingredients.ingredient is modified after an
+        ingredient rename
+        """
+        ingredient = baker.make(models.Ingredient)
+        baker.make(
+            models.IngredientInRecipe,
+            recipe=self.recipe,
+            ingredient=ingredient,
+            amount="1.00",
+            unit="cup",
+        )
+        url = f'{reverse("recipe")}?include=ingredients.ingredient'
+        response = self.client.get(url)
+
+        ingredient.name = "renamed"
+        ingredient.save()
+        modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(modified.status_code, 200)
+        self.assertEqual(
+            modified.json()[0]["ingredients"][0]["ingredient"]["name"], "renamed"
+        )
+
+    def test_list_pages_have_different_etags(self):
+        """
+        GET /tag/ ETag depends on the query string
+        """
+        first = self.client.get(reverse("tag"))
+        second = self.client.get(f'{reverse("tag")}?page_size=1')
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+    def test_tag_list_not_modified_until_tag_created(self):
+        """
+        GET /tag/ with If-None-Match
+        """
+        response = self.client.get(reverse("tag"))
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(
+                reverse("tag"), HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+
+        self.assertEqual(not_modified.status_code, 304)
+        baker.make(models.Tag)
+        modified = self.client.get(reverse("tag"), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(modified.status_code, 200)
+        self.assertEqual(len(modified.json()), 3)
+
+    def test_ingredient_list_if_modified_since(self):
+        """
+        GET /ingredient/ with If-Modified-Since
+        """
+        baker.make(models.Ingredient)
+        response = self.client.get(reverse("ingredient"))
+        not_modified = self.client.get(
+            reverse("ingredient"), HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_meal_plans_not_modified(self):
+        """
+        GET /meal-plan/ with If-None-Match
+        """
+        token = get_token()
+        response = self.client.get(reverse("meal-plan"), HTTP_AUTHORIZATION=token)
+        not_modified = self.client.get(
+            reverse("meal-plan"),
+            HTTP_AUTHORIZATION=token,
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+        baker.make(models.MealPlan, user=self.user, recipe=self.recipe)
+        modified = self.client.get(
+            reverse("meal-plan"),
+            HTTP_AUTHORIZATION=token,
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(modified.status_code, 200)
+
+
+class RecipeFieldsIncludeTestCase(TestCase):
+    """Tests for ?fields= and ?include= on recipe endpoints
+    """
+
+    def setUp(self):
+        self.recipes = make_recipes(5)
+
+    def test_sparse_fields(self):
+        """
+        GET /recipe/?fields=name,cook_time,tags
+        """
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                f'{reverse("recipe")}?fields=name,cook_time,tags'
+            )
+
+        for recipe in response.json():
+            self.assertEqual(set(recipe), {"id", "name", "cook_time", "tags"})
+            self.assertEqual(len(recipe["tags"]), 2)
+
+    def test_include_query_count_is_fixed(self):
+        """
+        GET /recipe/?include=... only adds looking up the embedded versions
+        """
+        with self.assertNumQueries(5):
+            plain = self.client.get(
+                f'{reverse("recipe")}?fields={",".join(projections.RECIPE_FIELDS)}'
+            )
+
+        with self.assertNumQueries(6):
+            included = self.client.get(
+                f'{reverse("recipe")}?include=ingredients.ingredient,tags.value'
+            )
+
+        self.assertEqual(len(plain.json()), len(included.json()))
+        recipe = included.json()[0]
+        ingredient = models.Ingredient.objects.get(
+            id=recipe["ingredients"][0]["ingredient_id"]
+        )
+        self.assertEqual(
+            recipe["ingredients"][0]["ingredient"]["name"], ingredient.name
+        )
+        self.assertEqual(set(recipe["tags"][0]), {"id", "value", "kind"})
+
+    def test_include_adds_its_relation(self):
+        """
+        GET /recipe/<int:pk>/?fields=name&include=tags.value
+        """
+        response = self.client.get(
+            f'{reverse("recipe-detail", kwargs={"pk": self.recipes[0].id})}'
+            "?fields=name&include=tags.value"
+        )
+        self.assertEqual(set(response.json()), {"id", "name", "tags"})
+
+    def test_unknown_field(self):
+        """
+        GET /recipe/?fields=secret
+        """
+        response = self.client.get(f'{reverse("recipe")}?fields=name,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("fields", response.json()["errors"])
+
+    def test_unknown_include(self):
+        """
+        GET /recipe/<int:pk>/?include=author
+        """
+        response = self.client.get(
+            f'{reverse("recipe-detail", kwargs={"pk": self.recipes[0].id})}'
+            "?include=author"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ORJSONTestCase(TestCase):
+    """orjson renderer and parser behave like the stdlib ones"""
+
+    data = {
+        "amount": Decimal("1.50"),
+        "created_on": datetime(2020, 3, 1, 12, 30, 5, 120, tzinfo=timezone.utc),
+        "offset": datetime(2020, 3, 1, 12, 30, tzinfo=timezone(timedelta(hours=-5))),
+        "planned_date": date(2020, 3, 1),
+        "cook_time": timedelta(minutes=90),
+        "name": 'crème brûlée ☕ \u2028\u2029 "quoted" \\ \n\t\x01',
+        "steps": ("one", "two"),
+        "tags": {3},
+        1: None,
+        "nested": [{"value": 1.5, "flag": True}],
+    }
+
+    def test_render_matches_json_renderer(self):
+        """Same bytes as JSONRenderer"""
+        self.assertEqual(
+            ORJSONRenderer().render(self.data), JSONRenderer().render(self.data)
+        )
+
+    def test_render_serializer_data(self):
+        """Same bytes for serialized recipes"""
+        recipes = make_recipes(3)
+        data = projections.recipe_documents(
+            recipes, include=projections.RECIPE_INCLUDES
+        )
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_render_indent(self):
+        """Indented output is left to JSONRenderer"""
+        self.assertEqual(
+            ORJSONRenderer().render(self.data, "application/json; indent=2"),
+            JSONRenderer().render(self.data, "application/json; indent=2"),
+        )
+
+    def test_render_none(self):
+        """Empty body for no data"""
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_parse(self):
+        """Parses what JSONParser parses"""
+        body = JSONRenderer().render(self.data)
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(body)),
+            JSONParser().parse(io.BytesIO(body)),
+        )
+
+    def test_parse_error(self):
+        """Invalid JSON is a ParseError"""
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"name": '))
+
+
+class RecipeSearchTestCase(TestCase):
+    """Tests for /recipes/search/
+    """
+
+    def setUp(self):
+        self.tomato = baker.make(models.Ingredient, name="Roma Tomatoes")
+        self.soup = baker.make(
+            models.Recipe, name="Tomato Soup", description="A warm bowl for a cold day",
+        )
+        self.salad = baker.make(
+            models.Recipe,
+            name="Garden Salad",
+            description="Crunchy greens with a bit of tomato",
+        )
+        self.bread = baker.make(
+            models.Recipe, name="Crusty Bread", description="Bake until golden"
+        )
+        baker.make(
+            models.Step, recipe=self.bread, order=1, instruction="Knead the dough"
+        )
+        baker.make(
+            models.IngredientInRecipe,
+            recipe=self.salad,
+            ingredient=self.tomato,
+            amount="2.00",
+            unit="pieces",
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse("recipe-search"), {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe["id"] for recipe in response.json()]
+
+    def test_name_ranks_first(self):
+        """
+        GET /recipes/search/?q=tomato
+        """
+        self.assertEqual(self.search("tomato"), [self.soup.id, self.salad.id])
+
+    def test_steps_and_prefixes(self):
+        """
+        GET /recipes/search/?q=knea
+        """
+        self.assertEqual(self.search("knea"), [self.bread.id])
+
+    def test_every_word_must_match(self):
+        """
+        GET /recipes/search/?q=tomato greens
+        """
+        self.assertEqual(self.search("tomato greens"), [self.salad.id])
+        self.assertEqual(self.search("'\"*:&"), [])
+
+    def test_index_follows_writes(self):
+        """
+        renamed ingredients, edited and deleted recipes are reindexed
+        """
+        self.tomato.name = "Cherry Peppers"
+        self.tomato.save()
+        self.assertEqual(self.search("peppers"), [self.salad.id])
+
+        self.bread.name = "Sourdough"
+        self.bread.save()
+        self.assertEqual(self.search("sourdough"), [self.bread.id])
+
+        self.soup.delete()
+        self.assertEqual(self.search("tomato"), [self.salad.id])
+
+    def test_rebuild_command(self):
+        """
+        manage.py rebuild_search_index indexes recipes written in bulk
+        """
+        recipe = make_recipes(1)[0]
+        self.assertEqual(search.search(recipe.name, 10), [])
+
+        call_command("rebuild_search_index", stdout=io.StringIO())
+        self.assertEqual(search.search(recipe.name, 10)[0], recipe.id)
+
+    def test_fields(self):
+        """
+        GET /recipes/search/?q=soup&fields=name
+        """
+        response = self.client.get(
+            reverse("recipe-search"), {"q": "soup", "fields": "name"}
+        )
+        self.assertEqual(response.json(), [{"id": self.soup.id, "name": "Tomato Soup"}])
+
+    def test_query_required(self):
+        """
+        GET /recipes/search/
+        """
+        response = self.client.get(reverse("recipe-search"))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("q", response.json()["errors"])
+
+
+class TagIndexTestCase(TestCase):
+    """Tests for /recipes/?tags= and the tag bitmap index
+    """
+
+    def setUp(self):
+        self.italian = baker.make(models.Tag, value="Italian", kind="Cuisine")
+        self.mexican = baker.make(models.Tag, value="Mexican", kind="Cuisine")
+        self.crock_pot = baker.make(models.Tag, value="Crock-Pot", kind="Prep Method")
+        self.recipes = baker.make(models.Recipe, _quantity=4)
+        self.recipes[0].tags.add(self.italian, self.crock_pot)
+        self.recipes[1].tags.add(self.italian)
+        self.recipes[2].tags.add(self.mexican, self.crock_pot)
+
+    def filter(self, tags, **params):
+        response = self.client.get(reverse("recipe"), {"tags": tags, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def ids(self, *positions):
+        return [self.recipes[position].id for position in positions]
+
+    def test_and_or_not(self):
+        """
+        GET /recipe/?tags=1,2 ?tags=1|2 ?tags=-3
+        """
+        self.assertEqual(
+            [
+                recipe["id"]
+                for recipe in self.filter(f"{self.italian.id},{self.crock_pot.id}")
+            ],
+            self.ids(0),
+        )
+        self.assertEqual(
+            [
+                recipe["id"]
+                for recipe in self.filter(f"{self.italian.id}|{self.mexican.id}")
+            ],
+            self.ids(0, 1, 2),
+        )
+        self.assertEqual(
+            [recipe["id"] for recipe in self.filter(f"-{self.crock_pot.id}")],
+            self.ids(1, 3),
+        )
+
+    def test_facets(self):
+        """
+        GET /recipe/?tags=3&facets=true
+        """
+        response = self.filter(str(self.crock_pot.id), facets="true")
+
+        self.assertEqual(
+            [recipe["id"] for recipe in response["results"]], self.ids(0, 2)
+        )
+        self.assertEqual(
+            response["facets"],
+            {
+                "Cuisine": {str(self.italian.id): 1, str(self.mexican.id): 1},
+                "Prep Method": {str(self.crock_pot.id): 2},
+            },
+        )
+
+    def test_pages(self):
+        """
+        GET /recipe/?tags=-1&page_size=1 links to the next page
+        """
+        response = self.client.get(
+            reverse("recipe"),
+            {"tags": f"-{self.italian.id}", "page_size": 1, "ordering": "-id"},
+        )
+        self.assertEqual([recipe["id"] for recipe in response.json()], self.ids(3))
+
+        response = self.client.get(get_link(response, "next"))
+        self.assertEqual([recipe["id"] for recipe in response.json()], self.ids(2))
+        self.assertIsNone(get_link(response, "next"))
+
+    def test_incremental_update(self):
+        """
+        writes are applied to this worker's index without a rebuild
+        """
+        bitmaps = indexes.tag_index.get()
+        self.recipes[3].tags.add(self.mexican)
+        self.recipes[2].tags.remove(self.crock_pot)
+        recipe = baker.make(models.Recipe)
+        recipe.tags.add(self.crock_pot)
+
+        self.assertIs(indexes.tag_index.get(), bitmaps)
+        self.assertEqual(
+            [recipe["id"] for recipe in self.filter(str(self.crock_pot.id))],
+            [self.recipes[0].id, recipe.id],
+        )
+
+        self.recipes[0].delete()
+        self.italian.delete()
+        self.assertIs(indexes.tag_index.get(), bitmaps)
+        self.assertEqual(
+            [recipe["id"] for recipe in self.filter(f"-{self.crock_pot.id}")],
+            self.ids(1, 2, 3),
+        )
+
+    def test_other_worker_replays(self):
+        """
+        another worker replays a write instead of rebuilding its index
+        """
+        other_worker = indexes.TagIndex()
+        bitmaps = other_worker.get()
+        self.mexican.recipes.clear()
+        self.recipes[1].tags.add(self.crock_pot)
+
+        with self.assertNumQueries(2):
+            self.assertIs(other_worker.get(), bitmaps)
+        self.assertEqual(bitmaps.tags[self.mexican.id], 0)
+        self.assertEqual(
+            bitmaps.tags[self.crock_pot.id],
+            indexes.tag_index.get().tags[self.crock_pot.id],
+        )
+
+    def test_other_worker_rebuilds(self):
+        """
+        another worker rebuilds its index when the writes since its version
+        can't be replayed
+        """
+        other_worker = indexes.TagIndex()
+        bitmaps = other_worker.get()
+        versions.bump(versions.RECIPE_TAGS)
+        self.assertIsNot(other_worker.get(), bitmaps)
+
+        bitmaps = other_worker.get()
+        with mock.patch.object(indexes.base, "MAX_REPLAYED", 1):
+            self.mexican.recipes.clear()
+            self.italian.recipes.clear()
+            self.assertIsNot(other_worker.get(), bitmaps)
+
+        self.assertEqual(other_worker.get().tags[self.italian.id], 0)
+
+    def test_query_count(self):
+        """
+        GET /recipe/?tags= is answered from the index
+        """
+        self.filter(str(self.italian.id))
+        with self.assertNumQueries(3):
+            self.filter(f"{self.italian.id}|{self.mexican.id},-{self.crock_pot.id}")
+
+    def test_invalid(self):
+        """
+        GET /recipe/?tags=italian
+        """
+        response = self.client.get(reverse("recipe"), {"tags": "italian"})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(
+            reverse("recipe"), {"tags": self.italian.id, "ordering": "name"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class IngredientSuggestTestCase(TestCase):
+    """Tests for /ingredients/suggest/
+    """
+
+    def setUp(self):
+        self.tomato, self.paste, self.cherry, self.onion = (
+            baker.make(models.Ingredient, name=name)
+            for name in ("Tomato", "Tomato Paste", "Cherry Tomatoes", "Onion")
+        )
+
+    def suggest(self, query, **params):
+        response = self.client.get(
+            reverse("ingredient-suggest"), {"q": query, **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [ingredient["name"] for ingredient in response.json()]
+
+    def test_prefix_matches_first(self):
+        """
+        GET /ingredients/suggest/?q=tom
+        """
+        self.assertEqual(self.suggest("tom"), ["Tomato", "Tomato Paste"])
+        self.assertEqual(self.suggest("tom", limit=1), ["Tomato"])
+
+    def test_fuzzy(self):
+        """
+        GET /ingredients/suggest/?q=tomatoe
+        """
+        self.assertEqual(
+            self.suggest("tomatoe"), ["Tomato", "Cherry Tomatoes", "Tomato Paste"]
+        )
+        self.assertEqual(self.suggest("  "), [])
+
+    def test_usage_breaks_ties(self):
+        """
+        the ingredient used in more recipes wins between equally similar names
+        """
+        _, bulb = (
+            baker.make(models.Ingredient, name=name)
+            for name in ("Garlic Salt", "Garlic Bulb")
+        )
+        self.assertEqual(self.suggest("garlic"), ["Garlic Salt", "Garlic Bulb"])
+
+        baker.make(
+            models.IngredientInRecipe, ingredient=bulb, amount="1.00", unit="pieces"
+        )
+        self.assertEqual(self.suggest("garlic"), ["Garlic Bulb", "Garlic Salt"])
+
+    def test_index_follows_writes(self):
+        """
+        created, renamed and deleted ingredients are applied to the index
+        """
+        self.suggest("on")
+        trigrams = indexes.ingredient_index.get()
+
+        self.onion.name = "Shallot"
+        self.onion.save()
+        self.paste.delete()
+        baker.make(models.Ingredient, name="Tomatillo")
+
+        self.assertIs(indexes.ingredient_index.get(), trigrams)
+        self.assertEqual(self.suggest("on"), [])
+        self.assertEqual(self.suggest("sha"), ["Shallot"])
+        self.assertEqual(self.suggest("tom"), ["Tomato", "Tomatillo"])
+
+        other_worker = indexes.IngredientIndex()
+        other_worker.get()
+        self.cherry.delete()
+        self.assertEqual(
+            [
+                ingredient["name"]
+                for ingredient in other_worker.get().suggest("cherry", 10)
+            ],
+            [],
+        )
+
+
+class RecipeMatchTestCase(TestCase):
+    """Tests for /recipes/match/
+    """
+
+    def setUp(self):
+        self.ingredients = baker.make(models.Ingredient, _quantity=4)
+        self.small, self.large, self.other = baker.make(models.Recipe, _quantity=3)
+
+        for recipe, ingredients in (
+            (self.small, self.ingredients[:2]),
+            (self.large, self.ingredients),
+            (self.other, self.ingredients[2:3]),
+        ):
+            for ingredient in ingredients:
+                baker.make(
+                    models.IngredientInRecipe,
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount="1.00",
+                    unit="c",
+                )
+
+    def match(self, *ingredients):
+        response = self.client.get(
+            reverse("recipe-match"),
+            {"ingredients": ",".join(str(ingredient.id) for ingredient in ingredients)},
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranked_by_coverage(self):
+        """
+        GET /recipes/match/?ingredients=1,2
+        """
+        matches = self.match(*self.ingredients[:2])
+
+        self.assertEqual(
+            [(match["recipe"]["id"], match["coverage"]) for match in matches],
+            [(self.small.id, 1.0), (self.large.id, 0.5)],
+        )
+        self.assertEqual(matches[0]["missing"], [])
+        self.assertEqual(
+            matches[1]["missing"],
+            [
+                {"id": ingredient.id, "name": ingredient.name}
+                for ingredient in self.ingredients[2:]
+            ],
+        )
+        self.assertEqual(
+            matches[0]["recipe"],
+            json.loads(documents.get((self.small.id,))[self.small.id]),
+        )
+
+    def test_index_follows_writes(self):
+        """
+        ingredients added to and removed from recipes are applied to the index
+        """
+        self.match(self.ingredients[0])
+        postings = indexes.pantry_index.get()
+
+        baker.make(
+            models.IngredientInRecipe,
+            recipe=self.other,
+            ingredient=self.ingredients[0],
+            amount="1.00",
+            unit="c",
+        )
+        self.small.delete()
+
+        self.assertIs(indexes.pantry_index.get(), postings)
+        self.assertEqual(
+            [
+                (match["recipe"]["id"], match["coverage"])
+                for match in self.match(self.ingredients[0])
+            ],
+            [(self.other.id, 0.5), (self.large.id, 0.25)],
+        )
+
+    def test_fields(self):
+        """
+        GET /recipes/match/?ingredients=3&fields=name
+        """
+        response = self.client.get(
+            reverse("recipe-match"),
+            {"ingredients": self.ingredients[2].id, "fields": "name"},
+        )
+        self.assertEqual(
+            [match["recipe"] for match in response.json()],
+            [
+                {"id": self.other.id, "name": self.other.name},
+                {"id": self.large.id, "name": self.large.name},
+            ],
+        )
+
+    def test_query_count(self):
+        """
+        GET /recipes/match/ is answered from the index
+        """
+        self.match(self.ingredients[0])
+        with self.assertNumQueries(4):
+            self.match(*self.ingredients[1:])
+
+    def test_invalid(self):
+        """
+        GET /recipes/match/?ingredients=salt
+        """
+        response = self.client.get(reverse("recipe-match"), {"ingredients": "salt"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse("recipe-match")).status_code, 400)
+
+
+class SimilarRecipesTestCase(TestCase):
+    """Tests for /recipes/<pk>/similar/
+    """
+
+    def setUp(self):
+        self.ingredients = baker.make(models.Ingredient, _quantity=4)
+        self.tag = baker.make(models.Tag)
+        self.recipe, self.close, self.partial, self.other = baker.make(
+            models.Recipe, _quantity=4
+        )
+
+        for recipe, ingredients in (
+            (self.recipe, self.ingredients[:3]),
+            (self.close, self.ingredients[:3]),
+            (self.partial, self.ingredients[:1]),
+            (self.other, self.ingredients[3:]),
+        ):
+            for ingredient in ingredients:
+                baker.make(
+                    models.IngredientInRecipe,
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount="1.00",
+                    unit="c",
+                )
+
+        self.recipe.tags.add(self.tag)
+        self.partial.tags.add(self.tag)
+
+    def similar(self, recipe, **params):
+        response = self.client.get(
+            reverse("recipe-similar", kwargs={"pk": recipe.id}), params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def scores(self, recipe):
+        return {
+            suggestion["recipe"]["id"]: suggestion["score"]
+            for suggestion in self.similar(recipe)
+        }
+
+    def test_ranked_by_similarity(self):
+        """
+        GET /recipes/<pk>/similar/
+        """
+        similar = self.similar(self.recipe)
+
+        self.assertEqual(
+            [suggestion["recipe"]["id"] for suggestion in similar],
+            [self.close.id, self.partial.id],
+        )
+        self.assertGreater(similar[0]["score"], similar[1]["score"])
+        self.assertLessEqual(similar[0]["score"], 1)
+        self.assertEqual(
+            similar[0]["recipe"],
+            json.loads(documents.get((self.close.id,))[self.close.id]),
+        )
+        self.assertEqual(self.similar(self.other), [])
+
+    def test_rarer_matches_count_more(self):
+        """
+        sharing a tag only two recipes have beats sharing a common ingredient
+        """
+        scores = self.scores(self.partial)
+        self.assertGreater(scores[self.recipe.id], scores[self.close.id])
+
+    def test_stored(self):
+        """
+        suggestions are computed once and read back from SimilarRecipe
+        """
+        similar = self.similar(self.recipe)
+        self.assertEqual(
+            similarity.get(self.recipe.id),
+            [
+                (suggestion["recipe"]["id"], suggestion["score"])
+                for suggestion in similar
+            ],
+        )
+        with self.assertNumQueries(4):
+            self.assertEqual(self.similar(self.recipe), similar)
+
+    def test_empty_stored(self):
+        """
+        a recipe nothing is similar to isn't recomputed on every read
+        """
+        self.assertEqual(self.similar(self.other), [])
+        self.assertTrue(
+            models.SimilarRecipesVersion.objects.filter(recipe=self.other).exists()
+        )
+        with mock.patch.object(similarity, "compute") as compute:
+            self.assertEqual(self.similar(self.other), [])
+
+        compute.assert_not_called()
+
+    def test_other_recipes_recomputed(self):
+        """
+        a recipe starting to share an ingredient joins the suggestions of
+        recipes it wasn't listed for, and rarer ingredients count for more
+        """
+        before = self.scores(self.recipe)
+        self.assertNotIn(self.other.id, before)
+        baker.make(
+            models.IngredientInRecipe,
+            recipe=self.other,
+            ingredient=self.ingredients[0],
+            amount="1.00",
+            unit="c",
+        )
+
+        after = self.scores(self.recipe)
+        self.assertIn(self.other.id, after)
+        # ingredients[0] is in more recipes, so sharing it counts for less
+        self.assertLess(after[self.partial.id], before[self.partial.id])
+
+    def test_ingredient_changes(self):
+        """
+        suggestions of a changed recipe and of the recipes listing it are
+        recomputed
+        """
+        before = self.scores(self.recipe)
+        self.scores(self.close)
+
+        for ingredient in self.ingredients[1:3]:
+            baker.make(
+                models.IngredientInRecipe,
+                recipe=self.partial,
+                ingredient=ingredient,
+                amount="1.00",
+                unit="c",
+            )
+
+        after = self.scores(self.recipe)
+        self.assertGreater(after[self.partial.id], before[self.partial.id])
+        self.assertEqual(list(after)[0], self.partial.id)
+
+    def test_tag_changes(self):
+        """
+        removing a tag changes the suggestions
+        """
+        self.assertIn(self.partial.id, self.scores(self.close))
+        self.partial.tags.remove(self.tag)
+        self.recipe.tags.remove(self.tag)
+
+        scores = self.scores(self.recipe)
+        self.assertEqual(scores[self.close.id], 1.0)
+
+    def test_unrelated_write_keeps_suggestions(self):
+        """
+        a write only makes stale the suggestions of recipes it can change
+        """
+        self.scores(self.recipe)
+        self.scores(self.other)
+        baker.make(
+            models.IngredientInRecipe,
+            recipe=self.other,
+            ingredient=baker.make(models.Ingredient),
+            amount="1.00",
+            unit="c",
+        )
+
+        with mock.patch.object(similarity, "compute") as compute:
+            self.scores(self.recipe)
+        compute.assert_not_called()
+        self.assertFalse(
+            models.SimilarRecipesVersion.objects.filter(
+                recipe=self.other, computed=F("version")
+            ).exists()
+        )
+
+    def assert_vectors_follow_writes(self):
+        self.scores(self.recipe)
+        vectors = indexes.vector_index.get()
+        recipe = baker.make(models.Recipe)
+        for ingredient in self.ingredients[2:]:
+            baker.make(
+                models.IngredientInRecipe,
+                recipe=recipe,
+                ingredient=ingredient,
+                amount="1.00",
+                unit="c",
+            )
+        recipe.tags.add(self.tag)
+        self.partial.tags.clear()
+        self.close.delete()
+
+        self.assertIs(indexes.vector_index.get(), vectors)
+        recipe_ids = list(models.Recipe.objects.values_list("id", flat=True))
+        self.assertEqual(
+            dict(vectors.most_similar(recipe_ids, 10)),
+            dict(indexes.VectorIndex().build().most_similar(recipe_ids, 10)),
+        )
+
+    def test_vectors_follow_writes(self):
+        """
+        writes change the vector rows in place and score like a rebuild
+        """
+        self.assert_vectors_follow_writes()
+
+    def test_vectors_compacted(self):
+        """
+        changed vector rows folded into the matrix score like a rebuild
+        """
+        with mock.patch.object(indexes.vectors, "COMPACT_AFTER", 0):
+            self.assert_vectors_follow_writes()
+
+    def test_deleted_recipe(self):
+        """
+        deleted recipes are dropped from the suggestions listing them
+        """
+        self.scores(self.recipe)
+        self.close.delete()
+        self.assertEqual(list(self.scores(self.recipe)), [self.partial.id])
+
+    def test_fields(self):
+        """
+        GET /recipes/<pk>/similar/?fields=name
+        """
+        self.assertEqual(
+            [
+                suggestion["recipe"]
+                for suggestion in self.similar(self.recipe, fields="name")
+            ],
+            [
+                {"id": self.close.id, "name": self.close.name},
+                {"id": self.partial.id, "name": self.partial.name},
+            ],
+        )
+
+    def test_not_found(self):
+        """
+        GET /recipes/<pk>/similar/ of a recipe that doesn't exist
+        """
+        response = self.client.get(reverse("recipe-similar", kwargs={"pk": 0}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_rebuild_command(self):
+        """
+        manage.py rebuild_similar_recipes computes every recipe's suggestions
+        """
+        recipes = make_recipes(3)
+        call_command("rebuild_similar_recipes", batch_size=2, stdout=io.StringIO())
+
+        self.assertEqual(
+            models.SimilarRecipe.objects.filter(recipe__in=recipes).count(), 6
+        )
+        self.assertEqual(
+            [score for _, score in similarity.get(recipes[0].id)], [1.0, 1.0]
+        )
+
+    def test_rebuild_command_stale(self):
+        """
+        manage.py rebuild_similar_recipes --stale only computes the
+        suggestions that are missing or stale
+        """
+        self.scores(self.recipe)
+        self.scores(self.other)
+        self.partial.tags.remove(self.tag)
+
+        with mock.patch.object(
+            similarity, "compute", wraps=similarity.compute
+        ) as compute:
+            call_command("rebuild_similar_recipes", stale=True, stdout=io.StringIO())
+
+        self.assertEqual(
+            sorted(compute.call_args[0][0]),
+            [self.recipe.id, self.close.id, self.partial.id],
+        )
+        with mock.patch.object(similarity, "compute") as compute:
+            self.scores(self.recipe)
+        compute.assert_not_called()
+
+
+class ShoppingListTestCase(TestCase):
+    """Tests for /meal-plan/shopping-list/ and unit conversion
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            TEST_USER_NAME, email=TEST_EMAIL, password=TEST_PASSWORD
+        )
+        self.token = get_token()
+        self.flour, self.milk, self.eggs = (
+            baker.make(models.Ingredient, name=name)
+            for name in ("flour", "milk", "eggs")
+        )
+        self.pancakes = baker.make(models.Recipe, servings=4)
+        self.crepes = baker.make(models.Recipe, servings=2)
+
+        for recipe, ingredients in (
+            (
+                self.pancakes,
+                (
+                    (self.flour, "1.00", "c"),
+                    (self.milk, "250", "ml"),
+                    (self.eggs, "2", "pieces"),
+                ),
+            ),
+            (
+                self.crepes,
+                (
+                    (self.flour, "2", "tbsp"),
+                    (self.milk, "1", "c"),
+                    (self.eggs, "1", "pieces"),
+                ),
+            ),
+        ):
+            for ingredient, amount, unit in ingredients:
+                baker.make(
+                    models.IngredientInRecipe,
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=amount,
+                    unit=unit,
+                )
+
+        self.today = date.today()
+        baker.make(
+            models.MealPlan,
+            user=self.user,
+            recipe=self.pancakes,
+            planned_date=self.today,
+        )
+        baker.make(
+            models.MealPlan,
+            user=self.user,
+            recipe=self.crepes,
+            planned_date=self.today + timedelta(days=1),
+            servings=4,
+        )
+        baker.make(
+            models.MealPlan,
+            user=self.user,
+            recipe=self.crepes,
+            planned_date=self.today + timedelta(days=10),
+        )
+        baker.make(models.MealPlan, recipe=self.pancakes, planned_date=self.today)
+
+    def shopping_list(self, **params):
+        response = self.client.get(
+            reverse("meal-plan-shopping-list"), params, HTTP_AUTHORIZATION=self.token
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_totals(self):
+        """
+        GET /meal-plan/shopping-list/ sums the coming week's meals, scaled to
+        the planned servings
+        """
+        shopping_list = self.shopping_list()
+
+        self.assertEqual(shopping_list["start"], self.today.isoformat())
+        self.assertEqual(
+            shopping_list["end"], (self.today + timedelta(days=6)).isoformat()
+        )
+        self.assertEqual(
+            [
+                (item["name"], item["amount"], item["unit"])
+                for item in shopping_list["ingredients"]
+            ],
+            [
+                ("eggs", "4.00", "pieces"),
+                ("flour", "1.25", "c"),
+                ("milk", "725.00", "ml"),
+            ],
+        )
+        self.assertEqual(shopping_list["ingredients"][0]["ingredient_id"], self.eggs.id)
+
+    def test_date_range(self):
+        """
+        GET /meal-plan/shopping-list/?start=<date>&end=<date>
+        """
+        shopping_list = self.shopping_list(
+            start=self.today.isoformat(), end=self.today.isoformat()
+        )
+        self.assertEqual(
+            [
+                (item["name"], item["amount"], item["unit"])
+                for item in shopping_list["ingredients"]
+            ],
+            [
+                ("eggs", "2.00", "pieces"),
+                ("flour", "1.00", "c"),
+                ("milk", "250.00", "ml"),
+            ],
+        )
+        self.assertEqual(
+            self.shopping_list(start=(self.today - timedelta(days=7)).isoformat())[
+                "ingredients"
+            ],
+            [],
+        )
+
+    def test_system(self):
+        """
+        GET /meal-plan/shopping-list/?system=us
+        """
+        self.assertEqual(
+            [
+                (item["name"], item["amount"], item["unit"])
+                for item in self.shopping_list(system="us")["ingredients"]
+            ],
+            [
+                ("eggs", "4.00", "pieces"),
+                ("flour", "1.25", "c"),
+                ("milk", "3.00", "c"),
+            ],
+        )
+
+    def test_query_count(self):
+        """
+        the meals, recipes and ingredients are read in one query
+        """
+        with self.assertNumQueries(4):
+            self.shopping_list()
+
+    def test_invalid_dates(self):
+        """
+        GET /meal-plan/shopping-list/?start=tomorrow
+        """
+        for params in (
+            {"start": "tomorrow"},
+            {"start": self.today.isoformat(), "end": "2000-01-01"},
+        ):
+            response = self.client.get(
+                reverse("meal-plan-shopping-list"),
+                params,
+                HTTP_AUTHORIZATION=self.token,
+            )
+            self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(
+            self.client.get(reverse("meal-plan-shopping-list")).status_code, 401
+        )
+
+    def test_convert(self):
+        """
+        units of the same dimension convert into each other
+        """
+        self.assertEqual(units.convert(Decimal("3"), "tsp", "tbsp"), Decimal("1"))
+        self.assertEqual(units.convert(Decimal("2"), "lb", "oz"), Decimal("32"))
+        self.assertEqual(
+            units.to_base(Decimal("2"), "pieces"), (Decimal("2"), "pieces")
+        )
+        with self.assertRaises(ValueError):
+            units.convert(Decimal("1"), "c", "g")
+
+    def test_kitchen_units(self):
+        """
+        amounts are put in the unit a cook would measure them with
+        """
+        for amount, unit, system, expected in (
+            ("0.0625", "c", None, ("1.00", "tbsp")),
+            ("1500", "ml", None, ("1.50", "l")),
+            ("1234", "g", None, ("1230.00", "g")),
+            ("100", "g", "us", ("3.50", "oz")),
+            ("454", "g", "us", ("1.00", "lb")),
+            ("500", "g", "us", ("17.75", "oz")),
+            ("0.001", "tsp", None, ("0.13", "tsp")),
+            ("1.1", "pieces", "metric", ("1.00", "pieces")),
+        ):
+            self.assertEqual(
+                units.kitchen(Decimal(amount), unit, system),
+                (Decimal(expected[0]), expected[1]),
+            )
+
+    def test_kitchen_units_keep_amounts(self):
+        """
+        a larger unit is only used when rounding keeps the amount within 5%
+        """
+        for amount, unit, expected in (
+            ("5", "tbsp", ("5.00", "tbsp")),
+            ("7", "tbsp", ("7.00", "tbsp")),
+            ("10", "tsp", ("10.00", "tsp")),
+            ("8", "tbsp", ("0.50", "c")),
+            ("9", "tsp", ("3.00", "tbsp")),
+            ("1.02", "l", ("1.00", "l")),
+        ):
+            self.assertEqual(
+                units.kitchen(Decimal(amount), unit),
+                (Decimal(expected[0]), expected[1]),
+            )
+
+
+class RecipeScalingTestCase(TestCase):
+    """Tests for /recipes/<pk>/?servings=&system=
+    """
+
+    def setUp(self):
+        self.recipe = baker.make(models.Recipe, servings=4)
+        for amount, unit in (("2", "c"), ("3", "tbsp"), ("3", "pieces"), ("250", "ml")):
+            baker.make(
+                models.IngredientInRecipe,
+                recipe=self.recipe,
+                amount=amount,
+                unit=unit,
+                specifier="",
+            )
+        self.url = reverse("recipe-detail", kwargs={"pk": self.recipe.id})
+
+    def get(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def amounts(self, document):
+        return [
+            (ingredient["amount"], ingredient["unit"])
+            for ingredient in document["ingredients"]
+        ]
+
+    def test_servings(self):
+        """
+        GET /recipes/<pk>/?servings=2
+        """
+        document = self.get(servings=2)
+        self.assertEqual(document["servings"], 2)
+        self.assertEqual(
+            self.amounts(document),
+            [("1.00", "c"), ("1.50", "tbsp"), ("1.50", "pieces"), ("125.00", "ml")],
+        )
+
+    def test_servings_and_system(self):
+        """
+        GET /recipes/<pk>/?servings=8&system=metric
+        """
+        self.assertEqual(
+            self.amounts(self.get(servings=8, system="metric")),
+            [("945.00", "ml"), ("89.00", "ml"), ("6.00", "pieces"), ("500.00", "ml")],
+        )
+        document = self.get(system="us")
+        self.assertEqual(document["servings"], 4)
+        self.assertEqual(
+            self.amounts(document),
+            [("2.00", "c"), ("3.00", "tbsp"), ("3.00", "pieces"), ("17.00", "tbsp")],
+        )
+
+    def test_fields(self):
+        """
+        GET /recipes/<pk>/?servings=2&fields=ingredients
+        """
+        document = self.get(servings=2, fields="ingredients")
+        self.assertNotIn("servings", document)
+        self.assertEqual(self.amounts(document)[0], ("1.00", "c"))
+
+    def test_invalid(self):
+        """
+        GET /recipes/<pk>/?servings=0&system=imperial
+        """
+        response = self.client.get(self.url, {"servings": 0, "system": "imperial"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()["errors"]), {"servings", "system"})
+        response = self.client.get(self.url, {"servings": "two"})
+        self.assertEqual(response.status_code, 400)
+
+
+class SubRecipeTestCase(TestCase):
+    """Tests for /recipes/<pk>/flattened/, /recipes/<pk>/used-in/, the
+    sub-recipe closure and cycles
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            TEST_USER_NAME, email=TEST_EMAIL, password=TEST_PASSWORD
+        )
+        self.dough = baker.make(models.Recipe, servings=2, author=self.user)
+        self.sauce = baker.make(models.Recipe, servings=4, author=self.user)
+        self.pizza = baker.make(models.Recipe, servings=2, author=self.user)
+        self.ingredients = {
+            name: baker.make(models.Ingredient, name=name, recipe=recipe)
+            for name, recipe in (
+                ("flour", None),
+                ("water", None),
+                ("tomato", None),
+                ("salt", None),
+                ("cheese", None),
+                ("pizza dough", self.dough),
+                ("pizza sauce", self.sauce),
+                ("pizza", self.pizza),
+            )
+        }
+        for recipe, ingredients in (
+            (self.dough, (("flour", "2", "c"), ("water", "1", "c"))),
+            (self.sauce, (("tomato", "4", "pieces"), ("salt", "1", "tsp"))),
+            (
+                self.pizza,
+                (
+                    ("pizza dough", "2", "n/a"),
+                    ("pizza sauce", "1", "n/a"),
+                    ("cheese", "200", "g"),
+                    ("salt", "1", "tsp"),
+                ),
+            ),
+        ):
+            for name, amount, unit in ingredients:
+                baker.make(
+                    models.IngredientInRecipe,
+                    recipe=recipe,
+                    ingredient=self.ingredients[name],
+                    amount=amount,
+                    unit=unit,
+                )
+
+    def flattened(self, recipe, **params):
+        response = self.client.get(
+            reverse("recipe-flattened", kwargs={"pk": recipe.id}), params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def amounts(self, flattened):
+        return [
+            (ingredient["name"], ingredient["amount"], ingredient["unit"])
+            for ingredient in flattened["ingredients"]
+        ]
+
+    def test_flattened(self):
+        """
+        GET /recipes/<pk>/flattened/
+        """
+        flattened = self.flattened(self.pizza)
+
+        self.assertEqual(flattened["recipe_id"], self.pizza.id)
+        self.assertEqual(flattened["servings"], 2)
+        self.assertEqual(
+            self.amounts(flattened),
+            [
+                ("cheese", "200.00", "g"),
+                ("flour", "2.00", "c"),
+                ("salt", "1.25", "tsp"),
+                ("tomato", "1.00", "pieces"),
+                ("water", "1.00", "c"),
+            ],
+        )
+
+    def test_servings(self):
+        """
+        GET /recipes/<pk>/flattened/?servings=4&system=metric
+        """
+        self.assertEqual(
+            self.amounts(self.flattened(self.pizza, servings=4, system="metric")),
+            [
+                ("cheese", "400.00", "g"),
+                ("flour", "945.00", "ml"),
+                ("salt", "12.00", "ml"),
+                ("tomato", "2.00", "pieces"),
+                ("water", "475.00", "ml"),
+            ],
+        )
+
+    def test_one_query(self):
+        """
+        every level is read with one recursive query
+        """
+        party = baker.make(models.Recipe, servings=8)
+        baker.make(
+            models.IngredientInRecipe,
+            recipe=party,
+            ingredient=self.ingredients["pizza"],
+            amount="4",
+            unit="n/a",
+        )
+
+        with self.assertNumQueries(1):
+            flattened = subrecipes.flatten(party.id)
+
+        self.assertEqual(
+            [ingredient["name"] for ingredient in flattened["ingredients"]],
+            ["cheese", "flour", "salt", "tomato", "water"],
+        )
+        self.assertEqual(flattened["ingredients"][1]["amount"], "4.00")
+
+    def test_stored(self):
+        """
+        flattened recipes are stored and dropped with their descendants'
+        changes
+        """
+        self.flattened(self.pizza)
+        self.assertTrue(
+            models.FlattenedRecipe.objects.filter(recipe=self.pizza).exists()
+        )
+        with self.assertNumQueries(2):
+            self.flattened(self.pizza)
+
+        water = models.IngredientInRecipe.objects.get(
+            recipe=self.dough, ingredient=self.ingredients["water"]
+        )
+        water.amount = "2"
+        water.save()
+
+        self.assertFalse(
+            models.FlattenedRecipe.objects.filter(recipe=self.pizza).exists()
+        )
+        self.assertEqual(self.amounts(self.flattened(self.pizza))[-1][1], "2.00")
+
+    def test_cycles_rejected(self):
+        """
+        POST /recipes/<pk>/ingredients/ with the recipe or one of its ancestors
+        """
+        token = get_token()
+
+        for recipe, ingredient in (
+            (self.dough, "pizza dough"),
+            (self.dough, "pizza"),
+            (self.sauce, "pizza"),
+        ):
+            response = self.client.post(
+                reverse("recipe-ingredients", kwargs={"recipe_pk": recipe.id}),
+                {
+                    "amount": "1.00",
+                    "unit": "n/a",
+                    "specifier": "",
+                    "ingredient_id": self.ingredients[ingredient].id,
+                },
+                content_type="application/json",
+                HTTP_AUTHORIZATION=token,
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("ingredient_id", response.json()["errors"])
+
+        serializer = serializers.IngredientSerializer(
+            self.ingredients["salt"], data={"name": "salt", "recipe_id": self.pizza.id}
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("recipe_id", serializer.errors)
+
+    def test_not_found(self):
+        """
+        GET /recipes/<pk>/flattened/ of a recipe that doesn't exist
+        """
+        response = self.client.get(reverse("recipe-flattened", kwargs={"pk": 0}))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse("recipe-used-in", kwargs={"pk": 0}))
+        self.assertEqual(response.status_code, 404)
+
+    def closure(self):
+        return set(
+            models.RecipeDependency.objects.values_list(
+                "ancestor_id", "descendant_id", "depth"
+            )
+        )
+
+    def test_closure(self):
+        """
+        every recipe is linked to every sub-recipe below it
+        """
+        party = baker.make(models.Recipe, servings=8)
+        baker.make(
+            models.IngredientInRecipe,
+            recipe=party,
+            ingredient=self.ingredients["pizza"],
+            amount="4",
+            unit="n/a",
+        )
+
+        self.assertEqual(
+            self.closure(),
+            {
+                (self.pizza.id, self.dough.id, 1),
+                (self.pizza.id, self.sauce.id, 1),
+                (party.id, self.pizza.id, 1),
+                (party.id, self.dough.id, 2),
+                (party.id, self.sauce.id, 2),
+            },
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                subrecipes.ancestors((self.dough.id,)),
+                {self.dough.id, self.pizza.id, party.id},
+            )
+
+        models.IngredientInRecipe.objects.get(
+            recipe=self.pizza, ingredient=self.ingredients["pizza dough"]
+        ).delete()
+        sauce = self.ingredients["pizza sauce"]
+        sauce.recipe = None
+        sauce.save()
+
+        self.assertEqual(self.closure(), {(party.id, self.pizza.id, 1)})
+
+    def test_relink(self):
+        """
+        rows written in bulk are linked by subrecipes.relink
+        """
+        party = baker.make(models.Recipe, servings=8)
+        models.IngredientInRecipe.objects.bulk_create(
+            (
+                models.IngredientInRecipe(
+                    recipe=party,
+                    ingredient=self.ingredients["pizza dough"],
+                    amount="1.00",
+                    unit="n/a",
+                ),
+            )
+        )
+        subrecipes.relink((party.id,))
+
+        self.assertIn((party.id, self.dough.id, 1), self.closure())
+
+    def test_used_in(self):
+        """
+        GET /recipes/<pk>/used-in/
+        """
+        party = baker.make(models.Recipe, servings=8)
+        baker.make(
+            models.IngredientInRecipe,
+            recipe=party,
+            ingredient=self.ingredients["pizza"],
+            amount="4",
+            unit="n/a",
+        )
+        response = self.client.get(
+            reverse("recipe-used-in", kwargs={"pk": self.dough.id})
+        )
+
+        self.assertEqual(
+            [(used["recipe"]["id"], used["depth"]) for used in response.json()],
+            [(self.pizza.id, 1), (party.id, 2)],
+        )
+        self.assertEqual(
+            response.json()[0]["recipe"],
+            json.loads(documents.get((self.pizza.id,))[self.pizza.id]),
+        )
+        response = self.client.get(
+            reverse("recipe-used-in", kwargs={"pk": self.dough.id}), {"fields": "name"},
+        )
+        self.assertEqual(
+            response.json()[0],
+            {"recipe": {"id": self.pizza.id, "name": self.pizza.name}, "depth": 1},
+        )
+
+
+class NestedRecipeWriteTestCase(TestCase):
+    """Tests for POST /recipe/ and PUT /recipe/<pk>/ with ingredients, steps
+    and tags
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            TEST_USER_NAME, email=TEST_EMAIL, password=TEST_PASSWORD
+        )
+        self.token = get_token()
+        self.ingredients = baker.make(models.Ingredient, recipe=None, _quantity=6)
+        self.tags = baker.make(models.Tag, _quantity=3)
+        self.dough = baker.make(models.Recipe, servings=2, author=self.user)
+        self.dough_ingredient = baker.make(
+            models.Ingredient, name="pizza dough", recipe=self.dough
+        )
+
+    def recipe(self, name="pizza", ingredients=(), tags=(), **extra):
+        return {
+            "name": name,
+            "description": "some description",
+            "servings": 2,
+            "cook_time": "1 hour",
+            "ingredients": [
+                {"amount": "1.50", "unit": "c", "ingredient_id": ingredient.id}
+                for ingredient in ingredients
+            ],
+            "steps": ["mix", "bake"],
+            "tags": [tag.id for tag in tags],
+            **extra,
+        }
+
+    def post(self, data):
+        return self.client.post(
+            reverse("recipe"),
+            data,
+            content_type="application/json",
+            HTTP_AUTHORIZATION=self.token,
+        )
+
+    def put(self, recipe_id, data):
+        return self.client.put(
+            reverse("recipe-detail", kwargs={"pk": recipe_id}),
+            data,
+            content_type="application/json",
+            HTTP_AUTHORIZATION=self.token,
+        )
+
+    def tagged(self, tag):
+        response = self.client.get(reverse("recipe"), {"tags": tag.id})
+        return [recipe["id"] for recipe in response.json()]
+
+    def matched(self, ingredient):
+        response = self.client.get(
+            reverse("recipe-match"), {"ingredients": ingredient.id}
+        )
+        return [match["recipe"]["id"] for match in response.json()]
+
+    def test_post(self):
+        """
+        POST /recipe/ with ingredients, steps and tags
+        """
+        ingredients = (*self.ingredients[:2], self.dough_ingredient)
+        response = self.post(self.recipe(ingredients=ingredients, tags=self.tags[:2]))
+        self.assertEqual(response.status_code, 201)
+        recipe = response.json()
+
+        self.assertEqual(
+            [ingredient["ingredient_id"] for ingredient in recipe["ingredients"]],
+            [ingredient.id for ingredient in ingredients],
+        )
+        self.assertEqual(recipe["steps"], ["mix", "bake"])
+        self.assertEqual(sorted(recipe["tags"]), [tag.id for tag in self.tags[:2]])
+        self.assertEqual(
+            json.loads(documents.get((recipe["id"],))[recipe["id"]]), recipe
+        )
+        self.assertEqual(self.tagged(self.tags[0]), [recipe["id"]])
+        self.assertEqual(self.matched(self.ingredients[0]), [recipe["id"]])
+        self.assertEqual(
+            subrecipes.ancestors((self.dough.id,)), {self.dough.id, recipe["id"]}
+        )
+
+    def test_post_query_count(self):
+        """
+        POST /recipe/ takes as many queries for one ingredient as for many
+        """
+        self.post(self.recipe("warm up", self.ingredients[:1], self.tags[:1]))
+        with CaptureQueriesContext(connection) as one:
+            self.post(self.recipe("one", self.ingredients[:1], self.tags[:1]))
+        with CaptureQueriesContext(connection) as many:
+            self.post(self.recipe("many", self.ingredients, self.tags))
+
+        self.assertEqual(len(one), len(many))
+
+    def test_post_invalid(self):
+        """
+        POST /recipe/ with unknown or repeated IDs writes nothing
+        """
+        unknown = {"amount": "1", "unit": "c", "ingredient_id": 999999}
+        for data in (
+            {**self.recipe(), "tags": [self.tags[0].id, 999999]},
+            {**self.recipe(), "ingredients": [unknown]},
+            self.recipe(ingredients=(self.ingredients[0], self.ingredients[0])),
+            self.recipe(steps=["mix", ""]),
+        ):
+            response = self.post(data)
+            self.assertEqual(response.status_code, 400)
+
+        self.assertFalse(models.Recipe.objects.filter(name="pizza").exists())
+
+    def test_put(self):
+        """
+        PUT /recipe/<pk>/ replaces the ingredients, steps and tags given
+        """
+        recipe = self.post(
+            self.recipe(ingredients=self.ingredients[:2], tags=self.tags[:2])
+        ).json()
+
+        response = self.put(
+            recipe["id"],
+            self.recipe(
+                "pizza bianca",
+                (self.ingredients[1], self.ingredients[2], self.dough_ingredient),
+                self.tags[2:],
+                steps=["stretch", "top", "bake"],
+            ),
+        )
+        self.assertEqual(response.status_code, 200)
+        recipe = response.json()
+
+        self.assertEqual(recipe["name"], "pizza bianca")
+        self.assertEqual(
+            [ingredient["ingredient_id"] for ingredient in recipe["ingredients"]],
+            [self.ingredients[1].id, self.ingredients[2].id, self.dough_ingredient.id],
+        )
+        self.assertEqual(recipe["steps"], ["stretch", "top", "bake"])
+        self.assertEqual(
+            json.loads(documents.get((recipe["id"],))[recipe["id"]]), recipe
+        )
+        self.assertEqual(self.tagged(self.tags[0]), [])
+        self.assertEqual(self.tagged(self.tags[2]), [recipe["id"]])
+        self.assertEqual(self.matched(self.ingredients[0]), [])
+        self.assertEqual(self.matched(self.ingredients[2]), [recipe["id"]])
+        self.assertEqual(
+            subrecipes.ancestors((self.dough.id,)), {self.dough.id, recipe["id"]}
+        )
+
+    def test_put_keeps_relations_left_out(self):
+        """
+        PUT /recipe/<pk>/ without ingredients, steps or tags keeps them
+        """
+        recipe = self.post(
+            self.recipe(ingredients=self.ingredients[:2], tags=self.tags[:2])
+        ).json()
+        data = self.recipe("renamed")
+        for relation in ("ingredients", "steps", "tags"):
+            data.pop(relation)
+
+        response = self.put(recipe["id"], data)
+        self.assertEqual(response.status_code, 200)
+
+        renamed = response.json()
+        self.assertEqual(renamed["name"], "renamed")
+        for relation in ("ingredients", "steps", "tags"):
+            self.assertEqual(renamed[relation], recipe[relation])
+
+        emptied = self.put(recipe["id"], {**data, "steps": []}).json()
+        self.assertEqual(emptied["steps"], [])
+        self.assertEqual(emptied["tags"], recipe["tags"])
+
+    def test_writes_refresh_once(self):
+        """
+        POST and PUT /recipe/<pk>/ rebuild the recipe's document once
+        """
+        with mock.patch.object(
+            documents, "rebuild", wraps=documents.rebuild
+        ) as rebuild:
+            recipe = self.post(
+                self.recipe(ingredients=self.ingredients[:2], tags=self.tags[:2])
+            ).json()
+            self.put(recipe["id"], self.recipe("renamed", self.ingredients[2:4]))
+
+        self.assertEqual(
+            [call.args[0] for call in rebuild.call_args_list],
+            [(recipe["id"],), (recipe["id"],)],
+        )
+
+    def test_put_invalid(self):
+        """
+        PUT /recipe/<pk>/ with invalid data or a cycle is rejected
+        """
+        response = self.put(self.dough.id, self.recipe(servings=0))
+        self.assertEqual(response.status_code, 400)
+
+        response = self.put(
+            self.dough.id, self.recipe("dough", (self.dough_ingredient,))
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            set(response.json()["errors"]), {"ingredients"},
+        )
+        self.assertFalse(self.dough.ingredients.exists())
+
+
+class RecipeTransferTestCase(TestCase):
+    """Tests for /recipes/export/, /recipes/import/ and the export_recipes and
+    import_recipes commands
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            TEST_USER_NAME, email=TEST_EMAIL, password=TEST_PASSWORD, is_staff=True
+        )
+        User.objects.create_user(
+            TEST_USER_NAME1, email=TEST_EMAIL1, password=TEST_PASSWORD
+        )
+        self.token = get_token()
+        self.dough = baker.make(
+            models.Recipe, name="dough", servings=2, author=self.user
+        )
+        self.pizza = baker.make(
+            models.Recipe, name="pizza", servings=2, author=self.user
+        )
+        baker.make(models.Ingredient, name="pizza dough", recipe=self.dough)
+        tag = baker.make(models.Tag, value="italian", kind="Cuisine")
+        self.pizza.tags.add(tag)
+        for recipe, ingredients in (
+            (self.dough, (("flour", "2.00", "c"), ("water", "1.00", "c"))),
+            (self.pizza, (("pizza dough", "1.00", "n/a"), ("cheese", "200.00", "g"))),
+        ):
+            for name, amount, unit in ingredients:
+                baker.make(
+                    models.IngredientInRecipe,
+                    recipe=recipe,
+                    ingredient=models.Ingredient.objects.get_or_create(name=name)[0],
+                    amount=amount,
+                    unit=unit,
+                    specifier="",
+                )
+        for order, instruction in enumerate(("mix", "bake"), 1):
+            baker.make(
+                models.Step,
+                recipe=self.pizza,
+                order=order * models.Step.ORDER_GAP,
+                instruction=instruction,
+            )
+
+    def export(self):
+        response = self.client.get(
+            reverse("recipe-export"), HTTP_AUTHORIZATION=self.token
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        return b"".join(response.streaming_content)
+
+    def import_lines(self, lines, token=None):
+        return self.client.post(
+            reverse("recipe-import"),
+            lines,
+            content_type="application/x-ndjson",
+            HTTP_AUTHORIZATION=token or self.token,
+        )
+
+    def test_export(self):
+        """
+        GET /recipes/export/ one recipe per line
+        """
+        lines = [json.loads(line) for line in self.export().splitlines()]
+
+        self.assertEqual([line["name"] for line in lines], ["dough", "pizza"])
+        self.assertEqual(
+            lines[1]["ingredients"][0],
+            {
+                "name": "pizza dough",
+                "recipe_id": self.dough.id,
+                "amount": "1.00",
+                "unit": "n/a",
+                "specifier": "",
+            },
+        )
+        self.assertEqual(lines[1]["steps"], ["mix", "bake"])
+        self.assertEqual(lines[1]["tags"], [{"value": "italian", "kind": "Cuisine"}])
+
+    def test_round_trip(self):
+        """
+        POST /recipes/import/ recreates exported recipes with new IDs
+        """
+        exported = self.export()
+        before = [
+            json.loads(document)
+            for _, document in sorted(
+                documents.get((self.dough.id, self.pizza.id)).items()
+            )
+        ]
+        self.pizza.delete()
+        self.dough.delete()
+        models.Ingredient.objects.all().delete()
+
+        response = self.import_lines(exported)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"created": 2, "updated": 0, "skipped_links": 0}
+        )
+
+        dough = models.Recipe.objects.get(name="dough")
+        pizza = models.Recipe.objects.get(name="pizza")
+        self.assertEqual(
+            models.Ingredient.objects.get(name="pizza dough").recipe_id, dough.id
+        )
+        self.assertEqual(subrecipes.descendants(pizza.id), {pizza.id, dough.id})
+
+        after = [
+            json.loads(document)
+            for _, document in sorted(documents.get((dough.id, pizza.id)).items())
+        ]
+        for old, new in zip(before, after):
+            self.assertEqual(old["steps"], new["steps"])
+            self.assertEqual(
+                [ingredient["amount"] for ingredient in old["ingredients"]],
+                [ingredient["amount"] for ingredient in new["ingredients"]],
+            )
+
+        self.assertEqual(
+            [
+                recipe["id"]
+                for recipe in self.client.get(
+                    reverse("recipe-search"), {"q": pizza.name}
+                ).json()
+            ],
+            [pizza.id],
+        )
+        flattened = self.client.get(
+            reverse("recipe-flattened", kwargs={"pk": pizza.id})
+        ).json()
+        self.assertEqual(
+            [ingredient["name"] for ingredient in flattened["ingredients"]],
+            ["cheese", "flour", "water"],
+        )
+
+    def test_upsert(self):
+        """
+        POST /recipes/import/ updates recipes with the same name
+        """
+        lines = [json.loads(line) for line in self.export().splitlines()]
+        lines[1]["steps"] = ["stretch", "top", "bake"]
+        lines[1]["ingredients"] = lines[1]["ingredients"][1:]
+        lines[1]["tags"] = [{"value": "dinner", "kind": "Meal"}]
+
+        response = self.import_lines("\n".join(json.dumps(line) for line in lines))
+        self.assertEqual(
+            response.json(), {"created": 0, "updated": 2, "skipped_links": 0}
+        )
+
+        pizza = self.client.get(
+            reverse("recipe-detail", kwargs={"pk": self.pizza.id})
+        ).json()
+        self.assertEqual(pizza["steps"], ["stretch", "top", "bake"])
+        self.assertEqual(len(pizza["ingredients"]), 1)
+        self.assertEqual(
+            pizza["tags"], [models.Tag.objects.get(value="dinner").id],
+        )
+        self.assertEqual(
+            self.client.get(
+                reverse("recipe-used-in", kwargs={"pk": self.dough.id})
+            ).json(),
+            [],
+        )
+
+    def test_skipped_links(self):
+        """
+        POST /recipes/import/ skips sub-recipe links that would make a recipe
+        contain itself or point an ingredient at another recipe
+        """
+        dough, pizza = [json.loads(line) for line in self.export().splitlines()]
+        marinara = baker.make(models.Recipe, name="marinara")
+        baker.make(models.Ingredient, name="tomato sauce", recipe=marinara)
+
+        def line(export_id, name, *ingredients):
+            return {
+                **pizza,
+                "id": export_id,
+                "name": name,
+                "ingredients": [
+                    {**pizza["ingredients"][0], "name": ingredient, "recipe_id": to}
+                    for ingredient, to in ingredients
+                ],
+            }
+
+        lines = [
+            line(dough["id"], "dough", ("pizza", pizza["id"])),
+            line(pizza["id"], "pizza", ("pizza dough", dough["id"])),
+            line(1001, "sauce"),
+            line(1002, "calzone", ("tomato sauce", 1001)),
+            line(1003, "bread", ("breadcrumbs", 1004)),
+            line(1004, "breadcrumbs", ("bread", 1003)),
+        ]
+
+        response = self.import_lines("\n".join(json.dumps(line) for line in lines))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["skipped_links"], 3)
+
+        self.assertIsNone(models.Ingredient.objects.get(name="pizza").recipe_id)
+        self.assertEqual(
+            models.Ingredient.objects.get(name="tomato sauce").recipe_id, marinara.id
+        )
+        self.assertEqual(
+            subrecipes.descendants(self.pizza.id), {self.pizza.id, self.dough.id}
+        )
+        bread = models.Recipe.objects.get(name="bread")
+        breadcrumbs = models.Recipe.objects.get(name="breadcrumbs")
+        self.assertEqual(subrecipes.descendants(bread.id), {bread.id, breadcrumbs.id})
+        self.assertIsNone(models.Ingredient.objects.get(name="bread").recipe_id)
+
+    def test_invalid(self):
+        """
+        POST /recipes/import/ imports nothing if a line is invalid
+        """
+        lines = self.export().splitlines()
+        new = json.loads(lines[0])
+        new["name"] = "new dough"
+
+        for invalid in (
+            {**new, "servings": 0},
+            {**new, "ingredients": [{"name": "flour", "amount": "1", "unit": "cup"}]},
+            {**new, "tags": [{"value": "quick", "kind": "Speed"}]},
+            {**new, "name": "n" * 257},
+            {**new, "cook_time": "t" * 129},
+            {**new, "tags": [{"value": "v" * 257, "kind": "Cuisine"}]},
+            {
+                **new,
+                "ingredients": [
+                    {
+                        "name": "flour",
+                        "amount": "1",
+                        "unit": "c",
+                        "specifier": "s" * 257,
+                    }
+                ],
+            },
+        ):
+            response = self.import_lines(
+                b"\n".join((json.dumps(new).encode(), json.dumps(invalid).encode()))
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertTrue(response.json()["errors"]["lines"][0].startswith("line 2"))
+
+        self.assertEqual(self.import_lines(b"{").status_code, 400)
+        self.assertFalse(models.Recipe.objects.filter(name="new dough").exists())
+
+    def test_import_staff_only(self):
+        """
+        POST /recipes/import/ by a user that isn't staff
+        """
+        response = self.import_lines(
+            self.export(), get_token(TEST_USER_NAME1, TEST_PASSWORD)
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_export_staff_only(self):
+        """
+        GET /recipes/export/ by a user that isn't staff or anonymously
+        """
+        self.assertEqual(
+            self.client.get(
+                reverse("recipe-export"),
+                HTTP_AUTHORIZATION=get_token(TEST_USER_NAME1, TEST_PASSWORD),
+            ).status_code,
+            403,
+        )
+        self.assertEqual(self.client.get(reverse("recipe-export")).status_code, 401)
+
+    def test_commands(self):
+        """
+        manage.py export_recipes and import_recipes
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "recipes.jsonl")
+            call_command("export_recipes", path, stderr=io.StringIO())
+            stdout = io.StringIO()
+            call_command("import_recipes", path, author=TEST_USER_NAME1, stdout=stdout)
+
+        self.assertIn("Created 0 recipes, updated 2", stdout.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command("import_recipes", path, author="nobody")
+
+
+class DatasetTestCase(TestCase):
+    """Tests for recipe_manager.dataset and the generate_dataset command"""
+
+    @staticmethod
+    def clear():
+        for model in (
+            models.MealPlan,
+            models.IngredientInRecipe,
+            models.Ingredient,
+            models.Recipe,
+            models.Tag,
+            User,
+        ):
+            model.objects.all().delete()
+
+    def snapshot(self):
+        return (
+            list(
+                models.Recipe.objects.order_by("id").values_list(
+                    "name", "servings", "cook_time", "author__username"
+                )
+            ),
+            list(
+                models.IngredientInRecipe.objects.order_by("id").values_list(
+                    "recipe__name", "ingredient__name", "amount", "unit"
+                )
+            ),
+            list(
+                models.Step.objects.order_by("id").values_list(
+                    "recipe__name", "order", "instruction"
+                )
+            ),
+            list(
+                models.MealPlan.objects.order_by("id").values_list(
+                    "user__username", "recipe__name", "planned_date", "meal"
+                )
+            ),
+        )
+
+    def test_generate(self):
+        """
+        counts and shape of the generated rows
+        """
+        counts = dataset.generate(
+            users=3,
+            recipes=60,
+            ingredients=40,
+            tags=10,
+            meal_plans=5,
+            sub_recipes=0.5,
+            batch_size=25,
+            start_date=date(2020, 3, 2),
+        )
+
+        self.assertEqual(models.Recipe.objects.count(), 60)
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(models.Tag.objects.count(), 10)
+        self.assertEqual(models.MealPlan.objects.count(), 15)
+        self.assertEqual(models.Ingredient.objects.count(), counts["ingredients"])
+        self.assertTrue(models.Ingredient.objects.filter(recipe__isnull=False).exists())
+        self.assertTrue(models.RecipeDependency.objects.exists())
+        self.assertEqual(
+            models.RecipeDocument.objects.count(), models.Recipe.objects.count()
+        )
+
+        for steps, used, tags in models.Recipe.objects.annotate(
+            step_count=Count("steps", distinct=True),
+            used=Count("ingredients_in_recipe", distinct=True),
+            tag_count=Count("tags", distinct=True),
+        ).values_list("step_count", "used", "tag_count"):
+            self.assertTrue(5 <= steps <= 25)
+            self.assertTrue(1 <= used <= 16)
+            self.assertTrue(1 <= tags <= 4)
+
+        # the first ingredient is the most used one
+        uses = Counter(
+            models.IngredientInRecipe.objects.values_list("ingredient_id", flat=True)
+        )
+        self.assertEqual(
+            uses.most_common(1)[0][0], models.Ingredient.objects.first().id
+        )
+        self.assertTrue(self.client.login(username="user1", password=dataset.PASSWORD))
+
+    def test_deterministic(self):
+        """
+        the same seed makes the same rows, another seed other rows
+        """
+        options = dict(
+            users=2, recipes=20, ingredients=15, tags=5, meal_plans=3, derived=False
+        )
+        options["start_date"] = date(2020, 3, 2)
+        dataset.generate(seed=7, **options)
+        first = self.snapshot()
+
+        self.clear()
+        dataset.generate(seed=7, **options)
+        self.assertEqual(self.snapshot(), first)
+
+        self.clear()
+        dataset.generate(seed=8, **options)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_command(self):
+        """
+        manage.py generate_dataset
+        """
+        stdout = io.StringIO()
+        call_command(
+            "generate_dataset",
+            recipes=5,
+            users=1,
+            ingredients=5,
+            tags=2,
+            skip_derived=True,
+            stdout=stdout,
+            stderr=io.StringIO(),
+        )
+
+        self.assertIn("5 recipes", stdout.getvalue())
+        self.assertFalse(models.RecipeDocument.objects.exists())
+
+
+class ScenarioMixin:
+    """Runs recipe_manager.benchmark scenarios through the test client"""
+
+    def send(self, request: benchmark.Request):
+        body = request.body
+        if body is not None and not isinstance(body, bytes):
+            body = json.dumps(body)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.generic(
+                request.method,
+                request.path,
+                body or "",
+                content_type="application/x-ndjson"
+                if isinstance(body, bytes)
+                else "application/json",
+                HTTP_AUTHORIZATION=f"Bearer {self.context.access}",
+            )
+            content = (
+                b"".join(response.streaming_content)
+                if response.streaming
+                else response.content
+            )
+
+        return benchmark.Reply(response.status_code, content), len(queries)
+
+    def run_scenario(self, name: str, worker: benchmark.Worker = None) -> list:
+        """Run a scenario
+
+        Args:
+            name (str): key of benchmark.SCENARIOS
+            worker (benchmark.Worker, optional): Defaults to a new one.
+
+        Returns:
+            list: request, reply and queries made of every request
+        """
+        worker = worker or benchmark.Worker(0, 1, self.context, seed=0)
+        requests = benchmark.SCENARIOS[name][2](self.context, worker)
+        sent = []
+
+        try:
+            request = next(requests)
+            while True:
+                reply, queries = self.send(request)
+                sent.append((request, reply, queries))
+                self.assertLess(reply.status, 300, (name, request, reply))
+                request = requests.send(reply)
+
+        except StopIteration:
+            pass
+
+        return sent
+
+
+class BenchmarkTestCase(ScenarioMixin, TestCase):
+    """Tests for recipe_manager.benchmark and BenchmarkMiddleware"""
+
+    def setUp(self):
+        dataset.generate(
+            users=2, recipes=12, ingredients=30, tags=8, meal_plans=2, sub_recipes=0.5
+        )
+        self.context = benchmark.prepare()
+
+    def test_scenarios(self):
+        """
+        every scenario succeeds and together they request every API route
+        """
+        routes = {
+            request.route
+            for name in benchmark.SCENARIOS
+            for request, _, _ in self.run_scenario(name)
+        }
+
+        self.assertEqual(routes, set(benchmark.route_names()))
+
+    def test_write_scenarios_restore(self):
+        """
+        scenarios that change a recipe's ingredients, steps and tags put them back
+        """
+        recipe_id = self.context.recipe_ids[0]
+        before = documents.get((recipe_id,))[recipe_id]
+
+        for name in ("add recipe ingredient", "add step", "add recipe tag"):
+            worker = benchmark.Worker(0, 1, self.context, seed=0)
+            worker.recipe_ids = [recipe_id]
+            self.assertGreater(len(self.run_scenario(name, worker)), 2)
+
+        after = documents.get((recipe_id,))[recipe_id]
+        self.assertEqual(
+            {**json.loads(after), "last_updated_on": None},
+            {**json.loads(before), "last_updated_on": None},
+        )
+
+    @override_settings(
+        MIDDLEWARE=("recipe_manager.middleware.BenchmarkMiddleware",)
+        + settings.MIDDLEWARE
+    )
+    def test_middleware(self):
+        """
+        query count and peak memory headers
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("recipe-detail", args=(self.context.recipe_ids[0],))
+            )
+
+        self.assertEqual(response["X-Query-Count"], str(len(queries)))
+        self.assertGreater(int(response["X-Max-RSS-KB"]), 0)
+
+    def test_summarize_and_compare(self):
+        """
+        percentiles, throughput and regressions between two runs
+        """
+        fast = benchmark._Samples()
+        slow = benchmark._Samples()
+        for millis in range(1, 101):
+            fast.add(millis / 1000, 200, "3", "1000")
+            slow.add(millis / 500, 200 if millis > 1 else 500, "5", "2000")
+
+        baseline = benchmark.summarize({("GET", "recipe"): fast}, 10)
+        current = benchmark.summarize({("GET", "recipe"): slow}, 10)
+        stats = baseline["endpoints"]["GET recipe"]
+
+        self.assertEqual(stats["requests"], 100)
+        self.assertEqual(stats["throughput_rps"], 10)
+        self.assertEqual(
+            stats["latency_ms"],
+            {"p50": 50, "p95": 95, "p99": 99, "mean": 50.5, "max": 100},
+        )
+        self.assertEqual(stats["queries"], {"mean": 3, "max": 3})
+        self.assertEqual(current["total"]["errors"], 1)
+        self.assertEqual(benchmark.compare(baseline, baseline), [])
+        self.assertEqual(
+            [
+                (regression["metric"], regression["change"])
+                for regression in benchmark.compare(baseline, current)
+            ],
+            [("p95 ms", 1), ("queries", 0.667)],
+        )
+        self.assertEqual(benchmark.compare(baseline, current, min_requests=101), [])
+
+
+@override_settings(QUERY_BUDGETS="raise")
+class QueryBudgetTestCase(ScenarioMixin, TestCase):
+    """Every API route keeps to its query budget in recipe_manager.budgets with
+    a small and a large dataset, so queries per row fail here
+    """
+
+    # list variants the benchmark scenarios don't request
+    LISTS = (
+        ("recipe", "/api/recipe-manager/recipes/?stream=true"),
+        ("recipe", "/api/recipe-manager/recipes/?facets=true"),
+        (
+            "recipe",
+            "/api/recipe-manager/recipes/?include=ingredients.ingredient,tags.value",
+        ),
+        ("ingredient", "/api/recipe-manager/ingredients/?stream=true"),
+        ("meal-plan", "/api/recipe-manager/meal-plan/?stream=true&historical=true"),
+    )
+
+    def check_budgets(self, **sizes):
+        dataset.generate(**sizes)
+        self.context = benchmark.prepare()
+        sent = [
+            sent for name in benchmark.SCENARIOS for sent in self.run_scenario(name)
+        ]
+        for route, path in self.LISTS:
+            reply, queries = self.send(benchmark.Request(route, "GET", path))
+            self.assertEqual(reply.status, 200, path)
+            sent.append((benchmark.Request(route, "GET", path), reply, queries))
+
+        for request, _, queries in sent:
+            limit = budgets.budget(request.route, request.method)
+            self.assertIsNotNone(limit, f"{request.method} {request.route}")
+            # saving a profile is outside the budget, the middleware still
+            # holds the profiled request itself to it
+            if "profile=" not in request.path:
+                self.assertLessEqual(queries, limit, request)
+
+    def nested_write(self, request: benchmark.Request) -> int:
+        reply, queries = self.send(request)
+        self.assertIn(reply.status, (200, 201), reply.body)
+        return queries
+
+    def test_nested_writes_fixed(self):
+        """
+        POST /recipe/ and PUT /recipe/<pk>/ make as many queries for 20
+        ingredients and steps as for 2
+        """
+        dataset.generate(users=1, recipes=6, ingredients=30, tags=5, sub_recipes=0.5)
+        self.context = benchmark.prepare()
+
+        def body(name, size):
+            return {
+                "name": name,
+                "description": "nested write",
+                "servings": 2,
+                "cook_time": "1 hour",
+                "ingredients": [
+                    {"ingredient_id": ingredient_id, "amount": "1.00", "unit": "c"}
+                    for ingredient_id in self.context.ingredient_ids[:size]
+                ],
+                "steps": [f"step {position}" for position in range(size)],
+                "tags": self.context.tag_ids[: min(size, 5)],
+            }
+
+        path = "/api/recipe-manager/recipes/"
+        self.nested_write(benchmark.Request("recipe", "POST", path, body("warm", 2)))
+        created = {
+            size: self.nested_write(
+                benchmark.Request("recipe", "POST", path, body(f"size {size}", size))
+            )
+            for size in (2, 20)
+        }
+        self.assertEqual(created[2], created[20])
+
+        recipe_id = models.Recipe.objects.get(name="size 2").id
+        replaced = [
+            self.nested_write(
+                benchmark.Request(
+                    "recipe-detail", "PUT", f"{path}{recipe_id}/", body("size 2", size)
+                )
+            )
+            for size in (20, 2, 20)
+        ]
+        self.assertEqual(len(set(replaced)), 1, replaced)
+        self.assertLessEqual(created[20], budgets.budget("recipe", "POST"))
+        self.assertLessEqual(replaced[0], budgets.budget("recipe-detail", "PUT"))
+
+    def test_every_route(self):
+        """
+        every API route has a budget
+        """
+        self.assertEqual(set(budgets.QUERY_BUDGETS), set(benchmark.route_names()))
+
+    def test_exceeded(self):
+        """
+        a request over its budget fails
+        """
+        with mock.patch.dict(budgets.QUERY_BUDGETS, {"tag": {"GET": 0}}):
+            with self.assertRaises(budgets.QueryBudgetExceeded):
+                self.client.get(reverse("tag"))
+
+            with override_settings(QUERY_BUDGETS="warn"), self.assertLogs(
+                "recipe_manager.budgets", "WARNING"
+            ):
+                self.assertEqual(self.client.get(reverse("tag")).status_code, 200)
+
+    def test_meal_plan_unknown_recipe(self):
+        """
+        POST /meal-plan/ with a recipe that doesn't exist is a 400, not a 500
+        """
+        User.objects.create_user(
+            TEST_USER_NAME, email=TEST_EMAIL, password=TEST_PASSWORD
+        )
+        response = self.client.post(
+            reverse("meal-plan"),
+            {
+                "recipe_id": 404,
+                "planned_date": "2020-03-02",
+                "meal": None,
+                "cooked": False,
+            },
+            content_type="application/json",
+            HTTP_AUTHORIZATION=get_token(),
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()["errors"]), ["recipe_id"])
+
+    def test_small(self):
+        """
+        a few rows in every table
+        """
+        self.check_budgets(
+            users=2, recipes=6, ingredients=20, tags=5, meal_plans=3, sub_recipes=0.5
+        )
+
+    def test_large(self):
+        """
+        more rows than a page in every table
+        """
+        self.check_budgets(
+            users=2,
+            recipes=150,
+            ingredients=150,
+            tags=120,
+            meal_plans=120,
+            sub_recipes=0.2,
+        )
+
+
+class ServerTimingTestCase(TestCase):
+    """Sampled requests report their phases in Server-Timing and the log"""
+
+    def setUp(self):
+        User.objects.create_user(
+            TEST_USER_NAME, email=TEST_EMAIL, password=TEST_PASSWORD
+        )
+        self.token = get_token()
+        baker.make(models.Tag, _quantity=3)
+        settings_override = override_settings(
+            RECIPE_MANAGER={**settings.RECIPE_MANAGER, "SERVER_TIMING_SAMPLE_RATE": 1}
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("tag"), HTTP_AUTHORIZATION=self.token)
+
+        self.assertEqual(response.status_code, 200)
+
+        return response, len(queries)
+
+    def test_header(self):
+        """
+        every phase is in the header with the number of queries
+        """
+        with self.assertLogs("recipe_manager.timing", "INFO"):
+            response, queries = self.get()
+
+        phases = {
+            metric.split(";")[0]: metric.split(";")[1:]
+            for metric in response["Server-Timing"].split(", ")
+        }
+
+        self.assertEqual(list(phases), ["db", "auth", "serialize", "render", "total"])
+        self.assertEqual(phases["db"][1], f'desc="{queries} queries"')
+        for name in ("auth", "serialize", "render"):
+            self.assertRegex(phases[name][0], r"^dur=\d+\.\d$")
+
+    def test_log(self):
+        """
+        sampled requests are logged with the durations as fields
+        """
+        with self.assertLogs("recipe_manager.timing", "INFO") as logs:
+            _, queries = self.get()
+
+        fields = logs.records[0].timing
+        self.assertEqual(fields["url_name"], "tag")
+        self.assertEqual(fields["status"], 200)
+        self.assertEqual(fields["db_queries"], queries)
+        self.assertGreater(fields["serialize_ms"], 0)
+        self.assertGreater(fields["render_ms"], 0)
+        self.assertGreater(fields["auth_ms"], 0)
+        self.assertGreaterEqual(fields["total_ms"], fields["db_ms"])
+        self.assertEqual(
+            json.loads(timing.LogFormatter().format(logs.records[0]))["url_name"], "tag"
+        )
+
+    def test_not_sampled(self):
+        """
+        no header when sampling is off
+        """
+        with override_settings(
+            RECIPE_MANAGER={**settings.RECIPE_MANAGER, "SERVER_TIMING_SAMPLE_RATE": 0}
+        ):
+            response, _ = self.get()
+
+        self.assertNotIn("Server-Timing", response)
+        self.assertIs(timing.phase(timing.SERIALIZE), timing.phase(timing.RENDER))
+
+    def test_nested(self):
+        """
+        a phase entered again while open is only timed once
+        """
+        with timing.timed() as timings:
+            with timing.phase(timing.SERIALIZE), timing.phase(timing.SERIALIZE):
+                pass
+
+            with timing.phase(timing.SERIALIZE):
+                pass
+
+        self.assertEqual(timings.counts[timing.SERIALIZE], 2)
+
+
+class MetricsTestCase(TestCase):
+    """/metrics adds up the counts of every worker"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(
+            RECIPE_MANAGER={
+                **settings.RECIPE_MANAGER,
+                "METRICS_DIR": self.directory,
+                "METRICS_TOKEN": "scraper",
+            }
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        baker.make(models.Tag, _quantity=3)
+
+    def scrape(self):
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer scraper"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+
+        return dict(
+            line.rsplit(" ", 1)
+            for line in response.content.decode().splitlines()
+            if not line.startswith("#")
+        )
+
+    def test_requests(self):
+        """
+        requests are counted with their latency and queries by URL name
+        """
+        for _ in range(2):
+            self.assertEqual(self.client.get(reverse("tag")).status_code, 200)
+
+        samples = self.scrape()
+        labels = 'url_name="tag",method="GET",status="200"'
+
+        self.assertEqual(samples[f"cookbook_http_requests_total{{{labels}}}"], "2.0")
+        self.assertEqual(
+            samples[
+                f'cookbook_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'
+            ],
+            "2.0",
+        )
+        self.assertEqual(
+            samples[f"cookbook_http_request_duration_seconds_count{{{labels}}}"], "2.0"
+        )
+        self.assertEqual(
+            samples['cookbook_db_queries_per_request_count{url_name="tag"}'], "2.0"
+        )
+        # the scrape itself is in flight
+        self.assertEqual(samples["cookbook_http_requests_in_flight"], "1.0")
+        buckets = [
+            float(value)
+            for sample, value in samples.items()
+            if sample.startswith(
+                'cookbook_db_queries_per_request_bucket{url_name="tag"'
+            )
+        ]
+        self.assertEqual(buckets, sorted(buckets))
+
+    def test_workers(self):
+        """
+        counts of exited workers are kept, their gauges are not
+        """
+        exited = subprocess.Popen(("true",))
+        exited.wait()
+        worker = metrics.MmapValues(os.path.join(self.directory, f"{exited.pid}.db"))
+        worker.add(json.dumps((metrics.REQUESTS, ("tag", "GET", "200"))), 5)
+        worker.add(json.dumps((metrics.REQUESTS_IN_FLIGHT, ())), 3)
+        worker.close()
+
+        self.client.get(reverse("tag"))
+        samples = self.scrape()
+
+        self.assertEqual(
+            samples[
+                'cookbook_http_requests_total{url_name="tag",method="GET",status="200"}'
+            ],
+            "6.0",
+        )
+        self.assertEqual(samples["cookbook_http_requests_in_flight"], "1.0")
+
+    def test_grow(self):
+        """
+        files grow past their initial size and keep their values when reopened
+        """
+        path = os.path.join(self.directory, "1.db")
+        values = metrics.MmapValues(path)
+        keys = [
+            json.dumps((metrics.REQUESTS, (f"route {index}", "GET", "200")))
+            for index in range(2000)
+        ]
+        for key in keys:
+            values.add(key, 2)
+        values.add(keys[0], 1)
+        values.close()
+
+        reopened = metrics.MmapValues(path)
+        reopened.add(keys[-1], 1)
+        reopened.close()
+        read = dict(metrics._read(path))  # pylint: disable=protected-access
+
+        self.assertEqual(len(read), 2000)
+        self.assertEqual(read[metrics.REQUESTS, ("route 0", "GET", "200")], 3)
+        self.assertEqual(read[metrics.REQUESTS, ("route 1999", "GET", "200")], 3)
+
+    def test_cache(self):
+        """
+        cache lookups give a hit ratio
+        """
+        recipe = baker.make(models.Recipe)
+        models.RecipeDocument.objects.all().delete()
+        documents.get((recipe.id,))
+        documents.get((recipe.id,))
+        documents.get((recipe.id,))
+        samples = self.scrape()
+
+        self.assertEqual(
+            samples['cookbook_cache_requests_total{cache="documents",result="hit"}'],
+            "2.0",
+        )
+        self.assertEqual(
+            float(samples['cookbook_cache_hit_ratio{cache="documents"}']), 2 / 3
+        )
+
+    def test_off(self):
+        """
+        nothing is counted or served without a metrics directory
+        """
+        with override_settings(
+            RECIPE_MANAGER={**settings.RECIPE_MANAGER, "METRICS_DIR": None}
+        ):
+            self.client.get(reverse("tag"))
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
+
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_token(self):
+        """
+        /metrics is only served to scrapers sending the metrics token
+        """
+        for authorization in ("", "Bearer other", "scraper"):
+            response = self.client.get(
+                reverse("metrics"), HTTP_AUTHORIZATION=authorization
+            )
+            self.assertEqual(response.status_code, 401, authorization)
+            self.assertEqual(response["WWW-Authenticate"], "Bearer")
+
+        with override_settings(
+            RECIPE_MANAGER={**settings.RECIPE_MANAGER, "METRICS_TOKEN": None}
+        ):
+            response = self.client.get(
+                reverse("metrics"), HTTP_AUTHORIZATION="Bearer scraper"
+            )
+            self.assertEqual(response.status_code, 404)
+
+
+class ProfileTestCase(TestCase):
+    """Superusers can have single requests profiled"""
+
+    def setUp(self):
+        User.objects.create_superuser(
+            TEST_USER_NAME, email=TEST_EMAIL, password=TEST_PASSWORD
+        )
+        User.objects.create_user(
+            TEST_USER_NAME1, email=TEST_EMAIL1, password=TEST_PASSWORD
+        )
+        self.token = get_token()
+        self.recipe = baker.make(models.Recipe, make_m2m=True)
+
+    def profile(self, token=None, **extra):
+        return self.client.get(
+            reverse("recipe-detail", args=(self.recipe.id,)),
+            HTTP_AUTHORIZATION=token or self.token,
+            **extra,
+        )
+
+    def test_cprofile(self):
+        """
+        a pstats dump and the plans of the queries made
+        """
+        response = self.profile(HTTP_X_PROFILE="cprofile")
+        self.assertEqual(response.status_code, 200)
+
+        detail = self.client.get(
+            response["X-Profile"], HTTP_AUTHORIZATION=self.token
+        ).json()
+        self.assertEqual(detail["profiler"], "cprofile")
+        self.assertEqual(
+            detail["path"], f"/api/recipe-manager/recipes/{self.recipe.id}/"
+        )
+        self.assertTrue(detail["queries"])
+        self.assertTrue(
+            all(
+                query["plan"]
+                for query in detail["queries"]
+                if query["sql"].startswith("SELECT")
+            )
+        )
+
+        download = self.client.get(
+            reverse("profile-download", args=(detail["id"],)),
+            HTTP_AUTHORIZATION=self.token,
+        )
+        self.assertEqual(
+            download["Content-Disposition"],
+            f'attachment; filename="profile-{detail["id"]}.prof"',
+        )
+        with tempfile.NamedTemporaryFile() as dump:
+            dump.write(download.content)
+            dump.flush()
+            functions = {name for _, _, name in pstats.Stats(dump.name).stats}
+
+        self.assertIn("get", functions)
+
+    def test_sample(self):
+        """
+        collapsed stacks from ?profile=
+        """
+        response = self.profile(data={"profile": "1"})
+        profile_id = response["X-Profile"].rstrip("/").split("/")[-1]
+        download = self.client.get(
+            reverse("profile-download", args=(profile_id,)),
+            HTTP_AUTHORIZATION=self.token,
+        )
+
+        self.assertEqual(download["Content-Type"], "text/plain; charset=utf-8")
+        self.assertEqual(
+            self.client.get(reverse("profile"), HTTP_AUTHORIZATION=self.token).json()[
+                0
+            ]["profiler"],
+            "sample",
+        )
+
+        with profiling.SamplingProfiler(0.001) as profiler:
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        stacks = profiler.result().decode().splitlines()
+        self.assertTrue(stacks)
+        self.assertTrue(
+            all(re.fullmatch(r".+ \(.+:\d+\)(;.+)* \d+", line) for line in stacks)
+        )
+        self.assertIn("test_sample", stacks[0])
+
+    def test_not_superuser(self):
+        """
+        other users and anonymous requests are not profiled
+        """
+        token = get_token(TEST_USER_NAME1)
+
+        self.assertNotIn("X-Profile", self.profile(token, HTTP_X_PROFILE="sample"))
+        self.assertNotIn(
+            "X-Profile",
+            self.client.get(
+                reverse("recipe-detail", args=(self.recipe.id,)),
+                HTTP_X_PROFILE="sample",
+            ),
+        )
+        self.assertEqual(
+            self.profile("Bearer nope", HTTP_X_PROFILE="sample").status_code, 401
+        )
+        self.assertFalse(models.RequestProfile.objects.exists())
+        self.assertEqual(
+            self.client.get(reverse("profile"), HTTP_AUTHORIZATION=token).status_code,
+            403,
+        )
+
+    @override_settings(RECIPE_MANAGER={**settings.RECIPE_MANAGER, "PROFILES_KEPT": 2})
+    def test_kept(self):
+        """
+        only the newest profiles are kept
+        """
+        ids = [self.profile(HTTP_X_PROFILE="sample")["X-Profile"] for _ in range(3)]
+
+        self.assertEqual(
+            [
+                profile["id"]
+                for profile in self.client.get(
+                    reverse("profile"), HTTP_AUTHORIZATION=self.token
+                ).json()
+            ],
+            list(
+                models.RequestProfile.objects.order_by("-id").values_list(
+                    "id", flat=True
+                )
+            ),
+        )
+        self.assertEqual(models.RequestProfile.objects.count(), 2)
+        self.assertEqual(
+            self.client.get(ids[0], HTTP_AUTHORIZATION=self.token).status_code, 404
+        )
@@ -0,0 +1,159 @@
+"""
+Per request timing of the phases a request spends its time in. The request
+being timed has a Timings in a context variable, see middleware.
+ServerTimingMiddleware, and the code doing the work marks it with phase().
+When the request is not being timed phase() hands back a shared no-op context
+manager, so marking a phase costs one context variable lookup.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import time
+from collections import Counter, defaultdict
+
+# phases reported for every timed request, in Server-Timing header order
+DB = "db"
+AUTH = "auth"
+SERIALIZE = "serialize"
+RENDER = "render"
+PHASES = (DB, AUTH, SERIALIZE, RENDER)
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("timings", default=None)
+_NOT_TIMED = contextlib.nullcontext()
+
+
+class Timings:
+    """Time spent in each phase of one request. Phases may overlap, queries
+    run while serializing count towards both db and serialize.
+
+    Attributes:
+        durations (defaultdict): phase to seconds spent in it
+        counts (Counter): phase to times it was entered
+    """
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = Counter()
+        self._open = set()
+
+    def phase(self, name: str) -> "_Phase":
+        """Context manager timing a phase, entering a phase that is already
+        open is not timed again so nested serializers are not counted twice
+
+        Args:
+            name (str): phase
+
+        Returns:
+            _Phase: context manager
+        """
+        return _Phase(self, name)
+
+    def query(self, execute, sql, params, many, context):
+        """Time a SQL query, install with connection.execute_wrapper"""
+        start = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+
+        finally:
+            self.durations[DB] += time.perf_counter() - start
+            self.counts[DB] += 1
+
+    def header(self, total: float) -> str:
+        """Server-Timing header value with durations in milliseconds
+
+        Args:
+            total (float): seconds the whole request took
+
+        Returns:
+            str: header value
+        """
+        metrics = [
+            f'{DB};dur={self.durations[DB] * 1000:.1f};desc="{self.counts[DB]} queries"'
+        ]
+        metrics.extend(
+            f"{name};dur={self.durations[name] * 1000:.1f}" for name in PHASES[1:]
+        )
+        metrics.append(f"total;dur={total * 1000:.1f}")
+
+        return ", ".join(metrics)
+
+    def fields(self, total: float) -> dict:
+        """Structured log fields with durations in milliseconds
+
+        Args:
+            total (float): seconds the whole request took
+
+        Returns:
+            dict: field name to value
+        """
+        return {
+            **{f"{name}_ms": round(self.durations[name] * 1000, 3) for name in PHASES},
+            "db_queries": self.counts[DB],
+            "total_ms": round(total * 1000, 3),
+        }
+
+
+class _Phase:
+    __slots__ = ("timings", "name", "start")
+
+    def __init__(self, timings: Timings, name: str):
+        self.timings = timings
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if self.name not in self.timings._open:
+            self.timings._open.add(self.name)
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            self.timings.durations[self.name] += time.perf_counter() - self.start
+            self.timings.counts[self.name] += 1
+            self.timings._open.discard(self.name)
+
+
+def phase(name: str):
+    """Time a phase of the current request if it is being timed
+
+    Args:
+        name (str): phase, one of PHASES
+
+    Returns:
+        context manager timing the phase
+    """
+    timings = _current.get()
+
+    return _NOT_TIMED if timings is None else timings.phase(name)
+
+
+@contextlib.contextmanager
+def timed():
+    """Time the phases of the code run inside
+
+    Yields:
+        Timings: time spent in each phase so far
+    """
+    timings = Timings()
+    token = _current.set(timings)
+
+    try:
+        yield timings
+
+    finally:
+        _current.reset(token)
+
+
+class LogFormatter(logging.Formatter):
+    """Format records as one JSON object per line with the message and the
+    record's timing fields
+    """
+
+    def format(self, record):
+        return json.dumps(
+            {"message": record.getMessage(), **getattr(record, "timing", {})}
+        )
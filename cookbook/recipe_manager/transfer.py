@@ -0,0 +1,483 @@
+"""
+Recipes exported and imported as JSON lines, one recipe with its ingredients,
+steps and tags per line. Ingredients and tags are written by name so a file
+can be imported into another database: they are matched by name, recipes are
+upserted by name and sub-recipe links are remapped to the IDs the recipes get
+there. Both directions work a batch of recipes at a time so memory use doesn't
+grow with the size of the file.
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, Iterator, List, Tuple
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.settings import api_settings
+from . import models, projections, signals, similarity, subrecipes, versions
+from .utils import chunked, delete_rows
+
+BATCH_SIZE = 500
+
+_FIELDS = ("name", "description", "servings", "cook_time")
+_UNITS = frozenset(
+    unit for _, choices in models.IngredientInRecipe.UNITS for unit, _ in choices
+)
+_KINDS = frozenset(kind for kind, _ in models.Tag.KIND)
+_AMOUNT_LIMIT = Decimal("1000")
+
+
+def export_lines(queryset=None, batch_size: int = BATCH_SIZE) -> Iterator[bytes]:
+    """Render recipes as JSON lines. Recipes are read with QuerySet.iterator(),
+    a server-side cursor on Postgres, and serialized a batch at a time.
+
+    Args:
+        queryset (QuerySet, optional): recipes to export. Defaults to all.
+        batch_size (int, optional): recipes serialized at a time.
+
+    Yields:
+        bytes: a batch of lines, each ending with a newline
+    """
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    queryset = models.Recipe.objects.all() if queryset is None else queryset
+
+    for batch in chunked(
+        queryset.order_by("id").iterator(chunk_size=batch_size), batch_size
+    ):
+        yield b"".join(
+            renderer.render(_to_line(document)) + b"\n"
+            for document in projections.recipe_documents(
+                batch, include=("ingredients.ingredient", "tags.value")
+            )
+        )
+
+
+def import_lines(
+    lines: Iterable, author_id: int = None, batch_size: int = BATCH_SIZE
+) -> Dict[str, int]:
+    """Import recipes from JSON lines in one transaction. Recipes whose name
+    exists are updated and their ingredients, steps and tags replaced.
+    Ingredients and tags missing from the database are created.
+
+    Args:
+        lines (Iterable): lines as str or bytes, blank lines are skipped
+        author_id (int, optional): author of created recipes. Defaults to None.
+        batch_size (int, optional): recipes written at a time.
+
+    Raises:
+        ValueError: a line isn't a valid recipe, nothing is imported
+
+    Returns:
+        Dict[str, int]: number of recipes created and updated and of
+            sub-recipe links skipped, see _Importer.link_sub_recipes
+    """
+    importer = _Importer(author_id)
+    recipes = (
+        _parse(number, line) for number, line in enumerate(lines, 1) if line.strip()
+    )
+
+    with transaction.atomic():
+        for batch in chunked(recipes, batch_size):
+            recipe_ids = importer.write(batch)
+            subrecipes.relink(recipe_ids)
+            # last_updated_on was written with the rows
+            signals.refresh_recipes(recipe_ids, touch=False)
+
+        for batch in chunked(importer.link_sub_recipes(), batch_size):
+            subrecipes.invalidate(batch)
+
+        # per-worker indexes and suggestions are rebuilt on their next read
+        versions.bump(
+            versions.RECIPES,
+            versions.TAGS,
+            versions.INGREDIENTS,
+            versions.RECIPE_TAGS,
+            versions.INGREDIENT_USES,
+            versions.RECIPE_INGREDIENTS,
+            versions.RECIPE_VECTORS,
+        )
+        similarity.invalidate_all()
+
+    return importer.counts
+
+
+def _to_line(document: dict) -> dict:
+    return {
+        "id": document["id"],
+        **{field: document[field] for field in _FIELDS},
+        "ingredients": [
+            {
+                "name": ingredient["ingredient"]["name"],
+                "recipe_id": ingredient["ingredient"]["recipe_id"],
+                "amount": ingredient["amount"],
+                "unit": ingredient["unit"],
+                "specifier": ingredient["specifier"],
+            }
+            for ingredient in document["ingredients"]
+        ],
+        "steps": document["steps"],
+        "tags": [
+            {"value": tag["value"], "kind": tag["kind"]} for tag in document["tags"]
+        ],
+    }
+
+
+def _parse(number: int, line) -> dict:
+    """Decode a line and check it enough for the database to accept it, much
+    cheaper than a serializer per line
+    """
+    try:
+        recipe = json.loads(line)
+
+        if not isinstance(recipe, dict):
+            raise ValueError("must be an object")
+
+        for field in ("name", "description", "cook_time"):
+            if not isinstance(recipe.get(field), str) or not recipe[field]:
+                raise ValueError(f"{field} must be a non-empty string")
+
+            _check_length(models.Recipe, field, recipe[field])
+
+        if not isinstance(recipe.get("servings"), int) or recipe["servings"] < 1:
+            raise ValueError("servings must be a positive integer")
+
+        names = set()
+        for ingredient in recipe.setdefault("ingredients", []):
+            if not isinstance(ingredient.get("name"), str) or not ingredient["name"]:
+                raise ValueError("ingredient name must be a non-empty string")
+
+            _check_length(models.Ingredient, "name", ingredient["name"], "ingredient")
+
+            if ingredient["name"] in names:
+                raise ValueError(f"ingredient {ingredient['name']} is used twice")
+
+            if ingredient.get("unit") not in _UNITS:
+                raise ValueError(f"unknown unit {ingredient.get('unit')}")
+
+            amount = Decimal(str(ingredient.get("amount"))).quantize(Decimal("0.01"))
+            if not 0 <= amount < _AMOUNT_LIMIT:
+                raise ValueError(f"amount {amount} is out of range")
+
+            if not isinstance(ingredient.setdefault("specifier", ""), str):
+                raise ValueError("specifier must be a string")
+
+            _check_length(
+                models.IngredientInRecipe, "specifier", ingredient["specifier"]
+            )
+            names.add(ingredient["name"])
+            ingredient["amount"] = amount
+
+        if not all(isinstance(step, str) for step in recipe.setdefault("steps", [])):
+            raise ValueError("steps must be strings")
+
+        for tag in recipe.setdefault("tags", []):
+            if not isinstance(tag.get("value"), str) or tag.get("kind") not in _KINDS:
+                raise ValueError("tags must have a value and a known kind")
+
+            _check_length(models.Tag, "value", tag["value"], "tag")
+
+    except (ValueError, TypeError, AttributeError, InvalidOperation) as err:
+        raise ValueError(f"line {number}: {err}") from err
+
+    return recipe
+
+
+def _check_length(model, field: str, value: str, name: str = None):
+    """Raise ValueError if a string is longer than its column allows, SQLite
+    would store it and Postgres would fail the whole import
+    """
+    max_length = model._meta.get_field(field).max_length
+
+    if max_length is not None and len(value) > max_length:
+        raise ValueError(f"{name or field} must be at most {max_length} characters")
+
+
+def _get_or_create(model, key: str, defaults: Dict[str, dict], ids: Dict[str, int]):
+    """Add the IDs of rows by a unique field to ids, creating the missing rows.
+    Values already in ids aren't looked up again.
+    """
+    if not (missing := [value for value in defaults if value not in ids]):
+        return
+
+    ids.update(model.objects.filter(**{f"{key}__in": missing}).values_list(key, "id"))
+
+    if created := [value for value in missing if value not in ids]:
+        model.objects.bulk_create(
+            (model(**{key: value, **defaults[value]}) for value in created),
+            ignore_conflicts=True,
+        )
+        ids.update(
+            model.objects.filter(**{f"{key}__in": created}).values_list(key, "id")
+        )
+
+
+def _update_rows(model, fields: Tuple[str, ...], rows: Iterable[tuple]):
+    """Update rows by ID with one executemany, bulk_update builds a CASE
+    expression per row and field. Each row is its field values then its ID.
+    """
+    quote = connection.ops.quote_name
+    columns = ", ".join(
+        f"{quote(model._meta.get_field(field).column)} = %s" for field in fields
+    )
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {quote(model._meta.db_table)} SET {columns} WHERE id = %s",
+            [
+                tuple(
+                    model._meta.get_field(field).get_db_prep_save(value, connection)
+                    for field, value in zip((*fields, "id"), row)
+                )
+                for row in rows
+            ],
+        )
+
+
+def _insert_rows(model, fields: Tuple[str, ...], rows: Iterable[tuple]):
+    """Insert rows with COPY on Postgres and one executemany elsewhere,
+    skipping the model instances bulk_create would build for each row
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ", ".join(quote(model._meta.get_field(field).column) for field in fields)
+
+    with connection.cursor() as cursor:
+        if connection.vendor != "postgresql":
+            cursor.executemany(
+                f"INSERT INTO {table} ({columns}) "
+                f"VALUES ({', '.join(['%s'] * len(fields))})",
+                list(rows),
+            )
+            return
+
+        buffer = io.StringIO()
+        # quoted so empty strings aren't read as NULL
+        csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH CSV", buffer)
+
+
+class _Importer:
+    """State kept across the batches of an import
+
+    Attributes:
+        author_id (int): author of created recipes
+        counts (Dict[str, int]): recipes created and updated and sub-recipe
+            links skipped
+        recipe_ids (Dict[int, int]): exported recipe ID to its ID here
+        links (Dict[str, int]): ingredient name to the exported ID of the
+            recipe it stands for
+        ingredient_ids (Dict[str, int]): ingredient IDs by name
+        tag_ids (Dict[str, int]): tag IDs by value
+    """
+
+    def __init__(self, author_id: int = None):
+        self.author_id = author_id
+        self.counts = {"created": 0, "updated": 0, "skipped_links": 0}
+        self.recipe_ids = {}
+        self.links = {}
+        self.ingredient_ids = {}
+        self.tag_ids = {}
+
+    def write(self, batch: List[dict]) -> Tuple[int, ...]:
+        """Upsert a batch of recipes and replace their relations
+
+        Args:
+            batch (List[dict]): parsed lines
+
+        Returns:
+            Tuple[int, ...]: IDs of the recipes written
+        """
+        # the last line wins when a name repeats
+        batch = list({recipe["name"]: recipe for recipe in batch}.values())
+        names = [recipe["name"] for recipe in batch]
+        existing = dict(
+            models.Recipe.objects.filter(name__in=names).values_list("name", "id")
+        )
+        now = timezone.now()
+
+        models.Recipe.objects.bulk_create(
+            models.Recipe(
+                author_id=self.author_id, **{field: recipe[field] for field in _FIELDS}
+            )
+            for recipe in batch
+            if recipe["name"] not in existing
+        )
+        _update_rows(
+            models.Recipe,
+            (*_FIELDS[1:], "last_updated_on"),
+            (
+                (
+                    *(recipe[field] for field in _FIELDS[1:]),
+                    now,
+                    existing[recipe["name"]],
+                )
+                for recipe in batch
+                if recipe["name"] in existing
+            ),
+        )
+        self.counts["created"] += len(batch) - len(existing)
+        self.counts["updated"] += len(existing)
+
+        ids = (
+            dict(models.Recipe.objects.filter(name__in=names).values_list("name", "id"))
+            if len(existing) < len(batch)
+            else existing
+        )
+        self.recipe_ids.update(
+            (recipe["id"], ids[recipe["name"]]) for recipe in batch if "id" in recipe
+        )
+
+        if existing:
+            replaced = tuple(existing.values())
+            for model in (
+                models.IngredientInRecipe,
+                models.Step,
+                models.Recipe.tags.through,
+            ):
+                # no signals, the batch is refreshed as a whole
+                delete_rows(model, "recipe", replaced)
+
+        _get_or_create(
+            models.Ingredient,
+            "name",
+            {
+                ingredient["name"]: {}
+                for recipe in batch
+                for ingredient in recipe["ingredients"]
+            },
+            self.ingredient_ids,
+        )
+        _get_or_create(
+            models.Tag,
+            "value",
+            {
+                tag["value"]: {"kind": tag["kind"]}
+                for recipe in batch
+                for tag in recipe["tags"]
+            },
+            self.tag_ids,
+        )
+        self.links.update(
+            (ingredient["name"], ingredient["recipe_id"])
+            for recipe in batch
+            for ingredient in recipe["ingredients"]
+            if ingredient.get("recipe_id") is not None
+        )
+
+        _insert_rows(
+            models.IngredientInRecipe,
+            ("recipe_id", "ingredient_id", "amount", "unit", "specifier"),
+            (
+                (
+                    ids[recipe["name"]],
+                    self.ingredient_ids[ingredient["name"]],
+                    ingredient["amount"],
+                    ingredient["unit"],
+                    ingredient["specifier"],
+                )
+                for recipe in batch
+                for ingredient in recipe["ingredients"]
+            ),
+        )
+        _insert_rows(
+            models.Step,
+            ("recipe_id", "order", "instruction"),
+            (
+                (ids[recipe["name"]], position * models.Step.ORDER_GAP, instruction)
+                for recipe in batch
+                for position, instruction in enumerate(recipe["steps"], 1)
+            ),
+        )
+        _insert_rows(
+            models.Recipe.tags.through,
+            ("recipe_id", "tag_id"),
+            {
+                (ids[recipe["name"]], self.tag_ids[tag["value"]])
+                for recipe in batch
+                for tag in recipe["tags"]
+            },
+        )
+
+        return tuple(ids.values())
+
+    def link_sub_recipes(self) -> List[int]:
+        """Point ingredients standing for exported recipes at the recipes' IDs
+        here, a batch at a time. Links are skipped, and counted in
+        counts["skipped_links"], when another ingredient already stands for
+        the recipe, the ingredient already stands for another one or the
+        recipe would end up containing itself. Each batch's closure rows are
+        rebuilt before the next batch is checked for cycles.
+
+        Returns:
+            List[int]: recipes using the linked ingredients, their flattened
+                recipes need rebuilding
+        """
+        # one ingredient per recipe, Ingredient.recipe is one to one
+        targets = {}
+        for name, recipe_id in self.links.items():
+            targets.setdefault(self.recipe_ids.get(recipe_id), name)
+
+        targets = {name: recipe_id for recipe_id, name in targets.items() if recipe_id}
+        linked = set()
+
+        for batch in chunked(targets.items(), BATCH_SIZE):
+            batch = [
+                (self.ingredient_ids[name], recipe_id) for name, recipe_id in batch
+            ]
+            stands_for = dict(
+                models.Ingredient.objects.filter(
+                    Q(id__in=[ingredient_id for ingredient_id, _ in batch])
+                    | Q(recipe_id__in=[recipe_id for _, recipe_id in batch])
+                )
+                .exclude(recipe_id=None)
+                .values_list("id", "recipe_id")
+            )
+            taken = set(stands_for.values())
+            # already linked by an earlier import
+            batch = [link for link in batch if stands_for.get(link[0]) != link[1]]
+            free = [
+                (ingredient_id, recipe_id)
+                for ingredient_id, recipe_id in batch
+                if ingredient_id not in stands_for and recipe_id not in taken
+            ]
+
+            used = defaultdict(set)
+            for ingredient_id, recipe_id in models.IngredientInRecipe.objects.filter(
+                ingredient_id__in=[ingredient_id for ingredient_id, _ in free]
+            ).values_list("ingredient_id", "recipe_id"):
+                used[ingredient_id].add(recipe_id)
+
+            links = [
+                link
+                for link, cycle in zip(
+                    free,
+                    subrecipes.creates_cycles(
+                        [
+                            (used[ingredient_id], recipe_id)
+                            for ingredient_id, recipe_id in free
+                        ]
+                    ),
+                )
+                if not cycle
+            ]
+            self.counts["skipped_links"] += len(batch) - len(links)
+
+            models.Ingredient.objects.bulk_update(
+                [
+                    models.Ingredient(id=ingredient_id, recipe_id=recipe_id)
+                    for ingredient_id, recipe_id in links
+                ],
+                ("recipe_id",),
+            )
+            users = {
+                recipe_id
+                for ingredient_id, _ in links
+                for recipe_id in used[ingredient_id]
+            }
+            subrecipes.relink(users)
+            linked.update(users)
+
+        return sorted(linked)
@@ -0,0 +1,255 @@
+"""
+Conversions between the units of IngredientInRecipe.UNITS. Each convertible
+unit is a Decimal multiple of its dimension's base unit, ml, g or mm, built
+once at import from the UNITS groups. Scaled or converted amounts are put in
+the unit and rounding a cook would measure them with.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Tuple, Union
+from rest_framework import exceptions
+from . import models
+
+METRIC = "metric"
+US = "us"
+SYSTEMS = (METRIC, US)
+METRIC_UNITS = frozenset(("ml", "l", "g", "mm", "cm"))
+
+# base unit of each group of IngredientInRecipe.UNITS that can be converted
+BASE_UNITS = {"Volume": "ml", "Mass": "g", "Length": "mm"}
+
+# size of each unit in its base unit, US customary volumes
+_SIZES = {
+    "tsp": Decimal("4.92892159375"),
+    "tbsp": Decimal("14.78676478125"),
+    "fl oz": Decimal("29.5735295625"),
+    "c": Decimal("236.5882365"),
+    "pt": Decimal("473.176473"),
+    "qt": Decimal("946.352946"),
+    "gal": Decimal("3785.411784"),
+    "ml": Decimal("1"),
+    "l": Decimal("1000"),
+    "lb": Decimal("453.59237"),
+    "oz": Decimal("28.349523125"),
+    "g": Decimal("1"),
+    "in": Decimal("25.4"),
+    "mm": Decimal("1"),
+    "cm": Decimal("10"),
+}
+
+# unit to (base unit, size in base unit), units missing from it e.g. pieces
+# can only be added to themselves
+FACTORS: Dict[str, Tuple[str, Decimal]] = {
+    unit: (BASE_UNITS[group], _SIZES[unit])
+    for group, choices in models.IngredientInRecipe.UNITS
+    if group in BASE_UNITS
+    for unit, _ in choices
+}
+
+# units each system measures a dimension in, as (unit, smallest amount of it
+# worth using), largest first
+_KITCHEN_UNITS = {
+    (METRIC, "ml"): (("l", Decimal("1")), ("ml", Decimal("0"))),
+    (METRIC, "g"): (("g", Decimal("0")),),
+    (METRIC, "mm"): (("cm", Decimal("1")), ("mm", Decimal("0"))),
+    (US, "ml"): (
+        ("gal", Decimal("1")),
+        ("c", Decimal("0.25")),
+        ("tbsp", Decimal("1")),
+        ("tsp", Decimal("0")),
+    ),
+    (US, "g"): (("lb", Decimal("1")), ("oz", Decimal("0"))),
+    (US, "mm"): (("in", Decimal("0")),),
+}
+
+# what amounts of each unit are rounded to, None for the steps of
+# _METRIC_STEPS
+_STEPS = {
+    "tsp": Decimal("0.125"),
+    "tbsp": Decimal("0.5"),
+    "c": Decimal("0.25"),
+    "gal": Decimal("0.25"),
+    "l": Decimal("0.05"),
+    "ml": None,
+    "lb": Decimal("0.25"),
+    "oz": Decimal("0.25"),
+    "g": None,
+    "in": Decimal("0.25"),
+    "cm": Decimal("0.5"),
+    "mm": Decimal("1"),
+    "pieces": Decimal("0.25"),
+}
+
+# (amounts below, step) for ml and g, larger amounts go by tens
+_METRIC_STEPS = (
+    (Decimal("10"), Decimal("0.5")),
+    (Decimal("100"), Decimal("1")),
+    (Decimal("1000"), Decimal("5")),
+)
+
+_CENTS = Decimal("0.01")
+
+# how far rounding may move an amount in a larger unit before the next smaller
+# unit is used instead, e.g. 5 tbsp is not rounded to 0.25 c
+_TOLERANCE = Decimal("0.05")
+
+
+def scaling_options(query_params) -> dict:
+    """Read ?servings= and ?system= from a request
+
+    Args:
+        query_params (QueryDict): request query params
+
+    Raises:
+        ValidationError: servings isn't a positive integer or unknown system
+
+    Returns:
+        dict: servings and system that were given
+    """
+    options = {}
+    errors = {}
+
+    if servings := query_params.get("servings"):
+        try:
+            options["servings"] = int(servings)
+
+        except ValueError:
+            options["servings"] = 0
+
+        if options["servings"] < 1:
+            errors["servings"] = ("servings must be a positive integer",)
+
+    if system := query_params.get("system"):
+        if system not in SYSTEMS:
+            errors["system"] = (f"Unknown system. Must be one of {', '.join(SYSTEMS)}",)
+
+        options["system"] = system
+
+    if errors:
+        raise exceptions.ValidationError({"errors": errors})
+
+    return options
+
+
+def system_of(unit: str) -> Union[str, None]:
+    """Measurement system of a unit
+
+    Args:
+        unit (str): unit from IngredientInRecipe.UNITS
+
+    Returns:
+        Union[str, None]: METRIC, US or None if the unit can't be converted
+    """
+    if unit not in FACTORS:
+        return None
+
+    return METRIC if unit in METRIC_UNITS else US
+
+
+def to_base(amount: Decimal, unit: str) -> Tuple[Decimal, str]:
+    """Convert an amount to its dimension's base unit
+
+    Args:
+        amount (Decimal): amount in unit
+        unit (str): unit from IngredientInRecipe.UNITS
+
+    Returns:
+        Tuple[Decimal, str]: amount and base unit, or the amount and unit
+            unchanged if the unit can't be converted
+    """
+    if unit not in FACTORS:
+        return amount, unit
+
+    base, size = FACTORS[unit]
+    return amount * size, base
+
+
+def convert(amount: Decimal, unit: str, to_unit: str) -> Decimal:
+    """Convert an amount between two units of the same dimension
+
+    Args:
+        amount (Decimal): amount in unit
+        unit (str): unit to convert from
+        to_unit (str): unit to convert to
+
+    Raises:
+        ValueError: the units can't be converted into each other
+
+    Returns:
+        Decimal: amount in to_unit
+    """
+    if unit == to_unit:
+        return amount
+
+    if unit not in FACTORS or FACTORS[unit][0] != FACTORS.get(to_unit, (None,))[0]:
+        raise ValueError(f"cannot convert {unit} to {to_unit}")
+
+    return amount * FACTORS[unit][1] / FACTORS[to_unit][1]
+
+
+def kitchen(amount: Decimal, unit: str, system: str = None) -> Tuple[Decimal, str]:
+    """Put an amount in the largest unit of a system it makes sense to measure
+    it in and round it to what that unit is measured in, e.g. 0.0625 c is
+    1 tbsp and 1234 g is 1230 g. A unit is skipped when rounding would move
+    the amount by _TOLERANCE or more, so 5 tbsp stays 5 tbsp rather than
+    0.25 c. Amounts too small to round to anything keep the smallest step so
+    nothing disappears from a recipe.
+
+    Args:
+        amount (Decimal): amount in unit
+        unit (str): unit from IngredientInRecipe.UNITS
+        system (str, optional): METRIC or US. Defaults to the unit's own.
+
+    Returns:
+        Tuple[Decimal, str]: amount rounded to cents and its unit, units that
+            can't be converted only get rounded
+    """
+    if amount and (base_system := system_of(unit)) is not None:
+        amount, base = to_base(amount, unit)
+
+        # the smallest unit of a system takes any amount, so one always fits
+        for unit, smallest in _KITCHEN_UNITS[system or base_system, base]:
+            if amount < smallest * FACTORS[unit][1]:
+                continue
+
+            exact = amount / FACTORS[unit][1]
+            rounded = _round(exact, _STEPS[unit])
+            if abs(rounded - exact) < exact * _TOLERANCE:
+                break
+
+    else:
+        rounded = _round(amount, _STEPS.get(unit, _CENTS))
+
+    return rounded.quantize(_CENTS, ROUND_HALF_UP), unit
+
+
+def scale(
+    amounts: Iterable[Tuple[Decimal, str]],
+    servings: int,
+    makes: int,
+    system: str = None,
+) -> List[Tuple[Decimal, str]]:
+    """Scale a recipe's amounts to a number of servings, converting them to
+    kitchen units
+
+    Args:
+        amounts (Iterable[Tuple[Decimal, str]]): (amount, unit) to scale
+        servings (int): servings wanted
+        makes (int): servings the amounts make
+        system (str, optional): METRIC or US. Defaults to each unit's own.
+
+    Returns:
+        List[Tuple[Decimal, str]]: scaled (amount, unit) in the order given
+    """
+    return [
+        kitchen(amount * servings / makes, unit, system) for amount, unit in amounts
+    ]
+
+
+def _round(amount: Decimal, step: Union[Decimal, None]) -> Decimal:
+    if step is None:
+        step = next(
+            (step for below, step in _METRIC_STEPS if amount < below), Decimal("10"),
+        )
+
+    rounded = (amount / step).to_integral_value(ROUND_HALF_UP) * step
+    return rounded if rounded or not amount else step
@@ -6,6 +6,7 @@ from . import views
 urlpatterns = [
     path("ingredients/", views.IngredientView.as_view(), name="ingredient"),
     path("ingredients/units/", views.ingredient_units, name="ingredient-units"),
+    path("ingredients/suggest/", views.ingredient_suggest, name="ingredient-suggest"),
     path(
         "ingredients/<int:pk>/",
         views.IngredientDetailView.as_view(),
@@ -15,7 +16,26 @@ urlpatterns = [
     path("tags/kind/", views.tag_kinds, name="tag_kind"),
     path("tags/<int:pk>/", views.TagDetailView.as_view(), name="tag-detail"),
     path("recipes/", views.RecipeView.as_view(), name="recipe"),
+    path("recipes/search/", views.RecipeSearchView.as_view(), name="recipe-search"),
+    path("recipes/match/", views.RecipeMatchView.as_view(), name="recipe-match"),
+    path("recipes/export/", views.RecipeExportView.as_view(), name="recipe-export"),
+    path("recipes/import/", views.RecipeImportView.as_view(), name="recipe-import"),
     path("recipes/<int:pk>/", views.RecipeDetailView.as_view(), name="recipe-detail"),
+    path(
+        "recipes/<int:pk>/flattened/",
+        views.RecipeFlattenedView.as_view(),
+        name="recipe-flattened",
+    ),
+    path(
+        "recipes/<int:pk>/used-in/",
+        views.RecipeUsedInView.as_view(),
+        name="recipe-used-in",
+    ),
+    path(
+        "recipes/<int:pk>/similar/",
+        views.RecipeSimilarView.as_view(),
+        name="recipe-similar",
+    ),
     path(
         "recipes/<int:recipe_pk>/ingredients/",
         views.RecipeIngredient.as_view(),
@@ -31,6 +51,11 @@ urlpatterns = [
         views.RecipeStep.as_view(),
         name="recipe-steps",
     ),
+    path(
+        "recipes/<int:recipe_pk>/steps/order/",
+        views.RecipeStepOrder.as_view(),
+        name="recipe-steps-order",
+    ),
     path(
         "recipes/<int:recipe_pk>/steps/<int:order>/",
         views.RecipeStepDetail.as_view(),
@@ -45,9 +70,23 @@ urlpatterns = [
         name="recipe-tags-delete",
     ),
     path("meal-plan/", views.MealPlanView.as_view(), name="meal-plan"),
+    path(
+        "meal-plan/shopping-list/",
+        views.MealPlanShoppingListView.as_view(),
+        name="meal-plan-shopping-list",
+    ),
     path(
         "meal-plan/<int:pk>/",
         views.MealPlanDetailView.as_view(),
         name="meal-plan-detail",
     ),
+    path("profiles/", views.ProfileView.as_view(), name="profile"),
+    path(
+        "profiles/<int:pk>/", views.ProfileDetailView.as_view(), name="profile-detail"
+    ),
+    path(
+        "profiles/<int:pk>/download/",
+        views.ProfileDownloadView.as_view(),
+        name="profile-download",
+    ),
 ]
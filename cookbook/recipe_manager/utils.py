@@ -1,6 +1,9 @@
 """
 Common functionality
 """
+from itertools import islice
+from typing import Iterable, Iterator
+from django.db import connection
 
 
 def user_owns_item(author_id: int, user_id: int, is_superuser: bool) -> bool:
@@ -24,8 +27,59 @@ def serialize_errors(errors: dict) -> dict:
         errors (dict): serializer errors dict
 
     Returns:
-        dict: new dict with error messages cast to string
+        dict: new dict with error messages cast to string, nested serializer
+            errors keep their shape
     """
     return {
-        key: tuple(str(error) for error in errors) for key, errors in errors.items()
+        key: serialize_errors(errors)
+        if isinstance(errors, dict)
+        else tuple(
+            serialize_errors(error) if isinstance(error, dict) else str(error)
+            for error in errors
+        )
+        for key, errors in errors.items()
     }
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """Split an iterable into lists of at most size items
+
+    Args:
+        iterable (Iterable): items to split
+        size (int): max items per list
+
+    Yields:
+        list: next chunk of items
+    """
+    iterator = iter(iterable)
+
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def delete_rows(model, field: str, values: Iterable) -> int:
+    """Delete the rows whose field is in values with one DELETE, without
+    collecting them first or sending delete signals
+
+    Args:
+        model (Model): model of the rows
+        field (str): field to match, e.g. "recipe_id"
+        values (Iterable): values of field to delete
+
+    Returns:
+        int: rows deleted
+    """
+    if not (values := list(values)):
+        return 0
+
+    quote = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(model._meta.db_table)} "
+            f"WHERE {quote(model._meta.get_field(field).column)} "
+            f"IN ({', '.join(['%s'] * len(values))})",
+            values,
+        )
+
+        return cursor.rowcount
@@ -0,0 +1,132 @@
+"""
+Version tokens for collections, see models.ResourceVersion
+"""
+import uuid
+from typing import Iterable, List, Tuple, Union
+from datetime import datetime
+from django.utils import timezone
+from . import models
+
+RECIPES = "recipes"
+TAGS = "tags"
+INGREDIENTS = "ingredients"
+# which recipes exist and which tags they have, see indexes.TagIndex
+RECIPE_TAGS = "recipe-tags"
+# ingredient names and how many recipes use each, see indexes.IngredientIndex
+INGREDIENT_USES = "ingredient-uses"
+# which ingredients each recipe uses, see indexes.PantryIndex
+RECIPE_INGREDIENTS = "recipe-ingredients"
+# ingredients and tags of every recipe, see indexes.VectorIndex
+RECIPE_VECTORS = "recipe-vectors"
+
+INITIAL_VERSION = "0"
+
+
+def meal_plans(user_id: int) -> str:
+    """Key for a user's meal plans
+
+    Args:
+        user_id (int): meal plan owner
+
+    Returns:
+        str: version key
+    """
+    return f"meal-plans:{user_id}"
+
+
+def bump(*keys: str):
+    """Replace the version token of collections that changed
+
+    Args:
+        keys (str): collections to bump
+    """
+    now = timezone.now()
+
+    for key in keys:
+        version = uuid.uuid4().hex
+
+        if not models.ResourceVersion.objects.filter(key=key).update(
+            version=version, last_modified=now
+        ):
+            models.ResourceVersion.objects.get_or_create(
+                key=key, defaults={"version": version, "last_modified": now}
+            )
+
+
+def get(key: str) -> Tuple[str, Union[datetime, None]]:
+    """Get the current version of a collection
+
+    Args:
+        key (str): collection to look up
+
+    Returns:
+        Tuple[str, Union[datetime, None]]: version token and when it last changed,
+            (INITIAL_VERSION, None) if it never changed
+    """
+    version = (
+        models.ResourceVersion.objects.filter(key=key)
+        .values_list("version", "last_modified")
+        .first()
+    )
+
+    return version or (INITIAL_VERSION, None)
+
+
+def get_many(keys: Iterable[str]) -> List[Tuple[str, Union[datetime, None]]]:
+    """Get the current versions of several collections in one query
+
+    Args:
+        keys (Iterable[str]): collections to look up
+
+    Returns:
+        List[Tuple[str, Union[datetime, None]]]: version of each key in order,
+            see get
+    """
+    keys = list(keys)
+    found = {
+        key: (version, last_modified)
+        for key, version, last_modified in models.ResourceVersion.objects.filter(
+            key__in=keys
+        ).values_list("key", "version", "last_modified")
+    }
+
+    return [found.get(key, (INITIAL_VERSION, None)) for key in keys]
+
+
+def token(key: str) -> str:
+    """Get the current version token of a collection, giving it a random one if
+    it never changed so every fresh database starts from a unique token
+
+    Args:
+        key (str): collection to look up
+
+    Returns:
+        str: version token
+    """
+    version, _ = models.ResourceVersion.objects.get_or_create(
+        key=key,
+        defaults={"version": uuid.uuid4().hex, "last_modified": timezone.now()},
+    )
+
+    return version.version
+
+
+def replace(key: str, expected: str) -> Union[str, None]:
+    """Bump a collection only if its version is still the expected one
+
+    Args:
+        key (str): collection to bump
+        expected (str): version the caller last saw
+
+    Returns:
+        Union[str, None]: new version token or None if the version had already
+            changed, in which case nothing is written
+    """
+    version = uuid.uuid4().hex
+
+    if models.ResourceVersion.objects.filter(key=key, version=expected).update(
+        version=version, last_modified=timezone.now()
+    ):
+        return version
+
+    return None
@@ -3,7 +3,15 @@
 from .ingredients_view import *
 from .tags_view import *
 from .recipe_views import *
+from .recipe_search_view import *
+from .recipe_match_view import *
+from .recipe_similar_view import *
+from .recipe_flattened_view import *
+from .recipe_used_in_view import *
+from .recipe_transfer_views import *
 from .recipe_ingredient_views import *
 from .recipe_steps_view import *
 from .recipe_tags_view import *
 from .meal_plan_view import *
+from .metrics_view import *
+from .profile_views import *
@@ -6,21 +6,28 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.decorators import api_view
 from rest_framework import status
+from django.conf import settings
 from django.db import IntegrityError
+from ..conditional import conditional_get
+from ..pagination import CursorPaginationMixin, get_page_size
 from ..serializers import IngredientSerializer
-from .. import models
+from ..streaming import StreamingListMixin
+from .. import models, suggest, versions
 
 # pylint: disable=no-self-use
-class IngredientView(APIView):
+class IngredientView(StreamingListMixin, CursorPaginationMixin, APIView):
     """
     [GET, POST]: /ingredient/
     {id: int, name: str, recipe_id: (int, None)}
+    GET ?stream=true sends every ingredient in one streamed response
     """
 
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    ordering_fields = ("id", "name")
 
+    @conditional_get(lambda request: versions.get(versions.INGREDIENTS))
     def get(self, request):
-        """Get list of all ingredients
+        """Get a page of ingredients
 
         Args:
             request (HttpRequest): Django HttpRequest
@@ -28,12 +35,18 @@ class IngredientView(APIView):
         Returns:
             Response: DRF Response
         """
-        return Response(
-            tuple(
-                IngredientSerializer(ingredient).data
-                for ingredient in models.Ingredient.objects.all()
-            ),
-            status=status.HTTP_200_OK,
+        if self.wants_stream(request):
+            return self.get_streaming_response(
+                models.Ingredient.objects.order_by("id"),
+                lambda chunk: (
+                    IngredientSerializer(ingredient).data for ingredient in chunk
+                ),
+            )
+
+        ingredients = self.paginate_queryset(models.Ingredient.objects.all(), request)
+
+        return self.get_paginated_response(
+            tuple(IngredientSerializer(ingredient).data for ingredient in ingredients)
         )
 
     def post(self, request):
@@ -114,3 +127,27 @@ def ingredient_units(request):
         Response: DRF Response
     """
     return Response(models.IngredientInRecipe.UNITS, status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+def ingredient_suggest(request):
+    """[GET]: /ingredients/suggest/?q=<partial name>
+    Best matching ingredients for autocomplete, names starting with q first
+    then similar names, ties going to the ingredient used in more recipes.
+    ?limit= sets the number of matches
+
+    Args:
+        request (HttpRequest): Django HttpRequest
+
+    Returns:
+        Response: DRF Response
+    """
+    return Response(
+        suggest.suggest_ingredients(
+            request.query_params.get("q", ""),
+            get_page_size(
+                request, "limit", default=settings.RECIPE_MANAGER["SUGGEST_LIMIT"]
+            ),
+        ),
+        status=status.HTTP_200_OK,
+    )
@@ -1,16 +1,20 @@
 """
-Views for /meal-plan/ and /meal-plan/<pk>/
+Views for /meal-plan/, /meal-plan/<pk>/ and /meal-plan/shopping-list/
 """
 import datetime
+from rest_framework import exceptions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
+from ..conditional import conditional_get
+from ..pagination import CursorPaginationMixin
 from ..serializers import MealPlanSerializer
-from .. import models, utils, constants
+from ..streaming import StreamingListMixin
+from .. import models, utils, constants, shopping, units, versions
 
 
-class MealPlanView(APIView):
+class MealPlanView(StreamingListMixin, CursorPaginationMixin, APIView):
     """
     [GET, POST]: /meal-plan/
     {
@@ -19,14 +23,18 @@ class MealPlanView(APIView):
         meal: str,
         cooked: bool,
     }
+    GET ?stream=true sends every meal plan in one streamed response
     """
 
     permission_classes = (IsAuthenticated,)
+    ordering_fields = ("id", "planned_date")
 
+    @conditional_get(lambda request: _meal_plans_version(request.user.id))
     def get(self, request):
         """Get users meal plans for authenticated user
         default behavior gets meal plans with dates greater than 4 days ago.
         provide historical = 1, true to get all meal plans for user
+        provide stream = 1, true to get every meal plan in one streamed response
 
         Args:
             request (HttpRequest): Django HttpRequest
@@ -41,12 +49,20 @@ class MealPlanView(APIView):
             four_days_ago = datetime.date.today() - datetime.timedelta(days=4)
             query["planned_date__gt"] = four_days_ago
 
-        return Response(
-            tuple(
-                MealPlanSerializer(meal_plan).data
-                for meal_plan in models.MealPlan.objects.filter(**query)
-            ),
-            status=status.HTTP_200_OK,
+        if self.wants_stream(request):
+            return self.get_streaming_response(
+                models.MealPlan.objects.filter(**query).order_by("id"),
+                lambda chunk: (
+                    MealPlanSerializer(meal_plan).data for meal_plan in chunk
+                ),
+            )
+
+        meal_plans = self.paginate_queryset(
+            models.MealPlan.objects.filter(**query), request
+        )
+
+        return self.get_paginated_response(
+            tuple(MealPlanSerializer(meal_plan).data for meal_plan in meal_plans)
         )
 
     def post(self, request):
@@ -107,3 +123,88 @@ class MealPlanDetailView(APIView):
             response = Response(serializer.data, status=status.HTTP_200_OK)
 
         return response
+
+
+class MealPlanShoppingListView(APIView):
+    """
+    [GET]: /meal-plan/shopping-list/?start=<date>&end=<date>
+    Ingredients needed for the authenticated user's meals planned from start
+    to end inclusive, dates are YYYY-MM-DD and default to the coming week.
+    ?system=metric or ?system=us picks the units amounts are given in
+    {
+        start: str,
+        end: str,
+        ingredients: [
+            {
+                ingredient_id: int,
+                name: str,
+                amount: decimal,
+                unit: str,
+            },
+        ]
+    }
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    @conditional_get(lambda request: _shopping_list_version(request.user.id))
+    def get(self, request):
+        """Get the shopping list for a date range
+
+        Args:
+            request (HttpRequest): Django HttpRequest
+
+        Returns:
+            Response: DRF Response
+        """
+        system = units.scaling_options(request.query_params).get("system")
+        start = _get_date(request, "start", datetime.date.today())
+        end = _get_date(request, "end", start + datetime.timedelta(days=6))
+
+        if end < start:
+            raise exceptions.ValidationError(
+                {"errors": {"end": ("end must not be before start",)}}
+            )
+
+        return Response(
+            {
+                "start": start,
+                "end": end,
+                "ingredients": shopping.shopping_list(
+                    request.user.id, start, end, system
+                ),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+def _get_date(request, param: str, default: datetime.date) -> datetime.date:
+    if not (value := request.query_params.get(param)):
+        return default
+
+    try:
+        return datetime.date.fromisoformat(value)
+
+    except ValueError:
+        raise exceptions.ValidationError(
+            {"errors": {param: ("Must be a date formatted YYYY-MM-DD",)}}
+        )
+
+
+def _shopping_list_version(user_id: int):
+    meal_plans, recipes = (
+        versions.get(versions.meal_plans(user_id)),
+        versions.get(versions.RECIPES),
+    )
+    last_modified = [version[1] for version in (meal_plans, recipes) if version[1]]
+    # the default range depends on today's date
+    return (
+        f"{meal_plans[0]}:{recipes[0]}:{datetime.date.today()}",
+        max(last_modified, default=None),
+    )
+
+
+def _meal_plans_version(user_id: int):
+    version, last_modified = versions.get(versions.meal_plans(user_id))
+    # the default listing depends on today's date as well as on the rows
+    return f"{version}:{datetime.date.today()}", last_modified
@@ -0,0 +1,40 @@
+"""
+View for /metrics
+"""
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from .. import metrics as recipe_metrics
+
+
+@require_GET
+def metrics(request):
+    """[GET]: /metrics
+    Metrics of every worker in the Prometheus text exposition format, only
+    served when RECIPE_MANAGER["METRICS_DIR"] and ["METRICS_TOKEN"] are set,
+    to requests with the header Authorization: Bearer <METRICS_TOKEN>
+
+    Args:
+        request (HttpRequest): Django HttpRequest
+
+    Returns:
+        HttpResponse: metrics
+    """
+    if (
+        settings.RECIPE_MANAGER["METRICS_DIR"] is None
+        or (token := settings.RECIPE_MANAGER["METRICS_TOKEN"]) is None
+    ):
+        raise Http404
+
+    if not constant_time_compare(
+        request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"
+    ):
+        response = HttpResponse(status=401)
+        response["WWW-Authenticate"] = "Bearer"
+
+        return response
+
+    return HttpResponse(
+        recipe_metrics.collect(), content_type=recipe_metrics.CONTENT_TYPE
+    )
@@ -0,0 +1,127 @@
+"""
+Views for /profiles/, /profiles/<pk>/ and /profiles/<pk>/download/
+"""
+import json
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ..serializers import RequestProfileSerializer
+from .. import models, profiling
+
+
+class IsSuperUser(BasePermission):
+    """
+    Allows access only to superusers
+    """
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_superuser)
+
+
+# pylint: disable=no-self-use
+class ProfileView(APIView):
+    """
+    [GET]: /profiles/
+    Kept request profiles newest first, superusers only
+    [{id, user_id, created_on, method, path, status, duration, profiler}]
+    """
+
+    permission_classes = (IsSuperUser,)
+
+    def get(self, request):
+        """Get every kept profile
+
+        Args:
+            request (HttpRequest): Django HttpRequest
+
+        Returns:
+            Response: DRF Response
+        """
+        return Response(
+            RequestProfileSerializer(
+                models.RequestProfile.objects.order_by("-id").defer(
+                    "result", "queries"
+                ),
+                many=True,
+            ).data,
+            status=status.HTTP_200_OK,
+        )
+
+
+class ProfileDetailView(APIView):
+    """
+    [GET]: /profiles/<int:pk>/
+    A profile with the SQL its request made, superusers only
+    {
+        ...RequestProfileSerializer,
+        queries: [{sql: str, params: [str], seconds: float, plan: (str, None)}],
+    }
+    """
+
+    permission_classes = (IsSuperUser,)
+
+    def get(self, request, pk):
+        """Get a profile
+
+        Args:
+            request (HttpRequest): Django HttpRequest
+            pk (int): RequestProfile primary key
+
+        Returns:
+            Response: DRF Response
+        """
+        try:
+            saved = models.RequestProfile.objects.defer("result").get(pk=pk)
+
+        except models.RequestProfile.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        return Response(
+            {
+                **RequestProfileSerializer(saved).data,
+                "queries": json.loads(saved.queries),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class ProfileDownloadView(APIView):
+    """
+    [GET]: /profiles/<int:pk>/download/
+    The profiler's output, superusers only. A pstats dump, profile-<pk>.prof,
+    for cprofile or collapsed stacks, profile-<pk>.folded, for sample
+    """
+
+    permission_classes = (IsSuperUser,)
+
+    def get(self, request, pk):
+        """Download a profile's result
+
+        Args:
+            request (HttpRequest): Django HttpRequest
+            pk (int): RequestProfile primary key
+
+        Returns:
+            HttpResponse: result or 404 DRF Response
+        """
+        saved = (
+            models.RequestProfile.objects.filter(pk=pk)
+            .values_list("profiler", "result")
+            .first()
+        )
+
+        if saved is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        profiler, result = saved
+        file_name, content_type = (
+            (f"profile-{pk}.prof", "application/octet-stream")
+            if profiler == profiling.CPROFILE
+            else (f"profile-{pk}.folded", "text/plain; charset=utf-8")
+        )
+        response = HttpResponse(bytes(result), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{file_name}"'
+
+        return response
@@ -0,0 +1,55 @@
+"""
+View for /recipes/<pk>/flattened/
+"""
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ..conditional import conditional_get
+from .. import subrecipes, units, versions
+
+
+class RecipeFlattenedView(APIView):
+    """
+    [GET]: /recipes/<int:pk>/flattened/
+    Raw ingredients of a recipe with every sub-recipe expanded. A sub-recipe's
+    amount is the number of its servings used.
+    {
+        recipe_id: int,
+        servings: int,
+        ingredients: [
+            {
+                ingredient_id: int,
+                name: str,
+                amount: decimal,
+                unit: str,
+            },
+        ]
+    }
+    accepts ?servings= and ?system= like /recipes/<pk>/
+    """
+
+    permission_classes = (IsAuthenticatedOrReadOnly,)
+
+    @conditional_get(lambda request, pk: versions.get(versions.RECIPES))
+    def get(self, request, pk):
+        """Get a flattened recipe
+
+        Args:
+            request (HttpRequest): Django HttpRequest
+            pk (int): Recipe primary key
+
+        Returns:
+            HttpResponse: flattened recipe or 404 DRF Response
+        """
+        if scaling := units.scaling_options(request.query_params):
+            if (flattened := subrecipes.flatten(pk, **scaling)) is None:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+
+            return Response(flattened, status=status.HTTP_200_OK)
+
+        if (document := subrecipes.get(pk)) is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        return HttpResponse(document, content_type="application/json")
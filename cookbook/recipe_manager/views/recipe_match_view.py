@@ -0,0 +1,106 @@
+"""
+View for /recipes/match/
+"""
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from ..conditional import conditional_get
+from ..pagination import get_page_size
+from .. import models, projections, documents, indexes, versions
+
+
+class RecipeMatchView(APIView):
+    """
+    [GET]: /recipes/match/?ingredients=<id>,<id>,...
+    Recipes ranked by how much of each recipe the given ingredients cover
+    [
+        {
+            recipe: {...},
+            coverage: float,  # share of the recipe's ingredients on hand
+            missing: [{id: int, name: str},]
+        },
+    ]
+    ?page_size= limits the number of recipes
+    accepts ?fields= and ?include= like /recipe/ for the recipes
+    """
+
+    permission_classes = (IsAuthenticatedOrReadOnly,)
+
+    @conditional_get(
+        lambda request: projections.include_version(
+            request, versions.get(versions.RECIPES)
+        )
+    )
+    def get(self, request):
+        """Match recipes against a pantry
+
+        Args:
+            request (HttpRequest): Django HttpRequest
+
+        Returns:
+            HttpResponse: matching recipes
+        """
+        try:
+            pantry = {
+                int(ingredient_id)
+                for ingredient_id in request.query_params["ingredients"].split(",")
+            }
+
+        except (KeyError, ValueError):
+            raise exceptions.ValidationError(
+                {"errors": {"ingredients": ("Must be comma separated ingredient IDs",)}}
+            )
+
+        options = projections.recipe_options(request.query_params)
+        matches = indexes.pantry_index.get().match(pantry, get_page_size(request))
+        names = dict(
+            models.Ingredient.objects.filter(
+                id__in={
+                    ingredient_id
+                    for *_, missing in matches
+                    for ingredient_id in missing
+                }
+            ).values_list("id", "name")
+        )
+        scores = [
+            {
+                "coverage": round(on_hand / (on_hand + len(missing)), 4),
+                "missing": [
+                    {"id": ingredient_id, "name": names[ingredient_id]}
+                    for ingredient_id in missing
+                ],
+            }
+            for _, on_hand, missing in matches
+        ]
+
+        if options:
+            recipes = models.Recipe.objects.in_bulk(
+                recipe_id for recipe_id, *_ in matches
+            )
+            recipe_documents = dict(
+                zip(recipes, projections.recipe_documents(recipes.values(), **options))
+            )
+            return Response(
+                [
+                    {"recipe": recipe_documents[recipe_id], **score}
+                    for (recipe_id, *_), score in zip(matches, scores)
+                    if recipe_id in recipe_documents
+                ],
+                status=status.HTTP_200_OK,
+            )
+
+        renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+        recipe_documents = documents.get(recipe_id for recipe_id, *_ in matches)
+
+        return HttpResponse(
+            documents.to_json_array(
+                '{"recipe":%s,%s'
+                % (recipe_documents[recipe_id], renderer.render(score).decode()[1:])
+                for (recipe_id, *_), score in zip(matches, scores)
+                if recipe_id in recipe_documents
+            ),
+            content_type="application/json",
+        )
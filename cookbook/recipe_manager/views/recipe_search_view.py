@@ -0,0 +1,71 @@
+"""
+View for /recipes/search/
+"""
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from ..conditional import conditional_get
+from ..pagination import get_page_size
+from .. import models, projections, documents, search, versions
+
+
+class RecipeSearchView(APIView):
+    """
+    [GET]: /recipes/search/?q=<words>
+    Recipes whose name, ingredients, description or steps match every word
+    in q, best match first. Names weigh the most, then ingredients,
+    description and steps.
+    ?page_size= limits the number of results
+    accepts ?fields= and ?include= like /recipe/
+    """
+
+    permission_classes = (IsAuthenticatedOrReadOnly,)
+
+    @conditional_get(
+        lambda request: projections.include_version(
+            request, versions.get(versions.RECIPES)
+        )
+    )
+    def get(self, request):
+        """Search recipes
+
+        Args:
+            request (HttpRequest): Django HttpRequest
+
+        Returns:
+            HttpResponse: matching recipes
+        """
+        if not (query := request.query_params.get("q", "").strip()):
+            raise exceptions.ValidationError(
+                {"errors": {"q": ("A search query is required",)}}
+            )
+
+        options = projections.recipe_options(request.query_params)
+        recipe_ids = search.search(query, get_page_size(request))
+
+        if options:
+            recipes = models.Recipe.objects.in_bulk(recipe_ids)
+            return Response(
+                projections.recipe_documents(
+                    (
+                        recipes[recipe_id]
+                        for recipe_id in recipe_ids
+                        if recipe_id in recipes
+                    ),
+                    **options,
+                ),
+                status=status.HTTP_200_OK,
+            )
+
+        recipe_documents = documents.get(recipe_ids)
+
+        return HttpResponse(
+            documents.to_json_array(
+                recipe_documents[recipe_id]
+                for recipe_id in recipe_ids
+                if recipe_id in recipe_documents
+            ),
+            content_type="application/json",
+        )
@@ -0,0 +1,74 @@
+"""
+View for /recipes/<pk>/similar/
+"""
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ..conditional import conditional_get
+from .. import models, projections, documents, similarity, versions
+
+
+class RecipeSimilarView(APIView):
+    """
+    [GET]: /recipes/<int:pk>/similar/
+    Recipes sharing the most ingredients and tags with a recipe, rarer ones
+    counting for more
+    [
+        {
+            recipe: {...},
+            score: float,  # cosine similarity, 0 to 1
+        },
+    ]
+    accepts ?fields= and ?include= like /recipe/ for the recipes
+    """
+
+    permission_classes = (IsAuthenticatedOrReadOnly,)
+
+    @conditional_get(
+        lambda request, pk: projections.include_version(
+            request, versions.get(versions.RECIPES)
+        )
+    )
+    def get(self, request, pk):
+        """Get the most similar recipes to a recipe
+
+        Args:
+            request (HttpRequest): Django HttpRequest
+            pk (int): Recipe primary key
+
+        Returns:
+            HttpResponse: similar recipes or 404 DRF Response
+        """
+        if not models.Recipe.objects.filter(id=pk).exists():
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        similar = similarity.get(pk)
+
+        if options := projections.recipe_options(request.query_params):
+            recipes = models.Recipe.objects.in_bulk(
+                recipe_id for recipe_id, _ in similar
+            )
+            recipe_documents = dict(
+                zip(recipes, projections.recipe_documents(recipes.values(), **options))
+            )
+            return Response(
+                [
+                    {"recipe": recipe_documents[recipe_id], "score": score}
+                    for recipe_id, score in similar
+                    if recipe_id in recipe_documents
+                ],
+                status=status.HTTP_200_OK,
+            )
+
+        recipe_documents = documents.get(recipe_id for recipe_id, _ in similar)
+
+        return HttpResponse(
+            documents.to_json_array(
+                '{"recipe":%s,"score":%r}' % (recipe_documents[recipe_id], score)
+                for recipe_id, score in similar
+                if recipe_id in recipe_documents
+            ),
+            content_type="application/json",
+        )
@@ -1,25 +1,25 @@
 """
-Views for /recipe/<recipe_pk>/steps/ and /recipe/<recipe_pk>/steps/<step_pk>
+Views for /recipe/<recipe_pk>/steps/, /recipe/<recipe_pk>/steps/order/ and
+/recipe/<recipe_pk>/steps/<order>
 """
-from django.db.models import Prefetch
+from django.db import IntegrityError, transaction
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework import status
 from ..serializers import StepSerializer
-from .. import models, utils, constants
+from .. import models, utils, constants, steps
 
 
 class RecipeStep(APIView):
     """
     [GET, POST] /recipe/<int:recipe_pk>/steps/
     {
-        id: int,
-        order: int,
         instruction: str,
-        recipe_id: int
+        position: int,  # POST ONLY
     }
-    only instruction is required to post
+    only instruction is required to post, position is where the step goes
+    counting from 1 and defaults to after the last step
     Args:
         APIView ([type]): [description]
     """
@@ -36,19 +36,17 @@ class RecipeStep(APIView):
         Returns
             Response: DRF response
         """
-        try:
-            recipe = models.Recipe.objects.prefetch_related(
-                Prefetch("steps", queryset=models.Step.objects.only("instruction"))
-            ).get(id=recipe_pk)
+        instructions = tuple(
+            models.Step.objects.filter(recipe_id=recipe_pk).values_list(
+                "instruction", flat=True
+            )
+        )
 
-        except models.Recipe.DoesNotExist:
+        if not instructions and not models.Recipe.objects.filter(id=recipe_pk).exists():
             response = Response(status=status.HTTP_404_NOT_FOUND,)
 
         else:
-            response = Response(
-                tuple(step.instruction for step in recipe.steps.all()),
-                status=status.HTTP_200_OK,
-            )
+            response = Response(instructions, status=status.HTTP_200_OK)
 
         return response
 
@@ -73,23 +71,87 @@ class RecipeStep(APIView):
         ):
             return constants.NOT_ALLOWED_RESPONSE
 
-        current_step_count = recipe.steps.count()
-        serializer = StepSerializer(
-            data={
-                **request.data,
-                "recipe_id": recipe_pk,
-                "order": current_step_count + 1,
-            }
-        )
+        serializer = StepSerializer(data=request.data)
 
         if not serializer.is_valid():
             response = Response(
                 {"errors": utils.serialize_errors(serializer.errors)},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+
+        else:
+            try:
+                step = steps.insert(
+                    recipe_pk,
+                    serializer.validated_data["instruction"],
+                    serializer.validated_data.get("position"),
+                )
+
+            except IntegrityError:
+                response = constants.STEPS_CONFLICT_RESPONSE
+
+            else:
+                response = Response(
+                    StepSerializer(step).data, status=status.HTTP_201_CREATED
+                )
+
+        return response
+
+
+class RecipeStepOrder(APIView):
+    """
+    [PUT] /recipe/<int:recipe_pk>/steps/order/
+    {
+        positions: [int,],
+    }
+    current positions of every step in their new order, e.g. [2, 1, 3] swaps
+    the first two steps. Responds with the reordered instructions.
+    """
+
+    permission_classes = (IsAuthenticatedOrReadOnly,)
+
+    def put(self, request, recipe_pk):
+        """Reorder every step of a recipe at once
+
+        Args:
+            request (HttpRequest): Django HttpRequest
+            recipe_pk (int): Recipe primary key
+
+        Returns
+            Response: DRF response
+        """
+        try:
+            recipe = models.Recipe.objects.get(id=recipe_pk)
+
+        except models.Recipe.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND,)
+
+        if not utils.user_owns_item(
+            recipe.author_id, request.user.id, request.user.is_superuser
+        ):
+            return constants.NOT_ALLOWED_RESPONSE
+
+        positions = request.data.get("positions")
+
+        try:
+            if not isinstance(positions, list) or not all(
+                isinstance(position, int) for position in positions
+            ):
+                raise ValueError("positions must be an array of step positions")
+
+            instructions = steps.reorder(recipe_pk, positions)
+
+        except ValueError as err:
+            response = Response(
+                {"errors": {"positions": (str(err),)}},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        except IntegrityError:
+            response = constants.STEPS_CONFLICT_RESPONSE
+
         else:
-            serializer.save()
-            response = Response(serializer.data, status=status.HTTP_201_CREATED)
+            response = Response(instructions, status=status.HTTP_200_OK)
 
         return response
 
@@ -98,11 +160,11 @@ class RecipeStepDetail(APIView):
     """
     [GET, PUT, DELETE] /recipe/<int:recipe_pk>/steps/<int:order>/
     {
-        id: int,
-        order: int,
         instruction: str,
-        recipe_id: int
+        position: int,  # PUT ONLY
     }
+    order is the position of the step counting from 1, PUT with a position
+    moves the step there
     """
 
     permission_classes = (IsAuthenticatedOrReadOnly,)
@@ -118,10 +180,7 @@ class RecipeStepDetail(APIView):
         Returns
             Response: DRF response
         """
-        try:
-            step = models.Step.objects.get(recipe_id=recipe_pk, order=order)
-
-        except models.Step.DoesNotExist:
+        if (step := steps.step_at(recipe_pk, order)) is None:
             response = Response(status=status.HTTP_404_NOT_FOUND,)
 
         else:
@@ -140,12 +199,7 @@ class RecipeStepDetail(APIView):
         Returns
             Response: DRF response
         """
-        try:
-            step = models.Step.objects.select_related("recipe").get(
-                recipe_id=recipe_pk, order=order
-            )
-
-        except models.Step.DoesNotExist:
+        if (step := steps.step_at(recipe_pk, order)) is None:
             return Response(status=status.HTTP_404_NOT_FOUND,)
 
         if not utils.user_owns_item(
@@ -153,13 +207,28 @@ class RecipeStepDetail(APIView):
         ):
             return constants.NOT_ALLOWED_RESPONSE
 
-        serializer = StepSerializer(step, data={**request.data, "order": step.order})
+        serializer = StepSerializer(step, data=request.data, partial=True)
 
         if not serializer.is_valid():
-            response = Response({"errors": utils.serialize_errors(serializer.errors)})
+            response = Response(
+                {"errors": utils.serialize_errors(serializer.errors)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         else:
-            serializer.save()
-            response = Response(serializer.data, status=status.HTTP_200_OK)
+            try:
+                with transaction.atomic():
+                    if (
+                        position := serializer.validated_data.get("position")
+                    ) is not None:
+                        steps.move(step, position)
+
+                    serializer.save(order=step.order)
+
+            except IntegrityError:
+                response = constants.STEPS_CONFLICT_RESPONSE
+
+            else:
+                response = Response(serializer.data, status=status.HTTP_200_OK)
 
         return response
 
@@ -174,12 +243,7 @@ class RecipeStepDetail(APIView):
         Returns
             Response: DRF response
         """
-        try:
-            step = models.Step.objects.select_related("recipe").get(
-                recipe_id=recipe_pk, order=order
-            )
-
-        except models.Step.DoesNotExist:
+        if (step := steps.step_at(recipe_pk, order)) is None:
             return Response(status=status.HTTP_404_NOT_FOUND,)
 
         if not utils.user_owns_item(
@@ -187,14 +251,6 @@ class RecipeStepDetail(APIView):
         ):
             return constants.NOT_ALLOWED_RESPONSE
 
-        if models.Step.objects.filter(recipe_id=recipe_pk).count() == step.order:
-            step.delete()
-            response = Response(status=status.HTTP_204_NO_CONTENT)
-
-        else:
-            response = Response(
-                {"errors": ("Steps must be deleted in decresing order",)},
-                status=status.HTTP_409_CONFLICT,
-            )
+        step.delete()
 
-        return response
+        return Response(status=status.HTTP_204_NO_CONTENT)
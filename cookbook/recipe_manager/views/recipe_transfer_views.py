@@ -0,0 +1,92 @@
+"""
+Views for /recipes/export/ and /recipes/import/
+"""
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .. import transfer
+
+JSON_LINES = "application/x-ndjson"
+
+
+class RecipeExportView(APIView):
+    """
+    [GET]: /recipes/export/
+    Every recipe as JSON lines streamed a batch at a time, one recipe per
+    line, staff only
+    {
+        id: int,
+        name: str,
+        description: str,
+        servings: int,
+        cook_time: str,
+        ingredients: [
+            {
+                name: str,
+                recipe_id: int,  # recipe the ingredient stands for or null
+                amount: decimal,
+                unit: str,
+                specifier: str,
+            }
+        ],
+        steps: [str,],
+        tags: [{value: str, kind: str},],
+    }
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        """Export every recipe
+
+        Args:
+            request (HttpRequest): Django HttpRequest
+
+        Returns:
+            StreamingHttpResponse: JSON lines
+        """
+        response = StreamingHttpResponse(
+            transfer.export_lines(), content_type=JSON_LINES
+        )
+        response["Content-Disposition"] = 'attachment; filename="recipes.jsonl"'
+
+        return response
+
+
+class RecipeImportView(APIView):
+    """
+    [POST]: /recipes/import/
+    Import recipes sent as JSON lines in the format of /recipes/export/.
+    Recipes are matched by name and replaced, ingredients and tags by name
+    and value. Sub-recipe links that would make a recipe contain itself or
+    point an ingredient at another recipe are skipped. Staff only.
+    {
+        created: int,
+        updated: int,
+        skipped_links: int,
+    }
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def post(self, request):
+        """Import recipes from the request body, read a line at a time
+
+        Args:
+            request (HttpRequest): Django HttpRequest
+
+        Returns:
+            Response: DRF Response
+        """
+        try:
+            # the body is read as a stream rather than parsed by DRF
+            counts = transfer.import_lines(request._request, request.user.id)
+
+        except ValueError as err:
+            return Response(
+                {"errors": {"lines": (str(err),)}}, status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(counts, status=status.HTTP_200_OK)
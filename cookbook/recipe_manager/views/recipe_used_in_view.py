@@ -0,0 +1,81 @@
+"""
+View for /recipes/<pk>/used-in/
+"""
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ..conditional import conditional_get
+from ..pagination import get_page_size
+from .. import models, projections, documents, versions
+
+
+class RecipeUsedInView(APIView):
+    """
+    [GET]: /recipes/<int:pk>/used-in/
+    Recipes using a recipe as an ingredient, directly or through other
+    sub-recipes, closest first
+    [
+        {
+            recipe: {...},
+            depth: int,  # 1 when the recipe is one of its ingredients
+        },
+    ]
+    ?page_size= limits the number of recipes
+    accepts ?fields= and ?include= like /recipe/ for the recipes
+    """
+
+    permission_classes = (IsAuthenticatedOrReadOnly,)
+
+    @conditional_get(
+        lambda request, pk: projections.include_version(
+            request, versions.get(versions.RECIPES)
+        )
+    )
+    def get(self, request, pk):
+        """Get the recipes a recipe is used in
+
+        Args:
+            request (HttpRequest): Django HttpRequest
+            pk (int): Recipe primary key
+
+        Returns:
+            HttpResponse: recipes using the recipe or 404 DRF Response
+        """
+        if not models.Recipe.objects.filter(id=pk).exists():
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        options = projections.recipe_options(request.query_params)
+        used_in = list(
+            models.RecipeDependency.objects.filter(descendant_id=pk)
+            .order_by("depth", "ancestor_id")
+            .values_list("ancestor_id", "depth")[: get_page_size(request)]
+        )
+
+        if options:
+            recipes = models.Recipe.objects.in_bulk(
+                recipe_id for recipe_id, _ in used_in
+            )
+            recipe_documents = dict(
+                zip(recipes, projections.recipe_documents(recipes.values(), **options))
+            )
+            return Response(
+                [
+                    {"recipe": recipe_documents[recipe_id], "depth": depth}
+                    for recipe_id, depth in used_in
+                    if recipe_id in recipe_documents
+                ],
+                status=status.HTTP_200_OK,
+            )
+
+        recipe_documents = documents.get(recipe_id for recipe_id, _ in used_in)
+
+        return HttpResponse(
+            documents.to_json_array(
+                '{"recipe":%s,"depth":%d}' % (recipe_documents[recipe_id], depth)
+                for recipe_id, depth in used_in
+                if recipe_id in recipe_documents
+            ),
+            content_type="application/json",
+        )
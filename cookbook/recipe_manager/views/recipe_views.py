@@ -1,20 +1,26 @@
 """
 Views for /recipe/ and /recipe/<pk>/
 """
-from django.db import transaction, IntegrityError
-from django.db.models import Prefetch
+import functools
+import json
+from decimal import Decimal
+from django.db import IntegrityError
+from django.http import HttpResponse
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework import status
-from ..serializers import (
-    RecipeSerializer,
-    IngredientInRecipeSerializer,
-)
-from .. import models, utils, constants
+from rest_framework.settings import api_settings
+from ..conditional import conditional_get
+from ..pagination import CursorPaginationMixin
+from ..serializers import NestedRecipeSerializer
+from ..streaming import StreamingListMixin
+from .. import models, utils, constants, projections, documents, indexes, units
+from .. import writes
+from .. import versions
 
 
-class RecipeView(APIView):
+class RecipeView(StreamingListMixin, CursorPaginationMixin, APIView):
     """
     [GET, POST]: /recipe/
     {
@@ -23,24 +29,37 @@ class RecipeView(APIView):
         servings: int,
         cook_time: str,
         tags: [int,],
-        # GET ONLY
         steps: [str,],
         ingredients: [
             {
                 amount: decimal,
                 unit: str,
                 specifier: str,
-                recipe_id: int # does not need to be provided
+                recipe_id: int # GET ONLY
                 ingredient_id: int
             }
         ],
     }
+    POST creates the recipe with its ingredients, steps and tags at once,
+        all of them are optional
+    GET ?stream=true sends every recipe in one streamed response
+    GET ?fields=name,tags trims each recipe to those fields
+    GET ?include=ingredients.ingredient,tags.value embeds related objects
+    GET ?tags=1,2|3,-4 keeps recipes tagged 1 and 2 or 3 and not 4
+    GET ?facets=true wraps the page in {results: [], facets: {kind: {tag_id: count}}}
+        counting the recipes matching ?tags= that have each tag
     """
 
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    ordering_fields = ("id", "name")
 
+    @conditional_get(
+        lambda request: projections.include_version(
+            request, versions.get(versions.RECIPES)
+        )
+    )
     def get(self, request):
-        """Returns a list of all Recipes
+        """Returns a page of Recipes from their stored documents
 
         Args:
             request (HttpRequest): Django HttpRequest
@@ -48,16 +67,88 @@ class RecipeView(APIView):
         Returns:
             Response: DRF Response
         """
+        options = projections.recipe_options(request.query_params)
+
+        if "tags" in request.query_params or "facets" in request.query_params:
+            return self._get_tagged(request, options)
+
+        if self.wants_stream(request):
+            return self.get_streaming_response(
+                models.Recipe.objects.order_by("id"),
+                functools.partial(projections.recipe_documents, **options),
+            )
+
+        if options:
+            recipes = self.paginate_queryset(models.Recipe.objects.all(), request)
+            return self.get_paginated_response(
+                projections.recipe_documents(recipes, **options)
+            )
 
-        def serialize_recipes_with_relations(recipes):
-            for recipe in recipes:
-                yield _serialize_recipe_with_relations(recipe)
+        recipes = self.paginate_queryset(
+            models.Recipe.objects.only(*self.ordering_fields), request
+        )
+        recipe_documents = documents.get(recipe.id for recipe in recipes)
+
+        response = HttpResponse(
+            documents.to_json_array(
+                recipe_documents[recipe.id]
+                for recipe in recipes
+                if recipe.id in recipe_documents
+            ),
+            content_type="application/json",
+        )
+        self.set_pagination_headers(response)
+
+        return response
+
+    def _get_tagged(self, request, options):
+        """Page of recipes matching ?tags= read from the tag index, with facet
+        counts if ?facets=true
+        """
+        tag_bitmaps = indexes.tag_index.get()
+        matched = tag_bitmaps.match(
+            indexes.parse_tag_filter(request.query_params["tags"])
+            if request.query_params.get("tags")
+            else ()
+        )
+        recipe_ids = self.paginate_bitmap(matched, request)
+        facets = (
+            tag_bitmaps.facets(matched)
+            if request.query_params.get("facets", "").lower() in ("1", "true")
+            else None
+        )
 
-        recipes = _query_recipe_with_relations().all()
+        if options:
+            recipes = models.Recipe.objects.in_bulk(recipe_ids)
+            results = projections.recipe_documents(
+                (
+                    recipes[recipe_id]
+                    for recipe_id in recipe_ids
+                    if recipe_id in recipes
+                ),
+                **options,
+            )
+            return self.get_paginated_response(
+                results if facets is None else {"results": results, "facets": facets}
+            )
 
-        return Response(
-            tuple(serialize_recipes_with_relations(recipes)), status=status.HTTP_200_OK,
+        recipe_documents = documents.get(recipe_ids)
+        content = documents.to_json_array(
+            recipe_documents[recipe_id]
+            for recipe_id in recipe_ids
+            if recipe_id in recipe_documents
         )
+        if facets is not None:
+            renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+            content = b'{"results":%s,"facets":%s}' % (
+                content,
+                renderer.render(facets),
+            )
+
+        response = HttpResponse(content, content_type="application/json")
+        self.set_pagination_headers(response)
+
+        return response
 
     def post(self, request):
         """Create a new Recipe
@@ -69,34 +160,18 @@ class RecipeView(APIView):
             Response: DRF Response
         """
 
-        user = request.user
-        data = {**request.data, "author_id": user.id}
-        errors = {}
-
-        if isinstance(tags := data.pop("tags", ()), (list, tuple)):
-            try:
-                tag_ids = tuple(int(tag_id) for tag_id in tags)
-            except ValueError:
-                errors["errors"] = {"tags": ["Must be an array of Tag IDs if provided"]}
-
-        else:
-            errors["errors"] = {"tags": ["Must be an Array of Tag IDs if provided"]}
+        serializer = NestedRecipeSerializer(
+            data={**request.data, "author_id": request.user.id}
+        )
 
-        if not (serializer := RecipeSerializer(data=data)).is_valid():
-            errors.setdefault("errors", {}).update(
-                utils.serialize_errors(serializer.errors)
+        if not serializer.is_valid():
+            return Response(
+                {"errors": utils.serialize_errors(serializer.errors)},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        if errors:
-            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
-
         try:
-            recipe = serializer.save()
-            if tag_ids:
-                tags = models.Tag.objects.filter(id__in=tag_ids)
-
-                if tags:
-                    recipe.tags.add(*tags)
+            recipe = writes.create_recipe(serializer.validated_data)
 
         except IntegrityError as err:
             response = Response(
@@ -105,8 +180,9 @@ class RecipeView(APIView):
             )
 
         else:
-            response = Response(
-                _serialize_recipe_with_relations(recipe),
+            response = HttpResponse(
+                documents.get((recipe.id,))[recipe.id],
+                content_type="application/json",
                 status=status.HTTP_201_CREATED,
             )
 
@@ -121,48 +197,74 @@ class RecipeDetailView(APIView):
         description: str,
         servings: int,
         cook_time: str,
-        # GET ONLY
         ingredients: [
              {
                 amount: decimal,
                 unit: str,
                 specifier: str,
-                recipe_id: int # does not need to be provided
+                recipe_id: int # GET ONLY
                 ingredient_id: int
             }
         ],
         steps: [str,],
         tags: [int,]
     }
+    PUT replaces the recipe along with whichever of ingredients, steps and
+        tags are given. Unlike a full replacement the ones left out are kept,
+        send [] to remove them
+    GET accepts ?fields= and ?include= like /recipe/
+    GET ?servings=<int> scales the ingredient amounts and ?system=metric or
+    ?system=us converts them, both put amounts in kitchen friendly units
     """
 
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
+    @conditional_get(
+        lambda request, pk: projections.include_version(request, _recipe_version(pk))
+    )
     def get(self, request, pk):
-        """Get Recipe detail
+        """Get Recipe detail from its stored document
 
         Args:
             request (HttpRequest): Django HttpRequest
             pk (int): Recipe primary key
 
         Returns:
-            Response: DRF Response
+            HttpResponse: stored document or 404 DRF Response
         """
-        try:
-            recipe = _query_recipe_with_relations().get(id=pk)
+        scaling = units.scaling_options(request.query_params)
 
-        except models.Recipe.DoesNotExist:
+        if options := projections.recipe_options(request.query_params):
+            try:
+                recipe = models.Recipe.objects.get(id=pk)
+
+            except models.Recipe.DoesNotExist:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+
+            document = projections.recipe_documents((recipe,), **options)[0]
+
+            return Response(
+                _scaled(document, recipe.servings, **scaling) if scaling else document,
+                status=status.HTTP_200_OK,
+            )
+
+        if (document := documents.get((pk,)).get(pk)) is None:
             response = Response(status=status.HTTP_404_NOT_FOUND)
 
-        else:
+        elif scaling:
+            document = json.loads(document)
             response = Response(
-                _serialize_recipe_with_relations(recipe), status=status.HTTP_200_OK,
+                _scaled(document, document["servings"], **scaling),
+                status=status.HTTP_200_OK,
             )
 
+        else:
+            response = HttpResponse(document, content_type="application/json")
+
         return response
 
     def put(self, request, pk):
-        """Edit an existing recipe
+        """Replace an existing recipe
 
         Args:
             request (HttpRequest): Django HttpRequest
@@ -172,7 +274,7 @@ class RecipeDetailView(APIView):
             Response: DRF Response
         """
         try:
-            recipe = _query_recipe_with_relations().get(id=pk)
+            recipe = models.Recipe.objects.get(id=pk)
 
         except models.Recipe.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND,)
@@ -185,43 +287,61 @@ class RecipeDetailView(APIView):
         data = {**request.data}
         data.pop("author_id", None)
 
-        serializer = RecipeSerializer(recipe, data=data)
+        serializer = NestedRecipeSerializer(recipe, data=data)
 
-        if serializer.is_valid():
-            try:
-                serializer.save()
+        if not serializer.is_valid():
+            return Response(
+                {"errors": utils.serialize_errors(serializer.errors)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            writes.replace_recipe(recipe, serializer.validated_data)
 
-            except IntegrityError as err:
-                return Response(
-                    {"errors": {"non_field_errors": (str(err.__cause__),)}},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        except IntegrityError as err:
+            return Response(
+                {"errors": {"non_field_errors": (str(err.__cause__),)}},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        return Response(
-            _serialize_recipe_with_relations(recipe), status=status.HTTP_200_OK
+        return HttpResponse(
+            documents.get((recipe.id,))[recipe.id], content_type="application/json"
         )
 
 
-def _query_recipe_with_relations():
-    return models.Recipe.objects.prefetch_related(
-        "ingredients_in_recipe",
-        Prefetch("steps", queryset=models.Step.objects.only("instruction")),
-        Prefetch("tags", queryset=models.Tag.objects.only("id")),
-    )
+def _scaled(document: dict, makes: int, servings: int = None, system: str = None):
+    servings = servings or makes
 
+    if "servings" in document:
+        document["servings"] = servings
 
-def _serialize_recipe_with_relations(recipe: models.Recipe) -> dict:
-    serialized_recipe = RecipeSerializer(recipe).data
-    serialized_recipe["ingredients"] = tuple(
-        IngredientInRecipeSerializer(ingredient).data
-        for ingredient in recipe.ingredients_in_recipe.all()
-    )
-    serialized_recipe["steps"] = tuple(
-        instruction
-        for instruction in recipe.steps.values_list("instruction", flat=True).all()
-    )
-    serialized_recipe["tags"] = tuple(
-        int(tag_id) for tag_id in recipe.tags.values_list("id", flat=True).all()
+    if "ingredients" in document:
+        scaled = units.scale(
+            (
+                (Decimal(ingredient["amount"]), ingredient["unit"])
+                for ingredient in document["ingredients"]
+            ),
+            servings,
+            makes,
+            system,
+        )
+        document["ingredients"] = [
+            {**ingredient, "amount": str(amount), "unit": unit}
+            for ingredient, (amount, unit) in zip(document["ingredients"], scaled)
+        ]
+
+    return document
+
+
+def _recipe_version(pk: int):
+    last_updated_on = (
+        models.Recipe.objects.filter(id=pk)
+        .values_list("last_updated_on", flat=True)
+        .first()
     )
 
-    return serialized_recipe
+    return (
+        None
+        if last_updated_on is None
+        else (f"recipe:{pk}:{last_updated_on.isoformat()}", last_updated_on)
+    )
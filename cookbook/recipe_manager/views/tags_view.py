@@ -7,20 +7,24 @@ from rest_framework.decorators import api_view
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework import status
 from django.db import IntegrityError
+from ..conditional import conditional_get
+from ..pagination import CursorPaginationMixin
 from ..serializers import TagSerializer
-from .. import models, utils
+from .. import models, utils, versions
 
 
-class TagView(APIView):
+class TagView(CursorPaginationMixin, APIView):
     """
     [GET, POST]: /tag/
     {id: int, value: str}
     """
 
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    ordering_fields = ("id", "value")
 
+    @conditional_get(lambda request: versions.get(versions.TAGS))
     def get(self, request):
-        """Get tag list
+        """Get a page of tags
 
         Args:
             request (HttpRequest): Django HttpRequest
@@ -28,9 +32,10 @@ class TagView(APIView):
         Returns:
             Response: DRF Response
         """
-        return Response(
-            tuple(TagSerializer(tag).data for tag in models.Tag.objects.all()),
-            status=status.HTTP_200_OK,
+        tags = self.paginate_queryset(models.Tag.objects.all(), request)
+
+        return self.get_paginated_response(
+            tuple(TagSerializer(tag).data for tag in tags)
         )
 
     def post(self, request):
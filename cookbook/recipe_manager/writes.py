@@ -0,0 +1,117 @@
+"""
+Recipes written together with their ingredients, steps and tags in one
+transaction. Related rows are bulk inserted, which sends no signals, so the
+data derived from them is brought up to date by signals.relations_written.
+"""
+from django.db import transaction
+from . import models, signals
+from .utils import delete_rows
+
+RELATIONS = ("ingredients", "steps", "tags")
+
+
+def create_recipe(validated_data: dict) -> models.Recipe:
+    """Create a recipe with its relations
+
+    Args:
+        validated_data (dict): data from NestedRecipeSerializer
+
+    Returns:
+        Recipe: created recipe
+    """
+    fields = {
+        field: value
+        for field, value in validated_data.items()
+        if field not in RELATIONS
+    }
+
+    with transaction.atomic(), signals.refresh_once():
+        recipe = models.Recipe.objects.create(**fields)
+        _write_relations(recipe, validated_data, replace=False)
+
+    return recipe
+
+
+def replace_recipe(recipe: models.Recipe, validated_data: dict) -> models.Recipe:
+    """Replace a recipe's fields and every relation given. Unlike a full
+    replacement, relations left out are kept as they are so a client that only
+    edits the recipe's own fields doesn't wipe them, pass an empty list to
+    remove every item of a relation.
+
+    Args:
+        recipe (Recipe): recipe to replace
+        validated_data (dict): data from NestedRecipeSerializer
+
+    Returns:
+        Recipe: replaced recipe
+    """
+    with transaction.atomic(), signals.refresh_once():
+        for field in ("name", "description", "servings", "cook_time"):
+            setattr(recipe, field, validated_data.get(field, getattr(recipe, field)))
+
+        recipe.save()
+        _write_relations(recipe, validated_data, replace=True)
+
+    return recipe
+
+
+def _write_relations(recipe: models.Recipe, validated_data: dict, replace: bool):
+    if not any(relation in validated_data for relation in RELATIONS):
+        return
+
+    written = {}
+
+    if (ingredients := validated_data.get("ingredients")) is not None:
+        before = ()
+
+        if replace:
+            before = tuple(
+                models.IngredientInRecipe.objects.filter(
+                    recipe_id=recipe.id
+                ).values_list("ingredient_id", flat=True)
+            )
+            # one DELETE without the per row signals, relations_written
+            # does their work once for the whole recipe
+            delete_rows(models.IngredientInRecipe, "recipe", (recipe.id,))
+
+        models.IngredientInRecipe.objects.bulk_create(
+            models.IngredientInRecipe(recipe_id=recipe.id, **ingredient)
+            for ingredient in ingredients
+        )
+        written["ingredients"] = (
+            before,
+            tuple(ingredient["ingredient_id"] for ingredient in ingredients),
+        )
+
+    if (steps := validated_data.get("steps")) is not None:
+        if replace:
+            delete_rows(models.Step, "recipe", (recipe.id,))
+
+        models.Step.objects.bulk_create(
+            models.Step(
+                recipe_id=recipe.id,
+                order=position * models.Step.ORDER_GAP,
+                instruction=instruction,
+            )
+            for position, instruction in enumerate(steps, 1)
+        )
+
+    if (tags := validated_data.get("tags")) is not None:
+        through = models.Recipe.tags.through
+        before = ()
+
+        if replace:
+            before = tuple(
+                through.objects.filter(recipe_id=recipe.id).values_list(
+                    "tag_id", flat=True
+                )
+            )
+            delete_rows(through, "recipe", (recipe.id,))
+
+        through.objects.bulk_create(
+            through(recipe_id=recipe.id, tag_id=tag_id) for tag_id in tags
+        )
+        written["tags"] = (before, tuple(tags))
+
+    # the recipe was saved just before, which updated last_updated_on
+    signals.relations_written(recipe.id, **written, touch=False)
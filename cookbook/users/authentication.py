@@ -3,6 +3,7 @@ app authentication
 """
 from rest_framework import HTTP_HEADER_ENCODING
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from recipe_manager import timing
 
 
 class JWTCookieAuthentication(JWTAuthentication):
@@ -10,6 +11,10 @@ class JWTCookieAuthentication(JWTAuthentication):
     Override JWTAuthentication to prefer cookies if provided
     """
 
+    def authenticate(self, request):
+        with timing.phase(timing.AUTH):
+            return super().authenticate(request)
+
     def get_header(self, request):
         cookie_token = request.COOKIES.get("access")
 